@@ -1,15 +1,20 @@
 ﻿"""
 主程式檔案：處理照片/影片上傳、人臉偵測、隱私處理
 """
+import atexit
 import json
 import os
+import shutil
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
 import cv2  # OpenCV：影像處理
 import numpy as np  # NumPy：數值運算
-from flask import Flask, render_template, request, send_from_directory, abort, url_for, redirect, session, flash, jsonify
+from flask import Flask, Response, render_template, request, send_from_directory, abort, url_for, redirect, session, flash, jsonify, stream_with_context
 from flask_login import login_required, current_user
 from flask_babel import Babel, gettext as _, lazy_gettext
 
@@ -25,11 +30,25 @@ from core.models import (
     ExhibitionFloor,
     ExhibitionCell,
     ExhibitionMergedRegion,
+    ProcessingJob,
     _media_id_from_seq,
     _refresh_media_id_suffix,
     media_cells,
 )  # 資料庫模型
-from core.media_processor import MediaProcessor  # 媒體處理模組
+from core.media_processor import MediaProcessor, PROCESS_MODES, normalize_face_modes, _needs_overlay  # 媒體處理模組
+from core.landmarker_pool import LandmarkerPool, MODE_IMAGE, MODE_VIDEO, MODE_SCORE, quantize_sensitivity  # 人臉偵測器池
+from core.face_landmarks import FaceLandmarks  # 人臉特徵點陣列
+from core.nms import nms, NMS_HARD, NMS_SOFT  # 向量化 NMS
+from core.tiled_detection import detect_tiled, DEFAULT_TILE_SIZE, DEFAULT_OVERLAP, DEFAULT_MAX_FACES  # 人群模式分塊偵測
+from core.detection_cache import DetectionCache, file_sha256, model_fingerprint  # 偵測結果快取
+from core.detection_service import DetectionService, DetectionServiceError, DetectorUnavailable  # 多行程偵測服務
+from core.frame_buffers import FrameBuffers  # 影片逐幀重複使用的緩衝區
+from core.overlay import PreparedOverlay  # 替換模式的覆蓋圖（預乘 alpha、尺寸快取）
+from core.face_atlas import crop_faces, pack_atlas  # 人臉截圖拼貼圖
+from core.live_preview import LivePreviewCache  # 即時效果預覽快取
+from core.job_queue import JobWorker, enqueue_job, active_job_for_media, delete_jobs_for_media  # 處理工作佇列
+from core.progress import ProgressHub, estimate_rate  # 處理進度發布（SSE）
+from core.decorators import super_admin_required
 
 # 匯入 MediaPipe（用於人臉偵測）
 try:
@@ -237,10 +256,6 @@ def _create_face_landmarker_image(min_detection_confidence=0.5):
         return None
 
 
-# 建立預設的照片人臉偵測器（信心度 0.6）
-FACE_LANDMARKER_IMAGE = _create_face_landmarker_image(0.6) if MP_AVAILABLE else None
-
-
 def _create_face_landmarker_video(min_detection_confidence=0.5):
     """
     建立影片用的人臉特徵偵測器
@@ -273,6 +288,161 @@ def _create_face_landmarker_video(min_detection_confidence=0.5):
         return None
 
 
+def _create_face_scorer(min_detection_confidence=0.3):
+    """
+    建立只做人臉偵測的 FaceDetector，用來取得每張臉的信心度
+    （FaceLandmarker 不回傳信心度；這裡使用 face_landmarker.task 內附的同一個偵測模型，
+    因此偵測框與 FaceLandmarker 內部的偵測結果一致）
+    
+    參數：
+        min_detection_confidence: 最低信心度（0.3-0.9）
+    
+    回傳：
+        FaceDetector 物件，模型檔不存在時回傳 None
+    """
+    if not MP_AVAILABLE:
+        return None
+    
+    try:
+        import zipfile
+        
+        model_path = MODEL_DIR / "face_landmarker.task"
+        if not model_path.exists():
+            return None
+        with zipfile.ZipFile(model_path) as bundle:
+            detector_model = bundle.read("face_detector.tflite")
+        
+        options_score = mp_vision.FaceDetectorOptions(
+            base_options=mp_python.BaseOptions(model_asset_buffer=detector_model),
+            min_detection_confidence=min_detection_confidence,
+            running_mode=mp_vision.RunningMode.IMAGE,
+        )
+        return mp_vision.FaceDetector.create_from_options(options_score)
+    except Exception:
+        return None
+
+
+# 人臉偵測器池：依模式與靈敏度重複使用已載入的模型（避免每次請求重新載入）
+LANDMARKER_POOL = LandmarkerPool(
+    {
+        MODE_IMAGE: _create_face_landmarker_image,
+        MODE_VIDEO: _create_face_landmarker_video,
+        MODE_SCORE: _create_face_scorer,
+    },
+    max_idle=int(os.environ.get("LANDMARKER_POOL_SIZE", "8")),
+)
+
+# 照片一律以最低靈敏度偵測一次並保留每張臉的信心度，各種靈敏度都由這份結果篩選而得（不需重新偵測）
+DETECTION_BASE_SENSITIVITY = 0.3
+
+# 預先建立照片用的人臉偵測器與信心度偵測器
+if MP_AVAILABLE:
+    LANDMARKER_POOL.warm(MODE_IMAGE, DETECTION_BASE_SENSITIVITY)
+    LANDMARKER_POOL.warm(MODE_SCORE, DETECTION_BASE_SENSITIVITY)
+
+# 偵測結果快取：以檔案內容雜湊 + 靈敏度 + 模型版本為 key，上傳、選項頁、處理共用
+DETECTION_CACHE = DetectionCache(
+    METADATA_DIR / "detections",
+    model_fingerprint(MODEL_DIR / "face_landmarker.task"),
+)
+DETECTION_CACHE.purge_stale()  # 模型更新後清除舊版本的快取
+
+
+# 人臉框 NMS 模式：hard（預設）或 soft（人群密集時保留較多部分重疊的人臉）
+FACE_NMS_METHOD = os.environ.get("FACE_NMS_METHOD", NMS_HARD)
+if FACE_NMS_METHOD not in (NMS_HARD, NMS_SOFT):
+    raise ValueError(f"FACE_NMS_METHOD 設定錯誤：{FACE_NMS_METHOD}（可用值：{NMS_HARD}、{NMS_SOFT}）")
+
+# 偵測用縮圖設定：長邊超過 DETECTION_MAX_SIDE 的影像先縮小再偵測（0 表示停用），
+# 縮圖上最小的臉小於 DETECTION_MIN_FACE_PX 時自動提高解析度
+DETECTION_MAX_SIDE = int(os.environ.get("DETECTION_MAX_SIDE", "1280"))
+DETECTION_MIN_FACE_PX = int(os.environ.get("DETECTION_MIN_FACE_PX", "40"))
+
+# 影片的關鍵幀間隔：每 N 幀才執行偵測，中間的影格以光流追蹤（場景切換、追蹤失準，或已知人臉以外的
+# 區域有大片變化時立即偵測）；1 表示每一幀都偵測。展場導覽影片建議 5-10。
+# 注意：關鍵幀之間新出現、但畫面變化不大的人臉（例如遠處的小臉、慢慢轉過來的側臉）最多
+# N - 1 幀沒有套用效果；不能容許任何一幀遺漏時請設為 1
+VIDEO_DETECT_STRIDE = max(1, int(os.environ.get("VIDEO_DETECT_STRIDE", "1")))
+
+# 影片處理管線的在途影格數上限：解碼與編碼在獨立的執行緒進行，最多同時保留這麼多張影格（0 表示不使用執行緒）
+VIDEO_PIPELINE_FRAMES = int(os.environ.get("VIDEO_PIPELINE_FRAMES", "6"))
+
+# 長影片分段平行偵測：WORKERS > 1 時把影片切成時間段交給多個 worker 行程偵測（0 或 1 表示不分段），
+# 每段至少 MIN_FRAMES 幀，並從段落起點之前 WARMUP_FRAMES 幀開始偵測，讓平滑與追蹤狀態在交界處延續。
+# 每段使用新的影片偵測器，結果與段落的執行順序、分配到的 worker 無關；段落開頭與整支影片依序處理時
+# 可能有 1-2 像素的差異（偵測器的追蹤狀態由暖機重建），暖機越長越接近
+VIDEO_SEGMENT_WORKERS = int(os.environ.get("VIDEO_SEGMENT_WORKERS", "0"))
+VIDEO_SEGMENT_MIN_FRAMES = int(os.environ.get("VIDEO_SEGMENT_MIN_FRAMES", "240"))
+VIDEO_SEGMENT_WARMUP_FRAMES = int(os.environ.get("VIDEO_SEGMENT_WARMUP_FRAMES", "24"))
+
+# 影片偵測的檢查點間隔（幀數，0 表示不使用）：長影片切成固定長度的段落偵測，每段完成後保存，
+# 處理中斷（worker 結束、請求逾時）後重新執行時從未完成的段落繼續，輸出與未中斷時相同
+VIDEO_CHECKPOINT_FRAMES = int(os.environ.get("VIDEO_CHECKPOINT_FRAMES", "0"))
+# 處理工作的檢查點目錄：每個工作一個子目錄（以 job_id 命名，不隨輸出的日期資料夾或 media_id 改名而變），
+# 工作成功時由 MediaProcessor 刪除，失敗時由 _discard_job_checkpoint 刪除
+JOB_CHECKPOINT_DIR = METADATA_DIR / "checkpoints"
+
+# 預覽圖的長邊上限（0 表示不縮小）：人臉框由選項頁在瀏覽器端依 faces.json 繪製，預覽圖只是底圖
+PREVIEW_MAX_SIDE = int(os.environ.get("PREVIEW_MAX_SIDE", "1280"))
+
+# 即時效果預覽：代理影像的長邊上限、保留的代理影像與渲染結果數量
+LIVE_PREVIEW_MAX_SIDE = int(os.environ.get("LIVE_PREVIEW_MAX_SIDE", "960"))
+LIVE_PREVIEWS = LivePreviewCache(
+    max_proxies=int(os.environ.get("LIVE_PREVIEW_PROXIES", "16")),
+    max_renders=int(os.environ.get("LIVE_PREVIEW_RENDERS", "128")),
+)
+
+# 人群模式（分塊偵測）設定：區塊大小、重疊比例、人臉數量上限、平行執行緒數（0 表示使用 CPU 核心數）
+CROWD_TILE_SIZE = int(os.environ.get("CROWD_TILE_SIZE", DEFAULT_TILE_SIZE))
+CROWD_TILE_OVERLAP = float(os.environ.get("CROWD_TILE_OVERLAP", DEFAULT_OVERLAP))
+CROWD_MAX_FACES = int(os.environ.get("CROWD_MAX_FACES", DEFAULT_MAX_FACES))
+CROWD_WORKERS = int(os.environ.get("CROWD_WORKERS", "0")) or None
+
+# 多行程偵測服務：DETECTION_SERVICE_WORKERS > 0 時，偵測改由常駐的 worker 行程執行（0 表示在本行程偵測）；
+# SLOTS 為共享記憶體中同時在途的影格數（0 表示 worker 數 × 2），SLOT_MB 為每個 slot 的大小
+DETECTION_SERVICE_WORKERS = int(os.environ.get("DETECTION_SERVICE_WORKERS", "0"))
+DETECTION_SERVICE_SLOTS = int(os.environ.get("DETECTION_SERVICE_SLOTS", "0")) or None
+DETECTION_SERVICE_SLOT_MB = int(os.environ.get("DETECTION_SERVICE_SLOT_MB", "24"))
+
+# 處理工作佇列：租約長度（秒）、worker 中斷時的重試上限，以及網站行程內執行工作的背景執行緒數
+# （另外以 scripts/run_job_worker.py 執行獨立的 worker 時，網站主機可設為 0，只負責排入工作）
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_WORKERS_IN_PROCESS = int(os.environ.get("JOB_WORKERS_IN_PROCESS", "1"))
+
+# 處理進度的 SSE 串流：本行程的 worker 發布的進度直接推送；工作在其他主機處理時，每 POLL_SECONDS 秒
+# 讀取資料庫中心跳寫入的進度。每條串流最多維持 STREAM_SECONDS 秒，之後由瀏覽器自動重新連線
+JOB_PROGRESS = ProgressHub()
+PROGRESS_POLL_SECONDS = float(os.environ.get("PROGRESS_POLL_SECONDS", "1.0"))
+PROGRESS_STREAM_SECONDS = int(os.environ.get("PROGRESS_STREAM_SECONDS", "300"))
+# 串流閒置時送出註解行的間隔（秒），避免反向代理關閉閒置連線
+_PROGRESS_KEEPALIVE_SECONDS = 15
+
+_detection_service = None
+_detection_service_lock = threading.Lock()
+
+
+def get_detection_service():
+    """
+    取得偵測服務（第一次使用時才啟動 worker 行程）
+    
+    回傳：
+        DetectionService；未啟用或 MediaPipe 不可用時回傳 None（呼叫端改用本行程的偵測器池）
+    """
+    global _detection_service
+    if DETECTION_SERVICE_WORKERS <= 0 or not MP_AVAILABLE:
+        return None
+    with _detection_service_lock:
+        if _detection_service is None:
+            _detection_service = DetectionService(
+                workers=DETECTION_SERVICE_WORKERS,
+                slots=DETECTION_SERVICE_SLOTS,
+                slot_bytes=DETECTION_SERVICE_SLOT_MB * (1 << 20),
+            ).start()
+            atexit.register(_detection_service.close)
+        return _detection_service
+
+
 # ==================== 檔案類型設定 ====================
 # 允許的檔案格式
 ALLOWED_IMAGE_EXT = {".jpg", ".jpeg", ".png", ".webp"}
@@ -301,17 +471,15 @@ def _rename_media_ids(old_id: str, new_id: str, media_record: Media):
     for p in PREVIEW_DIR.glob(f"{old_id}_preview.*"):
         new_p = p.parent / f"{new_id}_preview{p.suffix}"
         p.rename(new_p)
-    # 2b. 預覽目錄下的人臉截圖（{media_id}_face_0.jpg 等）
-    for p in PREVIEW_DIR.glob(f"{old_id}_face_*.jpg"):
-        rest = p.name[len(old_id) :]
-        p.rename(p.parent / f"{new_id}{rest}")
-    # 3. metadata（faces.json、face crops）
-    j = METADATA_DIR / f"{old_id}_faces.json"
-    if j.exists():
-        j.rename(METADATA_DIR / f"{new_id}_faces.json")
-    for p in METADATA_DIR.glob(f"{old_id}_face_*.jpg"):
-        rest = p.name[len(old_id) :]
-        p.rename(METADATA_DIR / f"{new_id}{rest}")
+    # 2b. 人臉截圖拼貼圖（{media_id}_faces.jpg）
+    atlas = _face_atlas_path(old_id)
+    if atlas.exists():
+        atlas.rename(_face_atlas_path(new_id))
+    # 3. metadata（faces.json、偵測參數、特徵點檔）
+    for suffix in ("_faces.json", "_detect.json", "_landmarks.lmk"):
+        j = METADATA_DIR / f"{old_id}{suffix}"
+        if j.exists():
+            j.rename(METADATA_DIR / f"{new_id}{suffix}")
     # 4. 輸出品（outputs 底下的 {old_id}_out.*）
     for base in (OUTPUT_IMAGE_DIR, OUTPUT_VIDEO_DIR):
         for p in base.rglob(f"{old_id}_out.*"):
@@ -338,6 +506,8 @@ def _rename_media_ids(old_id: str, new_id: str, media_record: Media):
                 ep.photo_path = ep.photo_path.replace(old_id, new_id)
             if ep.thumbnail_path and old_id in ep.thumbnail_path:
                 ep.thumbnail_path = ep.thumbnail_path.replace(old_id, new_id)
+    # 8. 處理工作（狀態頁與處理結果依 media_id 查詢）
+    ProcessingJob.query.filter_by(media_id=old_id).update({ProcessingJob.media_id: new_id}, synchronize_session=False)
 
 
 def _apply_real_media_id(media_record: Media) -> str:
@@ -365,10 +535,87 @@ def _is_video(path: Path) -> bool:
 
 
 
+def _run_landmarker(image_bgr: np.ndarray, landmarker, timestamp_ms: int | None = None, buffers=None, scorer=None):
+    """
+    執行 MediaPipe 偵測並轉為 FaceLandmarks（不計算邊界框、不做 NMS）
+    
+    參數：
+        image_bgr: OpenCV 圖片（BGR 格式）
+        landmarker: MediaPipe 人臉偵測器
+        timestamp_ms: 影片時間戳（毫秒），照片模式時為 None
+        buffers: FrameBuffers（影片逐幀處理時重複使用 RGB 轉換用的陣列），None 時每次配置新陣列
+        scorer: 照片模式的 FaceDetector（見 _create_face_scorer）；提供時在同一張影像上偵測並為每張臉補上信心度
+    """
+    # 將 BGR 轉換為 RGB（MediaPipe 需要）
+    rgb = cv2.cvtColor(
+        image_bgr,
+        cv2.COLOR_BGR2RGB,
+        dst=buffers.get("rgb", image_bgr.shape) if buffers is not None else None,
+    )
+    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+    
+    if timestamp_ms is None:
+        mp_result = landmarker.detect(mp_image)  # 照片模式
+    else:
+        mp_result = landmarker.detect_for_video(mp_image, timestamp_ms)  # 影片模式
+    
+    if not mp_result.face_landmarks:
+        return FaceLandmarks.empty()
+    h_img, w_img = image_bgr.shape[:2]
+    landmarks = FaceLandmarks.from_mediapipe(mp_result.face_landmarks, w_img, h_img)
+    if scorer is not None and landmarks:
+        detections = scorer.detect(mp_image).detections
+        det_boxes = [
+            (d.bounding_box.origin_x, d.bounding_box.origin_y,
+             d.bounding_box.origin_x + d.bounding_box.width, d.bounding_box.origin_y + d.bounding_box.height)
+            for d in detections
+        ]
+        det_scores = [d.categories[0].score if d.categories else np.nan for d in detections]
+        landmarks = landmarks.with_detection_scores(np.array(det_boxes), np.array(det_scores))
+    return landmarks
+
+
+def _run_landmarker_at(image_bgr: np.ndarray, landmarker, timestamp_ms: int | None, side: int, buffers=None, scorer=None):
+    """
+    在長邊為 side 的縮圖（proxy）上執行偵測，並把特徵點換回原圖座標
+    side 不小於原圖長邊時直接在原圖上偵測
+    """
+    h_img, w_img = image_bgr.shape[:2]
+    native_side = max(h_img, w_img)
+    if side >= native_side:
+        return _run_landmarker(image_bgr, landmarker, timestamp_ms, buffers, scorer)
+    scale = side / native_side
+    proxy_w, proxy_h = max(1, round(w_img * scale)), max(1, round(h_img * scale))
+    proxy = cv2.resize(
+        image_bgr,
+        (proxy_w, proxy_h),
+        dst=buffers.get("proxy", (proxy_h, proxy_w) + image_bgr.shape[2:]) if buffers is not None else None,
+        interpolation=cv2.INTER_AREA,
+    )
+    return _run_landmarker(proxy, landmarker, timestamp_ms, buffers, scorer).transformed(scale=1.0 / scale)
+
+
+def _required_detection_side(landmarks, native_side: int, side: int) -> int:
+    """
+    依偵測到的最小人臉，計算需要的偵測解析度（長邊像素）
+    縮圖上最小的臉小於 DETECTION_MIN_FACE_PX 時回傳較大的解析度（最多為原圖）
+    """
+    if not landmarks or side >= native_side:
+        return side
+    ext = landmarks.extents()
+    min_face = float(np.maximum(ext[:, 2] - ext[:, 0], ext[:, 3] - ext[:, 1]).min())
+    if min_face <= 0 or min_face * side / native_side >= DETECTION_MIN_FACE_PX:
+        return side
+    return min(native_side, int(np.ceil(native_side * DETECTION_MIN_FACE_PX / min_face)))
+
+
 def _detect_landmarks_bgr(
     image_bgr: np.ndarray,
     landmarker,
     timestamp_ms: int | None = None,
+    max_side: int | None = None,
+    buffers=None,
+    scorer=None,
 ):
     """
     偵測人臉並找出特徵點（478個關鍵點）
@@ -377,71 +624,219 @@ def _detect_landmarks_bgr(
         image_bgr: OpenCV 圖片（BGR 格式）
         landmarker: MediaPipe 人臉偵測器
         timestamp_ms: 影片時間戳（毫秒），照片模式時為 None
+        max_side: 偵測用縮圖的長邊上限（None 時使用 DETECTION_MAX_SIDE，0 表示用原圖偵測）
+        buffers: FrameBuffers（影片逐幀處理時重複使用縮圖與 RGB 陣列），None 時每次配置新陣列
+        scorer: 信心度偵測器（見 _run_landmarker），None 時信心度為 NaN
     
     回傳：
-        (landmarks, boxes) - 特徵點陣列和邊界框陣列
+        (landmarks, boxes) - FaceLandmarks 特徵點陣列和邊界框陣列（原圖座標）
+    
+    大圖先縮小再偵測（省下整張原圖的 RGB 轉換與推論時間），結果換回原圖座標；
+    若縮圖上的臉太小，會自動提高解析度重新偵測一次。
     """
     if landmarker is None:
-        return [], np.array([])
+        return FaceLandmarks.empty(), np.array([])
     
-    # 步驟 1：將 BGR 轉換為 RGB（MediaPipe 需要）
-    rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+    h_img, w_img = image_bgr.shape[:2]  # 取得圖片尺寸
+    native_side = max(h_img, w_img)
+    if max_side is None:
+        max_side = DETECTION_MAX_SIDE
+    side = min(native_side, max_side) if max_side else native_side
     
-    # 步驟 2：執行偵測
-    if timestamp_ms is None:
-        mp_result = landmarker.detect(mp_image)  # 照片模式
-    else:
-        mp_result = landmarker.detect_for_video(mp_image, timestamp_ms)  # 影片模式
+    # 步驟 1-2：在縮圖上執行偵測，並一次把所有特徵點轉成陣列（原圖座標）
+    landmarks = _run_landmarker_at(image_bgr, landmarker, timestamp_ms, side, buffers, scorer)
+    
+    # 縮圖上的臉太小時（特徵點不準），改用較高解析度重新偵測
+    required_side = _required_detection_side(landmarks, native_side, side)
+    if required_side > side:
+        landmarks = _run_landmarker_at(image_bgr, landmarker, timestamp_ms, required_side, buffers, scorer)
     
     # 如果沒有偵測到人臉，回傳空陣列
-    if not mp_result.face_landmarks:
-        return [], np.array([])
+    if not landmarks:
+        return FaceLandmarks.empty(), np.array([])
     
-    # 步驟 3：將特徵點轉換為邊界框（bounding box）
-    h_img, w_img = image_bgr.shape[:2]  # 取得圖片尺寸
-    boxes = []
-    
-    for landmarks in mp_result.face_landmarks:
-        # 取得所有特徵點的 x, y 座標
-        xs = [int(lm.x * w_img) for lm in landmarks]
-        ys = [int(lm.y * h_img) for lm in landmarks]
-        
-        if not xs or not ys:
-            continue
-        
-        # 計算最小的矩形框住所有特徵點
-        min_x, max_x = max(0, min(xs)), min(w_img, max(xs))
-        min_y, max_y = max(0, min(ys)), min(h_img, max(ys))
-        w = max_x - min_x
-        h = max_y - min_y
-        
-        # 擴大框的範圍（避免只框到臉部特徵，不含頭髮、下巴等）
-        expand_top = int(h * 0.3)    # 向上擴展 30%（包含額頭）
-        expand_sides = int(w * 0.15)  # 左右各擴展 15%
-        
-        min_x = max(0, min_x - expand_sides)
-        max_x = min(w_img, max_x + expand_sides)
-        min_y = max(0, min_y - expand_top)
-        max_y = min(h_img, max_y)
-        
-        # 重新計算擴展後的寬高
-        w = max_x - min_x
-        h = max_y - min_y
-        
-        if w > 0 and h > 0:
-            boxes.append((min_x, min_y, w, h))
+    # 步驟 3：計算邊界框（含額頭與兩側的擴展）
+    boxes = landmarks.compute_boxes(w_img, h_img)
+    valid = np.flatnonzero((boxes[:, 2] > 0) & (boxes[:, 3] > 0))
+    landmarks = landmarks.select(valid)
+    landmarks.boxes = boxes[valid]
     
     # 步驟 4：使用 NMS（非極大值抑制）移除重疊的框
-    keep_idx = _nms_indices(boxes)
+    keep_idx = _nms_indices(landmarks.boxes, scores=landmarks.scores, method=FACE_NMS_METHOD)
     if not keep_idx:
-        return [], np.array([])
+        return FaceLandmarks.empty(), np.array([])
     
     # 只保留沒有重疊的人臉
-    filtered_landmarks = [mp_result.face_landmarks[i] for i in keep_idx]
-    filtered_boxes = [boxes[i] for i in keep_idx]
+    landmarks = landmarks.select(keep_idx)
+    return landmarks, landmarks.boxes
+
+
+def _detect_landmarks_crowd(
+    image_bgr: np.ndarray,
+    sensitivity: float = 0.6,
+    max_faces: int | None = None,
+):
+    """
+    人群模式：分塊平行偵測高解析度照片中的小臉（遠處的觀眾等）
+    
+    參數：
+        image_bgr: OpenCV 圖片（BGR 格式）
+        sensitivity: 人臉偵測靈敏度（0.3-0.9）
+        max_faces: 最多保留的人臉數量（None 時使用 CROWD_MAX_FACES）
+    
+    回傳：
+        (landmarks, boxes) - 與 _detect_landmarks_bgr 相同格式（原圖座標）
     
-    return filtered_landmarks, np.array(filtered_boxes)
+    每個執行緒各自從偵測器池借用偵測器，記憶體用量只與區塊大小有關。
+    """
+    if not MP_AVAILABLE:
+        return FaceLandmarks.empty(), np.array([])
+    
+    def detect_tile(tile_bgr):
+        with (
+            LANDMARKER_POOL.lease(MODE_IMAGE, sensitivity) as landmarker,
+            LANDMARKER_POOL.lease(MODE_SCORE, sensitivity) as scorer,
+        ):
+            if landmarker is None:
+                return FaceLandmarks.empty()
+            return _run_landmarker(tile_bgr, landmarker, scorer=scorer)
+    
+    landmarks = detect_tiled(
+        image_bgr,
+        detect_tile,
+        tile_size=CROWD_TILE_SIZE,
+        overlap=CROWD_TILE_OVERLAP,
+        max_faces=max_faces or CROWD_MAX_FACES,
+        workers=CROWD_WORKERS,
+        nms_method=FACE_NMS_METHOD,
+    )
+    if not landmarks:
+        return FaceLandmarks.empty(), np.array([])
+    return landmarks, landmarks.boxes
+
+
+def _detection_variant(crowd: bool = False, max_side: int | None = None, max_faces: int | None = None) -> str:
+    """會影響偵測結果的參數（作為快取 key 的一部分）"""
+    if crowd:
+        return f"crowd{CROWD_TILE_SIZE}-{CROWD_TILE_OVERLAP}-{max_faces or CROWD_MAX_FACES}-{FACE_NMS_METHOD}"
+    if max_side is None:
+        max_side = DETECTION_MAX_SIDE
+    return f"img{max_side}-{DETECTION_MIN_FACE_PX}-{FACE_NMS_METHOD}"
+
+
+def _detect_image_cached(
+    image_bgr: np.ndarray,
+    content_hash: str | None,
+    sensitivity: float = 0.6,
+    crowd: bool = False,
+    max_side: int | None = None,
+    max_faces: int | None = None,
+    variant_suffix: str = "",
+):
+    """
+    偵測照片（或影片第一幀）的人臉，相同內容與參數的結果直接從快取取得
+    
+    偵測一律以 DETECTION_BASE_SENSITIVITY 執行一次，保留所有候選人臉與信心度並寫入快取；
+    指定的靈敏度只是篩選條件（信心度不低於靈敏度的臉），因此換靈敏度不需重新偵測。
+    
+    參數：
+        image_bgr: OpenCV 圖片（BGR 格式）
+        content_hash: 來源檔案的內容雜湊（None 時不使用快取）
+        sensitivity: 人臉偵測靈敏度（0.3-0.9）
+        crowd, max_side, max_faces: 偵測參數（見 _detect_landmarks_crowd / _detect_landmarks_bgr）
+        variant_suffix: 額外的 key 後綴（例如影片第一幀用 "-frame0"）
+    
+    回傳：
+        (landmarks, boxes) - 與 _detect_landmarks_bgr 相同格式
+    """
+    candidates = _detect_candidates_cached(image_bgr, content_hash, crowd, max_side, max_faces, variant_suffix)
+    landmarks = candidates.filter_scores(quantize_sensitivity(sensitivity), DETECTION_BASE_SENSITIVITY)
+    if not landmarks:
+        return FaceLandmarks.empty(), np.array([])
+    return landmarks, landmarks.boxes
+
+
+def _detect_candidates_cached(
+    image_bgr: np.ndarray,
+    content_hash: str | None,
+    crowd: bool = False,
+    max_side: int | None = None,
+    max_faces: int | None = None,
+    variant_suffix: str = "",
+):
+    """
+    以最低靈敏度偵測所有候選人臉（含信心度），結果以內容雜湊快取
+    
+    回傳：
+        FaceLandmarks（scores 為各臉的偵測信心度）
+    """
+    sensitivity = DETECTION_BASE_SENSITIVITY
+    variant = _detection_variant(crowd, max_side, max_faces) + variant_suffix
+    if content_hash:
+        cached = DETECTION_CACHE.get(content_hash, sensitivity, variant)
+        if cached is not None:
+            return cached
+    
+    landmarks = None
+    service = get_detection_service()
+    if service is not None:
+        try:
+            landmarks, _ = service.detect(
+                image_bgr, sensitivity, crowd=crowd, max_side=max_side, max_faces=max_faces
+            )
+            detected = True
+        except DetectorUnavailable:
+            landmarks = FaceLandmarks.empty()
+            detected = False
+        except DetectionServiceError:
+            landmarks = None  # 服務異常時改在本行程偵測
+    
+    if landmarks is None and crowd:
+        landmarks, _ = _detect_landmarks_crowd(image_bgr, sensitivity, max_faces)
+        detected = MP_AVAILABLE
+    elif landmarks is None:
+        with (
+            LANDMARKER_POOL.lease(MODE_IMAGE, sensitivity) as landmarker,
+            LANDMARKER_POOL.lease(MODE_SCORE, sensitivity) as scorer,
+        ):
+            landmarks, _ = _detect_landmarks_bgr(image_bgr, landmarker, None, max_side=max_side, scorer=scorer)
+            detected = landmarker is not None
+    
+    # 偵測器無法使用時的空結果不寫入快取
+    if content_hash and detected:
+        DETECTION_CACHE.put(content_hash, sensitivity, landmarks, variant)
+    return landmarks
+
+
+@contextmanager
+def _video_detector(sensitivity: float = 0.6, local: bool = False):
+    """
+    影片逐幀偵測用的偵測函數（with 區塊結束時釋放偵測器）
+    
+    啟用偵測服務時由服務的 worker 行程偵測（同一支影片固定送往同一個 worker，保留追蹤狀態），
+    否則向本行程的偵測器池借用影片模式的偵測器。
+    服務的 worker 中途結束時 detect 會拋出 DetectionServiceError（追蹤狀態隨 worker 消失），
+    呼叫端應以 local=True 在本行程從頭重新偵測。
+    
+    參數：
+        local: 不使用偵測服務，一律在本行程偵測
+    
+    產生：
+        detect(frame, timestamp_ms, max_side) -> (landmarks, boxes)；偵測器無法使用時為 None
+    """
+    service = get_detection_service() if not local else None
+    if service is not None:
+        with service.open_stream(sensitivity) as stream:
+            yield stream.detect
+        return
+    with LANDMARKER_POOL.lease(MODE_VIDEO, sensitivity) as landmarker:
+        if landmarker is None:
+            yield None
+            return
+        buffers = FrameBuffers()
+        yield lambda frame, timestamp_ms, max_side=None: _detect_landmarks_bgr(
+            frame, landmarker, timestamp_ms, max_side=max_side, buffers=buffers
+        )
 
 
 def detect_faces_bgr(image_bgr: np.ndarray):
@@ -454,9 +849,10 @@ def detect_faces_bgr(image_bgr: np.ndarray):
     回傳：
         人臉邊界框陣列 [(x, y, w, h), ...]
     """
-    if FACE_LANDMARKER_IMAGE is None:
-        return np.array([])
-    _, boxes = _detect_landmarks_bgr(image_bgr, FACE_LANDMARKER_IMAGE, timestamp_ms=None)
+    with LANDMARKER_POOL.lease(MODE_IMAGE, 0.6) as landmarker:
+        if landmarker is None:
+            return np.array([])
+        _, boxes = _detect_landmarks_bgr(image_bgr, landmarker, timestamp_ms=None)
     return boxes
 
 
@@ -509,171 +905,110 @@ def _smooth_faces(prev_faces, curr_faces, alpha=0.7):
     - 移動快時：跟隨度高（避免延遲）
     - 移動慢時：平滑度高（避免抖動）
     """
-    # 如果沒有目前幀的人臉，使用上一幀
+    # 如果沒有目前幀的人臉，使用上一幀（第一幀就沒有人臉時回傳空陣列）
     if curr_faces is None or len(curr_faces) == 0:
-        return prev_faces
+        return prev_faces if prev_faces is not None else curr_faces
     
     # 如果沒有上一幀，直接使用目前幀
     if prev_faces is None or len(prev_faces) == 0:
         return curr_faces
     
-    # 排序人臉（確保對應到同一張臉）
-    prev_faces = _sort_faces(prev_faces)
-    curr_faces = _sort_faces(curr_faces)
+    prev = np.asarray(prev_faces, dtype=np.float64).reshape(-1, 4)
+    curr = np.asarray(curr_faces, dtype=np.float64).reshape(-1, 4)
     
     # 如果人臉數量不同，無法對應，直接使用目前幀
-    if len(prev_faces) != len(curr_faces):
+    if len(prev) != len(curr):
         return curr_faces
     
-    # 計算平滑後的位置
-    smoothed = []
-    for (px, py, pw, ph), (cx, cy, cw, ch) in zip(prev_faces, curr_faces):
-        # 計算人臉的移動距離（相對於臉的大小）
-        face_size = max(pw, ph)
-        if face_size == 0:
-            face_size = 1
-        
-        dx = abs(cx - px) / face_size  # x 方向的相對移動
-        dy = abs(cy - py) / face_size  # y 方向的相對移動
-        movement = (dx**2 + dy**2) ** 0.5  # 總移動距離
-        
-        # 根據移動速度調整平滑係數
-        if movement > 0.3:  # 快速移動
-            adaptive_alpha = 0.2  # 降低平滑（快速跟隨）
-        elif movement > 0.1:  # 中速移動
-            adaptive_alpha = 0.4
-        else:  # 慢速移動
-            adaptive_alpha = 0.7  # 提高平滑（減少抖動）
-        
-        # 計算平滑後的座標（加權平均）
-        sx = int(round(adaptive_alpha * px + (1 - adaptive_alpha) * cx))
-        sy = int(round(adaptive_alpha * py + (1 - adaptive_alpha) * cy))
-        sw = int(round(adaptive_alpha * pw + (1 - adaptive_alpha) * cw))
-        sh = int(round(adaptive_alpha * ph + (1 - adaptive_alpha) * ch))
-        smoothed.append((sx, sy, sw, sh))
-    
-    return np.array(smoothed)
-
-
-def _compute_iou(a, b):
-    """
-    計算兩個矩形的 IoU（Intersection over Union，重疊度）
-    
-    參數：
-        a, b: 兩個矩形 (x, y, w, h)
-    
-    回傳：
-        0.0-1.0 之間的數值，0 表示完全不重疊，1 表示完全重疊
+    # 依位置排序後一一對應（確保對應到同一張臉），結果仍依目前幀的順序輸出，
+    # 讓邊界框與特徵點的索引保持一致
+    prev_order = np.lexsort((prev[:, 1], prev[:, 0]))
+    curr_order = np.lexsort((curr[:, 1], curr[:, 0]))
+    p = prev[prev_order]
+    c = curr[curr_order]
     
-    用途：NMS（非極大值抑制）時判斷兩個人臉框是否重疊
-    """
-    ax, ay, aw, ah = a
-    bx, by, bw, bh = b
-    ax2, ay2 = ax + aw, ay + ah  # a 的右下角
-    bx2, by2 = bx + bw, by + bh  # b 的右下角
+    # 計算人臉的移動距離（相對於臉的大小）
+    face_size = np.maximum(p[:, 2], p[:, 3])
+    face_size[face_size == 0] = 1
+    movement = np.hypot((c[:, 0] - p[:, 0]) / face_size, (c[:, 1] - p[:, 1]) / face_size)
     
-    # 計算交集矩形
-    inter_x1 = max(ax, bx)
-    inter_y1 = max(ay, by)
-    inter_x2 = min(ax2, bx2)
-    inter_y2 = min(ay2, by2)
-    inter_w = max(0, inter_x2 - inter_x1)
-    inter_h = max(0, inter_y2 - inter_y1)
-    inter_area = inter_w * inter_h  # 交集面積
+    # 根據移動速度調整平滑係數：快速移動 0.2、中速 0.4、慢速 0.7
+    adaptive_alpha = np.where(movement > 0.3, 0.2, np.where(movement > 0.1, 0.4, 0.7))[:, None]
     
-    if inter_area == 0:
-        return 0.0
-    
-    # 計算聯集面積
-    area_a = aw * ah
-    area_b = bw * bh
-    union_area = area_a + area_b - inter_area
-    
-    return inter_area / float(union_area)
+    # 計算平滑後的座標（加權平均）
+    smoothed = np.empty((len(c), 4), dtype=np.int32)
+    smoothed[curr_order] = np.rint(adaptive_alpha * p + (1 - adaptive_alpha) * c)
+    return smoothed
 
 
-def _nms_indices(faces, iou_thresh=0.45):
+def _nms_indices(faces, iou_thresh=0.45, scores=None, method=NMS_HARD):
     """
     NMS（非極大值抑制）- 移除重疊的人臉框
     
     參數：
         faces: 人臉框陣列 [(x, y, w, h), ...]
         iou_thresh: IoU 閾值，超過此值視為重疊
+        scores: 偵測信心度（可選），未提供時依面積排序
+        method: 'hard' 或 'soft'（Soft-NMS，適合人群密集的畫面）
     
     回傳：
         要保留的人臉索引列表
     
     原理：
-    1. 依面積大小排序（大的優先）
-    2. 保留最大的，移除與它重疊的
+    1. 依信心度（或面積）排序，高的優先
+    2. 一次算出所有框之間的 IoU 矩陣，保留最高分的，移除與它重疊的
     3. 重複直到所有人臉都處理完
     """
     if faces is None or len(faces) == 0:
         return []
-    
-    faces = np.array(faces)
-    scores = faces[:, 2] * faces[:, 3]  # 用面積當作分數
-    order = scores.argsort()[::-1]  # 從大到小排序
-    keep_idx = []
-    
-    while order.size > 0:
-        i = order[0]
-        keep_idx.append(int(i))  # 保留最大的
-        
-        if order.size == 1:
-            break
-        
-        # 檢查剩下的人臉是否與目前這張重疊
-        rest = []
-        for j in order[1:]:
-            if _compute_iou(faces[i], faces[j]) <= iou_thresh:
-                rest.append(j)  # 不重疊，保留
-        
-        order = np.array(rest, dtype=int)
-    
-    return keep_idx
+    return nms(faces, scores=scores, iou_thresh=iou_thresh, method=method)
 
 
 # ==================== 人臉資料儲存與載入 ====================
 
-def _save_faces_metadata(image_bgr: np.ndarray, faces, media_id: str):
+def _face_atlas_path(media_id: str) -> Path:
+    """人臉截圖拼貼圖的路徑（每個媒體一張）"""
+    return PREVIEW_DIR / f"{media_id}_faces.jpg"
+
+
+def _save_faces_metadata(image_bgr: np.ndarray, faces, media_id: str, scores=None):
     """
     儲存偵測到的人臉資訊
-    1. 裁切每張人臉並儲存為獨立圖片
-    2. 將人臉位置資訊儲存為 JSON
+    1. 裁切每張人臉，拼成一張拼貼圖（previews/<media_id>_faces.jpg）
+    2. 將人臉位置與在拼貼圖中的位置儲存為 JSON
     
     參數：
         image_bgr: 原始圖片
         faces: 人臉框陣列
         media_id: 媒體檔案 ID
+        scores: 各人臉的偵測信心度（可選，NaN 表示未知）
     
     回傳：
-        人臉資訊列表 [{"id": 0, "x": 100, "y": 200, "w": 80, "h": 100, "file": "xxx_face_0.jpg"}, ...]
+        人臉資訊列表 [{"id": 0, "x": 100, "y": 200, "w": 80, "h": 100, "score": 0.92,
+                       "sprite": {"x": 0, "y": 0, "w": 64, "h": 80}}, ...]
+        框落在畫面外的人臉 "sprite" 為 None；信心度未知時 "score" 為 None
     """
-    items = []
     if faces is None or len(faces) == 0:
         faces = []
     
-    for idx, (x, y, w, h) in enumerate(faces):
-        # 裁切人臉區域
-        x1, y1 = max(0, x), max(0, y)
-        x2, y2 = max(0, x + w), max(0, y + h)
-        crop = image_bgr[y1:y2, x1:x2]
-        
-        # 儲存人臉圖片
-        crop_name = f"{media_id}_face_{idx}.jpg"
-        crop_path = PREVIEW_DIR / crop_name
-        if crop.size > 0:
-            cv2.imwrite(str(crop_path), crop)
-        
-        # 記錄人臉資訊
+    atlas, rects = pack_atlas(crop_faces(image_bgr, faces))
+    atlas_path = _face_atlas_path(media_id)
+    if atlas is not None:
+        cv2.imwrite(str(atlas_path), atlas, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    elif atlas_path.exists():
+        atlas_path.unlink()
+    
+    items = []
+    for idx, ((x, y, w, h), rect) in enumerate(zip(faces, rects)):
+        score = float(scores[idx]) if scores is not None and idx < len(scores) else float("nan")
         items.append({
             "id": idx,
             "x": int(x),
             "y": int(y),
             "w": int(w),
             "h": int(h),
-            "file": crop_name
+            "score": round(score, 3) if np.isfinite(score) else None,
+            "sprite": dict(zip(("x", "y", "w", "h"), map(int, rect))) if rect is not None else None,
         })
     
     # 將資訊儲存為 JSON 檔案
@@ -701,6 +1036,39 @@ def _load_faces_metadata(media_id: str):
         return json.load(f)
 
 
+def _save_detection_ref(media_id: str, content_hash: str, sensitivity: float, image_bgr: np.ndarray | None = None):
+    """
+    記錄上傳時偵測所用的參數（內容雜湊與靈敏度），
+    讓 /process 以相同參數命中偵測快取，處理的人臉與選項頁勾選的人臉一致；
+    傳入 image_bgr 時一併記錄偵測畫面的尺寸，選項頁據此把人臉框換算到縮小後的預覽圖上
+    """
+    ref = {"content_hash": content_hash, "sensitivity": sensitivity}
+    if image_bgr is not None:
+        ref["frame_size"] = [int(image_bgr.shape[1]), int(image_bgr.shape[0])]
+    ref_path = METADATA_DIR / f"{media_id}_detect.json"
+    with open(ref_path, "w", encoding="utf-8") as f:
+        json.dump(ref, f)
+
+
+def _load_detection_ref(media_id: str):
+    """載入上傳時的偵測參數，找不到時回傳 None"""
+    ref_path = METADATA_DIR / f"{media_id}_detect.json"
+    if not ref_path.exists():
+        return None
+    with open(ref_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _load_media_frame(src_path: Path, is_video: bool):
+    """讀取照片，影片則讀取第一幀（與上傳時偵測的畫面相同）；無法讀取時回傳 None"""
+    if not is_video:
+        return cv2.imread(str(src_path))
+    cap = cv2.VideoCapture(str(src_path))
+    ok, frame = cap.read()
+    cap.release()
+    return frame if ok else None
+
+
 def _filter_faces_by_indices(faces, selected_ids):
     """
     根據使用者選擇，篩選要處理的人臉
@@ -717,12 +1085,9 @@ def _filter_faces_by_indices(faces, selected_ids):
     if not selected_ids:
         return faces
     
-    selected = []
-    for idx in selected_ids:
-        if 0 <= idx < len(faces):
-            selected.append(tuple(faces[idx]))
-    
-    return np.array(selected)
+    faces = np.asarray(faces)
+    idx = [i for i in selected_ids if 0 <= i < len(faces)]
+    return faces[idx]
 
 
 def _filter_landmarks_by_indices(landmarks, selected_ids):
@@ -730,45 +1095,55 @@ def _filter_landmarks_by_indices(landmarks, selected_ids):
     根據使用者選擇，篩選要處理的人臉特徵點
     
     參數：
-        landmarks: 所有人臉特徵點
+        landmarks: 所有人臉特徵點（FaceLandmarks）
         selected_ids: 使用者選擇的人臉 ID 列表
     
     回傳：
-        篩選後的特徵點列表
+        篩選後的 FaceLandmarks
     """
     if not landmarks:
-        return []
+        return FaceLandmarks.empty()
     if not selected_ids:
         return landmarks
     
-    selected = []
-    for idx in selected_ids:
-        if 0 <= idx < len(landmarks):
-            selected.append(landmarks[idx])
-    
-    return selected
+    return landmarks.select(i for i in selected_ids if 0 <= i < len(landmarks))
 
 
 # ==================== 影像處理函式 ====================
 
-def draw_face_boxes(image_bgr: np.ndarray, faces):
+def _effect_target(image_bgr: np.ndarray, out: np.ndarray | None):
+    """
+    決定效果函數要寫入的陣列
+    
+    out 為 None 時複製原圖（不修改輸入）；out 就是 image_bgr 時直接就地修改，只改寫人臉區域；
+    其他情況把原圖複製到 out（重複使用呼叫端預先配置的陣列）。
+    """
+    if out is None:
+        return image_bgr.copy()
+    if out is not image_bgr:
+        np.copyto(out, image_bgr)
+    return out
+
+
+def draw_face_boxes(image_bgr: np.ndarray, faces, out: np.ndarray | None = None):
     """
     在圖片上繪製人臉框（預覽用）
     
     參數：
         image_bgr: 原始圖片
         faces: 人臉框陣列
+        out: 輸出陣列（傳入 image_bgr 時就地繪製，見 _effect_target）
     
     回傳：
         繪製了黃色矩形框的圖片
     """
-    boxed = image_bgr.copy()
+    boxed = _effect_target(image_bgr, out)
     for (x, y, w, h) in faces:
         cv2.rectangle(boxed, (x, y), (x + w, y + h), (0, 255, 255), 2)  # 黃色框，線寬 2
     return boxed
 
 
-def apply_mosaic(image_bgr: np.ndarray, faces, block_size=12):
+def apply_mosaic(image_bgr: np.ndarray, faces, block_size=12, out: np.ndarray | None = None):
     """
     對人臉區域套用馬賽克效果
     
@@ -776,6 +1151,7 @@ def apply_mosaic(image_bgr: np.ndarray, faces, block_size=12):
         image_bgr: 原始圖片
         faces: 人臉框陣列
         block_size: 馬賽克方塊大小（預設 12 像素）
+        out: 輸出陣列（傳入 image_bgr 時就地處理，只改寫人臉區域，見 _effect_target）
     
     回傳：
         處理後的圖片
@@ -785,7 +1161,7 @@ def apply_mosaic(image_bgr: np.ndarray, faces, block_size=12):
     2. 再放大回原尺寸（使用最近鄰插值）
     3. 產生「像素化」的馬賽克效果
     """
-    result = image_bgr.copy()
+    result = _effect_target(image_bgr, out)
     
     for (x, y, w, h) in faces:
         # 取得人臉區域（ROI: Region of Interest）
@@ -798,21 +1174,68 @@ def apply_mosaic(image_bgr: np.ndarray, faces, block_size=12):
         small_h = max(1, h // block_size)
         small = cv2.resize(roi, (small_w, small_h))
         
-        # 放大回原尺寸（使用最近鄰插值，保持方塊狀）
-        mosaic = cv2.resize(small, (w, h), interpolation=cv2.INTER_NEAREST)
-        
-        # 替換原區域
-        result[y : y + h, x : x + w] = mosaic
+        # 放大回原尺寸（使用最近鄰插值，保持方塊狀），直接寫回原區域，不另外配置整塊 ROI
+        cv2.resize(small, (roi.shape[1], roi.shape[0]), dst=roi, interpolation=cv2.INTER_NEAREST)
     
     return result
 
 
+def _blur_sigma(w: int, h: int, strength: float = 0.08) -> float:
+    """模糊模式的高斯 sigma（像素）：與人臉大小成比例，大臉與小臉的模糊程度看起來一致"""
+    return max(1.0, strength * max(w, h))
+
+
+def apply_blur(image_bgr: np.ndarray, faces, strength: float = 0.08, out: np.ndarray | None = None):
+    """
+    對人臉區域套用強烈的高斯模糊
+    
+    參數：
+        image_bgr: 原始圖片
+        faces: 人臉框陣列
+        strength: 模糊強度（sigma 與人臉長邊的比例，預設 0.08）
+        out: 輸出陣列（傳入 image_bgr 時就地處理，只改寫人臉區域，見 _effect_target）
+    
+    回傳：
+        處理後的圖片
+    
+    原理：
+    1. 將人臉區域縮小，讓等效的 sigma 在縮圖上只剩約 2 像素
+    2. 在縮圖上做小核心的高斯模糊
+    3. 以線性插值放大回原尺寸（放大本身也有平滑效果）
+    縮圖大小與人臉大小無關，耗時幾乎固定；直接對大臉做大核心 GaussianBlur 的耗時則隨 sigma 增加。
+    """
+    result = _effect_target(image_bgr, out)
+    
+    for (x, y, w, h) in faces:
+        roi = result[y : y + h, x : x + w]
+        if roi.size == 0:
+            continue
+        rh, rw = roi.shape[:2]
+        sigma = _blur_sigma(rw, rh, strength)
+        factor = max(1.0, sigma / 2.0)
+        small = cv2.resize(
+            roi,
+            (max(1, round(rw / factor)), max(1, round(rh / factor))),
+            interpolation=cv2.INTER_AREA,
+        )
+        small = cv2.GaussianBlur(small, (0, 0), sigma / factor)
+        cv2.resize(small, (rw, rh), dst=roi, interpolation=cv2.INTER_LINEAR)
+    
+    return result
+
+
+def _sorted_box_array(boxes) -> np.ndarray:
+    """把眼部區域轉為 (n, 4) int64 陣列，並依 (x1, y1) 排序（與逐幀比對前一幀的順序一致）"""
+    arr = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    return arr[np.lexsort((arr[:, 1], arr[:, 0]))]
+
+
 def _adaptive_alpha(prev_boxes, curr_boxes, base=0.5, min_alpha=0.2):
     """
     根據眼部區域的移動速度動態調整平滑係數
     
     參數：
-        prev_boxes: 上一幀的眼部區域
+        prev_boxes: 上一幀的眼部區域（列表或 (n, 4) 陣列）
         curr_boxes: 目前這一幀的眼部區域
         base: 基礎平滑係數
         min_alpha: 最小平滑係數
@@ -824,33 +1247,25 @@ def _adaptive_alpha(prev_boxes, curr_boxes, base=0.5, min_alpha=0.2):
     - 快速移動：降低平滑（快速跟隨，避免延遲）
     - 慢速移動：提高平滑（減少抖動）
     """
-    if not prev_boxes or not curr_boxes:
+    if prev_boxes is None or curr_boxes is None or len(prev_boxes) == 0 or len(curr_boxes) == 0:
         return base
     
-    prev_boxes = sorted(prev_boxes, key=lambda b: (b[0], b[1]))
-    curr_boxes = sorted(curr_boxes, key=lambda b: (b[0], b[1]))
+    prev = _sorted_box_array(prev_boxes)
+    curr = _sorted_box_array(curr_boxes)
     
-    if len(prev_boxes) != len(curr_boxes):
+    if len(prev) != len(curr):
         return base
     
-    max_relative_move = 0
+    # 眼部區域大小（前後兩幀取較大者）與中心點的移動距離，所有人臉一次算完
+    prev_wh = prev[:, 2:] - prev[:, :2]
+    curr_wh = curr[:, 2:] - curr[:, :2]
+    box_wh = np.maximum(np.maximum(prev_wh, curr_wh), 1)
+    box_size = box_wh.sum(axis=1) / 2.0
+    move = (curr[:, :2] + curr[:, 2:]) / 2.0 - (prev[:, :2] + prev[:, 2:]) / 2.0
+    move_dist = np.sqrt((move ** 2).sum(axis=1))
     
-    for (px1, py1, px2, py2), (cx1, cy1, cx2, cy2) in zip(prev_boxes, curr_boxes):
-        # 計算眼部區域大小
-        box_width = max(px2 - px1, cx2 - cx1, 1)
-        box_height = max(py2 - py1, cy2 - cy1, 1)
-        box_size = (box_width + box_height) / 2.0
-        
-        # 計算中心點的移動距離
-        pcx = (px1 + px2) / 2.0
-        pcy = (py1 + py2) / 2.0
-        ccx = (cx1 + cx2) / 2.0
-        ccy = (cy1 + cy2) / 2.0
-        move_dist = ((ccx - pcx)**2 + (ccy - pcy)**2) ** 0.5
-        
-        # 計算相對移動距離（相對於區域大小）
-        relative_move = move_dist / box_size
-        max_relative_move = max(max_relative_move, relative_move)
+    # 相對移動距離（相對於區域大小）
+    max_relative_move = float((move_dist / box_size).max())
     
     # 根據移動速度選擇平滑係數
     if max_relative_move > 0.4:  # 快速移動
@@ -860,55 +1275,77 @@ def _adaptive_alpha(prev_boxes, curr_boxes, base=0.5, min_alpha=0.2):
     return base  # 慢速移動
 
 
-def _smooth_boxes(prev_boxes, curr_boxes, alpha=0.5):
+def _smooth_boxes(prev_boxes, curr_boxes, alpha=0.5) -> np.ndarray:
     """
     使用加權平均減少抖動
     
     參數：
-        prev_boxes: 上一幀的眼部區域 [(x1, y1, x2, y2), ...]
+        prev_boxes: 上一幀的眼部區域 [(x1, y1, x2, y2), ...]（列表或 (n, 4) 陣列）
         curr_boxes: 目前這一幀的眼部區域
         alpha: 平滑係數（0-1）
     
     回傳：
-        平滑後的區域列表
+        平滑後的區域，(n, 4) int64 陣列
     """
-    if not curr_boxes:
-        return prev_boxes or []
-    if not prev_boxes:
-        return curr_boxes
-    
-    prev_boxes = sorted(prev_boxes, key=lambda b: (b[0], b[1]))
-    curr_boxes = sorted(curr_boxes, key=lambda b: (b[0], b[1]))
+    if curr_boxes is None or len(curr_boxes) == 0:
+        return np.asarray(prev_boxes if prev_boxes is not None else [], dtype=np.int64).reshape(-1, 4)
+    if prev_boxes is None or len(prev_boxes) == 0:
+        return np.asarray(curr_boxes, dtype=np.int64).reshape(-1, 4)
     
-    if len(prev_boxes) != len(curr_boxes):
-        return curr_boxes
+    prev = _sorted_box_array(prev_boxes)
+    curr = _sorted_box_array(curr_boxes)
     
-    smoothed = []
-    for (px1, py1, px2, py2), (cx1, cy1, cx2, cy2) in zip(prev_boxes, curr_boxes):
-        # 使用加權平均計算新位置
-        sx1 = int(round(alpha * px1 + (1 - alpha) * cx1))
-        sy1 = int(round(alpha * py1 + (1 - alpha) * cy1))
-        sx2 = int(round(alpha * px2 + (1 - alpha) * cx2))
-        sy2 = int(round(alpha * py2 + (1 - alpha) * cy2))
-        smoothed.append((sx1, sy1, sx2, sy2))
+    if len(prev) != len(curr):
+        return curr
     
-    return smoothed
+    # 使用加權平均計算新位置（與 Python round 相同，採四捨六入五成雙）
+    return np.round(alpha * prev + (1 - alpha) * curr).astype(np.int64)
+
 
+# 遮眼用的特徵點索引
+LEFT_EYE_IDX = [33, 133, 160, 159, 158, 144, 145, 153]
+RIGHT_EYE_IDX = [362, 263, 387, 386, 385, 373, 374, 380]
+LEFT_IRIS_IDX = [474, 475, 476, 477]
+RIGHT_IRIS_IDX = [469, 470, 471, 472]
 
-def _get_points(landmarks, idxs, w_img, h_img):
-    points = []
-    for idx in idxs:
-        lm = landmarks[idx]
-        points.append((int(lm.x * w_img), int(lm.y * h_img)))
-    return points
+
+def _eye_bands(face_landmarks, w_img: int, h_img: int) -> np.ndarray:
+    """
+    由特徵點計算所有人臉的遮眼白條位置（一次處理所有人臉）
+    
+    白條以兩眼虹膜中心的中點為中心，寬為兩眼距離的 2.4 倍、高為 0.75 倍（兩眼距離至少 12 像素），
+    並裁切在畫面範圍內。
+    
+    回傳：
+        (人臉數, 4) int64 的 (x1, y1, x2, y2)
+    """
+    # 虹膜中心：像素座標取整後平均，再取整（與逐點計算結果一致）
+    centers = face_landmarks.pixel_xy(LEFT_IRIS_IDX + RIGHT_IRIS_IDX).reshape(-1, 2, len(LEFT_IRIS_IDX), 2)
+    centers = centers.mean(axis=2).astype(np.int64)
+    left, right = centers[:, 0], centers[:, 1]
+    center = ((left + right) / 2).astype(np.int64)
+    delta = right - left
+    eye_dist = np.maximum(12, np.sqrt((delta ** 2).sum(axis=1)).astype(np.int64))
+    half_w = (eye_dist * 2.4).astype(np.int64) // 2
+    half_h = (eye_dist * 0.75).astype(np.int64) // 2
+    return np.stack(
+        [
+            np.maximum(0, center[:, 0] - half_w),
+            np.maximum(0, center[:, 1] - half_h),
+            np.minimum(w_img, center[:, 0] + half_w),
+            np.minimum(h_img, center[:, 1] + half_h),
+        ],
+        axis=1,
+    )
 
 
 def apply_eye_cover(
     image_bgr: np.ndarray,
     face_landmarks,
     prev_boxes=None,
+    out: np.ndarray | None = None,
 ):
-    result = image_bgr.copy()
+    result = _effect_target(image_bgr, out)
     if not face_landmarks:
         if prev_boxes:
             for (x1, y1, x2, y2) in prev_boxes:
@@ -916,46 +1353,10 @@ def apply_eye_cover(
             return result, prev_boxes
         return result, prev_boxes or []
 
-    left_eye = [33, 133, 160, 159, 158, 144, 145, 153]
-    right_eye = [362, 263, 387, 386, 385, 373, 374, 380]
-    left_iris = [474, 475, 476, 477]
-    right_iris = [469, 470, 471, 472]
     h_img, w_img = result.shape[:2]
-    eye_boxes = []
-    for landmarks in face_landmarks:
-        left_iris_pts = _get_points(landmarks, left_iris, w_img, h_img)
-        right_iris_pts = _get_points(landmarks, right_iris, w_img, h_img)
-        left_eye_pts = _get_points(landmarks, left_eye, w_img, h_img)
-        right_eye_pts = _get_points(landmarks, right_eye, w_img, h_img)
-
-        if left_iris_pts and right_iris_pts:
-            lx = int(sum(p[0] for p in left_iris_pts) / len(left_iris_pts))
-            ly = int(sum(p[1] for p in left_iris_pts) / len(left_iris_pts))
-            rx = int(sum(p[0] for p in right_iris_pts) / len(right_iris_pts))
-            ry = int(sum(p[1] for p in right_iris_pts) / len(right_iris_pts))
-        else:
-            all_left = left_eye_pts
-            all_right = right_eye_pts
-            if not all_left or not all_right:
-                continue
-            lx = int(sum(p[0] for p in all_left) / len(all_left))
-            ly = int(sum(p[1] for p in all_left) / len(all_left))
-            rx = int(sum(p[0] for p in all_right) / len(all_right))
-            ry = int(sum(p[1] for p in all_right) / len(all_right))
-
-        center_x = int((lx + rx) / 2)
-        center_y = int((ly + ry) / 2)
-        eye_dist = max(12, int(((rx - lx) ** 2 + (ry - ly) ** 2) ** 0.5))
-        band_w = int(eye_dist * 2.4) 
-        band_h = int(eye_dist * 0.75) 
-        cover_x1 = max(0, center_x - band_w // 2)
-        cover_x2 = min(w_img, center_x + band_w // 2)
-        cover_y1 = max(0, center_y - band_h // 2)
-        cover_y2 = min(h_img, center_y + band_h // 2)
-        eye_boxes.append((cover_x1, cover_y1, cover_x2, cover_y2))
-
-    alpha = _adaptive_alpha(prev_boxes or [], eye_boxes, base=0.45, min_alpha=0.2)
-    eye_boxes = _smooth_boxes(prev_boxes, eye_boxes, alpha=alpha)
+    eye_boxes = _eye_bands(face_landmarks, w_img, h_img)
+    alpha = _adaptive_alpha(prev_boxes, eye_boxes, base=0.45, min_alpha=0.2)
+    eye_boxes = [tuple(box) for box in _smooth_boxes(prev_boxes, eye_boxes, alpha=alpha).tolist()]
     for (x1, y1, x2, y2) in eye_boxes:
         cv2.rectangle(result, (x1, y1), (x2, y2), (255, 255, 255), -1)
     return result, eye_boxes
@@ -983,39 +1384,40 @@ def _load_overlay_rgba(path: Path):
     return overlay
 
 
-def apply_face_replace(image_bgr: np.ndarray, faces, overlay_rgba: np.ndarray):
+def apply_face_replace(
+    image_bgr: np.ndarray,
+    faces,
+    overlay_rgba: np.ndarray | PreparedOverlay,
+    out: np.ndarray | None = None,
+):
     """
     用自訂圖片替換人臉
     
     參數：
         image_bgr: 原始圖片
         faces: 人臉框陣列
-        overlay_rgba: 要替換的圖片（RGBA 格式）
+        overlay_rgba: 要替換的圖片（RGBA 格式），或已前處理的 PreparedOverlay（影片逐幀重複使用時應傳入後者）
+        out: 輸出陣列（傳入 image_bgr 時就地處理，只改寫人臉區域，見 _effect_target）
     
     回傳：
         處理後的圖片
     
-    原理：使用 Alpha 混合，支援半透明效果
+    原理：使用 Alpha 混合，支援半透明效果（預乘 alpha、uint8 整數運算，見 core/overlay.py）
     """
-    result = image_bgr.copy()
+    result = _effect_target(image_bgr, out)
+    overlay = overlay_rgba if isinstance(overlay_rgba, PreparedOverlay) else PreparedOverlay(overlay_rgba)
     
     for (x, y, w, h) in faces:
         if w <= 0 or h <= 0:
             continue
         
-        # 將替換圖片調整為與人臉相同大小
-        overlay_resized = cv2.resize(overlay_rgba, (w, h))
-        overlay_rgb = overlay_resized[:, :, :3]  # RGB 部分
-        alpha = overlay_resized[:, :, 3:4] / 255.0  # Alpha 通道（0-1）
-        
-        # 取得原圖的人臉區域
+        # 取得原圖的人臉區域（超出畫面的臉略過）
         roi = result[y : y + h, x : x + w]
-        if roi.shape[:2] != overlay_rgb.shape[:2]:
+        if roi.shape[:2] != (h, w):
             continue
         
         # Alpha 混合：新圖 * alpha + 原圖 * (1 - alpha)
-        blended = (overlay_rgb * alpha + roi * (1 - alpha)).astype(np.uint8)
-        result[y : y + h, x : x + w] = blended
+        overlay.blend_into(roi)
     
     return result
 
@@ -1048,7 +1450,7 @@ def _open_video_writer(out_base: Path, fps: float, size: tuple[int, int]):
 
 def _save_preview(image_bgr: np.ndarray, name: str):
     """
-    儲存預覽圖片
+    儲存預覽圖片（長邊超過 PREVIEW_MAX_SIDE 時先縮小；不繪製人臉框，框由選項頁在瀏覽器端繪製）
     
     參數：
         image_bgr: 圖片
@@ -1057,6 +1459,11 @@ def _save_preview(image_bgr: np.ndarray, name: str):
     回傳：
         儲存的檔案路徑
     """
+    h, w = image_bgr.shape[:2]
+    if PREVIEW_MAX_SIDE and max(h, w) > PREVIEW_MAX_SIDE:
+        scale = PREVIEW_MAX_SIDE / max(h, w)
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        image_bgr = cv2.resize(image_bgr, size, interpolation=cv2.INTER_AREA)
     preview_path = PREVIEW_DIR / f"{name}.jpg"
     cv2.imwrite(str(preview_path), image_bgr)
     return preview_path
@@ -1515,24 +1922,23 @@ def options(media_id):
             upload_path = BASE_DIR / upload_path
         if upload_path.exists():
             try:
+                content_hash = file_sha256(upload_path)
                 if media.file_type == "image":
                     img = cv2.imread(str(upload_path))
                     if img is not None:
-                        fd = _create_face_landmarker_image(0.6)
-                        _, faces = _detect_landmarks_bgr(img, fd, None)
-                        faces_info = _save_faces_metadata(img, faces, media_id)
-                        preview = draw_face_boxes(img, faces)
-                        _save_preview(preview, f"{media_id}_preview")
+                        landmarks, faces = _detect_image_cached(img, content_hash, 0.6)
+                        faces_info = _save_faces_metadata(img, faces, media_id, landmarks.scores)
+                        _save_detection_ref(media_id, content_hash, 0.6, img)
+                        _save_preview(img, f"{media_id}_preview")
                 else:
                     cap = cv2.VideoCapture(str(upload_path))
                     ok, frame = cap.read()
                     cap.release()
                     if ok:
-                        fd = _create_face_landmarker_image(0.6)
-                        _, faces = _detect_landmarks_bgr(frame, fd, None)
-                        faces_info = _save_faces_metadata(frame, faces, media_id)
-                        preview = draw_face_boxes(frame, faces)
-                        _save_preview(preview, f"{media_id}_preview")
+                        landmarks, faces = _detect_image_cached(frame, content_hash, 0.6, variant_suffix="-frame0")
+                        faces_info = _save_faces_metadata(frame, faces, media_id, landmarks.scores)
+                        _save_detection_ref(media_id, content_hash, 0.6, frame)
+                        _save_preview(frame, f"{media_id}_preview")
                 if faces_info and media:
                     media.face_count = len(faces_info)
                     db.session.commit()
@@ -1544,15 +1950,89 @@ def options(media_id):
     
     is_video = media.file_type == "video"
     
+    # 人臉縮圖：拼貼圖的尺寸由各人臉的位置推得（拼貼圖恰好包住所有人臉）
+    sprites = [face["sprite"] for face in faces_info if face.get("sprite")]
+    atlas_url = ""
+    atlas_size = None
+    if sprites and _face_atlas_path(media_id).exists():
+        atlas_url = url_for("face_atlas", media_id=media_id)
+        atlas_size = (
+            max(sp["x"] + sp["w"] for sp in sprites),
+            max(sp["y"] + sp["h"] for sp in sprites),
+        )
+    
+    # 人臉框座標以偵測畫面為準；預覽圖可能已縮小，瀏覽器端以偵測畫面尺寸換算
+    # （舊資料沒有記錄尺寸，其預覽圖為原尺寸，前端改用預覽圖本身的尺寸）
+    detection_ref = _load_detection_ref(media_id)
+    frame_size = detection_ref.get("frame_size") if detection_ref else None
+    sensitivity = detection_ref.get("sensitivity", 0.6) if detection_ref else 0.6
+    
     return render_template(
         "options.html",
         media_id=media_id,
         is_video=is_video,
         preview_url=preview_url,
         faces=faces_info,
+        frame_size=frame_size,
+        sensitivity=sensitivity,
+        can_rethreshold=detection_ref is not None,
+        atlas_url=atlas_url,
+        atlas_size=atlas_size,
     )
 
 
+@app.route("/options/<media_id>/sensitivity", methods=["POST"])
+@login_required
+def update_sensitivity(media_id):
+    """
+    在選項頁調整偵測靈敏度：由上傳時保留的候選人臉與信心度重新篩選（不重新上傳、不重新偵測），
+    更新人臉資料、截圖拼貼圖與偵測參數，回傳新的人臉數量
+    """
+    media = Media.query.filter_by(media_id=media_id).first()
+    if not media:
+        abort(404, "找不到該檔案")
+    
+    # 權限檢查：與選項頁相同
+    has_permission = False
+    if current_user.is_super_admin_role():
+        has_permission = True
+    elif media.user_id == current_user.id:
+        has_permission = True
+    elif media.exhibition_id:
+        exhibition = db.session.get(Exhibition, media.exhibition_id)
+        if exhibition and current_user.can_manage_exhibition(exhibition):
+            has_permission = True
+    
+    if not has_permission:
+        abort(403, "您沒有權限處理此檔案")
+    
+    try:
+        sensitivity = quantize_sensitivity(float(request.form.get("sensitivity", "")))
+    except ValueError:
+        abort(400, "無效的靈敏度")
+    
+    detection_ref = _load_detection_ref(media_id)
+    if not detection_ref or not media.upload_path:
+        abort(400, "找不到偵測資料")
+    src_path = Path(media.upload_path)
+    if not src_path.is_absolute():
+        src_path = BASE_DIR / src_path
+    is_video = media.file_type == "video"
+    frame = _load_media_frame(src_path, is_video) if src_path.exists() else None
+    if frame is None:
+        abort(404, "找不到檔案")
+    
+    # 候選人臉在上傳時已以最低靈敏度偵測並快取，這裡只會篩選
+    landmarks, faces = _detect_image_cached(
+        frame, detection_ref["content_hash"], sensitivity, variant_suffix="-frame0" if is_video else ""
+    )
+    faces_info = _save_faces_metadata(frame, faces, media_id, landmarks.scores)
+    _save_detection_ref(media_id, detection_ref["content_hash"], sensitivity, frame)
+    media.face_count = len(faces_info)
+    db.session.commit()
+    return jsonify({"sensitivity": sensitivity, "face_count": len(faces_info)})
+
+
 @app.route("/upload/exhibition/<exhibition_public_id>/select-cells", methods=["GET", "POST"])
 @login_required
 def upload_exhibition_with_cells(exhibition_public_id):
@@ -1625,8 +2105,7 @@ def upload_exhibition_with_cells(exhibition_public_id):
                 ret, frame = cap.read()
                 cap.release()
                 if ret:
-                    preview_path = PREVIEW_DIR / f"{media_id}_preview.jpg"
-                    cv2.imwrite(str(preview_path), frame)
+                    preview_path = _save_preview(frame, f"{media_id}_preview")
                     thumbnail_path = str(preview_path.relative_to(BASE_DIR))
             except Exception:
                 pass
@@ -1634,8 +2113,7 @@ def upload_exhibition_with_cells(exhibition_public_id):
             try:
                 image = cv2.imread(str(saved_path))
                 if image is not None:
-                    preview_path = PREVIEW_DIR / f"{media_id}_preview.jpg"
-                    cv2.imwrite(str(preview_path), image)
+                    preview_path = _save_preview(image, f"{media_id}_preview")
                     thumbnail_path = str(preview_path.relative_to(BASE_DIR))
             except Exception:
                 pass
@@ -1805,18 +2283,16 @@ def upload_to_exhibition(exhibition_public_id):
             cap.release()
             if ret:
                 # 保存第一幀作為預覽圖
-                preview_path = PREVIEW_DIR / f"{media_id}_preview.jpg"
-                cv2.imwrite(str(preview_path), frame)
+                preview_path = _save_preview(frame, f"{media_id}_preview")
                 thumbnail_path = str(preview_path.relative_to(BASE_DIR))
         except Exception:
             pass  # 如果生成預覽圖失敗，使用原始路徑
     else:
-        # 對於圖片，也生成預覽圖（直接複製圖片作為預覽圖）
+        # 對於圖片，也生成預覽圖（縮小後的原圖）
         try:
             image = cv2.imread(str(saved_path))
             if image is not None:
-                preview_path = PREVIEW_DIR / f"{media_id}_preview.jpg"
-                cv2.imwrite(str(preview_path), image)
+                preview_path = _save_preview(image, f"{media_id}_preview")
                 thumbnail_path = str(preview_path.relative_to(BASE_DIR))
         except Exception:
             pass  # 如果生成預覽圖失敗，使用原始路徑
@@ -1944,11 +2420,11 @@ def upload():
 
     if _is_image(saved_path):
         image = cv2.imread(str(saved_path))
-        face_detector = _create_face_landmarker_image(sensitivity)
-        _, faces = _detect_landmarks_bgr(image, face_detector, None)
-        faces_info = _save_faces_metadata(image, faces, media_id)
-        preview = draw_face_boxes(image, faces)
-        preview_path = _save_preview(preview, f"{media_id}_preview")
+        content_hash = file_sha256(saved_path)
+        landmarks, faces = _detect_image_cached(image, content_hash, sensitivity)
+        faces_info = _save_faces_metadata(image, faces, media_id, landmarks.scores)
+        _save_detection_ref(media_id, content_hash, sensitivity, image)
+        preview_path = _save_preview(image, f"{media_id}_preview")
         
         media_record = Media(
             media_id=media_id,
@@ -1992,12 +2468,12 @@ def upload():
     cap.release()
     if not ok:
         abort(400, "無法讀取影片")
-    # 使用自訂靈敏度創建偵測器
-    face_detector = _create_face_landmarker_image(sensitivity)
-    _, faces = _detect_landmarks_bgr(frame, face_detector, None)
-    faces_info = _save_faces_metadata(frame, faces, media_id)
-    preview = draw_face_boxes(frame, faces)
-    preview_path = _save_preview(preview, f"{media_id}_preview")
+    # 使用自訂靈敏度偵測第一幀（結果寫入偵測快取）
+    content_hash = file_sha256(saved_path)
+    landmarks, faces = _detect_image_cached(frame, content_hash, sensitivity, variant_suffix="-frame0")
+    faces_info = _save_faces_metadata(frame, faces, media_id, landmarks.scores)
+    _save_detection_ref(media_id, content_hash, sensitivity, frame)
+    preview_path = _save_preview(frame, f"{media_id}_preview")
     
     media_record = Media(
         media_id=media_id,
@@ -2065,6 +2541,10 @@ def result(media_id):
         abort(403, "您沒有權限查看此檔案")
     
     if media.status != "processed" or not media.output_path:
+        # 處理工作還沒完成時改為顯示處理進度
+        job = active_job_for_media(media_id)
+        if job:
+            return redirect(url_for("job_page", job_id=job.job_id))
         abort(400, "檔案尚未處理完成")
     
     # 取得結果檔案 URL（支援新的日期目錄結構）
@@ -2094,37 +2574,74 @@ def result(media_id):
     )
 
 
+def _parse_face_selection(values):
+    """
+    從表單或查詢參數取得人臉選擇與逐臉處理計畫（/process 與即時預覽共用）
+    
+    參數：
+        values: request.form、request.args 或 request.values
+    
+    回傳：
+        (selected_ids, face_modes) - 勾選的人臉 ID 列表，以及 {人臉 ID: 模式}
+        （選項頁每張臉的下拉選單 face_mode_<人臉 ID>，空值表示跟隨上方選擇的處理方式，不列入）
+    """
+    selected_ids = []
+    for item in values.getlist("face_ids"):
+        try:
+            selected_ids.append(int(item))
+        except ValueError:
+            continue
+    
+    face_modes = {}
+    for key, value in values.items():
+        if not key.startswith("face_mode_") or not value.strip():
+            continue
+        try:
+            face_modes[int(key[len("face_mode_"):])] = value.strip()
+        except ValueError:
+            continue
+    return selected_ids, face_modes
+
+
+def _resolve_upload_path(media_record: Media):
+    """
+    取得媒體的原始檔路徑
+    優先使用 DB 的 upload_path，避免大量檔案時 rglob 掃描整棵目錄樹；找不到時回傳 None
+    """
+    if media_record.upload_path:
+        up = Path(media_record.upload_path)
+        src_path = up if up.is_absolute() else BASE_DIR / up
+        if src_path.exists():
+            return src_path
+    candidates = list(UPLOAD_IMAGE_DIR.rglob(f"{media_record.media_id}.*"))
+    if not candidates:
+        candidates = list(UPLOAD_VIDEO_DIR.rglob(f"{media_record.media_id}.*"))
+    return candidates[0] if candidates else None
+
+
 @app.route("/process", methods=["POST"])
 @login_required
 def process():
     """
     處理照片/影片
-    依照使用者選擇的模式（mosaic/eyes/replace）進行處理
+    依照使用者選擇的模式（mosaic/blur/eyes/replace）進行處理
     
     流程：
     1. 取得處理參數（media_id, mode, 選擇的人臉）
-    2. 載入原始檔案
-    3. 根據模式套用效果（馬賽克/遮眼/替換）
-    4. 儲存處理後的檔案
-    5. 重定向到結果頁面
+    2. 檢查權限並保存替換用的覆蓋圖
+    3. 排入處理工作（由 worker 在背景處理，見 _execute_process_job）
+    4. 重定向到工作狀態頁（要求 JSON 時回傳 202 與工作狀態）
     """
     # 步驟 1：取得處理參數
     media_id = request.form.get("media_id", "").strip()
-    mode = request.form.get("mode", "").strip()  # mosaic / eyes / replace
+    mode = request.form.get("mode", "").strip()  # mosaic / blur / eyes / replace
     
-    # 取得使用者選擇的人臉 ID
-    face_ids_raw = request.form.getlist("face_ids")
-    selected_ids = []
-    for item in face_ids_raw:
-        try:
-            selected_ids.append(int(item))
-        except ValueError:
-            continue
+    # 取得使用者選擇的人臉 ID 與逐臉處理計畫
+    selected_ids, face_modes = _parse_face_selection(request.form)
     
     if not media_id:
         abort(400, "缺少 media_id")
 
-    # 優先從 DB 的 upload_path 取得路徑，避免大量檔案時 rglob 掃描整棵目錄樹
     media_record_for_path = Media.query.filter_by(media_id=media_id).first()
     if not media_record_for_path:
         abort(404, "找不到該檔案")
@@ -2143,132 +2660,550 @@ def process():
     if not has_permission:
         abort(403, "您沒有權限處理此檔案")
     
-    if media_record_for_path.upload_path:
-        up = Path(media_record_for_path.upload_path)
-        src_path = up if up.is_absolute() else BASE_DIR / up
-        if not src_path.exists():
-            src_path = None
-    else:
-        src_path = None
+    # 處理參數在排入前先檢查，格式錯誤時直接回應，不必等 worker 處理才失敗
+    if mode not in PROCESS_MODES:
+        abort(400, f"不支援的處理模式: {mode}")
+    try:
+        normalize_face_modes(face_modes)
+    except ValueError as e:
+        abort(400, str(e))
+    
+    # 同一個媒體同時只處理一個工作（處理完成時 media_id 可能改名，排隊中的其他工作會找不到檔案）；
+    # 這裡先檢查以便直接回應，排入時 enqueue_job 會在資料庫中再次確認
+    if active_job_for_media(media_id):
+        abort(409, "此檔案正在處理中，請稍後再試")
+    
+    src_path = _resolve_upload_path(media_record_for_path)
     if src_path is None:
-        candidates = list(UPLOAD_IMAGE_DIR.rglob(f"{media_id}.*"))
-        if not candidates:
-            candidates = list(UPLOAD_VIDEO_DIR.rglob(f"{media_id}.*"))
-        if not candidates:
-            abort(404, "找不到檔案")
-        src_path = candidates[0]
+        abort(404, "找不到檔案")
 
     overlay_file = request.files.get("overlay")
-    overlay_path = None
+    overlay_ext = None
     if overlay_file and overlay_file.filename:
         overlay_ext = Path(overlay_file.filename).suffix.lower()
         if overlay_ext not in ALLOWED_IMAGE_EXT:
             abort(400, "圖片格式不支援")
-        # 查找原始檔案所在的目錄，將 overlay 保存在同一目錄
-        overlay_dir = src_path.parent
-        overlay_path = overlay_dir / f"{media_id}_overlay{overlay_ext}"
-        overlay_file.save(overlay_path)
+        # 將 overlay 保存在原始檔案所在的目錄（處理完成時隨 media_id 一起改名）
+        overlay_file.save(src_path.parent / f"{media_id}_overlay{overlay_ext}")
+    elif _needs_overlay(mode, face_modes):
+        # 替換模式（含逐臉計畫中的替換）沒有覆蓋圖時直接回應，不排入必定失敗的工作
+        abort(400, "替換模式需要提供 overlay_path")
+
+    job = enqueue_job(media_id, current_user.id, {
+        "mode": mode,
+        "selected_ids": selected_ids,
+        "face_modes": {str(face_id): face_mode for face_id, face_mode in face_modes.items()},
+        "overlay_ext": overlay_ext,
+    })
+    if job is None:
+        # 檢查後到排入前，另一個請求已排入同一個媒體的工作
+        abort(409, "此檔案正在處理中，請稍後再試")
+    _ensure_job_runner()
+    
+    if request.accept_mimetypes.best_match(["text/html", "application/json"]) == "application/json":
+        response = jsonify(_job_status(job))
+        response.status_code = 202
+        response.headers["Location"] = url_for("job_status", job_id=job.job_id)
+        return response
+    return redirect(url_for("job_page", job_id=job.job_id))
 
-    # 使用模組化處理器處理媒體檔案
-    try:
-        # 建立處理器（使用預設靈敏度 0.6，可從 media_record 取得自訂值）
-        processor = MediaProcessor(sensitivity=0.6)
-        
-        # 設定輸出路徑（按日期組織）
-        upload_date = datetime.now()
-        if _is_image(src_path):
-            date_dir = OUTPUT_IMAGE_DIR / str(upload_date.year) / f"{upload_date.month:02d}"
-            date_dir.mkdir(parents=True, exist_ok=True)
-            out_path = date_dir / f"{media_id}_out.jpg"
-        else:
-            date_dir = OUTPUT_VIDEO_DIR / str(upload_date.year) / f"{upload_date.month:02d}"
-            date_dir.mkdir(parents=True, exist_ok=True)
-            out_path = date_dir / f"{media_id}_out.mp4"
-        
-        # 處理媒體檔案
-        output_path = processor.process(
-            media_path=src_path,
-            mode=mode,
-            selected_face_ids=selected_ids if selected_ids else None,
-            overlay_path=overlay_path,
-            output_path=out_path,
-        )
-        
-        # 更新資料庫記錄
-        media_record = Media.query.filter_by(media_id=media_id).first()
-        if media_record:
-            media_record.output_path = str(output_path)
-            media_record.process_mode = mode
-            media_record.status = "processed"
-            media_record.processed_at = datetime.now()
-            # 編修（後續加隱私處理）：只重算 media_id 最後 4 碼並 rename 相關檔案
-            if len(media_id) == 20 and media_id[0] == "8":
-                new_media_id = _refresh_media_id_suffix(media_id)
-                if new_media_id != media_id:
-                    _rename_media_ids(media_id, new_media_id, media_record)
-                    media_id = new_media_id
+
+def _execute_process_job(job: ProcessingJob, on_progress=None) -> str:
+    """
+    執行一個處理工作（由 JobWorker 在 app context 中呼叫）
+    
+    流程：
+    1. 載入原始檔案與處理參數
+    2. 根據模式套用效果（馬賽克/模糊/遮眼/替換）
+    3. 儲存處理後的檔案並更新資料庫（含 media_id 改名與展覽照片）
+    
+    參數：
+        job: 租用到的 ProcessingJob
+        on_progress: 傳給 MediaProcessor 的進度回報函數
+    
+    回傳：
+        處理後的 media_id（編修後最後 4 碼會重算）
+    """
+    params = json.loads(job.params)
+    media_id = job.media_id
+    mode = params["mode"]
+    selected_ids = params.get("selected_ids") or []
+    face_modes = {int(face_id): face_mode for face_id, face_mode in (params.get("face_modes") or {}).items()}
+    
+    media_record = Media.query.filter_by(media_id=media_id).first()
+    if not media_record:
+        raise ValueError("找不到該檔案")
+    src_path = _resolve_upload_path(media_record)
+    if src_path is None:
+        raise ValueError("找不到檔案")
+    overlay_path = src_path.parent / f"{media_id}_overlay{params['overlay_ext']}" if params.get("overlay_ext") else None
+
+    # 建立處理器（使用上傳時的靈敏度，照片會直接命中上傳時的偵測快取）
+    detection_ref = _load_detection_ref(media_id)
+    sensitivity = detection_ref.get("sensitivity", 0.6) if detection_ref else 0.6
+    processor = MediaProcessor(
+        sensitivity=sensitivity,
+        checkpoint_dir=JOB_CHECKPOINT_DIR / job.job_id,
+        on_progress=on_progress,
+    )
+    
+    # 設定輸出路徑（按日期組織）
+    upload_date = datetime.now()
+    if _is_image(src_path):
+        date_dir = OUTPUT_IMAGE_DIR / str(upload_date.year) / f"{upload_date.month:02d}"
+        date_dir.mkdir(parents=True, exist_ok=True)
+        out_path = date_dir / f"{media_id}_out.jpg"
+    else:
+        date_dir = OUTPUT_VIDEO_DIR / str(upload_date.year) / f"{upload_date.month:02d}"
+        date_dir.mkdir(parents=True, exist_ok=True)
+        out_path = date_dir / f"{media_id}_out.mp4"
+    
+    # 處理媒體檔案
+    output_path = processor.process(
+        media_path=src_path,
+        mode=mode,
+        selected_face_ids=selected_ids if selected_ids else None,
+        overlay_path=overlay_path,
+        output_path=out_path,
+        landmarks_path=METADATA_DIR / f"{media_id}_landmarks.lmk",
+        face_modes=face_modes or None,
+    )
+    
+    # 更新資料庫記錄
+    media_record = Media.query.filter_by(media_id=media_id).first()
+    if media_record:
+        media_record.output_path = str(output_path)
+        # 逐臉計畫用到預設模式以外的效果時記為 mixed
+        plan_modes = {m for m in face_modes.values() if m not in ("none", mode)}
+        media_record.process_mode = "mixed" if plan_modes else mode
+        media_record.status = "processed"
+        media_record.processed_at = datetime.now()
+        # 編修（後續加隱私處理）：只重算 media_id 最後 4 碼並 rename 相關檔案
+        if len(media_id) == 20 and media_id[0] == "8":
+            new_media_id = _refresh_media_id_suffix(media_id)
+            if new_media_id != media_id:
+                _rename_media_ids(media_id, new_media_id, media_record)
+                media_id = new_media_id
+        
+        # 如果媒體檔案有關聯到展覽：展覽應顯示「處理後」的檔案，故更新既有展覽照片為 output，或無對應時才新增
+        if media_record.exhibition_id:
+            # 使用 media_record.output_path（_rename_media_ids 可能已改檔名，須用更新後的路徑）
+            output_path_for_display = Path(media_record.output_path)
+            if not output_path_for_display.is_absolute():
+                output_path_for_display = BASE_DIR / output_path_for_display
+            try:
+                relative_path = output_path_for_display.relative_to(BASE_DIR)
+            except ValueError:
+                relative_path = output_path_for_display
             
-            # 如果媒體檔案有關聯到展覽：展覽應顯示「處理後」的檔案，故更新既有展覽照片為 output，或無對應時才新增
-            if media_record.exhibition_id:
-                # 使用 media_record.output_path（_rename_media_ids 可能已改檔名，須用更新後的路徑）
-                output_path_for_display = Path(media_record.output_path)
-                if not output_path_for_display.is_absolute():
-                    output_path_for_display = BASE_DIR / output_path_for_display
-                try:
-                    relative_path = output_path_for_display.relative_to(BASE_DIR)
-                except ValueError:
-                    relative_path = output_path_for_display
-                
-                upload_full = Path(media_record.upload_path).resolve() if media_record.upload_path else None
-                existing_photo = None
-                if upload_full and upload_full.exists():
-                    for ep in ExhibitionPhoto.query.filter_by(exhibition_id=media_record.exhibition_id).all():
-                        ep_path = Path(ep.photo_path)
-                        if not ep_path.is_absolute():
-                            ep_path = BASE_DIR / ep_path
-                        if ep_path.resolve() == upload_full:
-                            existing_photo = ep
-                            break
-                
-                if media_record.file_type == "video":
-                    preview_files = list(PREVIEW_DIR.glob(f"{media_id}_preview.*"))
-                    thumbnail_path = preview_files[0].relative_to(BASE_DIR) if preview_files else str(relative_path)
-                else:
-                    thumbnail_path = str(relative_path)
-                
-                if existing_photo:
-                    # 更新既有展覽照片：改為顯示處理後的檔案（展覽不再顯示原檔）
-                    existing_photo.photo_path = str(relative_path)
-                    existing_photo.thumbnail_path = thumbnail_path
-                    existing_photo.title = media_record.original_filename or (f"處理後的{'影片' if media_record.file_type == 'video' else '照片'} {media_id}")
-                    existing_photo.description = f"處理模式: {mode}"
-                else:
-                    # 無對應的展覽照片（例如從選項頁關聯展覽）則新增一筆，直接使用處理後路徑
-                    max_order = db.session.query(db.func.max(ExhibitionPhoto.display_order)).filter_by(
-                        exhibition_id=media_record.exhibition_id
-                    ).scalar() or -1
-                    exhibition_photo = ExhibitionPhoto(
-                        exhibition_id=media_record.exhibition_id,
-                        photo_path=str(relative_path),
-                        thumbnail_path=thumbnail_path,
-                        title=media_record.original_filename or (f"處理後的{'影片' if media_record.file_type == 'video' else '照片'} {media_id}"),
-                        description=f"處理模式: {mode}",
-                        display_order=max_order + 1,
-                        created_at=datetime.now()
-                    )
-                    db.session.add(exhibition_photo)
+            upload_full = Path(media_record.upload_path).resolve() if media_record.upload_path else None
+            existing_photo = None
+            if upload_full and upload_full.exists():
+                for ep in ExhibitionPhoto.query.filter_by(exhibition_id=media_record.exhibition_id).all():
+                    ep_path = Path(ep.photo_path)
+                    if not ep_path.is_absolute():
+                        ep_path = BASE_DIR / ep_path
+                    if ep_path.resolve() == upload_full:
+                        existing_photo = ep
+                        break
             
-            db.session.commit()
+            if media_record.file_type == "video":
+                preview_files = list(PREVIEW_DIR.glob(f"{media_id}_preview.*"))
+                thumbnail_path = preview_files[0].relative_to(BASE_DIR) if preview_files else str(relative_path)
+            else:
+                thumbnail_path = str(relative_path)
+            
+            if existing_photo:
+                # 更新既有展覽照片：改為顯示處理後的檔案（展覽不再顯示原檔）
+                existing_photo.photo_path = str(relative_path)
+                existing_photo.thumbnail_path = thumbnail_path
+                existing_photo.title = media_record.original_filename or (f"處理後的{'影片' if media_record.file_type == 'video' else '照片'} {media_id}")
+                existing_photo.description = f"處理模式: {mode}"
+            else:
+                # 無對應的展覽照片（例如從選項頁關聯展覽）則新增一筆，直接使用處理後路徑
+                max_order = db.session.query(db.func.max(ExhibitionPhoto.display_order)).filter_by(
+                    exhibition_id=media_record.exhibition_id
+                ).scalar() or -1
+                exhibition_photo = ExhibitionPhoto(
+                    exhibition_id=media_record.exhibition_id,
+                    photo_path=str(relative_path),
+                    thumbnail_path=thumbnail_path,
+                    title=media_record.original_filename or (f"處理後的{'影片' if media_record.file_type == 'video' else '照片'} {media_id}"),
+                    description=f"處理模式: {mode}",
+                    display_order=max_order + 1,
+                    created_at=datetime.now()
+                )
+                db.session.add(exhibition_photo)
         
-        # 重定向到結果頁面
-        return redirect(url_for("result", media_id=media_id))
+        db.session.commit()
+    return media_id
+
+
+_job_runners = []
+_job_runners_lock = threading.Lock()
+
+
+def _discard_job_checkpoint(job_id: str):
+    """刪除失敗工作的影片偵測檢查點（工作不會再重試）"""
+    shutil.rmtree(JOB_CHECKPOINT_DIR / job_id, ignore_errors=True)
+
+
+def _ensure_job_runner():
+    """
+    在網站行程內啟動執行處理工作的背景執行緒（第一次排入或查詢工作時才啟動）
+    JOB_WORKERS_IN_PROCESS 為 0 時不啟動，工作只由獨立的 worker（scripts/run_job_worker.py）處理
+    """
+    if JOB_WORKERS_IN_PROCESS <= 0:
+        return
+    with _job_runners_lock:
+        while len(_job_runners) < JOB_WORKERS_IN_PROCESS:
+            worker = JobWorker(
+                app, _execute_process_job,
+                lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS, hub=JOB_PROGRESS,
+                on_failed=_discard_job_checkpoint,
+            )
+            thread = threading.Thread(target=worker.run, name=f"job-worker-{len(_job_runners)}", daemon=True)
+            thread.start()
+            _job_runners.append(worker)
+
+
+def _job_status(job: ProcessingJob) -> dict:
+    """處理工作狀態（/api/jobs/<job_id> 回傳的內容，進度由心跳寫入資料庫）"""
+    fps, eta = (None, None)
+    if job.state == ProcessingJob.STATE_RUNNING:
+        fps, eta = estimate_rate(job.frames_done, job.stage_started_at, job.frames_total)
+    return {
+        "job_id": job.job_id,
+        "media_id": job.media_id,
+        "state": job.state,
+        "stage": job.stage,
+        "frames_done": job.frames_done,
+        "frames_total": job.frames_total,
+        "percent": round(job.progress * 100, 1),
+        "fps": round(fps, 1) if fps is not None else None,
+        "eta_s": round(eta, 1) if eta is not None else None,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": url_for("job_page", job_id=job.job_id),
+        "result_url": url_for("result", media_id=job.media_id) if job.state == ProcessingJob.STATE_SUCCEEDED else None,
+    }
+
+
+def _live_job_status(status: dict, live: dict) -> dict:
+    """以本行程 worker 發布的最新進度（見 ProgressReporter.snapshot）更新工作狀態"""
+    done, total = live.get("frames_done", 0), live.get("frames_total", 0)
+    fps, eta = live.get("fps"), live.get("eta_s")
+    return {
+        **status,
+        "state": live["state"],
+        "stage": live.get("stage"),
+        "frames_done": done,
+        "frames_total": total,
+        "percent": round(min(1.0, done / total) * 100, 1) if total else 0.0,
+        "fps": round(fps, 1) if fps is not None else None,
+        "eta_s": round(eta, 1) if eta is not None else None,
+    }
+
+
+@app.route("/jobs/<job_id>")
+@login_required
+def job_page(job_id):
+    """
+    處理工作狀態頁
+    處理完成時直接重定向到結果頁面；處理中顯示進度（頁面訂閱 /media/<media_id>/progress 的 SSE 串流）
+    """
+    job = ProcessingJob.query.filter_by(job_id=job_id).first()
+    if not job:
+        abort(404, "找不到該處理工作")
+    
+    # 權限檢查：超級管理員、送出工作的使用者、或媒體所屬展覽的創辦人可以查看
+    has_permission = False
+    if current_user.is_super_admin_role():
+        has_permission = True
+    elif job.user_id == current_user.id:
+        has_permission = True
+    else:
+        media = Media.query.filter_by(media_id=job.media_id).first()
+        if media and media.exhibition_id:
+            exhibition = db.session.get(Exhibition, media.exhibition_id)
+            if exhibition and current_user.can_manage_exhibition(exhibition):
+                has_permission = True
     
+    if not has_permission:
+        abort(403, "您沒有權限查看此處理工作")
+    
+    if job.state == ProcessingJob.STATE_SUCCEEDED:
+        return redirect(url_for("result", media_id=job.media_id))
+    _ensure_job_runner()
+    
+    return render_template("result.html", job=_job_status(job))
+
+
+@app.route("/api/jobs/<job_id>")
+@login_required
+def job_status(job_id):
+    """
+    處理工作狀態 API
+    
+    回傳：
+        JSON：state（queued / running / succeeded / failed）、目前階段（detect / render / process）、
+        階段的已完成幀數與總幀數、進度百分比、處理速度（幀/秒）、預估剩餘秒數、錯誤訊息，完成時另有結果頁網址
+    """
+    job = ProcessingJob.query.filter_by(job_id=job_id).first()
+    if not job:
+        abort(404, "找不到該處理工作")
+    
+    # 權限檢查：超級管理員、送出工作的使用者、或媒體所屬展覽的創辦人可以查看
+    has_permission = False
+    if current_user.is_super_admin_role():
+        has_permission = True
+    elif job.user_id == current_user.id:
+        has_permission = True
+    else:
+        media = Media.query.filter_by(media_id=job.media_id).first()
+        if media and media.exhibition_id:
+            exhibition = db.session.get(Exhibition, media.exhibition_id)
+            if exhibition and current_user.can_manage_exhibition(exhibition):
+                has_permission = True
+    
+    if not has_permission:
+        abort(403, "您沒有權限查看此處理工作")
+    
+    status = _job_status(job)
+    if job.state in (ProcessingJob.STATE_QUEUED, ProcessingJob.STATE_RUNNING):
+        _ensure_job_runner()
+        # 工作在本行程處理時，使用 worker 最新發布的進度（資料庫中的進度每次心跳才更新）
+        _, live = JOB_PROGRESS.get(job.job_id)
+        if live is not None and live["state"] == ProcessingJob.STATE_RUNNING and job.state == ProcessingJob.STATE_RUNNING:
+            status = _live_job_status(status, live)
+    return jsonify(status)
+
+
+@app.route("/media/<media_id>/progress")
+@login_required
+def media_progress(media_id):
+    """
+    媒體處理進度的 SSE 串流（text/event-stream）
+    每次進度改變送出一個 progress 事件（內容與 /api/jobs/<job_id> 相同，另有 fps），工作結束（成功或失敗）後關閉串流。
+    worker 端的進度已節流（每個工作最多每 0.5 秒發布一次），串流醒來時只送出最新的一筆。
+    """
+    media = Media.query.filter_by(media_id=media_id).first()
+    if not media:
+        abort(404, "找不到該檔案")
+    
+    # 權限檢查：超級管理員、媒體上傳者、或媒體所屬展覽的創辦人可以查看
+    has_permission = False
+    if current_user.is_super_admin_role():
+        has_permission = True
+    elif media.user_id == current_user.id:
+        has_permission = True
+    elif media.exhibition_id:
+        exhibition = db.session.get(Exhibition, media.exhibition_id)
+        if exhibition and current_user.can_manage_exhibition(exhibition):
+            has_permission = True
+    
+    if not has_permission:
+        abort(403, "您沒有權限查看此檔案")
+    
+    job = active_job_for_media(media_id) or ProcessingJob.query.filter_by(media_id=media_id).order_by(
+        ProcessingJob.id.desc()
+    ).first()
+    if not job:
+        abort(404, "此檔案沒有處理工作")
+    if job.state in (ProcessingJob.STATE_QUEUED, ProcessingJob.STATE_RUNNING):
+        _ensure_job_runner()
+    job_pk, job_key = job.id, job.job_id
+    finished = (ProcessingJob.STATE_SUCCEEDED, ProcessingJob.STATE_FAILED)
+    
+    def _events():
+        deadline = time.monotonic() + PROGRESS_STREAM_SECONDS
+        version, sent, sent_at = 0, None, time.monotonic()
+        status = None
+        yield "retry: 2000\n\n"
+        while time.monotonic() < deadline:
+            previous = version
+            if status is None:
+                version, live = JOB_PROGRESS.get(job_key)  # 連線後立即送出目前的狀態
+            else:
+                version, live = JOB_PROGRESS.wait(job_key, version, PROGRESS_POLL_SECONDS)
+            if (
+                status is None
+                or live is None
+                or version == previous
+                or live["state"] in finished
+                or live["state"] != status["state"]
+            ):
+                # 工作尚未開始、在其他主機處理、本行程一段時間沒有發布、狀態改變（例如排隊中的工作開始處理），
+                # 或已結束：讀取資料庫（工作可能已由其他主機接手；結束後的 media_id 與結果網址以資料庫為準）
+                row = db.session.get(ProcessingJob, job_pk, populate_existing=True)
+                if row is None:
+                    return
+                status = _job_status(row)
+                db.session.rollback()  # 結束這次讀取的交易，下次才讀得到其他連線寫入的進度
+            running = ProcessingJob.STATE_RUNNING
+            if live is not None and live["state"] == running and status["state"] == running:
+                current = _live_job_status(status, live)
+            else:
+                current = status
+            if current != sent:
+                sent, sent_at = current, time.monotonic()
+                yield f"event: progress\ndata: {json.dumps(current, ensure_ascii=False)}\n\n"
+                if current["state"] in finished:
+                    return
+            elif time.monotonic() - sent_at >= _PROGRESS_KEEPALIVE_SECONDS:
+                sent_at = time.monotonic()
+                yield ": keep-alive\n\n"
+    
+    response = Response(stream_with_context(_events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # 不讓 nginx 緩衝串流
+    return response
+
+
+# 即時預覽共用的處理器（覆蓋圖的前處理結果可跨請求重用）
+_LIVE_PREVIEW_PROCESSOR = MediaProcessor()
+
+
+def _live_preview_proxy(media_id: str, src_path: Path, is_video: bool):
+    """
+    取得媒體的即時預覽代理影像：縮小的原圖（影片為第一幀），以及換算到同一座標的偵測結果
+    偵測結果沿用上傳時存入偵測快取的結果（與選項頁顯示的人臉相同），只有快取被清除時才重新偵測
+    
+    回傳：
+        (token, proxy_bgr, landmarks) - token 在原始檔或偵測參數改變時不同，作為渲染快取 key 的一部分
+    """
+    ref = _load_detection_ref(media_id) or {}
+    sensitivity = ref.get("sensitivity", 0.6)
+    st = src_path.stat()
+    token = (str(src_path), st.st_mtime_ns, st.st_size, ref.get("content_hash"), sensitivity)
+    
+    def build():
+        frame = _load_media_frame(src_path, is_video)
+        if frame is None:
+            raise ValueError("無法讀取影片" if is_video else "無法讀取圖片")
+        content_hash = ref.get("content_hash") or file_sha256(src_path)
+        landmarks, _ = _detect_image_cached(
+            frame, content_hash, sensitivity, variant_suffix="-frame0" if is_video else ""
+        )
+        h, w = frame.shape[:2]
+        if LIVE_PREVIEW_MAX_SIDE and max(h, w) > LIVE_PREVIEW_MAX_SIDE:
+            scale = LIVE_PREVIEW_MAX_SIDE / max(h, w)
+            frame = cv2.resize(frame, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+            boxes = np.round(landmarks.boxes * scale).astype(np.int32)
+            landmarks = FaceLandmarks(landmarks.transformed(scale).points, boxes, landmarks.scores)
+        return frame, landmarks
+    
+    proxy, landmarks = LIVE_PREVIEWS.proxy((media_id, token), build)
+    return token, proxy, landmarks
+
+
+@app.route("/live-preview/<media_id>", methods=["GET", "POST"])
+@login_required
+def live_preview(media_id):
+    """
+    即時效果預覽：在低解析度的代理影像上套用選擇的處理方式，回傳 JPEG（不產生處理紀錄與輸出檔）
+    
+    參數與 /process 的表單相同（mode、face_ids、face_mode_<人臉 ID>）；
+    替換模式使用這個媒體最近一次上傳的覆蓋圖，POST 時可附上 overlay 檔案更新覆蓋圖。
+    相同的「媒體 + 模式 + 人臉選擇 + 覆蓋圖」直接回傳快取的結果。
+    """
+    media = Media.query.filter_by(media_id=media_id).first()
+    if not media:
+        abort(404, "找不到該檔案")
+    
+    # 權限檢查：與 /process 相同
+    has_permission = False
+    if current_user.is_super_admin_role():
+        has_permission = True
+    elif media.user_id == current_user.id:
+        has_permission = True
+    elif media.exhibition_id:
+        exhibition = db.session.get(Exhibition, media.exhibition_id)
+        if exhibition and current_user.can_manage_exhibition(exhibition):
+            has_permission = True
+    
+    if not has_permission:
+        abort(403, "您沒有權限處理此檔案")
+    
+    src_path = None
+    if media.upload_path:
+        src_path = Path(media.upload_path)
+        if not src_path.is_absolute():
+            src_path = BASE_DIR / src_path
+    if src_path is None or not src_path.exists():
+        abort(404, "找不到檔案")
+    
+    mode = request.values.get("mode", "").strip()
+    selected_ids, face_modes = _parse_face_selection(request.values)
+    
+    overlay_file = request.files.get("overlay")
+    if overlay_file and overlay_file.filename:
+        overlay_ext = Path(overlay_file.filename).suffix.lower()
+        if overlay_ext not in ALLOWED_IMAGE_EXT:
+            abort(400, "圖片格式不支援")
+        overlay_file.save(src_path.parent / f"{media_id}_overlay{overlay_ext}")
+    
+    overlay_path = None
+    overlay_token = None
+    if mode == "replace" or "replace" in face_modes.values():
+        overlays = list(src_path.parent.glob(f"{media_id}_overlay.*"))
+        if not overlays:
+            abort(400, "替換模式需要先上傳覆蓋圖片")
+        overlay_path = max(overlays, key=lambda p: p.stat().st_mtime_ns)
+        overlay_token = (overlay_path.name, overlay_path.stat().st_mtime_ns)
+    
+    try:
+        token, proxy, landmarks = _live_preview_proxy(media_id, src_path, media.file_type == "video")
+        key = (
+            media_id,
+            token,
+            mode,
+            tuple(sorted(set(selected_ids))),
+            tuple(sorted(face_modes.items())),
+            overlay_token,
+        )
+        
+        def render():
+            output = _LIVE_PREVIEW_PROCESSOR.render_preview(
+                proxy,
+                mode,
+                landmarks,
+                landmarks.boxes,
+                selected_face_ids=selected_ids if selected_ids else None,
+                overlay_path=overlay_path,
+                face_modes=face_modes or None,
+            )
+            ok, encoded = cv2.imencode(".jpg", output, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            if not ok:
+                raise ValueError("無法編碼預覽圖")
+            return encoded.tobytes()
+        
+        data, hit = LIVE_PREVIEWS.render(key, render)
     except ValueError as e:
         abort(400, str(e))
-    except RuntimeError as e:
-        abort(500, str(e))
-    except Exception as e:
-        abort(500, f"處理失敗: {str(e)}")
+    
+    response = Response(data, mimetype="image/jpeg")
+    response.headers["Cache-Control"] = "private, max-age=60"
+    response.headers["X-Preview-Cache"] = "hit" if hit else "miss"
+    return response
+
+
+@app.route("/api/detection/stats")
+@super_admin_required
+def detection_stats():
+    """
+    偵測狀態（超級管理員）：偵測服務的佇列深度與延遲、偵測器池命中率、偵測快取與即時預覽快取命中率
+    """
+    service = _detection_service
+    return jsonify({
+        "service": service.stats() if service is not None else None,
+        "landmarker_pool": LANDMARKER_POOL.stats(),
+        "detection_cache": DETECTION_CACHE.stats(),
+        "live_preview": LIVE_PREVIEWS.stats(),
+    })
 
 
 @app.route("/outputs/images/<path:filename>")
@@ -2315,6 +3250,19 @@ def previews(filename):
     return send_from_directory(PREVIEW_DIR, filename, as_attachment=False)
 
 
+@app.route("/faces/<media_id>/atlas.jpg")
+@login_required
+def face_atlas(media_id):
+    """
+    提供媒體的人臉截圖拼貼圖（各人臉的位置見 faces.json 的 "sprite"）
+    需要登入才能存取
+    """
+    atlas = _face_atlas_path(media_id)
+    if atlas.parent != PREVIEW_DIR or not atlas.exists():
+        abort(404)
+    return send_from_directory(PREVIEW_DIR, atlas.name, as_attachment=False)
+
+
 @app.route("/uploads/images/<path:filename>")
 @login_required
 def upload_images(filename):
@@ -2478,21 +3426,19 @@ def delete_exhibition_photo(exhibition_public_id, photo_id):
                         errors.append(f"無法刪除預覽圖 {preview_file.name}: {e}")
         except Exception as e:
             errors.append(f"查找預覽圖時出錯: {e}")
-        try:
-            for crop_file in PREVIEW_DIR.glob(f"{media_id}_face_*.jpg"):
-                if crop_file.exists():
-                    try:
-                        crop_file.unlink()
-                    except Exception as e:
-                        errors.append(f"無法刪除人臉截圖 {crop_file.name}: {e}")
-        except Exception as e:
-            errors.append(f"查找人臉截圖時出錯: {e}")
-        faces_json = METADATA_DIR / f"{media_id}_faces.json"
-        if faces_json.exists():
+        atlas_file = _face_atlas_path(media_id)
+        if atlas_file.exists():
             try:
-                faces_json.unlink()
+                atlas_file.unlink()
             except Exception as e:
-                errors.append(f"無法刪除人臉資料: {e}")
+                errors.append(f"無法刪除人臉截圖 {atlas_file.name}: {e}")
+        for meta_name in (f"{media_id}_faces.json", f"{media_id}_detect.json", f"{media_id}_landmarks.lmk"):
+            faces_json = METADATA_DIR / meta_name
+            if faces_json.exists():
+                try:
+                    faces_json.unlink()
+                except Exception as e:
+                    errors.append(f"無法刪除人臉資料: {e}")
     
     # 刪除資料庫記錄（ExhibitionPhoto 與對應的 Media，媒體管理才不會殘留）
     try:
@@ -2797,36 +3743,25 @@ def _delete_media_file(media_id):
             errors.append(f"查找預覽圖時出錯: {e}")
         
         # 刪除人臉資料 JSON
-        faces_json = METADATA_DIR / f"{media_id}_faces.json"
-        if faces_json.exists():
+        for meta_name in (f"{media_id}_faces.json", f"{media_id}_detect.json", f"{media_id}_landmarks.lmk"):
+            faces_json = METADATA_DIR / meta_name
+            if faces_json.exists():
+                try:
+                    faces_json.unlink()
+                except Exception as e:
+                    errors.append(f"無法刪除人臉資料: {e}")
+        
+        # 刪除人臉截圖拼貼圖（保存在 PREVIEW_DIR）
+        atlas_file = _face_atlas_path(media_id)
+        if atlas_file.exists():
             try:
-                faces_json.unlink()
+                atlas_file.unlink()
             except Exception as e:
-                errors.append(f"無法刪除人臉資料: {e}")
-        
-        # 刪除人臉截圖（注意：人臉截圖保存在 PREVIEW_DIR，不是 METADATA_DIR）
-        try:
-            face_crops_preview = list(PREVIEW_DIR.glob(f"{media_id}_face_*.jpg"))
-            for crop_file in face_crops_preview:
-                if crop_file.exists():
-                    try:
-                        crop_file.unlink()
-                    except Exception as e:
-                        errors.append(f"無法刪除人臉截圖 {crop_file.name}: {e}")
-        except Exception as e:
-            errors.append(f"查找人臉截圖時出錯: {e}")
+                errors.append(f"無法刪除人臉截圖 {atlas_file.name}: {e}")
         
-        # 也檢查 METADATA_DIR（以防萬一）
-        try:
-            face_crops_metadata = list(METADATA_DIR.glob(f"{media_id}_face_*.jpg"))
-            for crop_file in face_crops_metadata:
-                if crop_file.exists():
-                    try:
-                        crop_file.unlink()
-                    except Exception as e:
-                        errors.append(f"無法刪除人臉截圖 {crop_file.name}: {e}")
-        except Exception as e:
-            pass  # METADATA_DIR 中沒有人臉截圖是正常的
+        # 刪除處理工作與工作的影片偵測檢查點
+        for job_id in delete_jobs_for_media(media_id):
+            _discard_job_checkpoint(job_id)
         
         # 刪除資料庫記錄
         db.session.delete(media)
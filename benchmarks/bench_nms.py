@@ -0,0 +1,109 @@
+"""
+NMS 微基準測試：比較舊版逐對計算 IoU 的迴圈與 core.nms 的向量化實作
+候選框數量從 5 到 500，輸出每種數量的平均耗時與加速倍數
+
+用法:
+    python benchmarks/bench_nms.py
+    python benchmarks/bench_nms.py --sizes 5 50 500 --repeat 20
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from core.nms import nms, NMS_HARD, NMS_SOFT  # noqa: E402
+
+
+def _legacy_iou(a, b):
+    """舊版 _compute_iou（逐對計算）"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter_area = inter_w * inter_h
+    if inter_area == 0:
+        return 0.0
+    return inter_area / float(aw * ah + bw * bh - inter_area)
+
+
+def _legacy_nms(faces, iou_thresh=0.45):
+    """舊版 _nms_indices（依面積排序、Python 迴圈）"""
+    faces = np.array(faces)
+    scores = faces[:, 2] * faces[:, 3]
+    order = scores.argsort()[::-1]
+    keep_idx = []
+    while order.size > 0:
+        i = order[0]
+        keep_idx.append(int(i))
+        if order.size == 1:
+            break
+        rest = [j for j in order[1:] if _legacy_iou(faces[i], faces[j]) <= iou_thresh]
+        order = np.array(rest, dtype=int)
+    return keep_idx
+
+
+def make_boxes(n: int, seed: int = 0, width: int = 3840, height: int = 2160) -> np.ndarray:
+    """產生 n 個隨機人臉框，約一半彼此重疊（模擬同一張臉被重複偵測）"""
+    rng = np.random.default_rng(seed)
+    base_n = max(1, n // 2)
+    sizes = rng.integers(24, 240, size=base_n)
+    xs = rng.integers(0, width - 240, size=base_n)
+    ys = rng.integers(0, height - 240, size=base_n)
+    base = np.stack([xs, ys, sizes, (sizes * 1.2).astype(int)], axis=1)
+    jitter = base[rng.integers(0, base_n, size=n - base_n)].copy()
+    jitter[:, :2] += rng.integers(-8, 9, size=(len(jitter), 2))
+    return np.concatenate([base, jitter])[:n].astype(np.int64)
+
+
+def _time(fn, repeat: int) -> float:
+    fn()  # 預熱
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(sizes, repeat: int):
+    """執行基準測試，回傳每種數量的結果列表"""
+    rows = []
+    for n in sizes:
+        boxes = make_boxes(n)
+        scores = np.random.default_rng(n).random(n)
+        legacy = _time(lambda: _legacy_nms(boxes), repeat)
+        hard = _time(lambda: nms(boxes, method=NMS_HARD), repeat)
+        hard_scored = _time(lambda: nms(boxes, scores, method=NMS_HARD), repeat)
+        soft = _time(lambda: nms(boxes, scores, method=NMS_SOFT), repeat)
+        rows.append({
+            "boxes": n,
+            "legacy_ms": legacy * 1000,
+            "hard_ms": hard * 1000,
+            "hard_scored_ms": hard_scored * 1000,
+            "soft_ms": soft * 1000,
+            "speedup": legacy / hard if hard else float("inf"),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NMS 微基準測試")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 25, 50, 100, 250, 500])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.repeat)
+    print(f"{'boxes':>6} {'legacy(ms)':>11} {'hard(ms)':>9} {'scored(ms)':>11} {'soft(ms)':>9} {'speedup':>8}")
+    for r in rows:
+        print(
+            f"{r['boxes']:>6} {r['legacy_ms']:>11.3f} {r['hard_ms']:>9.3f} "
+            f"{r['hard_scored_ms']:>11.3f} {r['soft_ms']:>9.3f} {r['speedup']:>7.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
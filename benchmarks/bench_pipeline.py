@@ -0,0 +1,325 @@
+"""
+人臉偵測與效果的微基準測試（合成影像，只使用 CPU，不需要網路）
+分別測量 _detect_landmarks_bgr、_nms_indices、apply_mosaic、apply_blur（與直接大核心 GaussianBlur 對照）、
+apply_eye_cover、apply_face_replace、draw_face_boxes 在不同解析度與人臉數量下的耗時，
+以 JSON 輸出各項的百分位數，並可與儲存的基準結果比較（超過門檻視為效能退步）。
+
+用法:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --quick --output results.json
+    python benchmarks/bench_pipeline.py --cases mosaic replace --resolutions 4k --faces 20
+    python benchmarks/bench_pipeline.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --baseline benchmarks/baseline.json --threshold 0.15
+
+與基準比較時有任何一項退步，結束代碼為 1（可用於 CI）。
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# app.py 匯入時需要資料庫設定；基準測試不使用資料庫，也不啟動多行程偵測服務
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("DETECTION_SERVICE_WORKERS", "0")
+
+from benchmarks.synthetic import make_face, make_scene, place_landmarks  # noqa: E402
+from core.overlay import PreparedOverlay  # noqa: E402
+
+RESOLUTIONS = {
+    "vga": (640, 480),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+FACE_COUNTS = [1, 5, 20]
+TEMPLATE_SIZE = 256  # 特徵點模板用的人臉大小
+
+
+def summarize(samples_s) -> dict:
+    """把多次量測（秒）整理成毫秒統計值"""
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000
+    return {
+        "n": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "std_ms": float(ms.std()),
+        "min_ms": float(ms.min()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def time_call(fn, repeat: int, warmup: int = 2) -> dict:
+    """執行 fn 數次（先預熱），回傳統計值"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def make_overlay(size: int = 256) -> np.ndarray:
+    """替換模式用的 RGBA 覆蓋圖（橢圓外透明、邊緣半透明）"""
+    rgb = make_face(size)
+    alpha = np.zeros((size, size), dtype=np.uint8)
+    cv2.ellipse(alpha, (size // 2, size // 2), (size * 2 // 5, size // 2 - 2), 0, 0, 360, 255, -1)
+    alpha = cv2.GaussianBlur(alpha, (0, 0), size / 40)
+    return np.dstack([rgb, alpha])
+
+
+def make_candidates(boxes: np.ndarray, seed: int = 0) -> np.ndarray:
+    """模擬 NMS 前的候選框：每張臉除了原始框，再加上兩個略微偏移的重複框"""
+    if len(boxes) == 0:
+        return np.zeros((0, 4), dtype=np.int32)
+    rng = np.random.default_rng(seed)
+    dup = np.repeat(boxes, 2, axis=0).astype(np.int64)
+    dup[:, :2] += rng.integers(-4, 5, size=(len(dup), 2))
+    return np.concatenate([boxes, dup]).astype(np.int32)
+
+
+class Scene:
+    """一組基準測試輸入：合成影像、特徵點、人臉框與 NMS 候選框"""
+
+    def __init__(self, app_module, template, width: int, height: int, num_faces: int, overlay):
+        self.image, placements = make_scene(width, height, num_faces, seed=num_faces)
+        self.landmarks, self.boxes = place_landmarks(template, TEMPLATE_SIZE, placements, width, height)
+        self.candidates = make_candidates(self.boxes, seed=num_faces)
+        self.overlay = overlay
+        self.app = app_module
+
+
+# 各項基準測試：名稱 -> 建立待測函數（參數為 Scene 與偵測器），回傳 None 表示略過
+def _bench_detect(scene, landmarker):
+    if landmarker is None:
+        return None
+    return lambda: scene.app._detect_landmarks_bgr(scene.image, landmarker, None)
+
+
+def _bench_nms(scene, landmarker):
+    return lambda: scene.app._nms_indices(scene.candidates, method=scene.app.FACE_NMS_METHOD)
+
+
+def _bench_mosaic(scene, landmarker):
+    return lambda: scene.app.apply_mosaic(scene.image, scene.boxes)
+
+
+def _bench_blur(scene, landmarker):
+    return lambda: scene.app.apply_blur(scene.image, scene.boxes)
+
+
+def _naive_blur(app_module, image, boxes):
+    """對照組：直接在原尺寸的人臉區域上做同樣 sigma 的大核心 GaussianBlur"""
+    result = image.copy()
+    for (x, y, w, h) in boxes:
+        roi = result[y : y + h, x : x + w]
+        if roi.size:
+            roi[:] = cv2.GaussianBlur(roi, (0, 0), app_module._blur_sigma(roi.shape[1], roi.shape[0]))
+    return result
+
+
+def _bench_blur_naive(scene, landmarker):
+    return lambda: _naive_blur(scene.app, scene.image, scene.boxes)
+
+
+def _bench_eyes(scene, landmarker):
+    return lambda: scene.app.apply_eye_cover(scene.image, scene.landmarks, None)
+
+
+def _bench_replace(scene, landmarker):
+    return lambda: scene.app.apply_face_replace(scene.image, scene.boxes, scene.overlay)
+
+
+def _bench_draw_boxes(scene, landmarker):
+    return lambda: scene.app.draw_face_boxes(scene.image, scene.boxes)
+
+
+BENCHMARKS = {
+    "detect": _bench_detect,
+    "nms": _bench_nms,
+    "mosaic": _bench_mosaic,
+    "blur": _bench_blur,
+    "blur_naive": _bench_blur_naive,
+    "eyes": _bench_eyes,
+    "replace": _bench_replace,
+    "draw_boxes": _bench_draw_boxes,
+}
+
+
+def run(cases, resolutions, face_counts, repeat: int, detect_repeat: int) -> dict:
+    """
+    執行基準測試
+
+    回傳:
+        {"meta": {...}, "results": {"<項目>/<解析度>/<人臉數>f": 統計值, ...}}
+    """
+    import app as app_module  # 延遲匯入：app 匯入時會載入模型
+
+    from core.face_landmarks import FaceLandmarks
+
+    model_path = app_module.MODEL_DIR / "face_landmarker.task"
+    notes = []
+    results = {}
+    if model_path.exists():
+        lease = app_module.LANDMARKER_POOL.lease("image", 0.6)
+    else:
+        # 沒有模型檔時不借用偵測器（建立偵測器會嘗試下載模型）
+        lease = nullcontext(None)
+        notes.append("找不到 face_landmarker.task，略過偵測項目（基準測試不會下載模型）")
+    with lease as landmarker:
+        template = FaceLandmarks.empty()
+        if landmarker is not None:
+            detected, _ = app_module._detect_landmarks_bgr(make_face(TEMPLATE_SIZE), landmarker, None)
+            if detected:
+                template = detected.select([0])
+            else:
+                notes.append("合成人臉未被偵測到，特徵點相關項目將沒有人臉")
+        overlay = PreparedOverlay(make_overlay())  # 與處理流程相同：覆蓋圖只前處理一次
+
+        for res_name in resolutions:
+            width, height = RESOLUTIONS[res_name]
+            for num_faces in face_counts:
+                scene = Scene(app_module, template, width, height, num_faces, overlay)
+                for case in cases:
+                    fn = BENCHMARKS[case](scene, landmarker)
+                    if fn is None:
+                        continue
+                    n = detect_repeat if case == "detect" else repeat
+                    stats = time_call(fn, n)
+                    stats["faces"] = len(scene.boxes)
+                    results[f"{case}/{res_name}/{num_faces}f"] = stats
+                    print(
+                        f"{case:>11} {res_name:>6} {num_faces:>3}f  "
+                        f"p50 {stats['p50_ms']:9.3f} ms  p90 {stats['p90_ms']:9.3f} ms",
+                        file=sys.stderr,
+                    )
+
+    app_module.LANDMARKER_POOL.clear()  # 在直譯器結束前關閉模型
+
+    meta = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "cv2_threads": cv2.getNumThreads(),
+        "repeat": repeat,
+        "detect_repeat": detect_repeat,
+        "notes": notes,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float, metric: str = "p50_ms", min_delta_ms: float = 0.05) -> dict:
+    """
+    與基準結果比較
+
+    參數:
+        threshold: 允許的變慢比例（0.15 表示慢 15% 以上視為退步）
+        metric: 比較的統計值
+        min_delta_ms: 絕對差距小於此值時不視為退步（避免極短項目的量測雜訊）
+
+    回傳:
+        {"metric", "threshold", "regressions": [...], "improvements": [...], "unchanged": n, "missing": [...]}
+    """
+    base_results = baseline.get("results", {})
+    cur_results = current.get("results", {})
+    regressions, improvements, unchanged = [], [], 0
+    for key, cur in sorted(cur_results.items()):
+        base = base_results.get(key)
+        if base is None or base.get(metric, 0) <= 0:
+            continue
+        ratio = cur[metric] / base[metric]
+        delta = cur[metric] - base[metric]
+        entry = {"case": key, "baseline_ms": base[metric], "current_ms": cur[metric], "ratio": ratio}
+        if ratio > 1 + threshold and delta > min_delta_ms:
+            regressions.append(entry)
+        elif ratio < 1 - threshold and -delta > min_delta_ms:
+            improvements.append(entry)
+        else:
+            unchanged += 1
+    return {
+        "metric": metric,
+        "threshold": threshold,
+        "regressions": regressions,
+        "improvements": improvements,
+        "unchanged": unchanged,
+        "missing": sorted(set(base_results) - set(cur_results)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="人臉偵測與效果的微基準測試")
+    parser.add_argument("--cases", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument("--faces", type=int, nargs="+", default=FACE_COUNTS)
+    parser.add_argument("--repeat", type=int, default=30, help="效果與 NMS 每項的量測次數")
+    parser.add_argument("--detect-repeat", type=int, default=10, help="偵測每項的量測次數")
+    parser.add_argument("--quick", action="store_true", help="快速模式（vga/1080p、1 與 5 張臉、較少次數）")
+    parser.add_argument("--threads", type=int, default=None, help="OpenCV 執行緒數（固定後結果較穩定）")
+    parser.add_argument("--output", type=Path, help="結果 JSON 的輸出路徑（預設輸出到 stdout）")
+    parser.add_argument("--baseline", type=Path, help="要比較的基準結果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.15, help="退步門檻（比例）")
+    parser.add_argument("--metric", default="p50_ms", help="比較用的統計值")
+    parser.add_argument("--save-baseline", type=Path, help="把這次結果存為基準")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.resolutions = [r for r in args.resolutions if r != "4k"] or ["vga"]
+        args.faces = [f for f in args.faces if f <= 5] or [1]
+        args.repeat = min(args.repeat, 10)
+        args.detect_repeat = min(args.detect_repeat, 3)
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    report = run(args.cases, args.resolutions, args.faces, args.repeat, args.detect_repeat)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparison = compare(report, baseline, args.threshold, args.metric)
+        report["comparison"] = comparison
+        for item in comparison["regressions"]:
+            print(
+                f"退步 {item['case']}: {item['baseline_ms']:.3f} -> {item['current_ms']:.3f} ms "
+                f"({item['ratio']:.2f}x)",
+                file=sys.stderr,
+            )
+        for item in comparison["improvements"]:
+            print(
+                f"改善 {item['case']}: {item['baseline_ms']:.3f} -> {item['current_ms']:.3f} ms "
+                f"({item['ratio']:.2f}x)",
+                file=sys.stderr,
+            )
+        if comparison["regressions"]:
+            exit_code = 1
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(text, encoding="utf-8")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+影片逐幀處理的吞吐量基準測試：比較「每幀配置新陣列」與「重複使用緩衝區、就地套用效果」兩種迴圈
+以合成影格模擬 process_video 的每一幀：解碼到影格陣列、偵測前的縮圖與 RGB 轉換、套用效果，
+輸出每種效果、解析度與人臉數量下兩種迴圈的 fps、加速倍數，以及 tracemalloc 記錄的記憶體峰值。
+
+解碼以複製預先產生的影格代替（不受編解碼器影響），偵測只包含送進模型前的前處理；
+加上 --detect 時改用實際的影片模式偵測器（需要 face_landmarker.task）。
+
+用法:
+    python benchmarks/bench_video.py
+    python benchmarks/bench_video.py --resolutions 4k --faces 5 --frames 120
+    python benchmarks/bench_video.py --detect --resolutions 1080p --output video.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import nullcontext
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# app.py 匯入時需要資料庫設定；基準測試不使用資料庫，也不啟動多行程偵測服務
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("DETECTION_SERVICE_WORKERS", "0")
+
+from benchmarks.bench_pipeline import RESOLUTIONS, TEMPLATE_SIZE, make_overlay  # noqa: E402
+from benchmarks.synthetic import make_face, make_scene, place_landmarks  # noqa: E402
+from core.frame_buffers import FrameBuffers  # noqa: E402
+from core.overlay import PreparedOverlay  # noqa: E402
+
+MODES = ["mosaic", "blur", "eyes", "replace"]
+
+
+def _legacy_frame(app_module, src, scene, mode, detect, timestamp_ms, side, prev_eye_boxes):
+    """每幀配置新陣列：解碼得到新影格，前處理與效果都回傳新陣列"""
+    frame = src.copy()
+    if detect is not None:
+        detect(frame, timestamp_ms, side, None)
+    else:
+        h, w = frame.shape[:2]
+        scale = side / max(h, w)
+        proxy = cv2.resize(frame, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(proxy, cv2.COLOR_BGR2RGB)
+    return _apply(app_module, frame, scene, mode, prev_eye_boxes, None)
+
+
+def _inplace_frame(app_module, src, scene, mode, detect, timestamp_ms, side, prev_eye_boxes, buffers):
+    """重複使用緩衝區：解碼到同一個影格陣列，前處理寫入固定的陣列，效果就地改寫人臉區域"""
+    frame = buffers.get("frame", src.shape)
+    np.copyto(frame, src)
+    if detect is not None:
+        detect(frame, timestamp_ms, side, buffers)
+    else:
+        h, w = frame.shape[:2]
+        scale = side / max(h, w)
+        proxy_w, proxy_h = round(w * scale), round(h * scale)
+        proxy = cv2.resize(
+            frame, (proxy_w, proxy_h), dst=buffers.get("proxy", (proxy_h, proxy_w, 3)), interpolation=cv2.INTER_AREA
+        )
+        cv2.cvtColor(proxy, cv2.COLOR_BGR2RGB, dst=buffers.get("rgb", proxy.shape))
+    return _apply(app_module, frame, scene, mode, prev_eye_boxes, frame)
+
+
+def _apply(app_module, frame, scene, mode, prev_eye_boxes, out):
+    if mode == "mosaic":
+        return app_module.apply_mosaic(frame, scene["boxes"], out=out), prev_eye_boxes
+    if mode == "blur":
+        return app_module.apply_blur(frame, scene["boxes"], out=out), prev_eye_boxes
+    if mode == "eyes":
+        return app_module.apply_eye_cover(frame, scene["landmarks"], prev_eye_boxes, out=out)
+    return app_module.apply_face_replace(frame, scene["boxes"], scene["overlay"], out=out), prev_eye_boxes
+
+
+def _run_loop(step, source, frames: int, measure_memory: bool):
+    """執行 frames 幀，回傳 (fps, 記憶體峰值 MB)"""
+    prev_eye_boxes = []
+    for i in range(2):  # 預熱（第一次呼叫會配置緩衝區）
+        _, prev_eye_boxes = step(source, int(i * 1000 / 30), prev_eye_boxes)
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(frames):
+        _, prev_eye_boxes = step(source, int((i + 2) * 1000 / 30), prev_eye_boxes)
+    elapsed = time.perf_counter() - start
+    peak_mb = None
+    if measure_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = peak / 1e6
+    return frames / elapsed, peak_mb
+
+
+def run(modes, resolutions, face_counts, frames: int, use_detector: bool, measure_memory: bool) -> dict:
+    """
+    執行基準測試
+
+    回傳:
+        {"meta": {...}, "results": {"<效果>/<解析度>/<人臉數>f": {"legacy_fps", "inplace_fps", "speedup", ...}}}
+    """
+    import app as app_module  # 延遲匯入：app 匯入時會載入模型
+
+    from core.face_landmarks import FaceLandmarks
+
+    notes = []
+    model_ready = (app_module.MODEL_DIR / "face_landmarker.task").exists()
+    if model_ready:
+        lease = app_module.LANDMARKER_POOL.lease("image", 0.6)
+    else:
+        lease = nullcontext(None)
+        notes.append("找不到 face_landmarker.task，效果使用空的特徵點，並略過 --detect")
+    with lease as landmarker:
+        template = FaceLandmarks.empty()
+        if landmarker is not None:
+            detected, _ = app_module._detect_landmarks_bgr(make_face(TEMPLATE_SIZE), landmarker, None)
+            if detected:
+                template = detected.select([0])
+    overlay = PreparedOverlay(make_overlay())  # 與處理流程相同：覆蓋圖只前處理一次
+    results = {}
+
+    for res_name in resolutions:
+        width, height = RESOLUTIONS[res_name]
+        side = min(max(width, height), app_module.DETECTION_MAX_SIDE or max(width, height))
+        for num_faces in face_counts:
+            source, placements = make_scene(width, height, num_faces, seed=num_faces)
+            landmarks, boxes = place_landmarks(template, TEMPLATE_SIZE, placements, width, height)
+            if not len(boxes):
+                boxes = np.array([[x, y, s, s] for x, y, s in placements], dtype=np.int32)
+            scene = {"landmarks": landmarks, "boxes": boxes, "overlay": overlay}
+
+            for mode in modes:
+                loops = {}
+                for name in ("legacy", "inplace"):
+                    # 每種迴圈各用一個影片模式偵測器（時間戳需遞增，不能共用）
+                    video_lease = (
+                        app_module.LANDMARKER_POOL.lease("video", 0.6)
+                        if use_detector and model_ready
+                        else nullcontext(None)
+                    )
+                    with video_lease as video_landmarker:
+                        detect = None
+                        if video_landmarker is not None:
+                            detect = lambda frame, ts, s, buffers: app_module._detect_landmarks_bgr(  # noqa: E731
+                                frame, video_landmarker, ts, max_side=s, buffers=buffers
+                            )
+                        if name == "legacy":
+                            step = lambda src, ts, prev: _legacy_frame(  # noqa: E731
+                                app_module, src, scene, mode, detect, ts, side, prev
+                            )
+                        else:
+                            buffers = FrameBuffers()
+                            step = lambda src, ts, prev: _inplace_frame(  # noqa: E731
+                                app_module, src, scene, mode, detect, ts, side, prev, buffers
+                            )
+                        loops[name] = _run_loop(step, source, frames, measure_memory)
+                (legacy_fps, legacy_peak), (inplace_fps, inplace_peak) = loops["legacy"], loops["inplace"]
+                entry = {
+                    "frames": frames,
+                    "faces": len(boxes),
+                    "legacy_fps": legacy_fps,
+                    "inplace_fps": inplace_fps,
+                    "speedup": inplace_fps / legacy_fps,
+                }
+                if measure_memory:
+                    entry["legacy_peak_mb"] = legacy_peak
+                    entry["inplace_peak_mb"] = inplace_peak
+                results[f"{mode}/{res_name}/{num_faces}f"] = entry
+                print(
+                    f"{mode:>8} {res_name:>6} {num_faces:>3}f  "
+                    f"legacy {legacy_fps:8.1f} fps  in-place {inplace_fps:8.1f} fps  ({entry['speedup']:.2f}x)",
+                    file=sys.stderr,
+                )
+
+    app_module.LANDMARKER_POOL.clear()  # 在直譯器結束前關閉模型
+
+    meta = {
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "cv2_threads": cv2.getNumThreads(),
+        "detector": bool(use_detector and model_ready),
+        "detection_max_side": app_module.DETECTION_MAX_SIDE,
+        "notes": notes,
+    }
+    return {"meta": meta, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="影片逐幀處理的吞吐量基準測試")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=["1080p", "4k"])
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--frames", type=int, default=60, help="每項量測的幀數")
+    parser.add_argument("--detect", action="store_true", help="包含實際的影片模式偵測（需要模型檔）")
+    parser.add_argument("--memory", action="store_true", help="以 tracemalloc 記錄記憶體峰值（會降低 fps）")
+    parser.add_argument("--threads", type=int, default=None, help="OpenCV 執行緒數（固定後結果較穩定）")
+    parser.add_argument("--output", type=Path, help="結果 JSON 的輸出路徑（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    report = run(args.modes, args.resolutions, args.faces, args.frames, args.detect, args.memory)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+基準測試用的合成影像：以程式繪製的人臉合成到有紋理的背景上
+不需要任何外部圖片或網路，繪製的臉可被 MediaPipe 偵測到（用於偵測的基準測試）；
+效果函數使用的特徵點則由單張臉的偵測結果平移縮放到每個位置，臉的數量不受偵測器上限影響。
+"""
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+
+def make_face(size: int) -> np.ndarray:
+    """繪製一張正面卡通人臉（size x size，BGR），包含頭髮、眼睛、虹膜、眉毛、鼻子與嘴巴"""
+    s = int(size)
+    img = np.full((s, s, 3), (200, 210, 220), dtype=np.uint8)
+    cx = s // 2
+    cv2.ellipse(img, (cx, int(s * 0.47)), (int(s * 0.36), int(s * 0.47)), 0, 0, 360, (60, 50, 40), -1)
+    cv2.ellipse(img, (cx, int(s * 0.55)), (int(s * 0.30), int(s * 0.40)), 0, 0, 360, (150, 175, 215), -1)
+    for side in (-1, 1):
+        ex, ey = cx + side * int(s * 0.12), int(s * 0.48)
+        cv2.ellipse(img, (ex, ey), (int(s * 0.07), int(s * 0.035)), 0, 0, 360, (245, 245, 245), -1)
+        cv2.circle(img, (ex, ey), int(s * 0.028), (60, 40, 30), -1)
+        cv2.circle(img, (ex, ey), int(s * 0.012), (10, 10, 10), -1)
+        cv2.line(
+            img,
+            (ex - int(s * 0.08), ey - int(s * 0.07)),
+            (ex + int(s * 0.08), ey - int(s * 0.08)),
+            (40, 35, 30),
+            max(1, s // 40),
+        )
+    cv2.line(img, (cx, int(s * 0.5)), (cx - int(s * 0.03), int(s * 0.64)), (110, 130, 170), max(1, s // 60))
+    cv2.ellipse(img, (cx, int(s * 0.75)), (int(s * 0.09), int(s * 0.03)), 0, 0, 180, (80, 80, 170), -1)
+    return cv2.GaussianBlur(img, (0, 0), max(0.5, s / 150))
+
+
+def make_background(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """產生有紋理的背景（低頻色塊 + 雜訊），避免純色背景讓編碼與縮放過於理想"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(40, 220, size=(max(2, height // 64), max(2, width // 64), 3), dtype=np.uint8)
+    bg = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(-12, 13, size=(height, width, 1), dtype=np.int16)
+    return np.clip(bg.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def layout_faces(width: int, height: int, num_faces: int, seed: int = 0) -> List[Tuple[int, int, int]]:
+    """
+    在畫面上排列不重疊的人臉位置
+
+    回傳:
+        [(x, y, size), ...]：每張臉的左上角與邊長；臉越多尺寸越小（模擬人群）
+    """
+    if num_faces <= 0:
+        return []
+    rng = np.random.default_rng(seed)
+    cols = int(np.ceil(np.sqrt(num_faces * width / height)))
+    rows = int(np.ceil(num_faces / cols))
+    cell_w, cell_h = width // cols, height // rows
+    cell = min(cell_w, cell_h)
+    slots = rng.permutation(rows * cols)[:num_faces]
+    faces = []
+    for slot in slots:
+        r, c = divmod(int(slot), cols)
+        size = max(48, int(cell * rng.uniform(0.55, 0.8)))
+        x = c * cell_w + int(rng.integers(0, max(1, cell_w - size)))
+        y = r * cell_h + int(rng.integers(0, max(1, cell_h - size)))
+        faces.append((x, y, size))
+    return faces
+
+
+def make_scene(width: int, height: int, num_faces: int, seed: int = 0):
+    """
+    合成測試影像
+
+    回傳:
+        (image_bgr, placements)：影像與每張臉的 (x, y, size)
+    """
+    image = make_background(width, height, seed)
+    placements = layout_faces(width, height, num_faces, seed)
+    for x, y, size in placements:
+        face = make_face(size)
+        h = min(size, height - y)
+        w = min(size, width - x)
+        image[y : y + h, x : x + w] = face[:h, :w]
+    return image, placements
+
+
+def place_landmarks(template, template_size: int, placements, width: int, height: int):
+    """
+    將單張臉（template_size 大小的 make_face 影像）的偵測結果平移縮放到每個位置
+
+    參數:
+        template: make_face(template_size) 的偵測結果（FaceLandmarks，一張臉）
+        placements: make_scene 回傳的 (x, y, size) 列表
+
+    回傳:
+        (FaceLandmarks, boxes)：與 _detect_landmarks_bgr 相同格式
+    """
+    from core.face_landmarks import FaceLandmarks
+
+    if not placements or not template:
+        return FaceLandmarks.empty(), np.zeros((0, 4), dtype=np.int32)
+    parts = [template.transformed(scale=size / template_size, dx=x, dy=y) for x, y, size in placements]
+    landmarks = FaceLandmarks.concatenate(parts)
+    landmarks.boxes = landmarks.compute_boxes(width, height)
+    return landmarks, landmarks.boxes
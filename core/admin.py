@@ -7,6 +7,7 @@ from datetime import datetime, date
 import json
 import re
 import logging
+import shutil
 from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
 from flask_login import login_required, current_user
 from flask_babel import gettext as _
@@ -25,6 +26,7 @@ from core.models import (
     _public_id_exhibition,
     media_cells,
 )
+from core.job_queue import delete_jobs_for_media
 from core.decorators import admin_required, super_admin_required, can_manage_exhibition
 from core.floor_plan_ocr import floor_plan_has_text, floor_plan_text_regions
 
@@ -36,6 +38,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent  # 專案根目錄（core 的
 EXHIBITION_DIR = BASE_DIR / "exhibitions"  # 展覽照片目錄
 PREVIEW_DIR = BASE_DIR / "previews"  # 預覽圖
 METADATA_DIR = BASE_DIR / "metadata"  # 人臉資料
+JOB_CHECKPOINT_DIR = METADATA_DIR / "checkpoints"  # 處理工作的影片偵測檢查點
 
 
 def init_admin(app):
@@ -662,7 +665,7 @@ def delete_exhibition(exhibition_public_id):
                     except Exception as e:
                         errors.append(f"無法刪除縮圖 {tp.name}: {e}")
         
-        # 2. 刪除該展覽下所有 Media 的實體檔案（uploads、outputs、previews、metadata）
+        # 2. 刪除該展覽下所有 Media 的實體檔案（uploads、outputs、previews、metadata）與處理工作
         for media in list(exhibition.media_files):
             media_id = media.media_id
             if media.upload_path:
@@ -689,24 +692,21 @@ def delete_exhibition(exhibition_public_id):
                         preview_file.unlink()
                     except Exception as e:
                         errors.append(f"無法刪除預覽圖 {preview_file.name}: {e}")
-            for crop_file in PREVIEW_DIR.glob(f"{media_id}_face_*.jpg"):
-                if crop_file.exists():
-                    try:
-                        crop_file.unlink()
-                    except Exception as e:
-                        errors.append(f"無法刪除人臉截圖 {crop_file.name}: {e}")
-            faces_json = METADATA_DIR / f"{media_id}_faces.json"
-            if faces_json.exists():
+            atlas_file = PREVIEW_DIR / f"{media_id}_faces.jpg"
+            if atlas_file.exists():
                 try:
-                    faces_json.unlink()
+                    atlas_file.unlink()
                 except Exception as e:
-                    errors.append(f"無法刪除人臉資料: {e}")
-            for crop_file in METADATA_DIR.glob(f"{media_id}_face_*.jpg"):
-                if crop_file.exists():
+                    errors.append(f"無法刪除人臉截圖 {atlas_file.name}: {e}")
+            for meta_name in (f"{media_id}_faces.json", f"{media_id}_detect.json", f"{media_id}_landmarks.lmk"):
+                faces_json = METADATA_DIR / meta_name
+                if faces_json.exists():
                     try:
-                        crop_file.unlink()
+                        faces_json.unlink()
                     except Exception as e:
-                        errors.append(f"無法刪除人臉截圖 {crop_file.name}: {e}")
+                        errors.append(f"無法刪除人臉資料: {e}")
+            for job_id in delete_jobs_for_media(media_id):
+                shutil.rmtree(JOB_CHECKPOINT_DIR / job_id, ignore_errors=True)
             db.session.delete(media)
         
         # 3. 刪除展覽（cascade 會一併刪除 ExhibitionPhoto）
@@ -0,0 +1,134 @@
+"""
+人臉偵測結果快取模組：以「檔案內容雜湊 + 靈敏度 + 偵測參數 + 模型版本」為 key
+上傳、選項頁與處理流程共用同一份偵測結果，避免同一張照片重複偵測，
+也確保使用者在選項頁勾選的人臉編號與實際處理的人臉一致。
+"""
+import hashlib
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from core.face_landmarks import FaceLandmarks
+from core.landmarker_pool import quantize_sensitivity
+
+
+# 偵測後處理（邊界框擴展、NMS 等）改變時遞增，讓舊快取失效
+# v2：照片改為以最低靈敏度偵測一次，快取內容為附信心度的所有候選人臉
+# v3：Soft-NMS 保留沒有信心度的臉，並移除重疊過高的重複偵測
+DETECTION_CACHE_VERSION = 3
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """計算檔案內容的 SHA-256（分段讀取，不會一次載入整個檔案）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_fingerprint(model_path: Path) -> str:
+    """模型版本識別碼：模型檔內容雜湊（前 12 碼）+ 快取格式版本"""
+    try:
+        model_hash = file_sha256(model_path)[:12]
+    except OSError:
+        model_hash = "nomodel"
+    return f"v{DETECTION_CACHE_VERSION}-{model_hash}"
+
+
+class DetectionCache:
+    """
+    偵測結果快取（記憶體 LRU + 磁碟 .npz）
+
+    磁碟上依模型版本分目錄存放：<cache_dir>/<model_version>/<key>.npz，
+    更換模型或調整 DETECTION_CACHE_VERSION 後，舊目錄可由 purge_stale() 清除。
+    多個 worker 行程共用同一個目錄，因此上傳與處理即使在不同行程也能命中。
+    """
+
+    def __init__(self, cache_dir: Path, model_version: str, max_memory_items: int = 64):
+        self.cache_dir = Path(cache_dir)
+        self.model_version = model_version
+        self._dir = self.cache_dir / model_version
+        self._max_items = max(1, int(max_memory_items))
+        self._memory: "OrderedDict[str, FaceLandmarks]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    @staticmethod
+    def make_key(content_hash: str, sensitivity: float, variant: str = "") -> str:
+        """組合快取 key（靈敏度會先量化，與偵測器池一致）"""
+        key = f"{content_hash}_{quantize_sensitivity(sensitivity):.2f}"
+        return f"{key}_{variant}" if variant else key
+
+    def _path(self, key: str) -> Path:
+        return self._dir / f"{key}.npz"
+
+    def _remember(self, key: str, landmarks: FaceLandmarks):
+        with self._lock:
+            self._memory[key] = landmarks
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, content_hash: str, sensitivity: float, variant: str = "") -> Optional[FaceLandmarks]:
+        """取得快取的偵測結果，找不到時回傳 None"""
+        key = self.make_key(content_hash, sensitivity, variant)
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return cached
+
+        path = self._path(key)
+        if path.exists():
+            try:
+                with np.load(path) as data:
+                    landmarks = FaceLandmarks(data["points"], data["boxes"], data["scores"])
+            except Exception:
+                landmarks = None  # 檔案毀損時視為未命中，之後會被覆寫
+            if landmarks is not None:
+                self._remember(key, landmarks)
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return landmarks
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, content_hash: str, sensitivity: float, landmarks: FaceLandmarks, variant: str = ""):
+        """儲存偵測結果（先寫暫存檔再改名，避免其他行程讀到寫一半的檔案）"""
+        key = self.make_key(content_hash, sensitivity, variant)
+        self._remember(key, landmarks)
+        try:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._dir / f"{key}.{threading.get_ident()}.tmp.npz"
+            np.savez(tmp_path, points=landmarks.points, boxes=landmarks.boxes, scores=landmarks.scores)
+            tmp_path.replace(self._path(key))
+        except OSError:
+            pass  # 磁碟寫入失敗時仍保留記憶體快取
+        with self._lock:
+            self._stats["stores"] += 1
+
+    def purge_stale(self) -> int:
+        """刪除其他模型版本的快取目錄，回傳刪除的目錄數"""
+        removed = 0
+        if not self.cache_dir.exists():
+            return removed
+        for child in self.cache_dir.iterdir():
+            if child.is_dir() and child.name != self.model_version:
+                shutil.rmtree(child, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+            data["memory_items"] = len(self._memory)
+        data["model_version"] = self.model_version
+        return data
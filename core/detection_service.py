@@ -0,0 +1,468 @@
+"""
+人臉偵測服務模組：多個常駐的偵測 worker 行程（各自載入模型並保持暖機）
+網頁路由與 MediaProcessor 透過 DetectionService 送出影格，偵測可使用所有 CPU 核心，
+不必在同一個網頁行程內互相搶用偵測器。
+
+影格放在 multiprocessing.shared_memory 的環狀緩衝區中交給 worker（固定數量的 slot，
+用完時送出端會等待，形成自然的背壓），不經過 pickle；只有偵測結果（特徵點陣列）經由佇列傳回。
+超過 slot 大小的影格才會改用佇列傳送。
+"""
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+import numpy as np
+
+from core.frame_buffers import FrameBuffers
+from core.face_landmarks import FaceLandmarks
+from core.landmarker_pool import MODE_IMAGE, MODE_SCORE, MODE_VIDEO
+
+
+# 預設 slot 大小：可放一張 4K（3840x2160）BGR 影格
+DEFAULT_SLOT_BYTES = 3840 * 2160 * 3
+
+
+class DetectionServiceError(RuntimeError):
+    """偵測服務本身的錯誤（worker 結束、逾時等），呼叫端可改用本行程偵測"""
+
+
+class DetectorUnavailable(RuntimeError):
+    """worker 無法建立人臉偵測器（MediaPipe 或模型檔不可用）"""
+
+
+def _worker_main(worker_id: int, shm_name: str, slot_bytes: int, tasks, results, free_slots):
+    """worker 行程主迴圈：從自己的任務佇列取出影格，偵測後把結果放回共用的結果佇列"""
+    # worker 內的偵測直接使用本行程的偵測器池，不再啟動巢狀的偵測服務
+    os.environ["DETECTION_SERVICE_WORKERS"] = "0"
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        from app import _detect_landmarks_bgr, _detect_landmarks_crowd, LANDMARKER_POOL, MP_AVAILABLE
+    except Exception as e:
+        results.put(("dead", worker_id, f"{type(e).__name__}: {e}"))
+        shm.close()
+        return
+    # 照片用的偵測器（最低靈敏度，含信心度偵測器）在匯入 app 時已預先建立
+    results.put(("ready", worker_id, None))
+
+    # 影片串流：stream_id -> (偵測器池 key, VIDEO 模式偵測器)，同一支影片固定由同一個 worker 處理
+    streams = {}
+    # 每個串流各自重複使用偵測縮圖與 RGB 轉換用的陣列
+    stream_buffers = {}
+
+    def detect(frame, params):
+        sensitivity = params["sensitivity"]
+        stream_id = params.get("stream_id")
+        if stream_id is not None:
+            entry = streams.get(stream_id)
+            if entry is None:
+                entry = streams[stream_id] = LANDMARKER_POOL.acquire(MODE_VIDEO, sensitivity)
+                stream_buffers[stream_id] = FrameBuffers()
+            if entry[1] is None:
+                raise DetectorUnavailable("無法初始化人臉偵測器")
+            landmarks, _ = _detect_landmarks_bgr(
+                frame,
+                entry[1],
+                params["timestamp_ms"],
+                max_side=params.get("max_side"),
+                buffers=stream_buffers[stream_id],
+            )
+            return landmarks
+        if params.get("crowd"):
+            if not MP_AVAILABLE:
+                raise DetectorUnavailable("無法初始化人臉偵測器")
+            landmarks, _ = _detect_landmarks_crowd(frame, sensitivity, params.get("max_faces"))
+            return landmarks
+        with (
+            LANDMARKER_POOL.lease(MODE_IMAGE, sensitivity) as landmarker,
+            LANDMARKER_POOL.lease(MODE_SCORE, sensitivity) as scorer,
+        ):
+            if landmarker is None:
+                raise DetectorUnavailable("無法初始化人臉偵測器")
+            landmarks, _ = _detect_landmarks_bgr(
+                frame, landmarker, None, max_side=params.get("max_side"), scorer=scorer
+            )
+            return landmarks
+
+    try:
+        while True:
+            msg = tasks.get()
+            if msg is None:
+                break
+            if msg[0] == "close_stream":
+                entry = streams.pop(msg[1], None)
+                stream_buffers.pop(msg[1], None)
+                if entry is not None:
+                    LANDMARKER_POOL.release(*entry)
+                continue
+
+            _, req_id, slot, shape, dtype, payload, params = msg
+            frame = None
+            try:
+                if slot is not None:
+                    frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=slot * slot_bytes)
+                else:
+                    frame = payload
+                landmarks = detect(frame, params)
+                reply = ("result", req_id, (landmarks.points, landmarks.boxes, landmarks.scores))
+            except DetectorUnavailable as e:
+                reply = ("unavailable", req_id, str(e))
+            except Exception as e:
+                reply = ("error", req_id, f"{type(e).__name__}: {e}")
+            finally:
+                frame = None  # 釋放對共享記憶體的參照後才歸還 slot
+                if slot is not None:
+                    free_slots.put(slot)
+            # 先歸還 slot 再回傳結果：主行程收到結果時即可確定 slot 已不屬於這個請求
+            results.put(reply)
+    finally:
+        for entry in streams.values():
+            LANDMARKER_POOL.release(*entry)
+        LANDMARKER_POOL.clear()  # 在直譯器結束前關閉模型
+        shm.close()
+
+
+class DetectionStream:
+    """
+    影片偵測串流：影格依序送往同一個 worker 的 VIDEO 模式偵測器（保留追蹤狀態）
+
+    範例:
+        with service.open_stream(0.6) as stream:
+            landmarks, boxes = stream.detect(frame, timestamp_ms, max_side)
+    """
+
+    def __init__(self, service: "DetectionService", worker_id: int, sensitivity: float):
+        self._service = service
+        self.worker_id = worker_id
+        self.sensitivity = sensitivity
+        self.stream_id = uuid.uuid4().hex
+
+    def submit(self, frame: np.ndarray, timestamp_ms: int, max_side: Optional[int] = None) -> Future:
+        return self._service.submit(
+            frame,
+            self.sensitivity,
+            max_side=max_side,
+            stream_id=self.stream_id,
+            timestamp_ms=timestamp_ms,
+            worker=self.worker_id,
+        )
+
+    def detect(self, frame: np.ndarray, timestamp_ms: int, max_side: Optional[int] = None):
+        """偵測一幀，回傳 (landmarks, boxes)（與 _detect_landmarks_bgr 相同格式）"""
+        return self._service.wait(self.submit(frame, timestamp_ms, max_side))
+
+    def close(self):
+        self._service._close_stream(self)
+
+
+class DetectionService:
+    """
+    多行程人臉偵測服務
+
+    參數:
+        workers: worker 行程數
+        slots: 共享記憶體 slot 數（同時在途的影格上限，None 時為 worker 數 × 2）
+        slot_bytes: 每個 slot 的大小（bytes）
+        timeout: 等待 slot 或結果的秒數上限
+
+    範例:
+        service = DetectionService(workers=4).start()
+        landmarks, boxes = service.detect(image_bgr, sensitivity=0.6)
+        print(service.stats()["pending"])
+        service.close()
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        slots: Optional[int] = None,
+        slot_bytes: int = DEFAULT_SLOT_BYTES,
+        timeout: float = 120.0,
+    ):
+        self.workers = max(1, int(workers))
+        self.slots = max(1, int(slots or self.workers * 2))
+        self.slot_bytes = int(slot_bytes)
+        self.timeout = timeout
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._shm = None
+        self._procs = []
+        self._tasks = []
+        self._results = None
+        self._free_slots = None
+        self._collector = None
+        self._closed = False
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending: Dict[int, tuple] = {}  # req_id -> (future, worker_id, 送出時間)
+        self._held_slots: Dict[int, tuple] = {}  # req_id -> (worker_id, slot)：worker 尚未歸還的 slot
+        self._inflight = [0] * self.workers
+        self._streams = [0] * self.workers
+        self._ready = set()
+        self._dead = {}
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "oversize": 0,
+            "slot_waits": 0,
+            "latency_s": 0.0,
+        }
+
+    def start(self) -> "DetectionService":
+        """建立共享記憶體並啟動 worker 行程（spawn，模型在 worker 內載入）"""
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        self._results = self._ctx.Queue()
+        self._free_slots = self._ctx.Queue()
+        for slot in range(self.slots):
+            self._free_slots.put(slot)
+        for worker_id in range(self.workers):
+            tasks = self._ctx.Queue()
+            proc = self._ctx.Process(
+                target=_worker_main,
+                args=(worker_id, self._shm.name, self.slot_bytes, tasks, self._results, self._free_slots),
+                name=f"detection-worker-{worker_id}",
+                daemon=True,
+            )
+            proc.start()
+            self._tasks.append(tasks)
+            self._procs.append(proc)
+        self._collector = threading.Thread(target=self._collect_results, name="detection-results", daemon=True)
+        self._collector.start()
+        return self
+
+    def _pick_worker(self) -> int:
+        """選擇在途影格最少的存活 worker"""
+        with self._lock:
+            alive = [w for w in range(self.workers) if w not in self._dead]
+            if not alive:
+                raise DetectionServiceError("偵測服務沒有可用的 worker")
+            return min(alive, key=lambda w: (self._inflight[w], self._streams[w]))
+
+    def submit(
+        self,
+        image_bgr: np.ndarray,
+        sensitivity: float = 0.6,
+        crowd: bool = False,
+        max_side: Optional[int] = None,
+        max_faces: Optional[int] = None,
+        stream_id: Optional[str] = None,
+        timestamp_ms: Optional[int] = None,
+        worker: Optional[int] = None,
+    ) -> Future:
+        """
+        送出一張影像，回傳 Future（結果為 (landmarks, boxes)）
+
+        slot 全部使用中時會等待（最多 timeout 秒），避免送出速度超過偵測速度時佔用過多記憶體
+        """
+        if self._closed or self._shm is None:
+            raise DetectionServiceError("偵測服務未啟動")
+        if worker is None:
+            worker = self._pick_worker()
+        elif worker in self._dead:
+            raise DetectionServiceError(f"偵測 worker {worker} 已結束: {self._dead[worker]}")
+
+        image_bgr = np.ascontiguousarray(image_bgr)
+        slot = None
+        payload = None
+        if image_bgr.nbytes <= self.slot_bytes:
+            try:
+                slot = self._free_slots.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    self._stats["slot_waits"] += 1
+                try:
+                    slot = self._free_slots.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise DetectionServiceError("等待偵測服務逾時（共享記憶體 slot 皆在使用中）")
+            view = np.ndarray(image_bgr.shape, dtype=image_bgr.dtype, buffer=self._shm.buf, offset=slot * self.slot_bytes)
+            view[...] = image_bgr
+            del view
+        else:
+            payload = image_bgr  # 超過 slot 大小的影格改經由佇列傳送
+            with self._lock:
+                self._stats["oversize"] += 1
+
+        future = Future()
+        with self._lock:
+            if worker in self._dead:
+                # 等待 slot 期間 worker 已結束：_mark_dead 不會再看到這個請求，在此歸還 slot
+                if slot is not None:
+                    self._free_slots.put(slot)
+                raise DetectionServiceError(f"偵測 worker {worker} 已結束: {self._dead[worker]}")
+            req_id = next(self._ids)
+            future.req_id = req_id
+            self._pending[req_id] = (future, worker, time.perf_counter())
+            if slot is not None:
+                self._held_slots[req_id] = (worker, slot)
+            self._inflight[worker] += 1
+            self._stats["submitted"] += 1
+        params = {
+            "sensitivity": sensitivity,
+            "crowd": crowd,
+            "max_side": max_side,
+            "max_faces": max_faces,
+            "stream_id": stream_id,
+            "timestamp_ms": timestamp_ms,
+        }
+        self._tasks[worker].put(
+            ("detect", req_id, slot, image_bgr.shape, image_bgr.dtype.str, payload, params)
+        )
+        return future
+
+    def detect(self, image_bgr: np.ndarray, sensitivity: float = 0.6, **kwargs):
+        """同步偵測，回傳 (landmarks, boxes)（與 _detect_landmarks_bgr 相同格式）"""
+        return self.wait(self.submit(image_bgr, sensitivity, **kwargs))
+
+    def wait(self, future: Future):
+        """
+        等待 submit 回傳的 Future（最多 timeout 秒）
+
+        逾時時移除在途的請求（不再計入 worker 的佇列深度），並拋出 DetectionServiceError，
+        讓呼叫端改用本行程偵測；worker 之後送回的結果會被忽略。
+        """
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            if self._finish(future.req_id) is not None:
+                with self._lock:
+                    self._stats["failed"] += 1
+            raise DetectionServiceError(f"等待偵測結果逾時（{self.timeout} 秒）")
+
+    @contextmanager
+    def open_stream(self, sensitivity: float = 0.6):
+        """開啟影片偵測串流（with 區塊結束時釋放 worker 上的 VIDEO 偵測器）"""
+        worker = self._pick_worker()
+        with self._lock:
+            self._streams[worker] += 1
+        stream = DetectionStream(self, worker, sensitivity)
+        try:
+            yield stream
+        finally:
+            stream.close()
+
+    def _close_stream(self, stream: DetectionStream):
+        with self._lock:
+            self._streams[stream.worker_id] = max(0, self._streams[stream.worker_id] - 1)
+        if not self._closed and stream.worker_id not in self._dead:
+            self._tasks[stream.worker_id].put(("close_stream", stream.stream_id))
+
+    def _finish(self, req_id: int):
+        with self._lock:
+            entry = self._pending.pop(req_id, None)
+            if entry is None:
+                return None
+            future, worker, submitted_at = entry
+            self._inflight[worker] = max(0, self._inflight[worker] - 1)
+            self._stats["latency_s"] += time.perf_counter() - submitted_at
+        return future
+
+    def _collect_results(self):
+        """背景執行緒：把 worker 的結果交給對應的 Future，並偵測結束的 worker"""
+        while not self._closed:
+            try:
+                kind, key, data = self._results.get(timeout=0.5)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            except (EOFError, OSError):
+                break
+
+            if kind == "ready":
+                with self._lock:
+                    self._ready.add(key)
+                continue
+            if kind == "dead":
+                self._mark_dead(key, data)
+                continue
+
+            with self._lock:
+                self._held_slots.pop(key, None)  # worker 在送回結果前已歸還 slot
+            future = self._finish(key)
+            if future is None:
+                continue
+            if kind == "result":
+                points, boxes, scores = data
+                landmarks = FaceLandmarks(points, boxes, scores)
+                with self._lock:
+                    self._stats["completed"] += 1
+                future.set_result((landmarks, landmarks.boxes if landmarks else np.array([])))
+            else:
+                with self._lock:
+                    self._stats["failed"] += 1
+                error_cls = DetectorUnavailable if kind == "unavailable" else DetectionServiceError
+                future.set_exception(error_cls(data))
+
+    def _check_workers(self):
+        for worker_id, proc in enumerate(self._procs):
+            if worker_id not in self._dead and not proc.is_alive():
+                self._mark_dead(worker_id, f"exit code {proc.exitcode}")
+
+    def _mark_dead(self, worker_id: int, reason: str):
+        """worker 結束時，讓送往它的請求立即失敗（呼叫端可改用本行程偵測），並收回它沒有歸還的 slot"""
+        with self._lock:
+            self._dead[worker_id] = reason
+            self._ready.discard(worker_id)
+            lost = [req_id for req_id, (_, w, _) in self._pending.items() if w == worker_id]
+            # 包含已逾時、不在 _pending 中的請求：worker 結束後不會再歸還這些 slot
+            held = [req_id for req_id, (w, _) in self._held_slots.items() if w == worker_id]
+            for req_id in held:
+                self._free_slots.put(self._held_slots.pop(req_id)[1])
+        for req_id in lost:
+            future = self._finish(req_id)
+            if future is not None:
+                with self._lock:
+                    self._stats["failed"] += 1
+                future.set_exception(DetectionServiceError(f"偵測 worker {worker_id} 已結束: {reason}"))
+
+    def stats(self) -> dict:
+        """服務狀態：worker 數、佇列深度（在途請求）、slot 使用量、平均延遲等"""
+        with self._lock:
+            data = dict(self._stats)
+            data["workers"] = self.workers
+            data["ready"] = len(self._ready)
+            data["dead"] = dict(self._dead)
+            data["pending"] = len(self._pending)
+            data["queue_depth"] = list(self._inflight)
+            data["streams"] = list(self._streams)
+        data["slots"] = self.slots
+        try:
+            data["slots_free"] = self._free_slots.qsize() if self._free_slots is not None else 0
+        except NotImplementedError:  # macOS 不支援 qsize
+            data["slots_free"] = None
+        finished = data["completed"] + data["failed"]
+        data["avg_latency_ms"] = data.pop("latency_s") * 1000 / finished if finished else 0.0
+        return data
+
+    def close(self, timeout: float = 5.0):
+        """停止 worker 並釋放共享記憶體"""
+        if self._closed:
+            return
+        self._closed = True
+        for tasks in self._tasks:
+            try:
+                tasks.put(None)
+            except Exception:
+                pass
+        for proc in self._procs:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+        with self._lock:
+            pending = list(self._pending.keys())
+        for req_id in pending:
+            future = self._finish(req_id)
+            if future is not None:
+                future.set_exception(DetectionServiceError("偵測服務已關閉"))
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
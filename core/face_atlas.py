@@ -0,0 +1,83 @@
+"""
+人臉截圖拼貼模組：每個媒體的所有人臉截圖拼成一張圖（sprite atlas）
+以前每張臉各存一個 JPEG（<media_id>_face_<n>.jpg），預覽目錄的檔案數隨人臉數成長，
+改名與刪除媒體時也必須 glob 搜尋；現在每個媒體只有一張 <media_id>_faces.jpg，
+各人臉在拼貼圖中的位置記錄在 faces.json，頁面以 CSS background-position 顯示，只需一次請求。
+"""
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# 每張人臉截圖的長邊上限（拼貼圖用於選項頁的縮圖，不需要原始解析度）
+FACE_CELL_MAX_SIDE = 192
+# 拼貼圖的寬度上限（人臉依高度排成多列）
+ATLAS_MAX_WIDTH = 1024
+# 人臉之間的間距（避免 JPEG 壓縮與縮放時相鄰人臉互相滲色）
+ATLAS_PADDING = 2
+
+
+def crop_faces(image_bgr: np.ndarray, faces, max_side: int = FACE_CELL_MAX_SIDE) -> List[Optional[np.ndarray]]:
+    """
+    裁切每張人臉並縮小到長邊不超過 max_side
+
+    回傳:
+        與 faces 同順序的截圖列表；框落在畫面外（面積為 0）時為 None
+    """
+    crops = []
+    h_img, w_img = image_bgr.shape[:2]
+    for (x, y, w, h) in faces:
+        x1, y1 = max(0, int(x)), max(0, int(y))
+        x2, y2 = min(w_img, int(x + w)), min(h_img, int(y + h))
+        if x2 <= x1 or y2 <= y1:
+            crops.append(None)
+            continue
+        crop = image_bgr[y1:y2, x1:x2]
+        scale = max_side / max(crop.shape[:2])
+        if scale < 1:
+            size = (max(1, round(crop.shape[1] * scale)), max(1, round(crop.shape[0] * scale)))
+            crop = cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+        crops.append(crop)
+    return crops
+
+
+def pack_atlas(
+    crops: List[Optional[np.ndarray]],
+    max_width: int = ATLAS_MAX_WIDTH,
+    padding: int = ATLAS_PADDING,
+    background=(255, 255, 255),
+) -> Tuple[Optional[np.ndarray], List[Optional[Tuple[int, int, int, int]]]]:
+    """
+    以「列」為單位排列截圖（shelf packing：依高度由高到低放，放不下就換下一列）
+
+    回傳:
+        (拼貼圖, 每張截圖在拼貼圖中的 (x, y, w, h))；沒有任何截圖時拼貼圖為 None，
+        位置列表與 crops 同順序，截圖為 None 的位置也是 None
+    """
+    rects: List[Optional[Tuple[int, int, int, int]]] = [None] * len(crops)
+    order = sorted(
+        (i for i, crop in enumerate(crops) if crop is not None),
+        key=lambda i: crops[i].shape[0],
+        reverse=True,
+    )
+    if not order:
+        return None, rects
+
+    width = max(max_width, max(crops[i].shape[1] for i in order) + padding)
+    x = y = shelf_h = 0
+    for i in order:
+        h, w = crops[i].shape[:2]
+        if x + w > width:
+            y += shelf_h + padding
+            x = shelf_h = 0
+        rects[i] = (x, y, w, h)
+        x += w + padding
+        shelf_h = max(shelf_h, h)
+
+    used_w = max(rx + rw for rx, _, rw, _ in (r for r in rects if r is not None))
+    atlas = np.empty((y + shelf_h, used_w, 3), dtype=np.uint8)
+    atlas[:] = background
+    for i in order:
+        rx, ry, rw, rh = rects[i]
+        atlas[ry : ry + rh, rx : rx + rw] = crops[i]
+    return atlas, rects
@@ -0,0 +1,202 @@
+"""
+人臉特徵點資料模組：以 NumPy 陣列保存整張影格的偵測結果
+每一幀只從 MediaPipe 結果轉換一次，之後的邊界框、遮眼區域、篩選與平滑都直接使用陣列
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+# MediaPipe FaceLandmarker 每張人臉的特徵點數量（含虹膜）
+NUM_LANDMARKS = 478
+
+
+class FaceLandmarks:
+    """
+    一張影格中所有人臉的特徵點
+
+    屬性:
+        points: (人臉數, 478, 3) float32，x/y 為像素座標，z 以影像寬度為單位
+        boxes: (人臉數, 4) int32，人臉邊界框 (x, y, w, h)
+        scores: (人臉數,) float32，偵測信心度；偵測器未提供時為 NaN
+    """
+
+    __slots__ = ("points", "boxes", "scores")
+
+    def __init__(
+        self,
+        points: np.ndarray,
+        boxes: Optional[np.ndarray] = None,
+        scores: Optional[np.ndarray] = None,
+    ):
+        self.points = np.asarray(points, dtype=np.float32).reshape(-1, NUM_LANDMARKS, 3)
+        n = self.points.shape[0]
+        if boxes is None:
+            boxes = np.zeros((n, 4), dtype=np.int32)
+        self.boxes = np.asarray(boxes, dtype=np.int32).reshape(n, 4)
+        if scores is None:
+            scores = np.full(n, np.nan, dtype=np.float32)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(n)
+
+    @classmethod
+    def empty(cls) -> "FaceLandmarks":
+        """沒有人臉的結果"""
+        return cls(np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float32))
+
+    @classmethod
+    def from_mediapipe(cls, mp_face_landmarks, width: int, height: int) -> "FaceLandmarks":
+        """
+        將 MediaPipe 的 face_landmarks（每張臉 478 個 NormalizedLandmark）轉為像素座標陣列
+
+        參數:
+            mp_face_landmarks: FaceLandmarkerResult.face_landmarks
+            width, height: 偵測時影像的尺寸
+        """
+        faces = [face for face in mp_face_landmarks if len(face) == NUM_LANDMARKS]
+        if not faces:
+            return cls.empty()
+        points = np.array(
+            [[(lm.x, lm.y, lm.z) for lm in face] for face in faces],
+            dtype=np.float32,
+        )
+        points *= np.array([width, height, width], dtype=np.float32)
+        return cls(points)
+
+    def __len__(self) -> int:
+        return self.points.shape[0]
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    @property
+    def has_scores(self) -> bool:
+        """偵測器是否提供了信心度"""
+        return len(self) > 0 and not np.isnan(self.scores).all()
+
+    @classmethod
+    def concatenate(cls, items) -> "FaceLandmarks":
+        """合併多組結果（例如分塊偵測的各個區塊）"""
+        items = [item for item in items if len(item) > 0]
+        if not items:
+            return cls.empty()
+        return cls(
+            np.concatenate([item.points for item in items]),
+            np.concatenate([item.boxes for item in items]),
+            np.concatenate([item.scores for item in items]),
+        )
+
+    def transformed(self, scale: float = 1.0, dx: float = 0.0, dy: float = 0.0) -> "FaceLandmarks":
+        """
+        座標轉換：先縮放再平移（例如把區塊或縮圖座標換回原圖座標）
+        邊界框不會轉換，需由呼叫端以 compute_boxes 重新計算
+        """
+        points = self.points * np.float32(scale)
+        points[:, :, 0] += np.float32(dx)
+        points[:, :, 1] += np.float32(dy)
+        return FaceLandmarks(points, self.boxes, self.scores)
+
+    def with_detection_scores(self, det_boxes: np.ndarray, det_scores: np.ndarray, min_overlap: float = 0.5) -> "FaceLandmarks":
+        """
+        以人臉偵測器的結果補上信心度：每張臉配對一個偵測框（一對一，依 IoU 由高到低貪婪配對）
+
+        偵測框通常比特徵點的外接矩形大一圈（包含額頭與下巴外側），因此以「外接矩形落在偵測框內的比例」
+        判斷是否為同一張臉，IoU 只用來決定配對順序。
+
+        參數:
+            det_boxes: (m, 4) 偵測框 (x1, y1, x2, y2)，與特徵點同一座標
+            det_scores: (m,) 偵測信心度
+            min_overlap: 外接矩形落在偵測框內的比例下限，低於此值不配對，該臉的信心度維持原值（NaN 表示未知）
+        """
+        n = len(self)
+        det_boxes = np.asarray(det_boxes, dtype=np.float32).reshape(-1, 4)
+        det_scores = np.asarray(det_scores, dtype=np.float32).reshape(-1)
+        scores = self.scores.copy()
+        if n == 0 or len(det_boxes) == 0:
+            return FaceLandmarks(self.points, self.boxes, scores)
+        ext = self.extents()
+        x1 = np.maximum(ext[:, None, 0], det_boxes[None, :, 0])
+        y1 = np.maximum(ext[:, None, 1], det_boxes[None, :, 1])
+        x2 = np.minimum(ext[:, None, 2], det_boxes[None, :, 2])
+        y2 = np.minimum(ext[:, None, 3], det_boxes[None, :, 3])
+        inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        area_a = np.maximum((ext[:, 2] - ext[:, 0]) * (ext[:, 3] - ext[:, 1]), 1e-6)
+        area_b = (det_boxes[:, 2] - det_boxes[:, 0]) * (det_boxes[:, 3] - det_boxes[:, 1])
+        iou = inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+        iou[inter / area_a[:, None] < min_overlap] = -1.0
+        face_used = np.zeros(n, dtype=bool)
+        det_used = np.zeros(len(det_boxes), dtype=bool)
+        for flat in np.argsort(-iou, axis=None):
+            i, j = divmod(int(flat), len(det_boxes))
+            if iou[i, j] < 0:
+                break
+            if face_used[i] or det_used[j]:
+                continue
+            scores[i] = det_scores[j]
+            face_used[i] = det_used[j] = True
+        return FaceLandmarks(self.points, self.boxes, scores)
+
+    def filter_scores(self, min_score: float, base_score: float) -> "FaceLandmarks":
+        """
+        只保留信心度不低於 min_score 的人臉
+
+        參數:
+            min_score: 信心度下限
+            base_score: 偵測時使用的靈敏度；信心度未知（NaN，沒有配對到偵測框）的臉只在
+                min_score 不高於 base_score 時保留，更高的門檻一律視為未通過
+        """
+        keep = self.scores >= np.float32(min_score)
+        if np.float32(min_score) <= np.float32(base_score):
+            keep |= np.isnan(self.scores)
+        return self.select(np.flatnonzero(keep))
+
+    def extents(self) -> np.ndarray:
+        """特徵點的外接矩形（不含擴展），形狀 (人臉數, 4) 的 (x1, y1, x2, y2) float32"""
+        if len(self) == 0:
+            return np.zeros((0, 4), dtype=np.float32)
+        xy = self.points[:, :, :2]
+        return np.concatenate([xy.min(axis=1), xy.max(axis=1)], axis=1)
+
+    def select(self, indices: Iterable[int]) -> "FaceLandmarks":
+        """依索引取出部分人臉（保持索引順序）"""
+        idx = np.asarray(list(indices), dtype=np.intp)
+        return FaceLandmarks(self.points[idx], self.boxes[idx], self.scores[idx])
+
+    def pixel_xy(self, idxs) -> np.ndarray:
+        """取出指定特徵點的整數像素座標，形狀 (人臉數, len(idxs), 2)"""
+        return np.trunc(self.points[:, idxs, :2]).astype(np.int32)
+
+    def compute_boxes(
+        self,
+        width: int,
+        height: int,
+        expand_top: float = 0.3,
+        expand_sides: float = 0.15,
+    ) -> np.ndarray:
+        """
+        由特徵點計算人臉邊界框（一次處理所有人臉）
+
+        參數:
+            width, height: 影像尺寸（用於裁切邊界）
+            expand_top: 向上擴展比例（包含額頭）
+            expand_sides: 左右擴展比例
+
+        回傳:
+            (人臉數, 4) int32 的 (x, y, w, h)，寬高為 0 的框也會保留，由呼叫端決定是否丟棄
+        """
+        if len(self) == 0:
+            return np.zeros((0, 4), dtype=np.int32)
+        xy = np.trunc(self.points[:, :, :2]).astype(np.int64)
+        min_x = np.maximum(0, xy[:, :, 0].min(axis=1))
+        max_x = np.minimum(width, xy[:, :, 0].max(axis=1))
+        min_y = np.maximum(0, xy[:, :, 1].min(axis=1))
+        max_y = np.minimum(height, xy[:, :, 1].max(axis=1))
+
+        # 擴大框的範圍（避免只框到臉部特徵，不含頭髮、下巴等）
+        pad_top = ((max_y - min_y) * expand_top).astype(np.int64)
+        pad_sides = ((max_x - min_x) * expand_sides).astype(np.int64)
+        min_x = np.maximum(0, min_x - pad_sides)
+        max_x = np.minimum(width, max_x + pad_sides)
+        min_y = np.maximum(0, min_y - pad_top)
+
+        boxes = np.stack([min_x, min_y, max_x - min_x, max_y - min_y], axis=1)
+        return boxes.astype(np.int32)
@@ -0,0 +1,40 @@
+"""
+影格緩衝區模組：影片逐幀處理時重複使用同一組陣列
+4K 影片每一幀若都重新配置解碼影格、偵測縮圖與 RGB 轉換用的陣列，會有數個整張影格大小的配置；
+這裡依名稱保留緩衝區，只有尺寸改變時才重新配置，穩定狀態下每一幀不再配置整張影格。
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+class FrameBuffers:
+    """
+    依名稱保留的可重複使用陣列（非執行緒安全，每個影片處理流程各用一組）
+
+    範例:
+        buffers = FrameBuffers()
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buffers.get("rgb", frame.shape))
+    """
+
+    def __init__(self):
+        self._buffers: Dict[str, np.ndarray] = {}
+        self.allocations = 0
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """取得指定名稱、形狀與型別的陣列（內容未初始化）；形狀或型別不同時重新配置"""
+        shape = tuple(int(s) for s in shape)
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != np.dtype(dtype):
+            buf = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buf
+            self.allocations += 1
+        return buf
+
+    @property
+    def nbytes(self) -> int:
+        """目前保留的緩衝區總大小（bytes）"""
+        return sum(buf.nbytes for buf in self._buffers.values())
+
+    def clear(self):
+        self._buffers.clear()
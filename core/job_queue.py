@@ -0,0 +1,452 @@
+"""
+處理工作佇列模組：/process 的處理要求存在資料庫（processing_jobs），由 worker 租用後在背景處理
+以前 /process 在 HTTP 請求中同步處理，長影片會佔住網站的 worker 直到反向代理逾時；
+現在請求只排入工作並立即回應，worker（網站行程內的背景執行緒，或以 scripts/run_job_worker.py
+在其他主機執行的獨立行程）從同一個資料庫租用工作。
+
+租用以「SELECT ... FOR UPDATE SKIP LOCKED 選出候選 + 條件式 UPDATE 取得租約」完成：
+MySQL 8 的 SKIP LOCKED 讓多個 worker 各自鎖到不同的工作；SQLite 不支援列鎖，
+只靠條件式 UPDATE（狀態與租用次數仍和剛才讀到的相同才更新）確保同一個工作只會被一個 worker 租到。
+處理中由心跳執行緒定期延長租約並寫入進度；worker 中斷後租約到期，工作會被其他 worker 重新租用
+（影片使用檢查點時從未完成的段落繼續），超過重試上限則標記為失敗。
+"""
+import json
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy import and_, insert, literal, or_, select, update
+
+from core.models import db, Media, ProcessingJob
+from core.progress import ProgressHub, ProgressReporter
+
+# 租約長度（秒）：worker 超過這段時間沒有心跳，工作就會被其他 worker 重新租用
+DEFAULT_LEASE_SECONDS = 60
+# 同一個工作最多租用幾次（worker 中斷時重試），超過後標記為失敗
+DEFAULT_MAX_ATTEMPTS = 3
+# 心跳（延長租約並寫入進度）間隔的上限（秒）；實際間隔不超過租約長度的 1/3
+DEFAULT_HEARTBEAT_SECONDS = 2.0
+# 佇列沒有工作時，worker 查詢的間隔（秒）
+DEFAULT_POLL_SECONDS = 2.0
+# 同一次租用中，候選工作被其他 worker 搶先租走時最多重新選幾次
+_LEASE_RETRIES = 5
+# 心跳時寫入資料庫的進度欄位
+_PROGRESS_COLUMNS = ("stage", "frames_done", "frames_total", "stage_started_at")
+# 進行中（同一個媒體同時只能有一個）的工作狀態
+_ACTIVE_STATES = (ProcessingJob.STATE_QUEUED, ProcessingJob.STATE_RUNNING)
+
+
+class LeaseLost(RuntimeError):
+    """租約已失效（心跳逾時後工作被其他 worker 租走，或工作已結束），目前的處理應中止"""
+
+
+def worker_name() -> str:
+    """這個 worker 的識別名稱（主機名稱:行程:執行緒），記錄在租用中的工作上"""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+
+def enqueue_job(media_id: str, user_id: Optional[int], params: dict) -> Optional[ProcessingJob]:
+    """
+    排入一個處理工作（同一個媒體已有排隊中或處理中的工作時不排入）
+
+    先以 SELECT ... FOR UPDATE 鎖住媒體的資料列，同一個媒體的排入在 MySQL 上依序進行；
+    新增本身是「沒有進行中的工作才新增」的 INSERT ... SELECT，在 SQLite（沒有列鎖）上也不會重複排入。
+
+    參數:
+        media_id: 要處理的媒體
+        user_id: 送出的使用者
+        params: 處理參數（會以 JSON 保存，worker 執行時讀回）
+
+    回傳:
+        新建立的 ProcessingJob（已 commit）；媒體已有進行中的工作（或媒體不存在）時為 None
+    """
+    db.session.query(Media.id).filter(Media.media_id == media_id).with_for_update().first()
+    job_id = uuid.uuid4().hex
+    values = {
+        "job_id": job_id,
+        "media_id": media_id,
+        "user_id": user_id,
+        "params": json.dumps(params, ensure_ascii=False),
+        "state": ProcessingJob.STATE_QUEUED,
+        "attempts": 0,
+        "frames_done": 0,
+        "frames_total": 0,
+        "created_at": datetime.now(),
+    }
+    columns = ProcessingJob.__table__.c
+    active = (
+        select(ProcessingJob.id)
+        .where(ProcessingJob.media_id == media_id, ProcessingJob.state.in_(_ACTIVE_STATES))
+        .exists()
+    )
+    result = db.session.execute(
+        insert(ProcessingJob).from_select(
+            list(values),
+            select(*(literal(value, columns[name].type) for name, value in values.items()))
+            .where(Media.media_id == media_id, ~active),
+        )
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        return None
+    return ProcessingJob.query.filter_by(job_id=job_id).one()
+
+
+def active_job_for_media(media_id: str) -> Optional[ProcessingJob]:
+    """這個媒體排隊中或處理中的工作（沒有時為 None）"""
+    return ProcessingJob.query.filter(
+        ProcessingJob.media_id == media_id,
+        ProcessingJob.state.in_(_ACTIVE_STATES),
+    ).order_by(ProcessingJob.id).first()
+
+
+def delete_jobs_for_media(media_id: str) -> List[str]:
+    """
+    刪除媒體的所有處理工作（刪除媒體時呼叫，與媒體在同一個交易中由呼叫端 commit）
+    處理中的工作被刪除後，worker 下一次心跳失敗就會中止處理
+
+    回傳:
+        被刪除的工作的 job_id（呼叫端據此刪除各工作的檢查點目錄）
+    """
+    job_ids = [
+        job_id for (job_id,) in db.session.query(ProcessingJob.job_id).filter(ProcessingJob.media_id == media_id)
+    ]
+    if job_ids:
+        ProcessingJob.query.filter(ProcessingJob.media_id == media_id).delete(synchronize_session=False)
+    return job_ids
+
+
+def _leasable(now: datetime):
+    """可以租用的工作：排隊中，或處理中但租約已到期"""
+    return or_(
+        ProcessingJob.state == ProcessingJob.STATE_QUEUED,
+        and_(ProcessingJob.state == ProcessingJob.STATE_RUNNING, ProcessingJob.lease_expires_at < now),
+    )
+
+
+def fail_abandoned_jobs(max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> List[str]:
+    """
+    把租約已到期且已達重試上限的工作標記為失敗
+
+    回傳:
+        標記為失敗的工作的 job_id
+    """
+    now = datetime.now()
+    abandoned = and_(
+        ProcessingJob.state == ProcessingJob.STATE_RUNNING,
+        ProcessingJob.lease_expires_at < now,
+        ProcessingJob.attempts >= max_attempts,
+    )
+    rows = (
+        db.session.query(ProcessingJob.id, ProcessingJob.job_id)
+        .filter(abandoned)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not rows:
+        db.session.commit()
+        return []
+    db.session.execute(
+        update(ProcessingJob)
+        .where(ProcessingJob.id.in_([row.id for row in rows]), abandoned)
+        .values(
+            state=ProcessingJob.STATE_FAILED,
+            error="處理中斷次數過多",
+            finished_at=now,
+            lease_owner=None,
+            lease_expires_at=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return [row.job_id for row in rows]
+
+
+def lease_next_job(
+    owner: str,
+    lease_seconds: int = DEFAULT_LEASE_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    on_failed: Optional[Callable[[str], None]] = None,
+) -> Optional[ProcessingJob]:
+    """
+    租用最早排入的可執行工作
+
+    參數:
+        owner: worker 名稱（之後的心跳與完成回報只有同一個 owner 才有效）
+        lease_seconds: 租約長度（秒）
+        max_attempts: 重試上限（租約到期且已租用這麼多次的工作不再租出，改標記為失敗）
+        on_failed: 工作因此被標記為失敗時以 job_id 呼叫（清除工作的暫存檔）
+
+    回傳:
+        租到的 ProcessingJob（state 為 running）；沒有可執行的工作時為 None
+    """
+    for failed_job_id in fail_abandoned_jobs(max_attempts):
+        if on_failed is not None:
+            on_failed(failed_job_id)
+    for _ in range(_LEASE_RETRIES):
+        now = datetime.now()
+        candidate = (
+            db.session.query(ProcessingJob.id, ProcessingJob.attempts)
+            .filter(_leasable(now))
+            .order_by(ProcessingJob.created_at, ProcessingJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if candidate is None:
+            db.session.commit()
+            return None
+        # 租用次數仍和剛才讀到的相同才更新：其他 worker 已先租走時不會有任何資料列被更新
+        result = db.session.execute(
+            update(ProcessingJob)
+            .where(
+                ProcessingJob.id == candidate.id,
+                ProcessingJob.attempts == candidate.attempts,
+                _leasable(now),
+            )
+            .values(
+                state=ProcessingJob.STATE_RUNNING,
+                attempts=candidate.attempts + 1,
+                lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                heartbeat_at=now,
+                started_at=now,
+                stage=None,
+                stage_started_at=None,
+                frames_done=0,
+                frames_total=0,
+                error=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(ProcessingJob, candidate.id, populate_existing=True)
+    return None
+
+
+def heartbeat(job_id: int, owner: str, lease_seconds: int = DEFAULT_LEASE_SECONDS, progress: Optional[dict] = None) -> bool:
+    """
+    延長租約並寫入進度
+
+    參數:
+        job_id: ProcessingJob.id
+        owner: 租用時的 worker 名稱
+        progress: 要寫入的進度欄位（stage、frames_done、frames_total、stage_started_at）
+
+    回傳:
+        租約是否仍屬於這個 worker（False 表示已被其他 worker 租走，應中止處理）
+    """
+    now = datetime.now()
+    result = db.session.execute(
+        update(ProcessingJob)
+        .where(
+            ProcessingJob.id == job_id,
+            ProcessingJob.lease_owner == owner,
+            ProcessingJob.state == ProcessingJob.STATE_RUNNING,
+        )
+        .values(lease_expires_at=now + timedelta(seconds=lease_seconds), heartbeat_at=now, **(progress or {}))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def finish_job(
+    job_id: int,
+    owner: str,
+    error: Optional[str] = None,
+    media_id: Optional[str] = None,
+    progress: Optional[dict] = None,
+) -> bool:
+    """
+    結束工作（error 為 None 表示成功）
+
+    參數:
+        media_id: 處理後的 media_id（處理時可能改名；None 表示不變）
+        progress: 最後的進度欄位（與 heartbeat 相同）
+
+    回傳:
+        是否成功寫入（租約已不屬於這個 worker 時為 False，結果以租走的 worker 為準）
+    """
+    now = datetime.now()
+    values = {
+        **(progress or {}),
+        "state": ProcessingJob.STATE_FAILED if error is not None else ProcessingJob.STATE_SUCCEEDED,
+        "error": error,
+        "finished_at": now,
+        "lease_owner": None,
+        "lease_expires_at": None,
+    }
+    if media_id is not None:
+        values["media_id"] = media_id
+    result = db.session.execute(
+        update(ProcessingJob)
+        .where(
+            ProcessingJob.id == job_id,
+            ProcessingJob.lease_owner == owner,
+            ProcessingJob.state == ProcessingJob.STATE_RUNNING,
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+class _JobProgress(ProgressReporter):
+    """
+    工作的進度回報：節流後發布到 ProgressHub（SSE 串流），心跳執行緒把最近一次發布的進度寫入資料庫；
+    租約失效後下一次發布時拋出 LeaseLost 中止處理
+    """
+
+    def __init__(self, job_id: str, hub: Optional[ProgressHub]):
+        super().__init__(self._publish_progress)
+        self.job_id = job_id
+        self.hub = hub
+        self.lost = threading.Event()
+
+    def _publish_progress(self, progress: dict):
+        if self.lost.is_set():
+            raise LeaseLost("工作已被其他 worker 接手")
+        if self.hub is not None:
+            self.hub.publish(self.job_id, {**progress, "state": ProcessingJob.STATE_RUNNING})
+
+    def columns(self) -> dict:
+        """最近一次發布的進度中，要寫入 processing_jobs 的欄位"""
+        latest = self.latest
+        return {key: latest[key] for key in _PROGRESS_COLUMNS if key in latest}
+
+
+class JobWorker:
+    """
+    從佇列租用工作並執行（一次執行一個工作；多個 worker 可以分佈在不同的主機與行程）
+
+    execute(job, on_progress) 在 app context 中執行工作並回傳處理後的 media_id；
+    on_progress 傳給 MediaProcessor，租約失效時會拋出 LeaseLost 中止處理。
+    工作結束為失敗（執行時拋出例外，或中斷次數超過重試上限）時以 job_id 呼叫 on_failed，
+    清除重試用的暫存檔（例如影片偵測的檢查點）。
+    指定 hub 時，工作開始、節流後的進度與結束狀態都會以 job_id 為 key 發布到 hub。
+
+    範例:
+        worker = JobWorker(app, _execute_process_job)
+        worker.run()  # 持續執行，直到 stop()
+    """
+
+    def __init__(
+        self,
+        app,
+        execute: Callable,
+        name: Optional[str] = None,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        poll_seconds: float = DEFAULT_POLL_SECONDS,
+        heartbeat_seconds: float = DEFAULT_HEARTBEAT_SECONDS,
+        hub: Optional[ProgressHub] = None,
+        on_failed: Optional[Callable[[str], None]] = None,
+    ):
+        """
+        參數:
+            app: Flask app（worker 與心跳執行緒各自建立 app context，使用各自的資料庫連線）
+            execute: 執行工作的函數
+            name: worker 名稱（None 時使用 worker_name()）
+            lease_seconds: 租約長度（秒）
+            max_attempts: 重試上限
+            poll_seconds: 佇列沒有工作時的查詢間隔（秒）
+            heartbeat_seconds: 心跳間隔的上限（秒）
+            hub: 發布進度的 ProgressHub（None 表示不發布，進度只寫入資料庫）
+            on_failed: 工作結束為失敗時的清理函數 on_failed(job_id)
+        """
+        self.app = app
+        self.execute = execute
+        self.name = name
+        self.lease_seconds = max(3, int(lease_seconds))
+        self.max_attempts = max(1, int(max_attempts))
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = min(heartbeat_seconds, self.lease_seconds / 3)
+        self.hub = hub
+        self.on_failed = on_failed
+        self._stop = threading.Event()
+
+    def stop(self):
+        """目前的工作完成後停止 run"""
+        self._stop.set()
+
+    def run(self):
+        """持續租用並執行工作，直到 stop()"""
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once()
+            except Exception as e:  # 資料庫暫時無法連線等：稍後再試，不讓 worker 結束
+                self.app.logger.warning("處理工作佇列錯誤: %s", e)
+                ran = False
+            if not ran:
+                self._stop.wait(self.poll_seconds)
+
+    def run_once(self) -> bool:
+        """
+        租用並執行一個工作
+
+        回傳:
+            是否有執行工作（佇列沒有可執行的工作時為 False）
+        """
+        owner = self.name or worker_name()
+        with self.app.app_context():
+            job = lease_next_job(owner, self.lease_seconds, self.max_attempts, on_failed=self._job_failed)
+            if job is None:
+                return False
+            job_id = job.id
+            tracker = _JobProgress(job.job_id, self.hub)
+            self._publish_state(tracker, ProcessingJob.STATE_RUNNING, media_id=job.media_id)
+            stop_heartbeat = threading.Event()
+            beat = threading.Thread(
+                target=self._heartbeat_loop, args=(job_id, owner, tracker, stop_heartbeat),
+                name=f"job-heartbeat-{job_id}", daemon=True,
+            )
+            beat.start()
+            error, media_id = None, None
+            try:
+                media_id = self.execute(job, tracker)
+            except LeaseLost:
+                db.session.rollback()
+                return True  # 工作已由其他 worker 接手，不寫入結果
+            except Exception as e:
+                db.session.rollback()
+                error = str(e) or type(e).__name__
+            finally:
+                stop_heartbeat.set()
+                beat.join()
+            if finish_job(job_id, owner, error=error, media_id=media_id, progress=tracker.columns()):
+                state = ProcessingJob.STATE_FAILED if error is not None else ProcessingJob.STATE_SUCCEEDED
+                self._publish_state(tracker, state, media_id=media_id, error=error)
+                if error is not None:
+                    self._job_failed(tracker.job_id)
+            return True
+
+    def _job_failed(self, job_id: str):
+        if self.on_failed is None:
+            return
+        try:
+            self.on_failed(job_id)
+        except Exception as e:  # 清理失敗不影響工作結果與 worker
+            self.app.logger.warning("清除失敗工作的暫存檔失敗 %s: %s", job_id, e)
+
+    def _publish_state(self, tracker: _JobProgress, state: str, **extra):
+        if self.hub is not None:
+            self.hub.publish(tracker.job_id, {**tracker.latest, "state": state, **extra})
+
+    def _heartbeat_loop(self, job_id: int, owner: str, tracker: _JobProgress, stop: threading.Event):
+        with self.app.app_context():
+            while not stop.wait(self.heartbeat_seconds):
+                try:
+                    alive = heartbeat(job_id, owner, self.lease_seconds, tracker.columns())
+                except Exception as e:  # 心跳失敗時不中止處理，租約到期前恢復連線即可
+                    db.session.rollback()
+                    self.app.logger.warning("處理工作心跳失敗: %s", e)
+                    continue
+                if not alive:
+                    tracker.lost.set()
+                    return
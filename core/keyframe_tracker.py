@@ -0,0 +1,246 @@
+"""
+關鍵幀偵測模組：影片每隔 N 幀（或遇到場景切換）才執行特徵點偵測，中間的影格以光流追蹤
+展場導覽影片的鏡頭移動緩慢，相鄰影格的人臉位置變化很小，逐幀執行模型大多是重複的計算；
+這裡在縮小的灰階影格上以 Lucas-Kanade 光流追蹤上一幀的特徵點，估計每張臉的相似轉換（平移、旋轉、縮放）
+並套用到全部 478 個特徵點。追蹤失準（有效點太少、前後向誤差過大、縮放變化異常或臉離開畫面）時
+立即改為偵測，不會等到下一個關鍵幀。
+光流只追蹤已知的臉，關鍵幀之間新出現的人臉要等到下一次偵測；因此已知人臉以外的區域有大片變化
+（例如有人走進畫面）時也立即偵測。變化較小的新人臉（例如遠處的人慢慢轉過頭）仍可能最多
+stride - 1 幀沒有套用效果。
+"""
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from core.face_landmarks import NUM_LANDMARKS, FaceLandmarks
+from core.frame_buffers import FrameBuffers
+
+# 追蹤用灰階影格的長邊上限（光流只需要粗略的影像，不需要原始解析度）
+TRACK_MAX_SIDE = 480
+# 每張臉追蹤的特徵點（每隔幾個取一個，478 點全部追蹤沒有必要）
+TRACK_POINT_STEP = 6
+# 有效追蹤點（順向與逆向都找到、前後向誤差小）占比的下限，低於此值視為追蹤失準
+MIN_TRACKED_RATIO = 0.6
+# 前後向誤差上限（追蹤影格上的像素）
+MAX_FB_ERROR = 1.0
+# 相鄰影格間人臉縮放比例的合理範圍
+MAX_SCALE_STEP = 1.15
+# 場景切換判斷：相鄰影格的灰階直方圖相關係數低於此值時視為切換鏡頭
+SCENE_CUT_CORRELATION = 0.6
+_HIST_BINS = 32
+# 畫面變化判斷：扣除鏡頭平移後，已知人臉（邊界框向外擴展 FACE_MARGIN 倍的寬高）以外，相鄰影格的
+# 灰階差超過 MOTION_PIXEL_DIFF 的像素在任一格（畫面分成 MOTION_GRID 格）中占比超過 MOTION_CELL_RATIO 時立即偵測
+MOTION_PIXEL_DIFF = 30
+MOTION_CELL_RATIO = 0.25
+MOTION_GRID = (8, 6)
+FACE_MARGIN = 0.5
+
+_LK_PARAMS = dict(
+    winSize=(15, 15),
+    maxLevel=3,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03),
+)
+_TRACK_IDXS = np.arange(0, NUM_LANDMARKS, TRACK_POINT_STEP)
+
+# 需要執行偵測的原因
+REASON_KEYFRAME = "keyframe"
+REASON_SCENE_CUT = "scene_cut"
+REASON_TRACK_LOST = "track_lost"
+REASON_MOTION = "motion"
+
+# 逐幀來源代碼：追蹤，或偵測（依原因區分）
+SOURCE_TRACK = "T"
+SOURCE_CODES = {REASON_KEYFRAME: "K", REASON_SCENE_CUT: "C", REASON_TRACK_LOST: "L", REASON_MOTION: "M"}
+
+
+def coverage_stats(sources: str, stride: int) -> dict:
+    """
+    由逐幀來源代碼計算偵測覆蓋率統計
+
+    參數:
+        sources: 逐幀來源代碼字串（"T" 為追蹤，"K"/"C"/"L"/"M" 為關鍵幀、場景切換、追蹤失準、畫面變化時的偵測）
+        stride: 關鍵幀間隔
+
+    回傳:
+        {"frames", "detected_frames", "tracked_frames", "coverage"（偵測幀占比）, "stride",
+         "keyframes", "scene_cuts", "track_lost", "motion", "longest_track"（最長連續追蹤幀數）, "frame_sources"}
+    """
+    frames = len(sources)
+    tracked = sources.count(SOURCE_TRACK)
+    runs = sources.replace("K", "D").replace("C", "D").replace("L", "D").replace("M", "D").split("D")
+    return {
+        "frames": frames,
+        "detected_frames": frames - tracked,
+        "tracked_frames": tracked,
+        "coverage": (frames - tracked) / frames if frames else 0.0,
+        "stride": stride,
+        "keyframes": sources.count(SOURCE_CODES[REASON_KEYFRAME]),
+        "scene_cuts": sources.count(SOURCE_CODES[REASON_SCENE_CUT]),
+        "track_lost": sources.count(SOURCE_CODES[REASON_TRACK_LOST]),
+        "motion": sources.count(SOURCE_CODES[REASON_MOTION]),
+        "longest_track": max(len(run) for run in runs),
+        "frame_sources": sources,
+    }
+
+
+class KeyframeTracker:
+    """
+    決定每一幀要偵測還是追蹤，並以光流追蹤上一幀的特徵點（非執行緒安全，每支影片各用一個）
+
+    範例:
+        tracker = KeyframeTracker(stride=5)
+        for frame in frames:
+            landmarks = tracker.track(frame)
+            if landmarks is None:  # 關鍵幀、場景切換、追蹤失準或畫面變化
+                landmarks, boxes = detect(frame, ...)
+                tracker.reset(landmarks)
+    """
+
+    def __init__(self, stride: int, track_max_side: int = TRACK_MAX_SIDE):
+        """
+        參數:
+            stride: 關鍵幀間隔（1 表示每一幀都偵測，不追蹤）
+            track_max_side: 追蹤用灰階影格的長邊上限
+        """
+        self.stride = max(1, int(stride))
+        self.track_max_side = track_max_side
+        self._buffers = FrameBuffers()
+        self._flip = False
+        self._prev_gray = None
+        self._prev_hist = None
+        self._landmarks: Optional[FaceLandmarks] = None
+        self._since_detect = 0
+        self._pending_reason = REASON_KEYFRAME
+        self.sources = []
+
+    def _gray(self, frame: np.ndarray) -> np.ndarray:
+        """縮小並轉成灰階（寫入輪替的兩個緩衝區，上一幀的灰階影格保留到下一幀）"""
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.track_max_side / max(h, w))
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        small = frame
+        if scale < 1:
+            small = cv2.resize(
+                frame, size, dst=self._buffers.get("small", (size[1], size[0], 3)), interpolation=cv2.INTER_AREA
+            )
+        self._flip = not self._flip
+        gray = self._buffers.get("gray_a" if self._flip else "gray_b", (size[1], size[0]))
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=gray)
+
+    def track(self, frame: np.ndarray) -> Optional[FaceLandmarks]:
+        """
+        追蹤這一幀的特徵點
+
+        回傳:
+            追蹤得到的 FaceLandmarks（邊界框已重新計算，原圖座標）；這一幀需要偵測時回傳 None，
+            呼叫端偵測後必須呼叫 reset
+        """
+        if self.stride == 1:
+            self._pending_reason = self._pending_reason or REASON_KEYFRAME
+            return None
+        gray = self._gray(frame)
+        hist = cv2.calcHist([gray], [0], None, [_HIST_BINS], [0, 256])
+        cv2.normalize(hist, hist)
+        prev_gray, prev_hist = self._prev_gray, self._prev_hist
+        self._prev_gray, self._prev_hist = gray, hist
+
+        reason = self._pending_reason
+        if reason is None and self._since_detect >= self.stride:
+            reason = REASON_KEYFRAME
+        if reason is None and cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL) < SCENE_CUT_CORRELATION:
+            reason = REASON_SCENE_CUT
+        if reason is None and self._new_motion(prev_gray, gray, frame.shape[1]):
+            reason = REASON_MOTION
+        tracked = None
+        if reason is None:
+            tracked = self._track_landmarks(prev_gray, gray, frame.shape[1], frame.shape[0])
+            if tracked is None:
+                reason = REASON_TRACK_LOST
+        if reason is not None:
+            self._pending_reason = reason
+            return None
+
+        self._landmarks = tracked
+        self._since_detect += 1
+        self.sources.append(SOURCE_TRACK)
+        return tracked
+
+    def reset(self, landmarks: FaceLandmarks):
+        """以這一幀的偵測結果作為之後追蹤的起點"""
+        self.sources.append(SOURCE_CODES[self._pending_reason or REASON_KEYFRAME])
+        self._pending_reason = None
+        self._landmarks = landmarks
+        self._since_detect = 1
+
+    def _new_motion(self, prev_gray, gray, width: int) -> bool:
+        """已知人臉以外的區域是否有大片變化（可能有新的人臉進入畫面）"""
+        # 導覽影片的鏡頭通常在平移：以相位相關估計整體位移，把上一幀對齊後再比較
+        shape = gray.shape
+        prev_f = self._buffers.get("prev_f", shape, np.float32)
+        gray_f = self._buffers.get("gray_f", shape, np.float32)
+        np.copyto(prev_f, prev_gray)
+        np.copyto(gray_f, gray)
+        (dx, dy), _ = cv2.phaseCorrelate(prev_f, gray_f)
+        aligned = cv2.warpAffine(
+            prev_gray, np.float32([[1, 0, dx], [0, 1, dy]]), (shape[1], shape[0]),
+            dst=self._buffers.get("aligned", shape), borderMode=cv2.BORDER_REPLICATE,
+        )
+        diff = cv2.absdiff(aligned, gray, dst=self._buffers.get("diff", shape))
+        cv2.threshold(diff, MOTION_PIXEL_DIFF, 255, cv2.THRESH_BINARY, dst=diff)
+        if self._landmarks:
+            scale = gray.shape[1] / width
+            for x, y, w, h in self._landmarks.boxes:
+                x0 = max(0, int((x - w * FACE_MARGIN) * scale))
+                y0 = max(0, int((y - h * FACE_MARGIN) * scale))
+                x1 = int((x + w * (1 + FACE_MARGIN)) * scale) + 1
+                y1 = int((y + h * (1 + FACE_MARGIN)) * scale) + 1
+                diff[y0:y1, x0:x1] = 0
+        cells = cv2.resize(diff, MOTION_GRID, interpolation=cv2.INTER_AREA)
+        return bool((cells > 255 * MOTION_CELL_RATIO).any())
+
+    def _track_landmarks(self, prev_gray, gray, width: int, height: int) -> Optional[FaceLandmarks]:
+        """以光流追蹤上一幀的每張臉；任何一張臉追蹤失準時回傳 None"""
+        landmarks = self._landmarks
+        if not landmarks:
+            return FaceLandmarks.empty()
+
+        scale = gray.shape[1] / width
+        n = len(landmarks)
+        prev_pts = (landmarks.points[:, _TRACK_IDXS, :2] * np.float32(scale)).reshape(-1, 1, 2)
+        next_pts, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, prev_pts, None, **_LK_PARAMS)
+        back_pts, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, next_pts, None, **_LK_PARAMS)
+        fb_error = np.linalg.norm((back_pts - prev_pts).reshape(-1, 2), axis=1)
+        good = (status.reshape(-1) == 1) & (back_status.reshape(-1) == 1) & (fb_error < MAX_FB_ERROR)
+        good = good.reshape(n, -1)
+        prev_pts = prev_pts.reshape(n, -1, 2)
+        next_pts = next_pts.reshape(n, -1, 2)
+
+        points = landmarks.points.copy()
+        for i in range(n):
+            if good[i].mean() < MIN_TRACKED_RATIO:
+                return None
+            matrix, inliers = cv2.estimateAffinePartial2D(
+                prev_pts[i, good[i]], next_pts[i, good[i]], method=cv2.RANSAC, ransacReprojThreshold=MAX_FB_ERROR * 2
+            )
+            if matrix is None or inliers.mean() < MIN_TRACKED_RATIO:
+                return None
+            face_scale = float(np.hypot(matrix[0, 0], matrix[1, 0]))
+            if not 1 / MAX_SCALE_STEP <= face_scale <= MAX_SCALE_STEP:
+                return None
+            # 追蹤影格的相似轉換換回原圖座標：旋轉縮放部分不變，平移量除以縮小比例
+            matrix[:, 2] /= scale
+            xy = points[i, :, :2] @ matrix[:, :2].T.astype(np.float32) + matrix[:, 2].astype(np.float32)
+            points[i, :, :2] = xy
+            points[i, :, 2] *= np.float32(face_scale)
+
+        tracked = FaceLandmarks(points, landmarks.boxes, landmarks.scores)
+        boxes = tracked.compute_boxes(width, height)
+        if ((boxes[:, 2] <= 0) | (boxes[:, 3] <= 0)).any():
+            return None  # 有臉離開畫面：重新偵測，讓人臉數量與偵測結果一致
+        tracked.boxes = boxes
+        return tracked
+
+    def stats(self, first: int = 0) -> dict:
+        """偵測覆蓋率統計（見 coverage_stats）；first 之前的影格（例如分段處理的暖機影格）不計入"""
+        return coverage_stats("".join(self.sources[first:]), self.stride)
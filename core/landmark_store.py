@@ -0,0 +1,247 @@
+"""
+人臉特徵點儲存模組：每個媒體一個二進位檔（metadata/<media_id>_landmarks.lmk）
+保存完整的偵測結果（影片為逐幀軌跡），之後換處理模式或換人臉選擇重新處理時，
+直接讀檔渲染，不必再執行人臉偵測。
+
+檔案格式（little-endian，各陣列以 64 bytes 對齊，可直接 memory-map）：
+    8 bytes   魔術字串 MAGIC
+    4 bytes   uint32，JSON 標頭長度
+    JSON 標頭 {"meta": {...}, "arrays": {名稱: [dtype, shape, offset]}}
+    陣列資料：
+        face_offsets (幀數+1,) int64   每幀人臉在 points 等陣列中的起訖位置
+        box_offsets  (幀數+1,) int64   每幀處理框在 track_boxes 中的起訖位置
+        origins      (人臉數, 2) float32  每張臉特徵點的中心（像素座標）
+        boxes        (人臉數, 4) int32    偵測時的人臉邊界框
+        scores       (人臉數,) float16    偵測信心度（NaN 表示沒有）
+        track_boxes  (框數, 4) int32      實際套用效果的框（影片為平滑後的結果）
+        points       (人臉數, 478, 3) float16  相對於 origins 的特徵點座標
+
+特徵點以「相對於臉部中心」的 float16 儲存：數值範圍只有臉的一半大小，
+即使 4K 影片也能保持次像素精度，檔案大小約為 float32 的一半。
+"""
+import json
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from core.face_landmarks import FaceLandmarks, NUM_LANDMARKS
+from core.landmarker_pool import quantize_sensitivity
+
+
+MAGIC = b"FLMK\x00\x01\r\n"
+LANDMARK_STORE_VERSION = 1
+_ALIGN = 64
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _encode(landmarks: FaceLandmarks) -> Tuple[np.ndarray, np.ndarray]:
+    """特徵點轉為（中心, 相對座標 float16）"""
+    if len(landmarks) == 0:
+        return (
+            np.zeros((0, 2), dtype=np.float32),
+            np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float16),
+        )
+    ext = landmarks.extents()
+    origins = ((ext[:, :2] + ext[:, 2:]) / 2).astype(np.float32)
+    rel = landmarks.points.copy()
+    rel[:, :, :2] -= origins[:, None, :]
+    return origins, rel.astype(np.float16)
+
+
+class LandmarkTrackWriter:
+    """
+    逐幀寫入特徵點軌跡
+
+    points（資料量最大的部分）邊處理邊寫入暫存檔，長影片也不會佔用大量記憶體；
+    save() 時再組合成正式檔案並以改名方式取代舊檔。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._points_tmp = self.path.with_name(f"{self.path.name}.{threading.get_ident()}.points.tmp")
+        self._points_file = open(self._points_tmp, "wb")
+        self._face_counts: List[int] = []
+        self._box_counts: List[int] = []
+        self._origins: List[np.ndarray] = []
+        self._boxes: List[np.ndarray] = []
+        self._scores: List[np.ndarray] = []
+        self._track_boxes: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._face_counts)
+
+    def append(self, landmarks: FaceLandmarks, track_boxes=None):
+        """
+        加入一幀
+
+        參數:
+            landmarks: 這一幀偵測到的人臉特徵點
+            track_boxes: 實際套用效果的框（None 時使用 landmarks.boxes）
+        """
+        if track_boxes is None:
+            track_boxes = landmarks.boxes
+        track_boxes = np.asarray(track_boxes, dtype=np.int32).reshape(-1, 4)
+        origins, rel = _encode(landmarks)
+        self._points_file.write(rel.tobytes())
+        self._face_counts.append(len(landmarks))
+        self._box_counts.append(len(track_boxes))
+        self._origins.append(origins)
+        self._boxes.append(landmarks.boxes)
+        self._scores.append(landmarks.scores.astype(np.float16))
+        self._track_boxes.append(track_boxes)
+
+    def save(self, **meta) -> Path:
+        """寫出正式檔案（meta 會存入標頭，例如內容雜湊、靈敏度、偵測參數）"""
+        self._points_file.close()
+        num_faces = int(sum(self._face_counts))
+        arrays = {
+            "face_offsets": np.concatenate([[0], np.cumsum(self._face_counts, dtype=np.int64)]).astype(np.int64),
+            "box_offsets": np.concatenate([[0], np.cumsum(self._box_counts, dtype=np.int64)]).astype(np.int64),
+            "origins": np.concatenate(self._origins) if self._origins else np.zeros((0, 2), np.float32),
+            "boxes": np.concatenate(self._boxes) if self._boxes else np.zeros((0, 4), np.int32),
+            "scores": np.concatenate(self._scores) if self._scores else np.zeros(0, np.float16),
+            "track_boxes": np.concatenate(self._track_boxes) if self._track_boxes else np.zeros((0, 4), np.int32),
+        }
+        points_spec = ("<f2", (num_faces, NUM_LANDMARKS, 3))
+
+        # 先以暫定的標頭長度算出各陣列位置，標頭長度變動時重算直到穩定
+        meta = dict(meta, version=LANDMARK_STORE_VERSION, frames=len(self._face_counts))
+        if "sensitivity" in meta:
+            meta["sensitivity"] = round(quantize_sensitivity(meta["sensitivity"]), 2)
+        header_len = 0
+        while True:
+            offset = _aligned(len(MAGIC) + 4 + header_len)
+            layout = {}
+            for name, arr in arrays.items():
+                layout[name] = [arr.dtype.newbyteorder("<").str, list(arr.shape), offset]
+                offset = _aligned(offset + arr.nbytes)
+            layout["points"] = [points_spec[0], list(points_spec[1]), offset]
+            header = json.dumps({"meta": meta, "arrays": layout}).encode("utf-8")
+            if len(header) == header_len:
+                break
+            header_len = len(header)
+
+        tmp_path = self.path.with_name(f"{self.path.name}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(MAGIC)
+                f.write(struct.pack("<I", len(header)))
+                f.write(header)
+                for name, arr in arrays.items():
+                    f.seek(layout[name][2])
+                    f.write(np.ascontiguousarray(arr, dtype=layout[name][0]).tobytes())
+                f.seek(layout["points"][2])
+                with open(self._points_tmp, "rb") as src:
+                    while True:
+                        chunk = src.read(1 << 20)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+            os.replace(tmp_path, self.path)
+        finally:
+            self._points_tmp.unlink(missing_ok=True)
+            tmp_path.unlink(missing_ok=True)
+        return self.path
+
+    def discard(self):
+        """放棄寫入（處理失敗時呼叫）"""
+        self._points_file.close()
+        self._points_tmp.unlink(missing_ok=True)
+
+
+def save_landmarks(path: Path, landmarks: FaceLandmarks, track_boxes=None, **meta) -> Path:
+    """儲存單張照片的偵測結果（一幀的軌跡）"""
+    writer = LandmarkTrackWriter(path)
+    try:
+        writer.append(landmarks, track_boxes)
+    except Exception:
+        writer.discard()
+        raise
+    return writer.save(**meta)
+
+
+class LandmarkStore:
+    """
+    讀取特徵點檔（memory-map，只有實際用到的幀才會從磁碟載入）
+
+    範例:
+        store = LandmarkStore.open(path)
+        if store and store.matches(content_hash, 0.6, variant):
+            landmarks, boxes = store.frame(0)
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是特徵點檔: {path}")
+            (header_len,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+        self.meta = header["meta"]
+        if self.meta.get("version") != LANDMARK_STORE_VERSION:
+            raise ValueError(f"不支援的特徵點檔版本: {self.meta.get('version')}")
+
+        self._arrays = {}
+        for name, (dtype, shape, offset) in header["arrays"].items():
+            if int(np.prod(shape)) == 0:
+                self._arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                self._arrays[name] = np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=tuple(shape))
+        # 索引陣列很小，直接載入記憶體
+        self._face_offsets = np.array(self._arrays["face_offsets"])
+        self._box_offsets = np.array(self._arrays["box_offsets"])
+
+    @classmethod
+    def open(cls, path: Optional[Path]) -> Optional["LandmarkStore"]:
+        """開啟特徵點檔，不存在或格式不符時回傳 None"""
+        if path is None or not Path(path).exists():
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError, KeyError, struct.error):
+            return None
+
+    @property
+    def num_frames(self) -> int:
+        return len(self._face_offsets) - 1
+
+    @property
+    def num_faces(self) -> int:
+        return int(self._face_offsets[-1])
+
+    def matches(self, content_hash: str, sensitivity: float, variant: str) -> bool:
+        """檔案是否對應同一份媒體內容與偵測參數"""
+        return (
+            self.meta.get("content_hash") == content_hash
+            and self.meta.get("sensitivity") == round(quantize_sensitivity(sensitivity), 2)
+            and self.meta.get("variant") == variant
+        )
+
+    def frame(self, index: int) -> Tuple[FaceLandmarks, np.ndarray]:
+        """
+        取得某一幀的資料
+
+        回傳:
+            (landmarks, track_boxes)：特徵點（float32 像素座標）與實際套用效果的框；
+            超出範圍的幀回傳空結果
+        """
+        if not 0 <= index < self.num_frames:
+            return FaceLandmarks.empty(), np.zeros((0, 4), dtype=np.int32)
+        a, b = int(self._face_offsets[index]), int(self._face_offsets[index + 1])
+        points = np.asarray(self._arrays["points"][a:b], dtype=np.float32)
+        points[:, :, :2] += np.asarray(self._arrays["origins"][a:b])[:, None, :]
+        landmarks = FaceLandmarks(points, np.array(self._arrays["boxes"][a:b]), self._arrays["scores"][a:b])
+        c, d = int(self._box_offsets[index]), int(self._box_offsets[index + 1])
+        return landmarks, np.array(self._arrays["track_boxes"][c:d], dtype=np.int32)
+
+    def close(self):
+        """釋放 memory-map"""
+        self._arrays.clear()
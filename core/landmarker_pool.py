@@ -0,0 +1,202 @@
+"""
+人臉偵測器池模組：重複使用 MediaPipe FaceLandmarker 實例
+依「模式（image / score）+ 量化後的靈敏度」分組，借出／歸還，避免每次請求都重新載入模型
+影片模式的偵測器會保留上一幀的人臉區域作為追蹤狀態，重複使用時下一支影片（或下一段）的開頭
+會受到之前處理內容的影響，因此每次借出都建立新的實例，歸還時直接關閉，不放回池中。
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+
+# 支援的執行模式
+MODE_IMAGE = "image"
+MODE_VIDEO = "video"
+# 只做人臉偵測（FaceDetector，不含特徵點），提供每張臉的信心度
+MODE_SCORE = "score"
+
+# 靈敏度量化間隔（0.6 與 0.61 共用同一組偵測器）
+SENSITIVITY_STEP = 0.05
+
+
+def quantize_sensitivity(sensitivity: float) -> float:
+    """將靈敏度限制在 0.3-0.9，並對齊到 SENSITIVITY_STEP 的倍數"""
+    try:
+        value = float(sensitivity)
+    except (TypeError, ValueError):
+        value = 0.6
+    value = max(0.3, min(0.9, value))
+    return round(round(value / SENSITIVITY_STEP) * SENSITIVITY_STEP, 2)
+
+
+class _VideoLandmarkerHandle:
+    """
+    影片模式偵測器的包裝
+    MediaPipe 要求同一個 VIDEO 偵測器的時間戳必須嚴格遞增；同一幀以較高解析度重新偵測時
+    會使用相同的時間戳，這裡把不遞增的時間戳順延 1 毫秒。
+    """
+
+    def __init__(self, landmarker):
+        self.landmarker = landmarker
+        self._last_ms = -1
+
+    def detect_for_video(self, mp_image, timestamp_ms: int):
+        ts = max(int(timestamp_ms), self._last_ms + 1)
+        self._last_ms = ts
+        return self.landmarker.detect_for_video(mp_image, ts)
+
+    def close(self):
+        self.landmarker.close()
+
+
+class LandmarkerPool:
+    """
+    執行緒安全的 FaceLandmarker 池
+
+    - 以 (mode, 量化靈敏度) 為 key，閒置實例總數上限為 max_idle，超過時淘汰最久未使用的 key
+    - 影片模式（MODE_VIDEO）的偵測器每次都新建、歸還時關閉，讓每個串流都從相同的初始狀態開始
+    - 借出中的實例不會被其他執行緒取得（MediaPipe 偵測器本身不是執行緒安全的）
+    - 提供命中／未命中／建立時間等統計，供監控使用
+    """
+
+    def __init__(
+        self,
+        factories: Dict[str, Callable[[float], object]],
+        max_idle: int = 8,
+    ):
+        """
+        參數:
+            factories: {mode: 建立函數}，建立函數接收靈敏度並回傳偵測器（失敗時回傳 None）
+            max_idle: 池中保留的閒置實例上限
+        """
+        self._factories = dict(factories)
+        self._max_idle = max(1, int(max_idle))
+        self._idle: "OrderedDict[Tuple[str, float], list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "creations": 0,
+            "creation_failures": 0,
+            "creation_time_s": 0.0,
+            "evictions": 0,
+            "in_use": 0,
+        }
+
+    def _idle_count(self) -> int:
+        return sum(len(items) for items in self._idle.values())
+
+    def _create(self, mode: str, sensitivity: float):
+        factory = self._factories.get(mode)
+        if factory is None:
+            raise ValueError(f"不支援的偵測器模式: {mode}")
+        start = time.perf_counter()
+        landmarker = factory(sensitivity)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if landmarker is None:
+                self._stats["creation_failures"] += 1
+                return None
+            self._stats["creations"] += 1
+            self._stats["creation_time_s"] += elapsed
+        if mode == MODE_VIDEO:
+            landmarker = _VideoLandmarkerHandle(landmarker)
+        return landmarker
+
+    def acquire(self, mode: str, sensitivity: float):
+        """
+        借出一個偵測器（池中沒有時會建立新的；影片模式一律建立新的）
+
+        回傳:
+            (key, landmarker)；landmarker 為 None 表示建立失敗
+        """
+        key = (mode, quantize_sensitivity(sensitivity))
+        with self._lock:
+            items = self._idle.get(key) if mode != MODE_VIDEO else None
+            if items:
+                landmarker = items.pop()
+                if not items:
+                    del self._idle[key]
+                self._stats["hits"] += 1
+                self._stats["in_use"] += 1
+                return key, landmarker
+            self._stats["misses"] += 1
+
+        # 在鎖外建立模型，避免阻塞其他執行緒
+        landmarker = self._create(mode, key[1])
+        if landmarker is not None:
+            with self._lock:
+                self._stats["in_use"] += 1
+        return key, landmarker
+
+    def release(self, key: Tuple[str, float], landmarker):
+        """歸還偵測器；影片模式的偵測器直接關閉，其他超過閒置上限時關閉最久未使用的實例"""
+        if landmarker is None:
+            return
+        evicted = []
+        with self._lock:
+            self._stats["in_use"] = max(0, self._stats["in_use"] - 1)
+            if key[0] == MODE_VIDEO:
+                evicted.append(landmarker)  # 追蹤狀態不能帶到下一個串流
+            else:
+                self._idle.setdefault(key, []).append(landmarker)
+                self._idle.move_to_end(key)
+            while self._idle_count() > self._max_idle:
+                old_key = next(iter(self._idle))
+                items = self._idle[old_key]
+                evicted.append(items.pop(0))
+                if not items:
+                    del self._idle[old_key]
+                self._stats["evictions"] += 1
+        for item in evicted:
+            try:
+                item.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def lease(self, mode: str, sensitivity: float):
+        """
+        以 with 區塊借用偵測器，離開時自動歸還
+
+        範例:
+            with LANDMARKER_POOL.lease("image", 0.6) as landmarker:
+                face_landmarks, faces = _detect_landmarks_bgr(image, landmarker, None)
+        """
+        key, landmarker = self.acquire(mode, sensitivity)
+        try:
+            yield landmarker
+        finally:
+            self.release(key, landmarker)
+
+    def warm(self, mode: str, sensitivity: float) -> bool:
+        """預先建立一個偵測器放入池中（啟動時使用），回傳是否成功"""
+        key, landmarker = self.acquire(mode, sensitivity)
+        self.release(key, landmarker)
+        return landmarker is not None
+
+    def stats(self) -> dict:
+        """取得統計資料（命中率、建立次數、平均建立時間等）"""
+        with self._lock:
+            data = dict(self._stats)
+            data["idle"] = self._idle_count()
+            data["keys"] = [f"{mode}@{sens:.2f}" for mode, sens in self._idle.keys()]
+        lookups = data["hits"] + data["misses"]
+        data["hit_rate"] = data["hits"] / lookups if lookups else 0.0
+        data["avg_creation_time_s"] = (
+            data["creation_time_s"] / data["creations"] if data["creations"] else 0.0
+        )
+        return data
+
+    def clear(self):
+        """關閉並清空所有閒置實例（例如更換模型檔後）"""
+        with self._lock:
+            items = [lm for group in self._idle.values() for lm in group]
+            self._idle.clear()
+        for item in items:
+            try:
+                item.close()
+            except Exception:
+                pass
@@ -0,0 +1,77 @@
+"""
+即時效果預覽模組：在低解析度的代理影像上套用效果，結果以 LRU 快取
+選項頁每次切換模式或勾選人臉都要看到效果，若等 /process 在原始解析度處理並存檔，每次要數秒；
+這裡每個媒體只建立一次代理影像（縮小的原圖與縮放後的偵測結果），之後每種「模式 + 人臉選擇」
+只在代理影像上渲染一次並快取 JPEG，重複的選擇直接回傳。
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+# 代理影像（縮圖 + 偵測結果）保留的媒體數量上限
+DEFAULT_MAX_PROXIES = 16
+# 渲染結果（JPEG bytes）保留的數量上限
+DEFAULT_MAX_RENDERS = 128
+
+
+class LivePreviewCache:
+    """
+    代理影像與渲染結果的 LRU 快取（執行緒安全）
+
+    範例:
+        cache = LivePreviewCache()
+        proxy = cache.proxy((media_id, token), lambda: build_proxy(...))
+        jpeg, hit = cache.render((media_id, token, mode, selection), lambda: encode(...))
+    """
+
+    def __init__(self, max_proxies: int = DEFAULT_MAX_PROXIES, max_renders: int = DEFAULT_MAX_RENDERS):
+        self._max_proxies = max(1, int(max_proxies))
+        self._max_renders = max(1, int(max_renders))
+        self._proxies: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._renders: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"proxy_hits": 0, "proxy_misses": 0, "render_hits": 0, "render_misses": 0}
+
+    def _get_or_build(self, store: OrderedDict, limit: int, key: Hashable, build: Callable, stat: str):
+        with self._lock:
+            if key in store:
+                store.move_to_end(key)
+                self._stats[f"{stat}_hits"] += 1
+                return store[key], True
+            self._stats[f"{stat}_misses"] += 1
+        # 建立時不持有鎖（同一個 key 同時未命中時可能重複建立，結果相同，不影響正確性）
+        value = build()
+        with self._lock:
+            store[key] = value
+            store.move_to_end(key)
+            while len(store) > limit:
+                store.popitem(last=False)
+        return value, False
+
+    def proxy(self, key: Hashable, build: Callable[[], object]):
+        """取得代理影像（未命中時呼叫 build 建立），回傳 build 的回傳值"""
+        value, _ = self._get_or_build(self._proxies, self._max_proxies, key, build, "proxy")
+        return value
+
+    def render(self, key: Hashable, build: Callable[[], bytes]):
+        """
+        取得渲染結果（未命中時呼叫 build 渲染並編碼）
+
+        回傳:
+            (JPEG bytes, 是否命中快取)
+        """
+        return self._get_or_build(self._renders, self._max_renders, key, build, "render")
+
+    def clear(self):
+        with self._lock:
+            self._proxies.clear()
+            self._renders.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "proxies": len(self._proxies),
+                "renders": len(self._renders),
+                "render_bytes": sum(len(data) for data in self._renders.values()),
+            }
@@ -2,11 +2,71 @@
 媒體處理模組：照片和影片的人臉隱私處理
 提供統一的處理介面，可被其他模組調用
 """
+import itertools
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, List
+from typing import Callable, Dict, Iterable, Iterator, Optional, List
 import cv2
 import numpy as np
 
+from core.detection_cache import file_sha256
+from core.detection_service import DetectionServiceError
+from core.face_landmarks import FaceLandmarks
+from core.keyframe_tracker import KeyframeTracker, coverage_stats
+from core.landmark_store import LandmarkStore, LandmarkTrackWriter, save_landmarks
+from core.overlay import PreparedOverlay
+from core.video_pipeline import VideoPipeline
+
+# 支援的處理模式：馬賽克 / 模糊 / 遮眼 / 替換
+PROCESS_MODES = ("mosaic", "blur", "eyes", "replace")
+
+# 逐臉處理計畫中表示「這張臉不處理」的模式
+FACE_MODE_NONE = "none"
+
+# 逐臉混合模式的套用順序：先處理整張臉的效果，遮眼白條最後畫，不會被其他效果蓋掉
+_MIXED_MODE_ORDER = ("mosaic", "blur", "replace", "eyes")
+
+# 進度回報的階段：分段偵測、偵測並套用效果（依序處理）、以已有的特徵點軌跡套用效果
+STAGE_DETECT = "detect"
+STAGE_PROCESS = "process"
+STAGE_RENDER = "render"
+
+# 每個處理器保留的前處理覆蓋圖數量上限
+_MAX_CACHED_OVERLAYS = 4
+
+
+def normalize_face_modes(face_modes) -> Optional[Dict[int, str]]:
+    """
+    檢查並整理逐臉處理計畫（人臉 ID -> 處理模式）
+    
+    參數:
+        face_modes: dict（鍵可為整數或數字字串，例如來自 JSON），None 表示不使用逐臉計畫
+    
+    回傳:
+        {人臉 ID: 模式}；模式為 PROCESS_MODES 之一或 "none"
+    """
+    if face_modes is None:
+        return None
+    plan = {}
+    for face_id, face_mode in dict(face_modes).items():
+        try:
+            face_id = int(face_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"無效的人臉 ID: {face_id}")
+        if face_mode not in PROCESS_MODES and face_mode != FACE_MODE_NONE:
+            raise ValueError(f"不支援的處理模式: {face_mode}")
+        plan[face_id] = face_mode
+    return plan
+
+
+def _needs_overlay(mode: str, face_modes: Optional[Dict[int, str]]) -> bool:
+    """預設模式或逐臉計畫中有替換模式時需要覆蓋圖"""
+    return mode == "replace" or bool(face_modes and "replace" in face_modes.values())
+
 
 class MediaProcessor:
     """
@@ -14,17 +74,50 @@ class MediaProcessor:
     提供照片和影片的統一處理介面
     """
     
-    def __init__(self, sensitivity: float = 0.6):
+    def __init__(
+        self,
+        sensitivity: float = 0.6,
+        crowd_mode: bool = False,
+        max_faces: Optional[int] = None,
+        detection_max_side: Optional[int] = None,
+        detect_stride: Optional[int] = None,
+        segment_workers: Optional[int] = None,
+        checkpoint_frames: Optional[int] = None,
+        checkpoint_dir: Optional[Path] = None,
+        on_progress: Optional[Callable[[str, int, int], None]] = None,
+    ):
         """
         初始化處理器
         
         參數:
             sensitivity: 人臉偵測靈敏度 (0.3-0.9)
+            crowd_mode: 人群模式（照片分塊偵測，適合高解析度的人群照片）
+            max_faces: 人群模式最多保留的人臉數量（None 時使用系統預設值）
+            detection_max_side: 偵測用縮圖的長邊上限（None 時使用系統預設值，0 表示用原圖偵測）；
+                效果一律套用在原始解析度上
+            detect_stride: 影片的關鍵幀間隔（None 時使用系統預設值）：每 N 幀（或場景切換、追蹤失準時）
+                才執行偵測，中間的影格以光流追蹤；1 表示每一幀都偵測
+            segment_workers: 長影片分段平行偵測的 worker 行程數（None 時使用系統預設值，1 表示不分段）
+            checkpoint_frames: 影片偵測的檢查點間隔（幀數，None 時使用系統預設值，0 表示不使用檢查點）
+            checkpoint_dir: 檢查點的保存目錄（None 時為 <輸出檔名>.parts）；輸出路徑每次執行可能不同時
+                （例如依日期分資料夾）應指定固定的目錄，重新執行時才找得到上次的檢查點
+            on_progress: 進度回報函數 on_progress(階段, 已完成幀數, 總幀數)（總幀數 0 表示未知）；
+                影片每完成一幀（分段偵測時每完成一段）呼叫一次，照片完成時呼叫一次。
+                在處理的執行緒中同步呼叫，應只記錄數值；拋出的例外會中止處理
         """
         self.sensitivity = max(0.3, min(0.9, sensitivity))
-        self.image_landmarker = None
-        self.video_landmarker = None
+        self.crowd_mode = crowd_mode
+        self.max_faces = max_faces
+        self.detection_max_side = detection_max_side
+        self.detect_stride = detect_stride
+        self.segment_workers = segment_workers
+        self.checkpoint_frames = checkpoint_frames
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir is not None else None
+        self.on_progress = on_progress
         self._app_funcs = None
+        self._overlays = {}
+        self.last_batch_report = None
+        self.last_video_report = None
     
     def _get_app_funcs(self):
         """取得 app.py 中的函數（延遲載入，避免循環導入）"""
@@ -32,53 +125,238 @@ class MediaProcessor:
             # 延遲導入，避免循環導入問題
             from app import (
                 _detect_landmarks_bgr,
+                _detect_image_cached,
+                _detection_variant,
                 _filter_landmarks_by_indices,
                 _filter_faces_by_indices,
                 apply_mosaic,
+                apply_blur,
                 apply_eye_cover,
                 apply_face_replace,
                 _load_overlay_rgba,
                 _smooth_faces,
-                _create_face_landmarker_image,
-                _create_face_landmarker_video,
+                _required_detection_side,
+                DETECTION_MAX_SIDE,
+                VIDEO_DETECT_STRIDE,
+                VIDEO_PIPELINE_FRAMES,
+                VIDEO_SEGMENT_WORKERS,
+                VIDEO_SEGMENT_WARMUP_FRAMES,
+                VIDEO_SEGMENT_MIN_FRAMES,
+                VIDEO_CHECKPOINT_FRAMES,
+                LANDMARKER_POOL,
+                _video_detector,
                 _open_video_writer,
                 _is_image,
                 _is_video,
                 OUTPUT_IMAGE_DIR,
                 OUTPUT_VIDEO_DIR,
+                MP_AVAILABLE,
             )
             self._app_funcs = {
                 '_detect_landmarks_bgr': _detect_landmarks_bgr,
+                '_detect_image_cached': _detect_image_cached,
+                '_detection_variant': _detection_variant,
                 '_filter_landmarks_by_indices': _filter_landmarks_by_indices,
                 '_filter_faces_by_indices': _filter_faces_by_indices,
                 'apply_mosaic': apply_mosaic,
+                'apply_blur': apply_blur,
                 'apply_eye_cover': apply_eye_cover,
                 'apply_face_replace': apply_face_replace,
                 '_load_overlay_rgba': _load_overlay_rgba,
                 '_smooth_faces': _smooth_faces,
-                '_create_face_landmarker_image': _create_face_landmarker_image,
-                '_create_face_landmarker_video': _create_face_landmarker_video,
+                '_required_detection_side': _required_detection_side,
+                'DETECTION_MAX_SIDE': DETECTION_MAX_SIDE,
+                'VIDEO_DETECT_STRIDE': VIDEO_DETECT_STRIDE,
+                'VIDEO_PIPELINE_FRAMES': VIDEO_PIPELINE_FRAMES,
+                'VIDEO_SEGMENT_WORKERS': VIDEO_SEGMENT_WORKERS,
+                'VIDEO_SEGMENT_WARMUP_FRAMES': VIDEO_SEGMENT_WARMUP_FRAMES,
+                'VIDEO_SEGMENT_MIN_FRAMES': VIDEO_SEGMENT_MIN_FRAMES,
+                'VIDEO_CHECKPOINT_FRAMES': VIDEO_CHECKPOINT_FRAMES,
+                'LANDMARKER_POOL': LANDMARKER_POOL,
+                '_video_detector': _video_detector,
                 '_open_video_writer': _open_video_writer,
                 '_is_image': _is_image,
                 '_is_video': _is_video,
                 'OUTPUT_IMAGE_DIR': OUTPUT_IMAGE_DIR,
                 'OUTPUT_VIDEO_DIR': OUTPUT_VIDEO_DIR,
+                'MP_AVAILABLE': MP_AVAILABLE,
             }
         return self._app_funcs
     
-    def _get_image_landmarker(self):
-        """取得照片用的人臉偵測器（延遲初始化）"""
-        if self.image_landmarker is None:
-            funcs = self._get_app_funcs()
-            self.image_landmarker = funcs['_create_face_landmarker_image'](self.sensitivity)
-        return self.image_landmarker
+    def _open_landmark_store(self, landmarks_path: Optional[Path], content_hash: Optional[str], variant: str):
+        """開啟特徵點檔，內容雜湊、靈敏度或偵測參數不符時回傳 None（需重新偵測）"""
+        store = LandmarkStore.open(landmarks_path)
+        if store is not None and not store.matches(content_hash, self.sensitivity, variant):
+            store.close()
+            return None
+        return store
+    
+    def _load_overlay(self, overlay_path: Path) -> Optional[PreparedOverlay]:
+        """
+        載入並前處理覆蓋圖（同一個處理器內以路徑、修改時間與大小快取，批次中重複使用的覆蓋圖只解碼一次）
+        
+        回傳:
+            PreparedOverlay；無法讀取時回傳 None
+        """
+        try:
+            st = os.stat(overlay_path)
+        except OSError:
+            return None
+        key = (str(overlay_path), st.st_mtime_ns, st.st_size)
+        overlay = self._overlays.get(key)
+        if overlay is None:
+            rgba = self._get_app_funcs()['_load_overlay_rgba'](overlay_path)
+            if rgba is None:
+                return None
+            overlay = PreparedOverlay(rgba)
+            if len(self._overlays) >= _MAX_CACHED_OVERLAYS:
+                self._overlays.pop(next(iter(self._overlays)))
+            self._overlays[key] = overlay
+        return overlay
+    
+    def _render_frame(
+        self,
+        frame: np.ndarray,
+        mode: str,
+        face_landmarks,
+        faces,
+        selected_face_ids: Optional[List[int]] = None,
+        overlay: Optional[np.ndarray] = None,
+        prev_eye_boxes=None,
+        out: Optional[np.ndarray] = None,
+        face_modes: Optional[Dict[int, str]] = None,
+    ):
+        """
+        篩選人臉並套用效果（照片與影片共用）
+        
+        out 傳入 frame 本身時就地處理（只改寫人臉區域，不複製整張影格）；None 時不修改 frame。
+        face_modes 為逐臉處理計畫時，各種效果在同一張影格上依序就地套用（見 _render_mixed）。
+        
+        回傳:
+            (處理後的影像, 遮眼框)；遮眼框供影片下一幀平滑使用
+        """
+        funcs = self._get_app_funcs()
+        if face_modes is not None:
+            return self._render_mixed(
+                frame, mode, face_landmarks, faces, selected_face_ids, overlay, prev_eye_boxes, out, face_modes
+            )
+        if selected_face_ids is not None:
+            face_landmarks = funcs['_filter_landmarks_by_indices'](face_landmarks, selected_face_ids)
+            faces = funcs['_filter_faces_by_indices'](faces, selected_face_ids)
+        
+        if mode == "mosaic":
+            return funcs['apply_mosaic'](frame, faces, out=out), prev_eye_boxes
+        if mode == "blur":
+            return funcs['apply_blur'](frame, faces, out=out), prev_eye_boxes
+        if mode == "eyes":
+            return funcs['apply_eye_cover'](frame, face_landmarks, prev_eye_boxes, out=out)
+        return funcs['apply_face_replace'](frame, faces, overlay, out=out), prev_eye_boxes
+    
+    @staticmethod
+    def _face_groups(
+        num_faces: int,
+        mode: str,
+        selected_face_ids: Optional[List[int]],
+        face_modes: Dict[int, str],
+    ) -> Dict[str, List[int]]:
+        """
+        依逐臉處理計畫把人臉分組
+        
+        計畫中有指定的臉使用指定的模式；其餘的臉若在 selected_face_ids 中（未指定時為全部）使用預設模式 mode，
+        否則不處理。
+        
+        回傳:
+            {模式: [人臉索引, ...]}（不含 "none"）
+        """
+        selected = set(selected_face_ids) if selected_face_ids else None
+        groups: Dict[str, List[int]] = {}
+        for i in range(num_faces):
+            face_mode = face_modes.get(i)
+            if face_mode is None:
+                face_mode = mode if selected is None or i in selected else FACE_MODE_NONE
+            if face_mode != FACE_MODE_NONE:
+                groups.setdefault(face_mode, []).append(i)
+        return groups
     
-    def _get_video_landmarker(self):
-        """取得影片用的人臉偵測器（延遲初始化）"""
-        if self.video_landmarker is None:
-            funcs = self._get_app_funcs()
-            self.video_landmarker = funcs['_create_face_landmarker_video'](self.sensitivity)
-        return self.video_landmarker
+    def _render_mixed(
+        self,
+        frame: np.ndarray,
+        mode: str,
+        face_landmarks,
+        faces,
+        selected_face_ids: Optional[List[int]],
+        overlay,
+        prev_eye_boxes,
+        out: Optional[np.ndarray],
+        face_modes: Dict[int, str],
+    ):
+        """逐臉混合模式：每種效果只處理分到該模式的臉，全部就地寫入同一張影格（只需一次解碼與編碼）"""
+        funcs = self._get_app_funcs()
+        if out is None:
+            result = frame.copy()
+        else:
+            if out is not frame:
+                np.copyto(out, frame)
+            result = out
+        
+        num_faces = len(faces) if faces is not None else 0
+        groups = self._face_groups(num_faces, mode, selected_face_ids, face_modes)
+        for face_mode in _MIXED_MODE_ORDER:
+            ids = groups.get(face_mode)
+            if face_mode == "eyes":
+                # 這一幀沒有分到遮眼的臉時仍呼叫 apply_eye_cover，沿用上一幀的白條（與單一遮眼模式相同）
+                if ids or prev_eye_boxes:
+                    group_landmarks = (
+                        funcs['_filter_landmarks_by_indices'](face_landmarks, ids) if ids else FaceLandmarks.empty()
+                    )
+                    _, prev_eye_boxes = funcs['apply_eye_cover'](result, group_landmarks, prev_eye_boxes, out=result)
+                continue
+            if not ids:
+                continue
+            group_faces = funcs['_filter_faces_by_indices'](faces, ids)
+            if face_mode == "mosaic":
+                funcs['apply_mosaic'](result, group_faces, out=result)
+            elif face_mode == "blur":
+                funcs['apply_blur'](result, group_faces, out=result)
+            else:
+                funcs['apply_face_replace'](result, group_faces, overlay, out=result)
+        return result, prev_eye_boxes
+    
+    def render_preview(
+        self,
+        frame: np.ndarray,
+        mode: str,
+        face_landmarks,
+        faces,
+        selected_face_ids: Optional[List[int]] = None,
+        overlay_path: Optional[Path] = None,
+        face_modes: Optional[Dict[int, str]] = None,
+    ) -> np.ndarray:
+        """
+        在已偵測好的影格（通常是縮小的代理影像）上套用效果，不執行偵測也不存檔（即時預覽用）
+        
+        參數:
+            frame: 影像（不會被修改）
+            face_landmarks, faces: 與 frame 同座標的偵測結果
+            其餘參數與 process_image 相同
+        
+        回傳:
+            處理後的影像（新陣列）
+        """
+        if mode not in PROCESS_MODES:
+            raise ValueError(f"不支援的處理模式: {mode}")
+        face_modes = normalize_face_modes(face_modes)
+        overlay = None
+        if _needs_overlay(mode, face_modes):
+            if overlay_path is None:
+                raise ValueError("替換模式需要提供 overlay_path")
+            overlay = self._load_overlay(overlay_path)
+            if overlay is None:
+                raise ValueError(f"無法讀取覆蓋圖片: {overlay_path}")
+        output, _ = self._render_frame(
+            frame, mode, face_landmarks, faces, selected_face_ids, overlay, face_modes=face_modes
+        )
+        return output
     
     def process_image(
         self,
@@ -87,16 +365,22 @@ class MediaProcessor:
         selected_face_ids: Optional[List[int]] = None,
         overlay_path: Optional[Path] = None,
         output_path: Optional[Path] = None,
+        landmarks_path: Optional[Path] = None,
+        face_modes: Optional[Dict[int, str]] = None,
     ) -> Path:
         """
         處理照片
         
         參數:
             image_path: 輸入照片路徑
-            mode: 處理模式 ('mosaic', 'eyes', 'replace')
+            mode: 處理模式 ('mosaic', 'blur', 'eyes', 'replace')
             selected_face_ids: 要處理的人臉 ID 列表（None 表示處理所有人臉）
             overlay_path: 替換模式用的覆蓋圖片路徑
             output_path: 輸出檔案路徑（None 時自動產生）
+            landmarks_path: 這個媒體的特徵點檔（None 表示不讀寫）；檔案存在且內容與偵測參數相符時
+                直接使用，不再執行偵測，否則偵測後寫入，之後換模式或換人臉選擇重新處理時可重用
+            face_modes: 逐臉處理計畫 {人臉 ID: 模式}，模式可為 PROCESS_MODES 之一或 "none"（不處理）；
+                沒有列出的臉依 selected_face_ids 套用 mode。各種效果在同一次走訪影格時一起套用
         
         回傳:
             輸出檔案路徑
@@ -111,50 +395,57 @@ class MediaProcessor:
         """
         funcs = self._get_app_funcs()
         _is_image = funcs['_is_image']
-        _detect_landmarks_bgr = funcs['_detect_landmarks_bgr']
-        _filter_landmarks_by_indices = funcs['_filter_landmarks_by_indices']
-        _filter_faces_by_indices = funcs['_filter_faces_by_indices']
-        apply_mosaic = funcs['apply_mosaic']
-        apply_eye_cover = funcs['apply_eye_cover']
-        apply_face_replace = funcs['apply_face_replace']
-        _load_overlay_rgba = funcs['_load_overlay_rgba']
         OUTPUT_IMAGE_DIR = funcs['OUTPUT_IMAGE_DIR']
         
         if not _is_image(image_path):
             raise ValueError(f"不支援的圖片格式: {image_path}")
         
-        if mode not in ['mosaic', 'eyes', 'replace']:
+        if mode not in PROCESS_MODES:
             raise ValueError(f"不支援的處理模式: {mode}")
+        face_modes = normalize_face_modes(face_modes)
         
         # 載入圖片
         image = cv2.imread(str(image_path))
         if image is None:
             raise ValueError(f"無法讀取圖片: {image_path}")
         
-        # 偵測人臉
-        landmarker = self._get_image_landmarker()
-        if landmarker is None:
-            raise RuntimeError("無法初始化人臉偵測器")
-        
-        face_landmarks, faces = _detect_landmarks_bgr(image, landmarker, None)
-        
-        # 篩選要處理的人臉
-        if selected_face_ids is not None:
-            face_landmarks = _filter_landmarks_by_indices(face_landmarks, selected_face_ids)
-            faces = _filter_faces_by_indices(faces, selected_face_ids)
-        
-        # 根據模式處理
-        if mode == "mosaic":
-            output = apply_mosaic(image, faces)
-        elif mode == "eyes":
-            output, _ = apply_eye_cover(image, face_landmarks, prev_boxes=None)
-        elif mode == "replace":
+        overlay = None
+        if _needs_overlay(mode, face_modes):
             if overlay_path is None:
                 raise ValueError("替換模式需要提供 overlay_path")
-            overlay = _load_overlay_rgba(overlay_path)
+            overlay = self._load_overlay(overlay_path)
             if overlay is None:
                 raise ValueError(f"無法讀取覆蓋圖片: {overlay_path}")
-            output = apply_face_replace(image, faces, overlay)
+        
+        # 取得人臉：優先讀取這個媒體已儲存的特徵點檔，其次使用偵測快取，最後才執行偵測
+        content_hash = file_sha256(image_path)
+        variant = funcs['_detection_variant'](
+            self.crowd_mode, self.detection_max_side, self.max_faces
+        )
+        store = self._open_landmark_store(landmarks_path, content_hash, variant)
+        if store is not None:
+            face_landmarks, faces = store.frame(0)
+        else:
+            if not funcs['MP_AVAILABLE']:
+                raise RuntimeError("無法初始化人臉偵測器")
+            face_landmarks, faces = funcs['_detect_image_cached'](
+                image,
+                content_hash,
+                self.sensitivity,
+                crowd=self.crowd_mode,
+                max_side=self.detection_max_side,
+                max_faces=self.max_faces,
+            )
+            if landmarks_path is not None:
+                save_landmarks(
+                    landmarks_path, face_landmarks,
+                    content_hash=content_hash, sensitivity=self.sensitivity, variant=variant,
+                    kind="image", width=image.shape[1], height=image.shape[0],
+                )
+        
+        output, _ = self._render_frame(
+            image, mode, face_landmarks, faces, selected_face_ids, overlay, out=image, face_modes=face_modes
+        )
         
         # 儲存結果
         if output_path is None:
@@ -162,6 +453,8 @@ class MediaProcessor:
         
         OUTPUT_IMAGE_DIR.mkdir(parents=True, exist_ok=True)
         cv2.imwrite(str(output_path), output)
+        if self.on_progress is not None:
+            self.on_progress(STAGE_PROCESS, 1, 1)
         
         return output_path
     
@@ -172,19 +465,29 @@ class MediaProcessor:
         selected_face_ids: Optional[List[int]] = None,
         overlay_path: Optional[Path] = None,
         output_path: Optional[Path] = None,
+        landmarks_path: Optional[Path] = None,
+        face_modes: Optional[Dict[int, str]] = None,
     ) -> Path:
         """
         處理影片
         
         參數:
             video_path: 輸入影片路徑
-            mode: 處理模式 ('mosaic', 'eyes', 'replace')
+            mode: 處理模式 ('mosaic', 'blur', 'eyes', 'replace')
             selected_face_ids: 要處理的人臉 ID 列表（None 表示處理所有人臉）
             overlay_path: 替換模式用的覆蓋圖片路徑
             output_path: 輸出檔案路徑（None 時自動產生）
+            landmarks_path: 這個媒體的特徵點檔（None 表示不讀寫）；檔案存在且內容與偵測參數相符時
+                直接使用，不再執行偵測，否則偵測後寫入，之後換模式或換人臉選擇重新處理時可重用
+            face_modes: 逐臉處理計畫 {人臉 ID: 模式}，模式可為 PROCESS_MODES 之一或 "none"（不處理）；
+                沒有列出的臉依 selected_face_ids 套用 mode。各種效果在同一次走訪影格時一起套用
         
         回傳:
-            輸出檔案路徑
+            輸出檔案路徑；處理統計存在 self.last_video_report：各階段的工作與等待時間在 "pipeline"
+            （見 VideoPipeline.stats），執行偵測時另有逐幀的偵測覆蓋率統計（見 KeyframeTracker.stats）
+        
+        偵測服務的 worker 在處理中途結束時，改在本行程偵測並重新處理整支影片
+        （分段偵測時只重新偵測中斷的那一段，已完成的段落與檢查點照常使用）
         
         範例:
             processor = MediaProcessor(sensitivity=0.6)
@@ -194,24 +497,36 @@ class MediaProcessor:
                 selected_face_ids=[0],  # 只處理第一張人臉
             )
         """
+        args = (video_path, mode, selected_face_ids, overlay_path, output_path, landmarks_path, face_modes)
+        try:
+            return self._process_video(*args)
+        except DetectionServiceError:
+            # 暫存輸出與未完成的特徵點檔已在中斷時刪除
+            return self._process_video(*args, local=True)
+    
+    def _process_video(
+        self,
+        video_path: Path,
+        mode: str,
+        selected_face_ids: Optional[List[int]],
+        overlay_path: Optional[Path],
+        output_path: Optional[Path],
+        landmarks_path: Optional[Path],
+        face_modes: Optional[Dict[int, str]],
+        local: bool = False,
+    ) -> Path:
+        """process_video 的實作；local 為 True 時不使用偵測服務"""
         funcs = self._get_app_funcs()
         _is_video = funcs['_is_video']
-        _detect_landmarks_bgr = funcs['_detect_landmarks_bgr']
-        _filter_landmarks_by_indices = funcs['_filter_landmarks_by_indices']
-        _filter_faces_by_indices = funcs['_filter_faces_by_indices']
-        apply_mosaic = funcs['apply_mosaic']
-        apply_eye_cover = funcs['apply_eye_cover']
-        apply_face_replace = funcs['apply_face_replace']
-        _load_overlay_rgba = funcs['_load_overlay_rgba']
-        _smooth_faces = funcs['_smooth_faces']
         _open_video_writer = funcs['_open_video_writer']
         OUTPUT_VIDEO_DIR = funcs['OUTPUT_VIDEO_DIR']
         
         if not _is_video(video_path):
             raise ValueError(f"不支援的影片格式: {video_path}")
         
-        if mode not in ['mosaic', 'eyes', 'replace']:
+        if mode not in PROCESS_MODES:
             raise ValueError(f"不支援的處理模式: {mode}")
+        face_modes = normalize_face_modes(face_modes)
         
         # 開啟影片
         cap = cv2.VideoCapture(str(video_path))
@@ -230,100 +545,434 @@ class MediaProcessor:
         
         height, width = first_frame.shape[:2]
         
+        # 載入覆蓋圖片（如果需要）：在建立輸出暫存檔之前檢查，參數錯誤時不會留下暫存檔
+        overlay = None
+        if _needs_overlay(mode, face_modes):
+            if overlay_path is None:
+                cap.release()
+                raise ValueError("替換模式需要提供 overlay_path")
+            overlay = self._load_overlay(overlay_path)
+            if overlay is None:
+                cap.release()
+                raise ValueError(f"無法讀取覆蓋圖片: {overlay_path}")
+        
         # 建立輸出影片寫入器
         if output_path is None:
             output_base = OUTPUT_VIDEO_DIR / f"{video_path.stem}_processed"
         else:
             output_base = output_path.with_suffix('')
         
+        # 先寫入暫存檔，完整輸出後才改名為正式檔名（中斷時不會留下不完整的輸出檔）
         OUTPUT_VIDEO_DIR.mkdir(parents=True, exist_ok=True)
-        writer, out_path = _open_video_writer(output_base, fps, (width, height))
+        writer, partial_path = _open_video_writer(output_base.with_name(f"{output_base.name}_partial"), fps, (width, height))
         if writer is None:
             cap.release()
             raise RuntimeError("無法初始化影片編碼器")
+        out_path = output_base.with_suffix(partial_path.suffix)
         
-        # 載入覆蓋圖片（如果需要）
-        overlay = None
-        if mode == "replace":
-            if overlay_path is None:
-                cap.release()
-                writer.release()
-                raise ValueError("替換模式需要提供 overlay_path")
-            overlay = _load_overlay_rgba(overlay_path)
-            if overlay is None:
-                cap.release()
-                writer.release()
-                raise ValueError(f"無法讀取覆蓋圖片: {overlay_path}")
+        # 長影片可分段偵測；使用檢查點時每段完成後保存在檢查點目錄（預設為 <輸出檔名>.parts），
+        # 中斷後重新執行時從未完成的段落繼續
+        frame_count = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        segments = self._plan_video_segments(frame_count)
+        checkpoint_dir = None
+        if self._checkpoint_frames():
+            checkpoint_dir = self.checkpoint_dir or output_base.with_name(f"{output_base.name}.parts")
+        
+        # 這個媒體已有相同內容與參數的特徵點軌跡時直接渲染，不再執行偵測
+        stride = self._video_detect_stride()
+        needs_hash = landmarks_path is not None or (checkpoint_dir is not None and len(segments) > 1)
+        content_hash = file_sha256(video_path) if needs_hash else None
+        variant = funcs['_detection_variant'](False, self.detection_max_side) + "-track"
+        if stride > 1:
+            variant += f"-k{stride}"
+        self.last_video_report = None
+        store = self._open_landmark_store(landmarks_path, content_hash, variant)
+        segment_report = None
+        scratch_path = None
+        completed = False
         
-        # 初始化人臉偵測器
-        landmarker = self._get_video_landmarker()
-        if landmarker is None:
+        try:
+            # 分段偵測：各段的特徵點軌跡合併成一個檔案後，與已有特徵點檔時相同，依序渲染
+            if store is None and len(segments) > 1:
+                track_path = landmarks_path
+                if track_path is None:
+                    scratch_path = output_base.with_name(f"{output_base.name}.{os.getpid()}.lmk")
+                    track_path = scratch_path
+                segment_report = self._analyze_video_segments(
+                    video_path, segments, fps, track_path,
+                    checkpoint_dir=checkpoint_dir, frame_count=frame_count,
+                    content_hash=content_hash, variant=variant, width=width, height=height,
+                )
+                store = LandmarkStore.open(track_path)
+            
+            # 解碼與編碼在獨立的執行緒進行，這裡只負責偵測與套用效果
+            pipeline = VideoPipeline(cap, writer, first_frame, funcs['VIDEO_PIPELINE_FRAMES'])
+            on_progress = self.on_progress
+            if store is not None:
+                prev_eye_boxes = []
+                with pipeline:
+                    for frame_idx, frame in enumerate(pipeline):
+                        face_landmarks, faces = store.frame(frame_idx)
+                        processed, prev_eye_boxes = self._render_frame(
+                            frame, mode, face_landmarks, faces, selected_face_ids, overlay, prev_eye_boxes,
+                            out=frame, face_modes=face_modes,
+                        )
+                        pipeline.write(processed)
+                        if on_progress is not None:
+                            on_progress(STAGE_RENDER, frame_idx + 1, frame_count)
+                self.last_video_report = {**(segment_report or {}), "pipeline": pipeline.stats()}
+                completed = True
+                return out_path
+            
+            # 取得影片用的偵測函數（偵測服務或本行程的偵測器池，處理完畢後釋放），並記錄逐幀特徵點軌跡
+            recorder = LandmarkTrackWriter(landmarks_path) if landmarks_path is not None else None
+            tracker = KeyframeTracker(stride)
+            try:
+                with funcs['_video_detector'](self.sensitivity, local=local) as detect, pipeline:
+                    if detect is None:
+                        raise RuntimeError("無法初始化人臉偵測器")
+                    
+                    prev_eye_boxes = []
+                    detected = self._detect_video_frames(pipeline, detect, fps, tracker)
+                    for frame_idx, (frame, face_landmarks, faces) in enumerate(detected):
+                        if recorder is not None:
+                            recorder.append(face_landmarks, faces)
+                        
+                        # 偵測完成後影格不再需要原始內容，直接就地套用效果
+                        processed, prev_eye_boxes = self._render_frame(
+                            frame, mode, face_landmarks, faces, selected_face_ids, overlay, prev_eye_boxes,
+                            out=frame, face_modes=face_modes,
+                        )
+                        pipeline.write(processed)
+                        if on_progress is not None:
+                            on_progress(STAGE_PROCESS, frame_idx + 1, frame_count)
+            except BaseException:
+                if recorder is not None:
+                    recorder.discard()
+                raise
+            
+            self.last_video_report = {**tracker.stats(), "pipeline": pipeline.stats()}
+            if recorder is not None:
+                recorder.save(
+                    content_hash=content_hash, sensitivity=self.sensitivity, variant=variant,
+                    kind="video", width=width, height=height, fps=fps,
+                )
+            completed = True
+        finally:
+            # 清理資源
             cap.release()
             writer.release()
-            raise RuntimeError("無法初始化人臉偵測器")
-        
-        # 處理第一幀
-        prev_faces = None
-        prev_eye_boxes = []
-        frame_idx = 0
-        
-        face_landmarks, faces = _detect_landmarks_bgr(first_frame, landmarker, 0)
-        faces = _smooth_faces(prev_faces, faces)
-        prev_faces = faces
+            if store is not None:
+                store.close()
+            if scratch_path is not None:
+                scratch_path.unlink(missing_ok=True)
+            if completed:
+                os.replace(partial_path, out_path)
+                if checkpoint_dir is not None:
+                    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+            else:
+                partial_path.unlink(missing_ok=True)
         
-        if selected_face_ids is not None:
-            face_landmarks = _filter_landmarks_by_indices(face_landmarks, selected_face_ids)
-            faces = _filter_faces_by_indices(faces, selected_face_ids)
+        return out_path
+    
+    def _video_detect_stride(self) -> int:
+        """影片的關鍵幀間隔（未指定時使用系統預設值）"""
+        return max(1, int(self.detect_stride or self._get_app_funcs()['VIDEO_DETECT_STRIDE']))
+    
+    def _detect_video_frames(self, frames, detect, fps: float, tracker: KeyframeTracker, first_index: int = 0):
+        """
+        逐幀偵測（關鍵幀之間以光流追蹤）並平滑人臉框
         
-        if mode == "mosaic":
-            processed = apply_mosaic(first_frame, faces)
-        elif mode == "eyes":
-            processed, prev_eye_boxes = apply_eye_cover(
-                first_frame, face_landmarks, prev_eye_boxes
-            )
-        elif mode == "replace":
-            processed = apply_face_replace(first_frame, faces, overlay)
+        參數:
+            frames: 影格的可迭代物件（影格可能重複使用同一個陣列）
+            detect: 影片用的偵測函數（見 app._video_detector）
+            fps: 影格率（計算偵測器的時間戳）
+            tracker: 這支影片（或這一段）的 KeyframeTracker
+            first_index: 第一幀在影片中的索引（分段處理時時間戳依整支影片計算）
         
-        writer.write(processed)
+        產生:
+            (影格, 特徵點, 平滑後的人臉框)
+        """
+        funcs = self._get_app_funcs()
+        _smooth_faces = funcs['_smooth_faces']
+        _required_detection_side = funcs['_required_detection_side']
         
-        # 處理後續影格
-        while True:
-            ok, frame = cap.read()
-            if not ok:
-                break
-            
-            frame_idx += 1
-            timestamp_ms = int(frame_idx * 1000 / fps)
+        # 偵測用縮圖的長邊：若某一幀的臉太小而需要提高解析度，之後的影格沿用較高的解析度
+        native_side = None
+        detect_side = None
+        prev_faces = None
+        for offset, frame in enumerate(frames):
+            if native_side is None:
+                native_side = max(frame.shape[:2])
+                max_side = self.detection_max_side
+                if max_side is None:
+                    max_side = funcs['DETECTION_MAX_SIDE']
+                detect_side = min(native_side, max_side) if max_side else native_side
+            timestamp_ms = int((first_index + offset) * 1000 / fps)
             
-            # 偵測人臉
-            face_landmarks, faces = _detect_landmarks_bgr(
-                frame, landmarker, timestamp_ms
-            )
+            # 關鍵幀之間以光流追蹤；關鍵幀、場景切換或追蹤失準時才偵測人臉
+            face_landmarks = tracker.track(frame)
+            if face_landmarks is not None:
+                faces = face_landmarks.boxes
+            else:
+                face_landmarks, faces = detect(frame, timestamp_ms, detect_side)
+                detect_side = _required_detection_side(face_landmarks, native_side, detect_side)
+                tracker.reset(face_landmarks)
             faces = _smooth_faces(prev_faces, faces)
             prev_faces = faces
-            
-            # 篩選要處理的人臉
-            if selected_face_ids is not None:
-                face_landmarks = _filter_landmarks_by_indices(face_landmarks, selected_face_ids)
-                faces = _filter_faces_by_indices(faces, selected_face_ids)
-            
-            # 根據模式處理
-            if mode == "mosaic":
-                processed = apply_mosaic(frame, faces)
-            elif mode == "eyes":
-                processed, prev_eye_boxes = apply_eye_cover(
-                    frame, face_landmarks, prev_eye_boxes
+            yield frame, face_landmarks, faces
+    
+    def _segment_worker_count(self) -> int:
+        """分段偵測的 worker 行程數（未指定時使用系統預設值）"""
+        workers = self.segment_workers if self.segment_workers is not None else self._get_app_funcs()['VIDEO_SEGMENT_WORKERS']
+        return max(1, int(workers or 1))
+    
+    def _checkpoint_frames(self) -> int:
+        """檢查點間隔（幀數，0 表示不使用檢查點）"""
+        frames = self.checkpoint_frames if self.checkpoint_frames is not None else self._get_app_funcs()['VIDEO_CHECKPOINT_FRAMES']
+        return max(0, int(frames or 0))
+    
+    def _plan_video_segments(self, frame_count: int) -> List[tuple]:
+        """
+        把影片切成分段偵測的時間段
+        
+        使用檢查點時切成固定長度（VIDEO_CHECKPOINT_FRAMES）的段落，每段偵測完成即保存，
+        段落的切法只與影片長度有關，中斷後重新執行時與未中斷時完全相同；否則依 worker 數平均切分。
+        
+        回傳:
+            [(起始幀, 結束幀), ...]；最後一段的結束幀為 None（讀到影片結尾，影片的總幀數不一定準確）。
+            未啟用分段或影片太短時只有一段
+        """
+        checkpoint = self._checkpoint_frames()
+        if checkpoint and frame_count > checkpoint:
+            bounds = list(range(0, frame_count, checkpoint))
+        else:
+            count = min(self._segment_worker_count(), frame_count // max(1, self._get_app_funcs()['VIDEO_SEGMENT_MIN_FRAMES']))
+            if count <= 1:
+                return [(0, None)]
+            bounds = [round(frame_count * i / count) for i in range(count)]
+        return [(start, end) for start, end in zip(bounds, bounds[1:] + [None])]
+    
+    def _analyze_video_segments(
+        self,
+        video_path: Path,
+        segments: List[tuple],
+        fps: float,
+        track_path: Path,
+        checkpoint_dir: Optional[Path] = None,
+        frame_count: int = 0,
+        **meta,
+    ) -> dict:
+        """
+        分段偵測影片（worker 數大於 1 時由多個 worker 行程平行偵測），各段的特徵點軌跡依序合併寫入 track_path
+        
+        每一段從起始幀之前至少 VIDEO_SEGMENT_WARMUP_FRAMES 幀開始偵測（不記錄），讓平滑、追蹤與偵測解析度的狀態
+        在段落交界處延續；暖機起點對齊關鍵幀間隔，關鍵幀的位置與整支影片依序處理時相同。
+        每一段都使用新的影片偵測器（不沿用其他段落留下的追蹤狀態），各段的結果只由影片內容與切法決定，
+        與執行順序及分配到的 worker 無關。
+        
+        參數:
+            checkpoint_dir: 檢查點目錄（None 表示不保存）；每段完成後的軌跡保存在這裡，
+                重新執行時內容與參數相符的段落直接使用，不再偵測
+            frame_count: 影片的總幀數（進度回報用，0 表示未知）
+            meta: 寫入合併後特徵點檔標頭的資料（content_hash、variant 等）
+        
+        回傳:
+            分段偵測的統計（合併後的偵測覆蓋率、各段資訊、暖機幀數與暖機時的偵測次數、沿用檢查點的段數）
+        """
+        funcs = self._get_app_funcs()
+        stride = self._video_detect_stride()
+        warmup = max(0, funcs['VIDEO_SEGMENT_WARMUP_FRAMES'])
+        if checkpoint_dir is not None:
+            checkpoint_dir.mkdir(parents=True, exist_ok=True)
+            parts = [checkpoint_dir / f"seg{start:08d}.lmk" for start, _ in segments]
+        else:
+            parts = [track_path.with_name(f"{track_path.name}.{os.getpid()}.seg{i}") for i in range(len(segments))]
+        # 段落軌跡的標頭：重新執行時以此確認檢查點對應同一份內容、參數與切法
+        part_meta = {"content_hash": meta.get("content_hash"), "variant": meta.get("variant")}
+        
+        results: List[Optional[dict]] = [None] * len(segments)
+        if checkpoint_dir is not None:
+            for i, ((start, end), part) in enumerate(zip(segments, parts)):
+                results[i] = self._load_segment_checkpoint(part, start, end, warmup, part_meta)
+        pending = [i for i, result in enumerate(results) if result is None]
+        
+        def _report():
+            if self.on_progress is not None:
+                done = sum(result["frames"] for result in results if result is not None)
+                self.on_progress(STAGE_DETECT, done, max(frame_count, done))
+        
+        _report()
+        start_time = time.perf_counter()
+        try:
+            workers = min(self._segment_worker_count(), len(pending))
+            if workers <= 1:
+                for i in pending:
+                    start, end = segments[i]
+                    try:
+                        results[i] = self._analyze_video_segment(video_path, start, end, warmup, fps, parts[i], **part_meta)
+                    except DetectionServiceError:
+                        # 偵測服務的 worker 中途結束：這一段改在本行程從暖機起點重新偵測
+                        results[i] = self._analyze_video_segment(
+                            video_path, start, end, warmup, fps, parts[i], local=True, **part_meta
+                        )
+                    _report()
+            else:
+                settings = {
+                    "sensitivity": self.sensitivity,
+                    "detection_max_side": self.detection_max_side,
+                    "detect_stride": stride,
+                }
+                executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_batch_worker_init,
+                    initargs=(settings,),
                 )
-            elif mode == "replace":
-                processed = apply_face_replace(frame, faces, overlay)
+                try:
+                    futures = {
+                        executor.submit(
+                            _segment_worker_run, str(video_path), *segments[i], warmup, fps, str(parts[i]), part_meta
+                        ): i
+                        for i in pending
+                    }
+                    for future in as_completed(futures):
+                        results[futures[future]] = future.result()
+                        _report()
+                finally:
+                    executor.shutdown(wait=True, cancel_futures=True)
             
-            writer.write(processed)
+            # 依時間順序合併各段的軌跡（段落結束幀不準確時以實際讀到的幀數為準）
+            writer = LandmarkTrackWriter(track_path)
+            try:
+                for (start, end), part, result in zip(segments, parts, results):
+                    if end is not None and result["frames"] != end - start:
+                        raise RuntimeError(f"影片分段讀取失敗：第 {start} 幀起應有 {end - start} 幀，實際 {result['frames']} 幀")
+                    part_store = LandmarkStore(part)
+                    try:
+                        for idx in range(part_store.num_frames):
+                            writer.append(*part_store.frame(idx))
+                    finally:
+                        part_store.close()
+            except BaseException:
+                writer.discard()
+                raise
+            writer.save(sensitivity=self.sensitivity, kind="video", fps=fps, **meta)
+        finally:
+            # 沒有使用檢查點時段落軌跡只是暫存檔；使用檢查點時保留到整支影片輸出完成
+            if checkpoint_dir is None:
+                for part in parts:
+                    part.unlink(missing_ok=True)
         
-        # 清理資源
-        cap.release()
-        writer.release()
+        report = coverage_stats("".join(r["frame_sources"] for r in results), stride)
+        report["segments"] = [
+            {"start": start, "frames": r["frames"], "elapsed_s": r["elapsed_s"], "resumed": r.get("resumed", False)}
+            for (start, _), r in zip(segments, results)
+        ]
+        report["resumed_segments"] = len(segments) - len(pending)
+        report["warmup_frames"] = sum(r["warmup_frames"] for r in results)
+        report["warmup_detections"] = sum(r["warmup_detections"] for r in results)
+        report["analysis_wall_s"] = time.perf_counter() - start_time
+        return report
+    
+    def _load_segment_checkpoint(
+        self, part: Path, start: int, end: Optional[int], warmup: int, part_meta: dict
+    ) -> Optional[dict]:
+        """
+        讀取已完成段落的檢查點
         
-        return out_path
+        回傳:
+            與 _analyze_video_segment 相同格式的結果（"resumed" 為 True）；檔案不存在或內容、參數不符時為 None
+        """
+        part_store = LandmarkStore.open(part)
+        if part_store is None:
+            return None
+        try:
+            info = part_store.meta
+            if (
+                not part_store.matches(part_meta["content_hash"], self.sensitivity, part_meta["variant"])
+                or info.get("warmup") != warmup
+                or info.get("start") != start
+                or info.get("end") != end
+                or len(info.get("frame_sources", "")) != part_store.num_frames
+            ):
+                return None
+            return {
+                "frames": part_store.num_frames,
+                "frame_sources": info["frame_sources"],
+                "warmup_frames": info["warmup_frames"],
+                "warmup_detections": info["warmup_detections"],
+                "elapsed_s": 0.0,
+                "resumed": True,
+            }
+        finally:
+            part_store.close()
+    
+    def _analyze_video_segment(
+        self,
+        video_path: Path,
+        start: int,
+        end: Optional[int],
+        warmup: int,
+        fps: float,
+        track_path: Path,
+        local: bool = False,
+        **meta,
+    ) -> dict:
+        """
+        偵測影片的一段並把 [start, end) 的特徵點軌跡寫入 track_path（統計資料一併寫入標頭，可作為檢查點）
+        
+        偵測器在這一段開始時新建（偵測器池不重複使用影片模式的偵測器），追蹤狀態由暖機影格重新建立；
+        local 為 True 時不使用偵測服務
+        
+        回傳:
+            {"frames": 記錄的幀數, "frame_sources": 逐幀來源代碼, "warmup_frames", "warmup_detections", "elapsed_s"}
+        """
+        started = time.perf_counter()
+        stride = self._video_detect_stride()
+        first = max(0, (start - warmup) // stride * stride)  # 暖機起點對齊關鍵幀間隔
+        cap = cv2.VideoCapture(str(video_path))
+        if not cap.isOpened():
+            raise ValueError(f"無法開啟影片: {video_path}")
+        recorder = LandmarkTrackWriter(track_path)
+        tracker = KeyframeTracker(stride)
+        try:
+            if first > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+            
+            def _frames():
+                frame = None
+                for _ in itertools.count(first) if end is None else range(first, end):
+                    ok, frame = cap.read(frame)
+                    if not ok:
+                        return
+                    yield frame
+            
+            with self._get_app_funcs()['_video_detector'](self.sensitivity, local=local) as detect:
+                if detect is None:
+                    raise RuntimeError("無法初始化人臉偵測器")
+                detected = self._detect_video_frames(_frames(), detect, fps, tracker, first_index=first)
+                for offset, (_, face_landmarks, faces) in enumerate(detected):
+                    if first + offset >= start:
+                        recorder.append(face_landmarks, faces)
+        except BaseException:
+            recorder.discard()
+            raise
+        finally:
+            cap.release()
+        warm = start - first
+        recorded = tracker.stats(first=warm)
+        result = {
+            "frames": len(recorder),
+            "frame_sources": recorded["frame_sources"],
+            "warmup_frames": warm,
+            "warmup_detections": tracker.stats()["detected_frames"] - recorded["detected_frames"],
+        }
+        recorder.save(
+            sensitivity=self.sensitivity, kind="video-segment", start=start, end=end, warmup=warmup, **meta, **result
+        )
+        result["elapsed_s"] = time.perf_counter() - started
+        return result
     
     def process(
         self,
@@ -332,16 +981,22 @@ class MediaProcessor:
         selected_face_ids: Optional[List[int]] = None,
         overlay_path: Optional[Path] = None,
         output_path: Optional[Path] = None,
+        landmarks_path: Optional[Path] = None,
+        face_modes: Optional[Dict[int, str]] = None,
     ) -> Path:
         """
         統一處理介面（自動判斷照片或影片）
         
         參數:
             media_path: 輸入媒體檔案路徑
-            mode: 處理模式 ('mosaic', 'eyes', 'replace')
+            mode: 處理模式 ('mosaic', 'blur', 'eyes', 'replace')
             selected_face_ids: 要處理的人臉 ID 列表（None 表示處理所有人臉）
             overlay_path: 替換模式用的覆蓋圖片路徑
             output_path: 輸出檔案路徑（None 時自動產生）
+            landmarks_path: 這個媒體的特徵點檔（None 表示不讀寫）；檔案存在且內容與偵測參數相符時
+                直接使用，不再執行偵測，否則偵測後寫入，之後換模式或換人臉選擇重新處理時可重用
+            face_modes: 逐臉處理計畫 {人臉 ID: 模式}，模式可為 PROCESS_MODES 之一或 "none"（不處理）；
+                沒有列出的臉依 selected_face_ids 套用 mode。各種效果在同一次走訪影格時一起套用
         
         回傳:
             輸出檔案路徑
@@ -359,14 +1014,190 @@ class MediaProcessor:
         
         if _is_image(media_path):
             return self.process_image(
-                media_path, mode, selected_face_ids, overlay_path, output_path
+                media_path, mode, selected_face_ids, overlay_path, output_path, landmarks_path, face_modes
             )
         elif _is_video(media_path):
             return self.process_video(
-                media_path, mode, selected_face_ids, overlay_path, output_path
+                media_path, mode, selected_face_ids, overlay_path, output_path, landmarks_path, face_modes
             )
         else:
             raise ValueError(f"不支援的媒體格式: {media_path}")
+    
+    def process_batch(self, items: Iterable[dict], workers: Optional[int] = None) -> Iterator[dict]:
+        """
+        批次處理多個媒體檔案（例如展覽結束後重新處理整個展覽）
+        照片與影片分散給多個 worker 行程平行處理，每個行程有自己的人臉偵測器。
+        
+        參數:
+            items: 要處理的項目，每項為 dict，鍵與 process() 的參數相同：
+                media_path、mode，以及可選的 selected_face_ids、overlay_path、output_path、landmarks_path、face_modes
+            workers: worker 行程數（None 時使用 CPU 核心數，1 表示在目前行程依序處理）
+        
+        指定 checkpoint_dir 時，每個項目的檢查點保存在 <checkpoint_dir>/<項目索引>，
+        平行處理的項目不會互相覆蓋，重新執行同一批次時各項目從自己的檢查點繼續
+        
+        回傳:
+            產生器，每處理完一項就產生一個結果（依完成順序，不是輸入順序）：
+            {"index": 項目在 items 中的索引, "media_path": ..., "output_path": 輸出路徑（失敗時為 None）,
+             "error": 錯誤訊息（成功時為 None）, "elapsed_s": 處理秒數}
+            單一項目失敗不會中斷整個批次；整批的統計資料隨處理進度更新在 self.last_batch_report
+        
+        範例:
+            processor = MediaProcessor(sensitivity=0.6)
+            items = [{"media_path": p, "mode": "mosaic"} for p in paths]
+            for result in processor.process_batch(items, workers=4):
+                if result["error"]:
+                    print(result["media_path"], result["error"])
+            print(processor.last_batch_report)
+        """
+        items = list(items)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(int(workers), len(items) or 1))
+        
+        # 大檔案（通常是影片）先處理，避免批次最後只剩一個行程在處理長影片
+        order = sorted(range(len(items)), key=lambda i: _file_size(items[i].get("media_path")), reverse=True)
+        report = {
+            "total": len(items),
+            "completed": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "workers": workers,
+            "input_mb": sum(_file_size(item.get("media_path")) for item in items) / (1 << 20),
+            "wall_time_s": 0.0,
+            "busy_time_s": 0.0,
+            "items_per_s": 0.0,
+            "mb_per_s": 0.0,
+            "speedup": 0.0,
+        }
+        self.last_batch_report = report
+        start = time.perf_counter()
+        done_mb = 0.0
+        
+        def _record(result: dict) -> dict:
+            nonlocal done_mb
+            report["completed"] += 1
+            report["failed" if result["error"] else "succeeded"] += 1
+            report["busy_time_s"] += result["elapsed_s"]
+            done_mb += _file_size(result["media_path"]) / (1 << 20)
+            wall = time.perf_counter() - start
+            report["wall_time_s"] = wall
+            if wall > 0:
+                report["items_per_s"] = report["completed"] / wall
+                report["mb_per_s"] = done_mb / wall
+                # 各項目處理時間總和 / 實際經過時間，約等於平行處理的加速倍數
+                report["speedup"] = report["busy_time_s"] / wall
+            return result
+        
+        if workers == 1:
+            for index in order:
+                yield _record(_run_batch_item(self, index, items[index]))
+            return
+        
+        settings = {
+            "sensitivity": self.sensitivity,
+            "crowd_mode": self.crowd_mode,
+            "max_faces": self.max_faces,
+            "detection_max_side": self.detection_max_side,
+            "detect_stride": self.detect_stride,
+            "checkpoint_frames": self.checkpoint_frames,
+            "checkpoint_dir": self.checkpoint_dir,
+        }
+        # 使用 spawn：MediaPipe 與 Flask 已在目前行程初始化，fork 複製這些狀態並不安全
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_batch_worker_init,
+            initargs=(settings,),
+        )
+        try:
+            futures = {
+                executor.submit(_batch_worker_run, index, items[index]): index
+                for index in order
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # worker 行程本身異常（例如初始化失敗或被系統終止）
+                    result = {
+                        "index": index,
+                        "media_path": items[index].get("media_path"),
+                        "output_path": None,
+                        "error": f"{type(e).__name__}: {e}",
+                        "elapsed_s": 0.0,
+                    }
+                yield _record(result)
+        finally:
+            # 呼叫端提早結束迭代時，取消尚未開始的項目
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _file_size(path) -> int:
+    """檔案大小（bytes），讀取失敗時回傳 0"""
+    try:
+        return Path(path).stat().st_size
+    except (OSError, TypeError):
+        return 0
+
+
+def _run_batch_item(processor: MediaProcessor, index: int, item: dict) -> dict:
+    """處理批次中的一個項目，錯誤記錄在結果中而不拋出"""
+    start = time.perf_counter()
+    media_path = item.get("media_path")
+    output_path = None
+    error = None
+    # 每個項目使用自己的檢查點子目錄
+    checkpoint_dir = processor.checkpoint_dir
+    if checkpoint_dir is not None:
+        processor.checkpoint_dir = checkpoint_dir / str(index)
+    try:
+        output_path = processor.process(
+            Path(media_path),
+            item["mode"],
+            item.get("selected_face_ids"),
+            item.get("overlay_path"),
+            item.get("output_path"),
+            item.get("landmarks_path"),
+            item.get("face_modes"),
+        )
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        processor.checkpoint_dir = checkpoint_dir
+    return {
+        "index": index,
+        "media_path": media_path,
+        "output_path": output_path,
+        "error": error,
+        "elapsed_s": time.perf_counter() - start,
+    }
+
+
+# 批次處理與分段偵測 worker 行程中的處理器（每個行程一個，偵測器由行程內的偵測器池持有）
+_WORKER_PROCESSOR: Optional[MediaProcessor] = None
+
+
+def _batch_worker_init(settings: dict):
+    """worker 行程初始化：載入 app 並預先建立人臉偵測器"""
+    global _WORKER_PROCESSOR
+    # 每個批次 worker 本身就是獨立的偵測行程，不再另外啟動偵測服務，影片也不再分段交給更多行程
+    os.environ["DETECTION_SERVICE_WORKERS"] = "0"
+    os.environ["VIDEO_SEGMENT_WORKERS"] = "0"
+    _WORKER_PROCESSOR = MediaProcessor(**settings)
+    # 匯入 app 時會預先建立照片用的偵測器（照片一律以最低靈敏度偵測，與處理器的靈敏度無關）
+    _WORKER_PROCESSOR._get_app_funcs()
+
+
+def _batch_worker_run(index: int, item: dict) -> dict:
+    return _run_batch_item(_WORKER_PROCESSOR, index, item)
+
+
+def _segment_worker_run(
+    video_path: str, start: int, end: Optional[int], warmup: int, fps: float, track_path: str, meta: dict
+) -> dict:
+    return _WORKER_PROCESSOR._analyze_video_segment(Path(video_path), start, end, warmup, fps, Path(track_path), **meta)
 
 
 # 便利函數：快速處理
@@ -377,17 +1208,23 @@ def process_media(
     selected_face_ids: Optional[List[int]] = None,
     overlay_path: Optional[Path] = None,
     output_path: Optional[Path] = None,
+    crowd_mode: bool = False,
+    landmarks_path: Optional[Path] = None,
+    face_modes: Optional[Dict[int, str]] = None,
 ) -> Path:
     """
     快速處理媒體檔案的便利函數
     
     參數:
         media_path: 輸入媒體檔案路徑
-        mode: 處理模式 ('mosaic', 'eyes', 'replace')
+        mode: 處理模式 ('mosaic', 'blur', 'eyes', 'replace')
         sensitivity: 人臉偵測靈敏度 (0.3-0.9)
         selected_face_ids: 要處理的人臉 ID 列表
         overlay_path: 替換模式用的覆蓋圖片路徑
         output_path: 輸出檔案路徑
+        crowd_mode: 人群模式（照片分塊偵測）
+        landmarks_path: 特徵點檔路徑（見 MediaProcessor.process_image）
+        face_modes: 逐臉處理計畫（見 MediaProcessor.process_image）
     
     回傳:
         輸出檔案路徑
@@ -400,7 +1237,31 @@ def process_media(
             selected_face_ids=[0, 1],
         )
     """
-    processor = MediaProcessor(sensitivity=sensitivity)
+    processor = MediaProcessor(sensitivity=sensitivity, crowd_mode=crowd_mode)
     return processor.process(
-        media_path, mode, selected_face_ids, overlay_path, output_path
+        media_path, mode, selected_face_ids, overlay_path, output_path, landmarks_path, face_modes
     )
+
+
+
+def process_media_batch(
+    items: Iterable[dict],
+    workers: Optional[int] = None,
+    sensitivity: float = 0.6,
+    crowd_mode: bool = False,
+) -> List[dict]:
+    """
+    批次處理媒體檔案的便利函數（等待全部完成）
+    
+    參數:
+        items: 要處理的項目（格式見 MediaProcessor.process_batch）
+        workers: worker 行程數（None 時使用 CPU 核心數）
+        sensitivity: 人臉偵測靈敏度 (0.3-0.9)
+        crowd_mode: 人群模式（照片分塊偵測）
+    
+    回傳:
+        依輸入順序排列的結果列表
+    """
+    processor = MediaProcessor(sensitivity=sensitivity, crowd_mode=crowd_mode)
+    results = list(processor.process_batch(items, workers=workers))
+    return sorted(results, key=lambda r: r["index"])
@@ -163,7 +163,7 @@ class Media(db.Model):
     file_type = db.Column(db.String(10), nullable=False)  # 檔案類型（image 或 video）
     upload_path = db.Column(db.String(500))  # 上傳檔案的儲存路徑
     output_path = db.Column(db.String(500))  # 處理後檔案的儲存路徑
-    process_mode = db.Column(db.String(20))  # 處理模式（mosaic：馬賽克 / eyes：遮眼 / replace：替換）
+    process_mode = db.Column(db.String(20))  # 處理模式（mosaic：馬賽克 / blur：模糊 / eyes：遮眼 / replace：替換 / mixed：逐臉混合）
     face_count = db.Column(db.Integer, default=0)  # 偵測到的人臉數量
     status = db.Column(db.String(20), default="uploaded")  # 檔案狀態（uploaded：已上傳 / processed：已處理）
     created_at = db.Column(db.DateTime, default=datetime.now)  # 上傳時間
@@ -363,3 +363,49 @@ class ExhibitionPhoto(db.Model):
     
     def __repr__(self):
         return f"<ExhibitionPhoto {self.id}>"
+
+
+class ProcessingJob(db.Model):
+    """
+    處理工作資料表
+    /process 送出的處理要求先排入這裡，由 worker（網站行程內的背景執行緒或獨立的 worker 行程）租用後處理；
+    租約到期（worker 中斷）的工作會被其他 worker 重新租用
+    """
+    __tablename__ = "processing_jobs"
+
+    # 狀態常數
+    STATE_QUEUED = "queued"
+    STATE_RUNNING = "running"
+    STATE_SUCCEEDED = "succeeded"
+    STATE_FAILED = "failed"
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), unique=True, nullable=False, index=True)  # 對外識別碼（隨機）
+    media_id = db.Column(db.String(50), nullable=False, index=True)  # 處理的媒體（完成後為改名後的 media_id）
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True, index=True)  # 送出的使用者
+    params = db.Column(db.Text, nullable=False)  # 處理參數（JSON：mode、selected_ids、face_modes、overlay_ext）
+    state = db.Column(db.String(20), nullable=False, default=STATE_QUEUED, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # 已租用次數
+    stage = db.Column(db.String(20))  # 目前階段（detect / render / process）
+    frames_done = db.Column(db.Integer, nullable=False, default=0)  # 目前階段已完成的幀數
+    frames_total = db.Column(db.Integer, nullable=False, default=0)  # 目前階段的總幀數（0 表示未知）
+    error = db.Column(db.Text)  # 失敗原因
+    lease_owner = db.Column(db.String(100))  # 租用中的 worker（主機名稱:行程:執行緒）
+    lease_expires_at = db.Column(db.DateTime, index=True)  # 租約到期時間（worker 定期延長）
+    heartbeat_at = db.Column(db.DateTime)  # 最後一次延長租約的時間
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)  # 排入時間
+    started_at = db.Column(db.DateTime)  # 最近一次開始處理的時間
+    stage_started_at = db.Column(db.DateTime)  # 目前階段開始的時間（估計剩餘時間用）
+    finished_at = db.Column(db.DateTime)  # 完成（成功或失敗）時間
+
+    @property
+    def progress(self) -> float:
+        """目前階段的進度（0-1）；成功時為 1"""
+        if self.state == self.STATE_SUCCEEDED:
+            return 1.0
+        if not self.frames_total:
+            return 0.0
+        return min(1.0, self.frames_done / self.frames_total)
+
+    def __repr__(self):
+        return f"<ProcessingJob {self.job_id} {self.state}>"
@@ -0,0 +1,119 @@
+"""
+NMS（非極大值抑制）模組：以 NumPy 一次計算整個 IoU 矩陣
+照片、影片與分塊偵測共用，支援依偵測信心度排序與 Soft-NMS
+"""
+from typing import List, Optional
+
+import numpy as np
+
+
+NMS_HARD = "hard"
+NMS_SOFT = "soft"
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    計算兩組矩形之間的 IoU 矩陣
+
+    參數:
+        boxes_a: (N, 4) 的 (x, y, w, h)
+        boxes_b: (M, 4) 的 (x, y, w, h)，None 時與 boxes_a 自身比較
+
+    回傳:
+        (N, M) float64 矩陣，0 表示完全不重疊，1 表示完全重疊
+    """
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = a if boxes_b is None else np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = inter_w * inter_h
+
+    area_a = a[:, 2:3] * a[:, 3:4]
+    area_b = b[:, 2] * b[:, 3]
+    union = area_a + area_b - inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou = np.where(union > 0, inter / union, 0.0)
+    return iou
+
+
+def nms(
+    boxes,
+    scores: Optional[np.ndarray] = None,
+    iou_thresh: float = 0.45,
+    method: str = NMS_HARD,
+    sigma: float = 0.5,
+    score_thresh: float = 0.05,
+    max_overlap: float = 0.7,
+) -> List[int]:
+    """
+    非極大值抑制
+
+    參數:
+        boxes: (N, 4) 的 (x, y, w, h)
+        scores: (N,) 偵測信心度；None 或全為 NaN 時改用面積當作分數（大的優先）。
+            部分為 NaN（沒有信心度的臉）時排在有信心度的框之後，且不會因分數過低被移除
+        iou_thresh: IoU 閾值，超過此值視為重疊（hard 模式移除，soft 模式降分）
+        method: 'hard'（直接移除）或 'soft'（依重疊程度以高斯函數降低分數）
+        sigma: Soft-NMS 的高斯參數，越小抑制越強
+        score_thresh: Soft-NMS 降分後低於「原始最高分 × score_thresh」的框會被移除
+        max_overlap: Soft-NMS 中與已保留的框 IoU 超過此值時視為同一張臉，直接移除（不只降分）
+
+    回傳:
+        要保留的索引列表（依分數由高到低）
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    n = len(boxes)
+    if n == 0:
+        return []
+
+    unscored = np.zeros(n, dtype=bool)
+    if scores is None or np.isnan(np.asarray(scores, dtype=np.float64)).all():
+        scores = boxes[:, 2] * boxes[:, 3]  # 沒有信心度時用面積當作分數
+    else:
+        scores = np.asarray(scores, dtype=np.float64)
+        unscored = np.isnan(scores)
+        scores = np.nan_to_num(scores, nan=0.0)
+
+    iou = iou_matrix(boxes)
+
+    if method == NMS_SOFT:
+        return _soft_nms(iou, scores.copy(), unscored, iou_thresh, sigma, score_thresh, max_overlap)
+    if method != NMS_HARD:
+        raise ValueError(f"不支援的 NMS 模式: {method}")
+
+    # 依分數由高到低排序（分數相同時維持原本順序）
+    order = np.argsort(-scores, kind="stable")
+    suppressed = np.zeros(n, dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(int(i))
+        suppressed |= iou[i] > iou_thresh
+    return keep
+
+
+def _soft_nms(iou, scores, unscored, iou_thresh, sigma, score_thresh, max_overlap) -> List[int]:
+    """
+    Gaussian Soft-NMS：重疊的框不直接移除，而是依 IoU 降低分數；
+    重疊超過 max_overlap 的框視為重複偵測直接移除，沒有信心度（unscored）的框不套用分數下限
+    """
+    min_score = scores.max() * score_thresh
+    alive = np.ones(len(scores), dtype=bool)
+    keep = []
+    while alive.any():
+        i = int(np.argmax(np.where(alive, scores, -np.inf)))
+        keep.append(i)
+        alive[i] = False
+        overlap = iou[i]
+        decay = np.where(overlap > iou_thresh, np.exp(-(overlap ** 2) / sigma), 1.0)
+        scores = np.where(alive, scores * decay, scores)
+        alive &= (scores >= min_score) | unscored
+        alive &= overlap <= max_overlap
+    return keep
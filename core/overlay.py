@@ -0,0 +1,105 @@
+"""
+替換模式的覆蓋圖模組：覆蓋圖只前處理一次，每張臉的混合只用整數運算
+覆蓋圖轉為預乘 alpha（premultiplied）的 BGRA，並建立尺寸分級（每級以 INTER_AREA 長寬減半）；
+每個人臉尺寸從不小於該尺寸的最小一級縮放，結果以 LRU 快取，影片中尺寸穩定的臉不必每幀重新縮放。
+大張覆蓋圖縮到小臉時只需處理接近的分級，且縮圖有做區域平均（舊版直接線性縮放會有鋸齒）。
+混合使用 OpenCV 的 uint8 運算（結果 = 預乘色彩 + 原圖 * (255 - alpha) / 255），不轉成浮點數。
+"""
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class PreparedOverlay:
+    """
+    前處理過的覆蓋圖（可在多個影格、多張臉之間共用，執行緒安全）
+
+    範例:
+        overlay = PreparedOverlay(rgba)
+        overlay.blend_into(image[y : y + h, x : x + w])
+    """
+
+    def __init__(self, overlay_rgba: np.ndarray, max_cached_sizes: int = 64):
+        """
+        參數:
+            overlay_rgba: 含 alpha 通道的覆蓋圖（_load_overlay_rgba 的回傳值，色彩為 BGR 順序）
+            max_cached_sizes: 保留的縮放結果數量上限
+        """
+        bgr = np.ascontiguousarray(overlay_rgba[:, :, :3])
+        alpha = np.ascontiguousarray(overlay_rgba[:, :, 3])
+        self.opaque = bool(alpha.min() == 255)
+        premultiplied = cv2.multiply(bgr, cv2.cvtColor(alpha, cv2.COLOR_GRAY2BGR), scale=1 / 255)
+        # 預乘後再縮放，半透明邊緣不會混入透明區域的顏色
+        self._levels: List[np.ndarray] = [cv2.merge([premultiplied, alpha])]
+        self._max_items = max(1, int(max_cached_sizes))
+        self._sizes: "OrderedDict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    @property
+    def shape(self):
+        return self._levels[0].shape
+
+    def _level_for(self, width: int, height: int) -> np.ndarray:
+        """取得長寬都不小於目標尺寸的最小一級（需要時才建立下一級）"""
+        level = self._levels[0]
+        index = 0
+        while level.shape[1] >= width * 2 and level.shape[0] >= height * 2:
+            index += 1
+            if index == len(self._levels):
+                half = ((level.shape[1] + 1) // 2, (level.shape[0] + 1) // 2)
+                self._levels.append(cv2.resize(level, half, interpolation=cv2.INTER_AREA))
+            level = self._levels[index]
+        return level
+
+    def resized(self, width: int, height: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        取得指定尺寸的覆蓋圖
+
+        回傳:
+            (預乘色彩 BGR, 255 - alpha 的三通道陣列)；完全不透明的覆蓋圖第二項為 None。
+            回傳的陣列會被快取共用，請勿修改。
+        """
+        key = (int(width), int(height))
+        with self._lock:
+            cached = self._sizes.get(key)
+            if cached is not None:
+                self._sizes.move_to_end(key)
+                self._stats["hits"] += 1
+                return cached
+            self._stats["misses"] += 1
+            level = self._level_for(*key)
+            shrink = key[0] * key[1] < level.shape[0] * level.shape[1]
+            resized = cv2.resize(level, key, interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR)
+            premultiplied = cv2.cvtColor(resized, cv2.COLOR_BGRA2BGR)
+            inv_alpha = None
+            if not self.opaque:
+                inv_alpha = cv2.cvtColor(255 - resized[:, :, 3], cv2.COLOR_GRAY2BGR)
+            entry = (premultiplied, inv_alpha)
+            self._sizes[key] = entry
+            while len(self._sizes) > self._max_items:
+                self._sizes.popitem(last=False)
+            return entry
+
+    def blend_into(self, roi: np.ndarray):
+        """把覆蓋圖縮放到 roi 的尺寸並就地混合（roi 為 BGR uint8，可為原圖的切片）"""
+        h, w = roi.shape[:2]
+        premultiplied, inv_alpha = self.resized(w, h)
+        if inv_alpha is None:
+            roi[:] = premultiplied
+            return
+        # 原圖 * (255 - alpha) / 255（四捨五入），再加上預乘色彩；兩步都直接寫回 roi
+        cv2.multiply(roi, inv_alpha, dst=roi, scale=1 / 255)
+        cv2.add(roi, premultiplied, dst=roi)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "cached_sizes": len(self._sizes),
+                "levels": len(self._levels),
+                "opaque": self.opaque,
+            }
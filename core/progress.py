@@ -0,0 +1,150 @@
+"""
+處理進度發布模組：MediaProcessor 逐幀回報的進度經過節流與合併後發布，供 SSE 串流即時推送
+處理器每完成一幀就呼叫一次 on_progress，若每次都通知訂閱者（或寫入資料庫），4K 影片每秒數十次的
+鎖競爭與序列化會拖慢處理；ProgressReporter 每幀只記錄數值，距離上次發布超過設定的間隔
+（或階段改變、階段完成）時才發布一次。ProgressHub 每個 key 只保留最新的一筆，訂閱者醒來時
+直接取得最新狀態，中間來不及送出的更新會被合併。
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Hashable, Optional
+
+# 預設的發布間隔（秒）
+DEFAULT_PUBLISH_INTERVAL = 0.5
+# 保留最新進度的 key 數量上限（已結束的工作保留一段時間，讓晚連上的訂閱者取得最終狀態）
+DEFAULT_MAX_CHANNELS = 256
+
+
+class ProgressReporter:
+    """
+    傳給 MediaProcessor 的 on_progress：節流後把進度交給 publish
+
+    每幀只更新幾個屬性與讀取一次時鐘；階段改變、階段完成或距離上次發布超過 interval 秒時，
+    以 snapshot() 的內容呼叫 publish（在處理的執行緒中同步呼叫，publish 拋出的例外會中止處理）。
+
+    範例:
+        reporter = ProgressReporter(lambda progress: hub.publish(job_id, progress))
+        MediaProcessor(on_progress=reporter).process(...)
+    """
+
+    def __init__(self, publish: Callable[[dict], None], interval: float = DEFAULT_PUBLISH_INTERVAL):
+        """
+        參數:
+            publish: 發布函數 publish(snapshot)
+            interval: 同一階段內兩次發布的最短間隔（秒）
+        """
+        self._publish = publish
+        self.interval = interval
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self.latest = {}  # 最近一次發布的進度
+        self._stage_started = 0.0
+        self._stage_started_at = None
+        self._next = 0.0
+
+    def __call__(self, stage: str, done: int, total: int):
+        self.done = done
+        self.total = total
+        now = time.monotonic()
+        if stage != self.stage:
+            self.stage = stage
+            self._stage_started = now
+            self._stage_started_at = datetime.now()
+        elif now < self._next and done != total:
+            return
+        self._next = now + self.interval
+        self.latest = self.snapshot(now)
+        self._publish(self.latest)
+
+    def snapshot(self, now: Optional[float] = None) -> dict:
+        """
+        目前的進度
+
+        回傳:
+            {"stage", "frames_done", "frames_total", "stage_started_at", "fps", "eta_s"}；
+            fps 與 eta_s 依目前階段的平均速度計算，尚無法估計時為 None
+        """
+        elapsed = (now if now is not None else time.monotonic()) - self._stage_started
+        done, total = self.done, self.total
+        fps = done / elapsed if done and elapsed > 0 else None
+        return {
+            "stage": self.stage,
+            "frames_done": done,
+            "frames_total": total,
+            "stage_started_at": self._stage_started_at,
+            "fps": fps,
+            "eta_s": max(0.0, (total - done) / fps) if fps and total else None,
+        }
+
+
+class ProgressHub:
+    """
+    行程內的進度發布與訂閱（執行緒安全）：每個 key 只保留最新的一筆與版本號
+
+    範例:
+        hub.publish(job_id, {"state": "running", ...})
+        version, progress = hub.wait(job_id, version, timeout=1.0)  # 版本改變或逾時才返回
+    """
+
+    def __init__(self, max_channels: int = DEFAULT_MAX_CHANNELS):
+        self._max_channels = max(1, int(max_channels))
+        self._channels: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._version = 0
+
+    def publish(self, key: Hashable, data: dict):
+        """發布 key 的最新進度（取代尚未送出的上一筆），並喚醒等待中的訂閱者"""
+        with self._cond:
+            self._version += 1
+            self._channels[key] = (self._version, dict(data))
+            self._channels.move_to_end(key)
+            while len(self._channels) > self._max_channels:
+                self._channels.popitem(last=False)
+            self._cond.notify_all()
+
+    def get(self, key: Hashable) -> tuple:
+        """
+        回傳:
+            (版本號, 最新進度)；沒有發布過時為 (0, None)
+        """
+        with self._cond:
+            return self._channels.get(key, (0, None))
+
+    def wait(self, key: Hashable, version: int, timeout: float) -> tuple:
+        """
+        等待 key 發布比 version 新的進度
+
+        回傳:
+            (版本號, 最新進度)；逾時時回傳目前的狀態（版本號可能與 version 相同）
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                current = self._channels.get(key, (0, None))
+                remaining = deadline - time.monotonic()
+                if current[0] != version or remaining <= 0:
+                    return current
+                self._cond.wait(remaining)
+
+    def clear(self):
+        with self._cond:
+            self._channels.clear()
+
+
+def estimate_rate(frames_done: int, stage_started_at: Optional[datetime], frames_total: int) -> tuple:
+    """
+    由階段開始時間估計處理速度與剩餘時間（資料庫中的進度沒有 fps 時使用）
+
+    回傳:
+        (fps, eta_s)；無法估計時為 None
+    """
+    if not frames_done or not stage_started_at:
+        return None, None
+    elapsed = (datetime.now() - stage_started_at) / timedelta(seconds=1)
+    if elapsed <= 0:
+        return None, None
+    fps = frames_done / elapsed
+    return fps, (max(0.0, (frames_total - frames_done) / fps) if frames_total else None)
@@ -0,0 +1,155 @@
+"""
+分塊人臉偵測模組（人群模式）：針對高解析度的展覽人群照片
+MediaPipe 的人臉偵測只能找到佔畫面一定比例以上的臉，整張大圖直接偵測會漏掉遠處的小臉。
+這裡把影像切成重疊的小區塊，並以多層縮放（影像金字塔）涵蓋不同大小的臉，
+各區塊平行偵測後換回原圖座標，再以 NMS 合併。
+每個區塊只會複製「區塊大小」的資料，記憶體用量與區塊大小有關，與原圖大小無關。
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from core.face_landmarks import FaceLandmarks
+from core.nms import nms, NMS_HARD
+
+
+# 預設區塊大小（像素）：約 45-120 像素的臉在此大小的區塊中偵測效果最好
+DEFAULT_TILE_SIZE = 256
+# 相鄰區塊重疊比例：不超過「區塊大小 × 重疊比例」的臉一定會完整落在某個區塊內
+DEFAULT_OVERLAP = 0.25
+# 預設最多保留的人臉數量
+DEFAULT_MAX_FACES = 100
+
+# 區塊：(層級縮放比例, 原圖 x1, y1, x2, y2)
+Tile = Tuple[float, int, int, int, int]
+
+
+def _axis_starts(length: int, window: int, stride: int) -> List[int]:
+    """單一軸上的區塊起點（最後一塊貼齊邊界）"""
+    if length <= window:
+        return [0]
+    starts = list(range(0, length - window, stride))
+    starts.append(length - window)
+    return starts
+
+
+def tile_grid(
+    width: int,
+    height: int,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    overlap: float = DEFAULT_OVERLAP,
+) -> List[Tile]:
+    """
+    產生影像金字塔各層的區塊
+
+    第 0 層以原始解析度切塊，之後每層縮小一半（區塊在原圖上涵蓋的範圍加倍），
+    直到一個區塊可以涵蓋整張影像為止。
+
+    回傳:
+        [(scale, x1, y1, x2, y2), ...]，座標為原圖座標；scale 為偵測時的縮放比例
+    """
+    tiles: List[Tile] = []
+    scale = 1.0
+    while True:
+        window = int(round(tile_size / scale))
+        stride = max(1, int(window * (1 - overlap)))
+        for y in _axis_starts(height, window, stride):
+            for x in _axis_starts(width, window, stride):
+                tiles.append((scale, x, y, min(width, x + window), min(height, y + window)))
+        if window >= max(width, height):
+            break
+        scale /= 2
+    return tiles
+
+
+def _detect_tile(
+    image_bgr: np.ndarray,
+    tile: Tile,
+    detect_fn: Callable[[np.ndarray], FaceLandmarks],
+    edge_margin: float,
+) -> FaceLandmarks:
+    """偵測單一區塊，回傳原圖座標的結果（丟棄被區塊內側邊緣切到的臉）"""
+    scale, x1, y1, x2, y2 = tile
+    region = image_bgr[y1:y2, x1:x2]  # view，不複製原圖
+    if scale != 1.0:
+        w = max(1, int(round((x2 - x1) * scale)))
+        h = max(1, int(round((y2 - y1) * scale)))
+        region = cv2.resize(region, (w, h), interpolation=cv2.INTER_AREA)
+    landmarks = detect_fn(region)
+    if not landmarks:
+        return landmarks
+
+    # 被內側邊緣切到的臉會在相鄰區塊（或下一層）完整出現，這裡先丟棄
+    h_img, w_img = image_bgr.shape[:2]
+    rh, rw = region.shape[:2]
+    ext = landmarks.extents()
+    keep = np.ones(len(landmarks), dtype=bool)
+    if x1 > 0:
+        keep &= ext[:, 0] > edge_margin
+    if y1 > 0:
+        keep &= ext[:, 1] > edge_margin
+    if x2 < w_img:
+        keep &= ext[:, 2] < rw - edge_margin
+    if y2 < h_img:
+        keep &= ext[:, 3] < rh - edge_margin
+    landmarks = landmarks.select(np.flatnonzero(keep))
+    return landmarks.transformed(scale=1.0 / scale, dx=x1, dy=y1)
+
+
+def detect_tiled(
+    image_bgr: np.ndarray,
+    detect_fn: Callable[[np.ndarray], FaceLandmarks],
+    tile_size: int = DEFAULT_TILE_SIZE,
+    overlap: float = DEFAULT_OVERLAP,
+    max_faces: Optional[int] = DEFAULT_MAX_FACES,
+    workers: Optional[int] = None,
+    iou_thresh: float = 0.45,
+    nms_method: str = NMS_HARD,
+    edge_margin: float = 2.0,
+) -> FaceLandmarks:
+    """
+    分塊平行偵測人臉
+
+    參數:
+        image_bgr: 原始影像（BGR）
+        detect_fn: 偵測單一區塊的函數，回傳區塊座標的 FaceLandmarks（不需邊界框）；
+                   會在多個執行緒中同時呼叫，每次呼叫須使用各自的偵測器
+        tile_size: 區塊大小（像素）
+        overlap: 相鄰區塊重疊比例（0-0.9）
+        max_faces: 最多保留的人臉數量（None 表示不限制）
+        workers: 平行執行緒數（None 時使用 CPU 核心數）
+        iou_thresh, nms_method: 合併各區塊結果時的 NMS 參數
+        edge_margin: 距離區塊內側邊緣多少像素以內的臉視為被切到
+
+    回傳:
+        原圖座標的 FaceLandmarks（含邊界框），依分數（或面積）由高到低排序
+    """
+    h_img, w_img = image_bgr.shape[:2]
+    overlap = max(0.0, min(0.9, overlap))
+    tiles = tile_grid(w_img, h_img, tile_size, overlap)
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or len(tiles) == 1:
+        parts = [_detect_tile(image_bgr, t, detect_fn, edge_margin) for t in tiles]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(tiles))) as executor:
+            parts = list(executor.map(
+                lambda t: _detect_tile(image_bgr, t, detect_fn, edge_margin), tiles
+            ))
+
+    merged = FaceLandmarks.concatenate(parts)
+    if not merged:
+        return merged
+
+    boxes = merged.compute_boxes(w_img, h_img)
+    valid = np.flatnonzero((boxes[:, 2] > 0) & (boxes[:, 3] > 0))
+    merged = merged.select(valid)
+    merged.boxes = boxes[valid]
+
+    keep = nms(merged.boxes, merged.scores, iou_thresh=iou_thresh, method=nms_method)
+    if max_faces is not None:
+        keep = keep[:max_faces]
+    return merged.select(keep)
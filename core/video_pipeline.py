@@ -0,0 +1,214 @@
+"""
+影片處理管線模組：解碼、偵測與渲染、編碼分成三個階段同時進行
+以前每一幀依序執行 cap.read()、偵測、套用效果、writer.write()，解碼與編碼時 CPU 其他核心閒置；
+OpenCV 在解碼、編碼與縮放時會釋放 GIL，因此這裡讓解碼與編碼各自在獨立的執行緒執行，
+偵測與渲染留在呼叫端的執行緒（偵測器的時間戳與追蹤狀態需要依序處理）。
+
+影格陣列來自固定數量的緩衝區池：解碼執行緒只能解碼到空閒的緩衝區，編碼完成後才歸還，
+因此在途的影格數（記憶體用量）有上限，某個階段較慢時其他階段會自動等待（backpressure）。
+"""
+import queue
+import threading
+import time
+from typing import Iterator
+
+import numpy as np
+
+# 預設的在途影格數（緩衝區池大小）；4K 影格每張約 25MB
+DEFAULT_PIPELINE_FRAMES = 6
+
+# 佇列結束標記
+_END = object()
+
+
+class _StageTimer:
+    """累計單一階段的工作時間與等待時間（秒）"""
+
+    __slots__ = ("busy", "idle")
+
+    def __init__(self):
+        self.busy = 0.0
+        self.idle = 0.0
+
+    def as_dict(self, wall: float) -> dict:
+        return {
+            "busy_s": round(self.busy, 4),
+            "idle_s": round(self.idle, 4),
+            "utilization": round(self.busy / wall, 4) if wall > 0 else 0.0,
+        }
+
+
+class VideoPipeline:
+    """
+    解碼 → 處理 → 編碼 管線（with 區塊內使用，離開時停止並等待執行緒結束）
+
+    迭代取得每一幀（依序），就地處理後以 write 送出；write 必須在取得下一幀之前呼叫，
+    送出後影格陣列會交給編碼執行緒，之後不可再修改。max_frames 為 0 時不啟動執行緒，
+    在呼叫端的執行緒依序解碼與編碼（結果相同）。
+
+    範例:
+        with VideoPipeline(cap, writer, first_frame) as pipeline:
+            for frame in pipeline:
+                processed = render(frame, out=frame)
+                pipeline.write(processed)
+        print(pipeline.stats())
+    """
+
+    def __init__(self, cap, writer, first_frame: np.ndarray, max_frames: int = DEFAULT_PIPELINE_FRAMES):
+        """
+        參數:
+            cap: cv2.VideoCapture（first_frame 已先讀出）
+            writer: cv2.VideoWriter
+            first_frame: 第一幀（也作為緩衝區池的第一個緩衝區）
+            max_frames: 在途影格數上限（至少 3：解碼中、處理中、編碼中各一張）；0 表示不使用執行緒
+        """
+        self._cap = cap
+        self._writer = writer
+        self._first_frame = first_frame
+        self._threaded = max_frames > 0
+        self._max_frames = max(3, int(max_frames)) if self._threaded else 1
+        self._free: "queue.Queue" = queue.Queue()
+        self._decoded: "queue.Queue" = queue.Queue()
+        self._encode: "queue.Queue" = queue.Queue()
+        self._stop = threading.Event()
+        self._errors = []
+        self._threads = []
+        self._current = None
+        self._timers = {"decode": _StageTimer(), "process": _StageTimer(), "encode": _StageTimer()}
+        self._frames = 0
+        self._start = None
+        self._wall = 0.0
+
+    def __enter__(self) -> "VideoPipeline":
+        self._start = time.perf_counter()
+        if self._threaded:
+            for _ in range(self._max_frames - 1):
+                self._free.put(np.empty_like(self._first_frame))
+            self._threads = [
+                threading.Thread(target=self._decode_loop, name="video-decode", daemon=True),
+                threading.Thread(target=self._encode_loop, name="video-encode", daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(raise_errors=exc_type is None)
+        return False
+
+    def close(self, raise_errors: bool = True):
+        """停止解碼、等待已送出的影格編碼完畢，並結束執行緒；raise_errors 時拋出解碼或編碼執行緒的錯誤"""
+        if self._threaded and self._threads:
+            self._stop.set()
+            self._encode.put(_END)
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+        if self._start is not None:
+            self._wall = time.perf_counter() - self._start
+        if raise_errors:
+            self._raise_errors()
+
+    def _raise_errors(self):
+        if self._errors:
+            error = self._errors[0]
+            self._errors.clear()
+            raise error
+
+    def _decode_loop(self):
+        timer = self._timers["decode"]
+        try:
+            self._decoded.put(self._first_frame)  # 第一幀已由呼叫端解碼
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                try:
+                    buf = self._free.get(timeout=0.1)
+                except queue.Empty:
+                    timer.idle += time.perf_counter() - t0
+                    continue
+                timer.idle += time.perf_counter() - t0
+                t0 = time.perf_counter()
+                ok, frame = self._cap.read(buf)
+                timer.busy += time.perf_counter() - t0
+                if not ok:
+                    return
+                self._decoded.put(frame)
+        except BaseException as e:
+            self._errors.append(e)
+        finally:
+            self._decoded.put(_END)
+
+    def _encode_loop(self):
+        timer = self._timers["encode"]
+        while True:
+            t0 = time.perf_counter()
+            item = self._encode.get()
+            timer.idle += time.perf_counter() - t0
+            if item is _END:
+                return
+            processed, buf = item
+            if self._errors:
+                continue  # 發生錯誤後不再編碼，只清空佇列
+            t0 = time.perf_counter()
+            try:
+                self._writer.write(processed)
+            except BaseException as e:
+                self._errors.append(e)
+            timer.busy += time.perf_counter() - t0
+            self._free.put(buf)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        timer = self._timers["process"]
+        if not self._threaded:
+            frame = self._first_frame
+            while True:
+                t0, encode_busy = time.perf_counter(), self._timers["encode"].busy
+                yield frame
+                # write 在這段期間內同步編碼，編碼時間不計入處理階段
+                timer.busy += time.perf_counter() - t0 - (self._timers["encode"].busy - encode_busy)
+                t0 = time.perf_counter()
+                ok, frame = self._cap.read(frame)
+                self._timers["decode"].busy += time.perf_counter() - t0
+                if not ok:
+                    return
+        while True:
+            t0 = time.perf_counter()
+            frame = self._decoded.get()
+            timer.idle += time.perf_counter() - t0
+            if frame is _END:
+                self._raise_errors()
+                return
+            self._current = frame
+            t0 = time.perf_counter()
+            yield frame
+            timer.busy += time.perf_counter() - t0
+            self._raise_errors()
+
+    def write(self, processed: np.ndarray):
+        """送出目前這一幀的處理結果（依迭代順序編碼）"""
+        self._frames += 1
+        if not self._threaded:
+            t0 = time.perf_counter()
+            self._writer.write(processed)
+            self._timers["encode"].busy += time.perf_counter() - t0
+            return
+        self._encode.put((processed, self._current))
+        self._current = None
+
+    def stats(self) -> dict:
+        """
+        各階段的工作時間與等待時間
+
+        回傳:
+            {"frames", "wall_s", "fps", "threaded", "max_frames",
+             "decode" / "process" / "encode": {"busy_s", "idle_s", "utilization"}}
+        """
+        wall = self._wall or (time.perf_counter() - self._start if self._start is not None else 0.0)
+        return {
+            "frames": self._frames,
+            "wall_s": round(wall, 4),
+            "fps": round(self._frames / wall, 2) if wall > 0 else 0.0,
+            "threaded": self._threaded,
+            "max_frames": self._max_frames,
+            **{name: timer.as_dict(wall) for name, timer in self._timers.items()},
+        }
@@ -1,6 +1,6 @@
 -- ============================================================
 -- photobluuring 資料庫架構（MySQL）
--- 對應 core/models.py：users, media, exhibitions, exhibition_photos
+-- 對應 core/models.py：users, media, exhibitions, exhibition_photos, processing_jobs
 -- ============================================================
 
 -- 若需重建，可先 DROP 再執行（依賴順序：exhibition_photos -> media -> exhibitions -> users）
@@ -152,6 +152,38 @@ CREATE TABLE IF NOT EXISTS exhibition_photos (
     CONSTRAINT fk_exhibition_photos_exhibition FOREIGN KEY (exhibition_id) REFERENCES exhibitions(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- ------------------------------------------------------------
+-- 5. processing_jobs 處理工作（/process 排入、worker 租用後處理）
+-- ------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS processing_jobs (
+    id               INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    job_id           VARCHAR(32) NOT NULL,
+    media_id         VARCHAR(50) NOT NULL,
+    user_id          INT NULL,
+    params           TEXT NOT NULL,
+    state            VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts         INT NOT NULL DEFAULT 0,
+    stage            VARCHAR(20) NULL,
+    frames_done      INT NOT NULL DEFAULT 0,
+    frames_total     INT NOT NULL DEFAULT 0,
+    error            TEXT NULL,
+    lease_owner      VARCHAR(100) NULL,
+    lease_expires_at DATETIME NULL,
+    heartbeat_at     DATETIME NULL,
+    created_at       DATETIME NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at       DATETIME NULL,
+    stage_started_at DATETIME NULL,
+    finished_at      DATETIME NULL,
+    UNIQUE KEY ix_processing_jobs_job_id (job_id),
+    INDEX ix_processing_jobs_media_id (media_id),
+    INDEX ix_processing_jobs_user_id (user_id),
+    INDEX ix_processing_jobs_state (state),
+    INDEX ix_processing_jobs_lease_expires_at (lease_expires_at),
+    INDEX ix_processing_jobs_created_at (created_at),
+    CONSTRAINT fk_processing_jobs_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+-- worker 以 SELECT ... FOR UPDATE SKIP LOCKED 選取工作（需要 MySQL 8.0 以上）
+
 -- ============================================================
 -- 關聯簡表（畫 ER 圖用）
 -- ============================================================
@@ -164,6 +196,7 @@ CREATE TABLE IF NOT EXISTS exhibition_photos (
 -- exhibition_floors (1) ----< exhibition_cells : floor_id -> exhibition_floors.id
 -- exhibition_merged_regions (1) ----< exhibition_cells : merged_region_id -> exhibition_merged_regions.id
 -- media (M) ----< media_cells >---- (M) exhibition_cells : media_id/cell_id
+-- users (1) ----< processing_jobs : user_id -> users.id
 
 -- ============================================================
 -- 既有資料庫升級：合併區功能（若已存在 exhibition_cells 表）
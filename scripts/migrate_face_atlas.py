@@ -0,0 +1,116 @@
+"""
+把舊版的逐臉截圖（previews/<media_id>_face_<n>.jpg）合併成每個媒體一張的拼貼圖
+並在 metadata/<media_id>_faces.json 的每張人臉加上 "sprite"（在拼貼圖中的位置），最後刪除舊截圖。
+可重複執行：已轉換過的媒體沒有舊截圖，會直接略過。不需要資料庫。
+
+用法:
+    python scripts/migrate_face_atlas.py            # 轉換並刪除舊截圖
+    python scripts/migrate_face_atlas.py --dry-run  # 只列出會轉換的媒體
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import cv2
+
+from core.face_atlas import crop_faces, pack_atlas
+
+PREVIEW_DIR = BASE_DIR / "previews"
+METADATA_DIR = BASE_DIR / "metadata"
+LEGACY_CROP = re.compile(r"^(?P<media_id>.+)_face_(?P<idx>\d+)\.jpg$")
+
+
+def _legacy_crops():
+    """依媒體分組舊截圖：{media_id: {人臉編號: 路徑}}（預覽目錄與 metadata 目錄都找）"""
+    groups = defaultdict(dict)
+    for base in (PREVIEW_DIR, METADATA_DIR):
+        for path in base.glob("*_face_*.jpg"):
+            match = LEGACY_CROP.match(path.name)
+            if match:
+                groups[match["media_id"]].setdefault(int(match["idx"]), path)
+    return groups
+
+
+def migrate_media(media_id: str, crops_by_idx: dict, dry_run: bool) -> int:
+    """轉換單一媒體，回傳放進拼貼圖的人臉數"""
+    meta_path = METADATA_DIR / f"{media_id}_faces.json"
+    items = []
+    if meta_path.exists():
+        with open(meta_path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+
+    ids = [item["id"] for item in items] if items else sorted(crops_by_idx)
+    crops = []
+    for face_id in ids:
+        img = cv2.imread(str(crops_by_idx[face_id])) if face_id in crops_by_idx else None
+        if img is None:
+            crops.append(None)
+        else:
+            crops.append(crop_faces(img, [(0, 0, img.shape[1], img.shape[0])])[0])
+    packed = sum(crop is not None for crop in crops)
+    if dry_run:
+        return packed
+
+    # 拼貼圖與 JSON 都先寫入暫存檔再取代，任一步失敗時保留舊截圖與原本的 JSON，下次可重新轉換
+    atlas, rects = pack_atlas(crops)
+    if atlas is not None:
+        atlas_path = PREVIEW_DIR / f"{media_id}_faces.jpg"
+        tmp_path = atlas_path.with_name(f"{media_id}_faces.tmp.jpg")
+        if not cv2.imwrite(str(tmp_path), atlas, [cv2.IMWRITE_JPEG_QUALITY, 90]):
+            tmp_path.unlink(missing_ok=True)
+            raise OSError(f"無法寫入拼貼圖 {atlas_path}")
+        os.replace(tmp_path, atlas_path)
+    if items:
+        for item, rect in zip(items, rects):
+            item.pop("file", None)
+            item["sprite"] = dict(zip(("x", "y", "w", "h"), map(int, rect))) if rect is not None else None
+        tmp_path = meta_path.with_name(f"{meta_path.name}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(items, f)
+            os.replace(tmp_path, meta_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    for path in crops_by_idx.values():
+        path.unlink()
+    return packed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把逐臉截圖合併成每個媒體一張的拼貼圖")
+    parser.add_argument("--dry-run", action="store_true", help="只列出會轉換的媒體，不修改檔案")
+    args = parser.parse_args()
+
+    groups = _legacy_crops()
+    if not groups:
+        print("沒有需要轉換的人臉截圖")
+        return 0
+
+    total_files = 0
+    for media_id, crops_by_idx in sorted(groups.items()):
+        try:
+            packed = migrate_media(media_id, crops_by_idx, args.dry_run)
+        except Exception as e:
+            print(f"✗ {media_id}: {e}")
+            continue
+        total_files += len(crops_by_idx)
+        print(f"{'○' if args.dry_run else '✓'} {media_id}: {len(crops_by_idx)} 張截圖 → 拼貼圖（{packed} 張人臉）")
+
+    action = "將合併" if args.dry_run else "已合併"
+    print(f"\n{action} {len(groups)} 個媒體、{total_files} 個截圖檔")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+獨立執行處理工作的 worker：從資料庫（processing_jobs）租用 /process 排入的工作並處理
+可以在多台主機上同時執行，各 worker 以資料列鎖與租約分配工作，不會重複處理；
+需要與網站使用同一個 DATABASE_URL，且能讀寫相同的 uploads/outputs/metadata 目錄（例如共用的網路磁碟）。
+網站主機只負責排入工作時，將網站的 JOB_WORKERS_IN_PROCESS 設為 0。
+
+用法:
+    python scripts/run_job_worker.py                 # 持續處理，Ctrl+C 在目前的工作完成後結束
+    python scripts/run_job_worker.py --once          # 處理到佇列清空後結束
+    python scripts/run_job_worker.py --name gpu-01   # 指定 worker 名稱（顯示在工作的 lease_owner）
+"""
+
+import argparse
+import signal
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+from app import app, _discard_job_checkpoint, _execute_process_job, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+from core.job_queue import DEFAULT_POLL_SECONDS, JobWorker, worker_name
+
+
+def main():
+    parser = argparse.ArgumentParser(description="從資料庫租用並處理 /process 排入的工作")
+    parser.add_argument("--once", action="store_true", help="處理到佇列清空後結束")
+    parser.add_argument("--name", default=None, help="worker 名稱（預設為 主機名稱:行程:執行緒）")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_SECONDS, help="佇列沒有工作時的查詢間隔（秒）")
+    args = parser.parse_args()
+
+    worker = JobWorker(
+        app,
+        _execute_process_job,
+        name=args.name,
+        lease_seconds=JOB_LEASE_SECONDS,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        poll_seconds=args.poll_interval,
+        on_failed=_discard_job_checkpoint,
+    )
+    print(f"處理工作 worker 啟動：{args.name or worker_name()}（租約 {worker.lease_seconds} 秒）")
+
+    if args.once:
+        count = 0
+        while worker.run_once():
+            count += 1
+        print(f"已處理 {count} 個工作")
+        return 0
+
+    def _stop(signum, frame):
+        print("收到結束訊號，目前的工作完成後結束")
+        worker.stop()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+    worker.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
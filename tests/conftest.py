@@ -0,0 +1,42 @@
+"""
+測試共用設定：匯入 app 前指定暫存的 SQLite 資料庫（不會連到開發用的 DATABASE_URL），
+並停用網站行程內的處理工作 worker（需要時由測試自行執行工作）
+"""
+import os
+import tempfile
+
+import cv2
+import pytest
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='photoblur-tests-'), 'test.db')}"
+os.environ["JOB_WORKERS_IN_PROCESS"] = "0"
+
+
+@pytest.fixture(scope="session")
+def web_app():
+    """匯入 app 模組（載入偵測模型），測試結束時關閉偵測器"""
+    import app
+
+    yield app
+    app.LANDMARKER_POOL.clear()
+
+
+def write_face_video(path, frames: int = 72, width: int = 320, height: int = 240, fps: float = 24.0):
+    """
+    寫入一支合成人臉由左向右移動的測試影片（benchmarks.synthetic 的人臉可被 MediaPipe 偵測到）
+
+    回傳:
+        影片路徑
+    """
+    from benchmarks.synthetic import make_background, make_face
+
+    background = make_background(width, height, seed=1)
+    face = make_face(120)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(frames):
+        frame = background.copy()
+        x = 10 + i * (width - 140) // max(1, frames - 1)
+        frame[60:180, x : x + 120] = face
+        writer.write(frame)
+    writer.release()
+    return path
@@ -0,0 +1,73 @@
+"""MediaProcessor.process_batch 的測試"""
+import cv2
+import numpy as np
+import pytest
+
+from conftest import write_face_video
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_batch_processes_largest_first_and_isolates_failures(web_app, tmp_path):
+    from core.media_processor import MediaProcessor
+
+    photo = tmp_path / "photo.png"
+    cv2.imwrite(str(photo), np.full((64, 64, 3), 128, np.uint8))
+    video = write_face_video(tmp_path / "faces.mp4", frames=12)
+    items = [
+        {"media_path": photo, "mode": "blur", "output_path": tmp_path / "photo_out.jpg"},
+        {"media_path": tmp_path / "missing.jpg", "mode": "blur"},
+        {"media_path": video, "mode": "mosaic", "output_path": tmp_path / "video_out.mp4"},
+    ]
+    processor = MediaProcessor(0.6, segment_workers=1)
+    results = list(processor.process_batch(items, workers=1))
+
+    # 大檔案先處理；失敗的項目不中斷其他項目
+    assert [result["index"] for result in results] == [2, 0, 1]
+    assert results[0]["output_path"].exists() and results[1]["output_path"].exists()
+    assert results[0]["error"] is None and results[1]["error"] is None
+    assert results[2]["output_path"] is None and results[2]["error"]
+    report = processor.last_batch_report
+    assert (report["total"], report["completed"], report["succeeded"], report["failed"]) == (3, 3, 2, 1)
+    assert report["wall_time_s"] > 0 and report["items_per_s"] > 0
+
+
+def test_batch_items_resume_from_their_own_checkpoints(web_app, tmp_path, monkeypatch):
+    from core.media_processor import MediaProcessor
+
+    videos = [write_face_video(tmp_path / f"faces{i}.mp4", width=320 + 32 * i) for i in range(2)]
+    items = [
+        {"media_path": video, "mode": "mosaic", "output_path": tmp_path / f"out{i}.mp4"}
+        for i, video in enumerate(videos)
+    ]
+    settings = {"sensitivity": 0.6, "detect_stride": 2, "segment_workers": 1, "checkpoint_frames": 24}
+    expected = [
+        MediaProcessor(**settings).process_video(video, "mosaic", output_path=tmp_path / f"expected{i}.mp4")
+        for i, video in enumerate(videos)
+    ]
+
+    analyze = MediaProcessor._analyze_video_segment
+
+    def interrupt_at_48(self, video_path, start, *args, **kwargs):
+        if start == 48:
+            raise Interrupted()
+        return analyze(self, video_path, start, *args, **kwargs)
+
+    # 第一次在目前行程依序處理，兩個項目都在第三段中斷
+    monkeypatch.setattr(MediaProcessor, "_analyze_video_segment", interrupt_at_48)
+    processor = MediaProcessor(**settings, checkpoint_dir=tmp_path / "batch.parts")
+    results = list(processor.process_batch(items, workers=1))
+    assert all(result["error"] for result in results)
+    assert processor.checkpoint_dir == tmp_path / "batch.parts"
+    for i in range(2):
+        assert len(list((tmp_path / "batch.parts" / str(i)).glob("seg*.lmk"))) == 2
+    monkeypatch.undo()
+
+    # 重新執行時由 worker 行程平行處理（檢查點與關鍵幀設定要一起傳給 worker），各自從自己的檢查點繼續
+    results = sorted(processor.process_batch(items, workers=2), key=lambda result: result["index"])
+    assert [result["error"] for result in results] == [None, None]
+    for i, result in enumerate(results):
+        assert result["output_path"].read_bytes() == expected[i].read_bytes()
+        assert not (tmp_path / "batch.parts" / str(i)).exists()
@@ -0,0 +1,26 @@
+"""benchmarks/bench_pipeline.py 的測試：基準測試可執行，並能與基準結果比較"""
+from benchmarks import bench_pipeline
+
+
+def test_run_measures_every_case(web_app):
+    report = bench_pipeline.run(list(bench_pipeline.BENCHMARKS), ["vga"], [1], repeat=2, detect_repeat=1)
+    assert report["meta"]["repeat"] == 2
+    assert set(report["results"]) == {f"{case}/vga/1f" for case in bench_pipeline.BENCHMARKS}
+    for stats in report["results"].values():
+        assert stats["n"] in (1, 2)
+        assert 0 <= stats["min_ms"] <= stats["p50_ms"] <= stats["max_ms"]
+        assert stats["faces"] == 1
+
+
+def test_compare_reports_regressions_above_threshold():
+    def report(**results):
+        return {"results": {case: {"p50_ms": ms} for case, ms in results.items()}}
+
+    baseline = report(mosaic=10.0, blur=10.0, eyes=10.0, tiny=0.01, removed=1.0)
+    current = report(mosaic=12.0, blur=8.0, eyes=10.5, tiny=0.05)
+    comparison = bench_pipeline.compare(current, baseline, threshold=0.15)
+    assert [item["case"] for item in comparison["regressions"]] == ["mosaic"]
+    assert [item["case"] for item in comparison["improvements"]] == ["blur"]
+    # 在門檻內或絕對差距太小的項目不視為退步
+    assert comparison["unchanged"] == 2
+    assert comparison["missing"] == ["removed"]
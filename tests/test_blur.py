@@ -0,0 +1,46 @@
+"""模糊模式（apply_blur 縮圖模糊）的測試"""
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_background, make_face
+
+
+@pytest.mark.parametrize("size", [60, 200, 600])
+def test_fast_blur_matches_full_size_gaussian(web_app, size):
+    image = make_background(1400, 1000, seed=5)
+    image[100 : 100 + size, 100 : 100 + size] = make_face(size)
+    out = web_app.apply_blur(image, [(100, 100, size, size)])
+
+    roi = image[100 : 100 + size, 100 : 100 + size]
+    expected = cv2.GaussianBlur(roi, (0, 0), web_app._blur_sigma(size, size))
+    # 不比較 ROI 邊緣（直接模糊時會混入 ROI 外的像素）
+    m = size // 4
+    diff = np.abs(out[100 + m : 100 + size - m, 100 + m : 100 + size - m].astype(np.int16) - expected[m:-m, m:-m])
+    assert diff.mean() < 2
+    # 只改寫人臉區域
+    np.testing.assert_array_equal(out[100 + size :], image[100 + size :])
+
+
+def test_blur_removes_detail_at_every_face_size(web_app):
+    rng = np.random.default_rng(0)
+    for size in (40, 400):
+        noise = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        blurred = web_app.apply_blur(noise, [(0, 0, size, size)])
+        # 模糊程度與人臉大小成比例：大小臉的殘留雜訊都很少
+        assert blurred.std() < noise.std() * 0.15
+
+
+def test_blur_mode_in_processor(web_app, tmp_path):
+    from core.media_processor import PROCESS_MODES, MediaProcessor
+
+    assert "blur" in PROCESS_MODES
+    image = make_background(640, 480, seed=4)
+    image[100:300, 200:400] = make_face(200)
+    cv2.imwrite(str(tmp_path / "face.png"), image)
+    out = MediaProcessor(0.5).process_image(tmp_path / "face.png", "blur", output_path=tmp_path / "out.png")
+    result = cv2.imread(str(out))
+    assert cv2.Laplacian(result[150:250, 250:350], cv2.CV_32F).var() < cv2.Laplacian(
+        image[150:250, 250:350], cv2.CV_32F
+    ).var()
+    np.testing.assert_array_equal(result[:60], image[:60])
@@ -0,0 +1,75 @@
+"""core.detection_cache 的測試"""
+import numpy as np
+
+from benchmarks.synthetic import make_background, make_face
+from core.detection_cache import DETECTION_CACHE_VERSION, DetectionCache, file_sha256, model_fingerprint
+from core.face_landmarks import NUM_LANDMARKS, FaceLandmarks
+
+
+def _faces():
+    rng = np.random.default_rng(0)
+    return FaceLandmarks(
+        rng.random((2, NUM_LANDMARKS, 3), dtype=np.float32) * 100,
+        np.array([[1, 2, 30, 40], [50, 60, 20, 20]]),
+        np.float32([0.9, np.nan]),
+    )
+
+
+def test_hit_after_put_in_memory_and_from_disk(tmp_path):
+    faces = _faces()
+    cache = DetectionCache(tmp_path, "v1-abc")
+    assert cache.get("hash", 0.6) is None
+    cache.put("hash", 0.6, faces, variant="img1280")
+    assert cache.get("hash", 0.61, variant="img1280") is faces  # 靈敏度量化後相同
+    assert cache.get("hash", 0.6) is None  # 偵測參數不同
+
+    # 另一個行程（新的快取物件）從磁碟讀取
+    other = DetectionCache(tmp_path, "v1-abc")
+    loaded = other.get("hash", 0.6, variant="img1280")
+    np.testing.assert_array_equal(loaded.points, faces.points)
+    np.testing.assert_array_equal(loaded.boxes, faces.boxes)
+    np.testing.assert_array_equal(loaded.scores, faces.scores)
+    assert other.stats()["disk_hits"] == 1
+    assert other.get("hash", 0.6, variant="img1280") is loaded  # 之後由記憶體命中
+    assert other.stats()["memory_hits"] == 1
+
+
+def test_model_version_change_invalidates_and_purges(tmp_path):
+    DetectionCache(tmp_path, "v1-abc").put("hash", 0.6, _faces())
+    cache = DetectionCache(tmp_path, "v1-def")
+    assert cache.get("hash", 0.6) is None
+    cache.put("hash", 0.6, _faces())
+    assert cache.purge_stale() == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["v1-def"]
+
+
+def test_model_fingerprint_follows_model_content(tmp_path):
+    model = tmp_path / "model.task"
+    model.write_bytes(b"model-a")
+    first = model_fingerprint(model)
+    assert first == f"v{DETECTION_CACHE_VERSION}-{file_sha256(model)[:12]}"
+    model.write_bytes(b"model-b")
+    assert model_fingerprint(model) != first
+    assert model_fingerprint(tmp_path / "missing.task").endswith("-nomodel")
+
+
+def test_corrupt_cache_file_is_a_miss(tmp_path):
+    cache = DetectionCache(tmp_path, "v1-abc")
+    cache.put("hash", 0.6, _faces())
+    path = tmp_path / "v1-abc" / f"{DetectionCache.make_key('hash', 0.6)}.npz"
+    path.write_bytes(b"broken")
+    assert DetectionCache(tmp_path, "v1-abc").get("hash", 0.6) is None
+
+
+def test_upload_and_process_share_detection(web_app):
+    # 上傳、選項頁與處理使用同一份偵測結果：第二次起直接命中快取
+    image = make_background(640, 480, seed=4)
+    image[100:300, 200:400] = make_face(200)
+    before = web_app.DETECTION_CACHE.stats()
+    first, _ = web_app._detect_image_cached(image, "shared-detection-test", 0.6)
+    second, _ = web_app._detect_image_cached(image, "shared-detection-test", 0.6)
+    after = web_app.DETECTION_CACHE.stats()
+    assert len(first) == 1
+    np.testing.assert_array_equal(first.points, second.points)
+    assert after["stores"] - before["stores"] == 1
+    assert after["memory_hits"] - before["memory_hits"] == 1
@@ -0,0 +1,58 @@
+"""core.detection_service 的回歸測試（不啟動 worker 行程，模擬沒有回應或結束的 worker）"""
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from core.detection_service import DetectionService, DetectionServiceError
+
+
+@pytest.fixture
+def service():
+    service = DetectionService(workers=2, slots=2, slot_bytes=64, timeout=0.05)
+    service._shm = shared_memory.SharedMemory(create=True, size=service.slots * service.slot_bytes)
+    service._free_slots = queue.Queue()
+    for slot in range(service.slots):
+        service._free_slots.put(slot)
+    service._tasks = [queue.Queue() for _ in range(service.workers)]
+    yield service
+    service._shm.close()
+    service._shm.unlink()
+
+
+def test_detect_timeout_raises_service_error_and_clears_pending(service):
+    # worker 沒有回應：逾時應改為 DetectionServiceError（呼叫端會改用本行程偵測），且不再計入佇列深度
+    with pytest.raises(DetectionServiceError):
+        service.detect(np.zeros((2, 2, 3), np.uint8), worker=0)
+    stats = service.stats()
+    assert stats["pending"] == 0
+    assert stats["queue_depth"] == [0, 0]
+    assert stats["failed"] == 1
+
+
+def test_mark_dead_returns_slots_of_crashed_worker(service):
+    frame = np.zeros((2, 2, 3), np.uint8)
+    with pytest.raises(DetectionServiceError):
+        service.detect(frame, worker=0)  # 逾時後 slot 仍由 worker 0 持有
+    service.submit(frame, worker=0)
+    assert service._free_slots.qsize() == 0
+
+    service._mark_dead(0, "exit code -9")
+    assert service._free_slots.qsize() == 2
+    assert service.stats()["pending"] == 0
+
+
+def test_submit_returns_slot_when_worker_dies_while_waiting(service):
+    # 取得 slot 後、登記請求前 worker 結束：slot 不能遺失
+    get_nowait = service._free_slots.get_nowait
+
+    def get_then_die():
+        slot = get_nowait()
+        service._mark_dead(1, "exit code 1")
+        return slot
+
+    service._free_slots.get_nowait = get_then_die
+    with pytest.raises(DetectionServiceError):
+        service.submit(np.zeros((2, 2, 3), np.uint8), worker=1)
+    assert service._free_slots.qsize() == 2
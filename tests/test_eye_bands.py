@@ -0,0 +1,88 @@
+"""遮眼白條（向量化的 _eye_bands、_adaptive_alpha、_smooth_boxes）的測試：與逐張臉計算的結果一致"""
+import numpy as np
+
+from core.face_landmarks import NUM_LANDMARKS, FaceLandmarks
+
+
+def _faces(n, seed):
+    rng = np.random.default_rng(seed)
+    # 包含畫面外（負座標）與超出右下角的臉
+    points = rng.uniform(-80, 700, (n, NUM_LANDMARKS, 3)).astype(np.float32)
+    return FaceLandmarks(points)
+
+
+def _eye_bands_reference(web_app, faces, w_img, h_img):
+    left_centers = faces.pixel_xy(web_app.LEFT_IRIS_IDX).mean(axis=1).astype(np.int64)
+    right_centers = faces.pixel_xy(web_app.RIGHT_IRIS_IDX).mean(axis=1).astype(np.int64)
+    boxes = []
+    for (lx, ly), (rx, ry) in zip(left_centers.tolist(), right_centers.tolist()):
+        center_x, center_y = int((lx + rx) / 2), int((ly + ry) / 2)
+        eye_dist = max(12, int(((rx - lx) ** 2 + (ry - ly) ** 2) ** 0.5))
+        band_w, band_h = int(eye_dist * 2.4), int(eye_dist * 0.75)
+        boxes.append((
+            max(0, center_x - band_w // 2),
+            max(0, center_y - band_h // 2),
+            min(w_img, center_x + band_w // 2),
+            min(h_img, center_y + band_h // 2),
+        ))
+    return boxes
+
+
+def _adaptive_alpha_reference(prev_boxes, curr_boxes, base, min_alpha):
+    prev_boxes = sorted(prev_boxes, key=lambda b: (b[0], b[1]))
+    curr_boxes = sorted(curr_boxes, key=lambda b: (b[0], b[1]))
+    max_relative_move = 0
+    for (px1, py1, px2, py2), (cx1, cy1, cx2, cy2) in zip(prev_boxes, curr_boxes):
+        box_size = (max(px2 - px1, cx2 - cx1, 1) + max(py2 - py1, cy2 - cy1, 1)) / 2.0
+        move = (((cx1 + cx2) - (px1 + px2)) ** 2 / 4 + ((cy1 + cy2) - (py1 + py2)) ** 2 / 4) ** 0.5
+        max_relative_move = max(max_relative_move, move / box_size)
+    if max_relative_move > 0.4:
+        return min_alpha
+    if max_relative_move > 0.15:
+        return 0.3
+    return base
+
+
+def _smooth_reference(prev_boxes, curr_boxes, alpha):
+    prev_boxes = sorted(prev_boxes, key=lambda b: (b[0], b[1]))
+    curr_boxes = sorted(curr_boxes, key=lambda b: (b[0], b[1]))
+    return [
+        tuple(int(round(alpha * p + (1 - alpha) * c)) for p, c in zip(prev, curr))
+        for prev, curr in zip(prev_boxes, curr_boxes)
+    ]
+
+
+def test_eye_bands_match_per_face_reference(web_app):
+    for seed in range(20):
+        faces = _faces(6, seed)
+        expected = _eye_bands_reference(web_app, faces, 640, 480)
+        assert web_app._eye_bands(faces, 640, 480).tolist() == [list(box) for box in expected]
+
+
+def test_smoothing_matches_per_face_reference(web_app):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n = int(rng.integers(1, 5))
+        prev = rng.integers(-20, 400, (n, 4))
+        # 包含同 x1（依 y1 排序）與不同移動速度的情況
+        prev[:, 0] = rng.integers(0, 3, n) * 50
+        prev[:, 2:] = prev[:, :2] + rng.integers(10, 80, (n, 2))
+        curr = prev + rng.integers(-30, 30, (n, 1)) * rng.integers(0, 2, (n, 4))
+        prev_list, curr_list = [tuple(b) for b in prev.tolist()], [tuple(b) for b in curr.tolist()]
+        alpha = web_app._adaptive_alpha(prev_list, curr_list, base=0.45, min_alpha=0.2)
+        assert alpha == _adaptive_alpha_reference(prev_list, curr_list, 0.45, 0.2)
+        smoothed = web_app._smooth_boxes(prev_list, curr_list, alpha=alpha)
+        assert [tuple(b) for b in smoothed.tolist()] == _smooth_reference(prev_list, curr_list, alpha)
+
+
+def test_eye_cover_draws_every_band(web_app):
+    faces = _faces(3, 1)
+    image = np.zeros((480, 640, 3), np.uint8)
+    result, boxes = web_app.apply_eye_cover(image, faces)
+    assert len(boxes) == 3
+    for x1, y1, x2, y2 in boxes:
+        if x2 > x1 and y2 > y1:
+            assert (result[y1:y2, x1:x2] == 255).all()
+    # 沒有臉時沿用上一幀的白條
+    empty, kept = web_app.apply_eye_cover(image, FaceLandmarks.empty(), boxes)
+    assert kept == boxes and (empty == result).all()
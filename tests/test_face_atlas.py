@@ -0,0 +1,84 @@
+"""人臉截圖拼貼圖（core.face_atlas、faces.json 的 sprite 與舊截圖轉換）的測試"""
+import json
+
+import cv2
+import numpy as np
+
+from core.face_atlas import crop_faces, pack_atlas
+
+
+def _crops(seed=0):
+    rng = np.random.default_rng(seed)
+    sizes = [(120, 90), (40, 60), (192, 150), (80, 80), (150, 192), (30, 30), (100, 60)] * 3
+    return [np.full((h, w, 3), rng.integers(0, 255, 3), np.uint8) for h, w in sizes]
+
+
+def test_crop_faces_downscales_and_skips_offscreen_boxes():
+    image = np.zeros((1000, 1200, 3), np.uint8)
+    crops = crop_faces(image, [(100, 100, 600, 400), (50, 50, 80, 100), (1300, 10, 50, 50), (-20, 900, 100, 200)])
+    assert crops[0].shape[:2] == (128, 192)      # 長邊縮到 192
+    assert crops[1].shape[:2] == (100, 80)       # 小臉不放大
+    assert crops[2] is None                      # 完全在畫面外
+    assert crops[3].shape[:2] == (100, 80)       # 只保留畫面內的部分
+
+
+def test_pack_atlas_places_every_crop_without_overlap():
+    crops = _crops()
+    crops[3] = None
+    atlas, rects = pack_atlas(crops, max_width=512)
+    assert rects[3] is None
+    assert atlas.shape[1] <= 512
+    used = np.zeros(atlas.shape[:2], dtype=bool)
+    for crop, rect in zip(crops, rects):
+        if crop is None:
+            continue
+        x, y, w, h = rect
+        assert (h, w) == crop.shape[:2]
+        assert not used[y : y + h, x : x + w].any()
+        used[y : y + h, x : x + w] = True
+        np.testing.assert_array_equal(atlas[y : y + h, x : x + w], crop)
+    assert pack_atlas([None, None]) == (None, [None, None])
+
+
+def test_saved_metadata_points_into_atlas(web_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(web_app, "PREVIEW_DIR", tmp_path)
+    monkeypatch.setattr(web_app, "METADATA_DIR", tmp_path)
+    image = np.zeros((480, 640, 3), np.uint8)
+    image[100:200, 100:180] = (0, 0, 255)
+    image[250:400, 300:450] = (255, 0, 0)
+    faces = np.array([[100, 100, 80, 100], [300, 250, 150, 150], [700, 0, 40, 40]])
+    items = web_app._save_faces_metadata(image, faces, "atlas-test", scores=np.float32([0.9, np.nan, 0.5]))
+
+    # 每個媒體只有一張拼貼圖與一個 JSON
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["atlas-test_faces.jpg", "atlas-test_faces.json"]
+    assert [item["score"] for item in items] == [0.9, None, 0.5]
+    assert items[2]["sprite"] is None
+    assert json.loads((tmp_path / "atlas-test_faces.json").read_text(encoding="utf-8")) == items
+    atlas = cv2.imread(str(tmp_path / "atlas-test_faces.jpg"))
+    for item, color in zip(items, [(0, 0, 255), (255, 0, 0)]):
+        sprite = item["sprite"]
+        assert (sprite["w"], sprite["h"]) == (item["w"], item["h"])
+        cell = atlas[sprite["y"] : sprite["y"] + sprite["h"], sprite["x"] : sprite["x"] + sprite["w"]]
+        assert np.abs(cell.mean(axis=(0, 1)) - color).max() < 8
+
+
+def test_migrate_legacy_crops(tmp_path, monkeypatch):
+    from scripts import migrate_face_atlas
+
+    previews, metadata = tmp_path / "previews", tmp_path / "metadata"
+    previews.mkdir()
+    metadata.mkdir()
+    monkeypatch.setattr(migrate_face_atlas, "PREVIEW_DIR", previews)
+    monkeypatch.setattr(migrate_face_atlas, "METADATA_DIR", metadata)
+    items = [{"id": i, "x": 0, "y": 0, "w": 50, "h": 60, "file": f"m1_face_{i}.jpg"} for i in range(3)]
+    (metadata / "m1_faces.json").write_text(json.dumps(items), encoding="utf-8")
+    for i in range(3):
+        cv2.imwrite(str(previews / f"m1_face_{i}.jpg"), np.full((60, 50, 3), 80 * i, np.uint8))
+
+    groups = migrate_face_atlas._legacy_crops()
+    assert migrate_face_atlas.migrate_media("m1", groups["m1"], dry_run=False) == 3
+    assert sorted(p.name for p in previews.iterdir()) == ["m1_faces.jpg"]
+    migrated = json.loads((metadata / "m1_faces.json").read_text(encoding="utf-8"))
+    assert all("file" not in item and item["sprite"]["w"] == 50 for item in migrated)
+    # 再執行一次時沒有舊截圖可轉換
+    assert migrate_face_atlas._legacy_crops() == {}
@@ -0,0 +1,77 @@
+"""core.face_landmarks 的測試"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from core.face_landmarks import NUM_LANDMARKS, FaceLandmarks
+
+
+def _mp_face(x0, y0, size):
+    """模擬 MediaPipe 的一張臉（478 個正規化座標的特徵點，排成 size x size 的方格）"""
+    grid = np.linspace(0, size, 22)
+    return [
+        SimpleNamespace(x=x0 + grid[i % 22], y=y0 + grid[i // 22], z=0.01)
+        for i in range(NUM_LANDMARKS)
+    ]
+
+
+def test_from_mediapipe_converts_to_pixels_once():
+    faces = FaceLandmarks.from_mediapipe([_mp_face(0.1, 0.2, 0.25), _mp_face(0.5, 0.5, 0.1)[:10]], 400, 200)
+    assert len(faces) == 1  # 特徵點數量不完整的臉不採用
+    assert faces.points.dtype == np.float32 and faces.points.shape == (1, NUM_LANDMARKS, 3)
+    np.testing.assert_allclose(faces.points[0, 0], [40, 40, 4], rtol=1e-6)
+    np.testing.assert_allclose(faces.points[0, :, :2].min(axis=0), [40, 40], rtol=1e-6)
+    np.testing.assert_allclose(faces.points[0, :, :2].max(axis=0), [140, 90], rtol=1e-6)
+    assert np.isnan(faces.scores).all() and not faces.has_scores
+
+
+def test_compute_boxes_expands_and_clips_all_faces():
+    faces = FaceLandmarks.from_mediapipe([_mp_face(0.1, 0.2, 0.25), _mp_face(0.8, 0.0, 0.25)], 400, 200)
+    boxes = faces.compute_boxes(400, 200)
+    # 第一張臉 x 40-140、y 40-90：左右各擴展 15%、向上擴展 30%
+    assert boxes[0].tolist() == [25, 25, 130, 65]
+    # 第二張臉超出右邊界：裁切在影像內
+    x, y, w, h = boxes[1].tolist()
+    assert x + w == 400 and y == 0
+
+
+def test_select_transformed_and_concatenate_keep_arrays_aligned():
+    faces = FaceLandmarks.from_mediapipe([_mp_face(0.1, 0.1, 0.1), _mp_face(0.5, 0.5, 0.1)], 100, 100)
+    faces.scores = np.float32([0.9, 0.4])
+    faces.boxes = faces.compute_boxes(100, 100)
+    picked = faces.select([1, 0])
+    np.testing.assert_array_equal(picked.scores, np.float32([0.4, 0.9]))
+    np.testing.assert_array_equal(picked.boxes, faces.boxes[[1, 0]])
+    moved = faces.transformed(scale=2.0, dx=5, dy=-5)
+    np.testing.assert_allclose(moved.points[:, :, :2], faces.points[:, :, :2] * 2 + np.float32([5, -5]))
+    merged = FaceLandmarks.concatenate([faces, FaceLandmarks.empty(), picked])
+    np.testing.assert_array_equal(merged.scores, np.float32([0.9, 0.4, 0.4, 0.9]))
+    np.testing.assert_array_equal(merged.points[2], faces.points[1])
+
+
+def test_smooth_faces_keeps_current_face_order(web_app):
+    prev = np.array([[10, 10, 50, 50], [200, 10, 50, 50]])
+    curr = np.array([[202, 12, 50, 50], [12, 10, 50, 50]])  # 偵測器回傳的順序與上一幀不同
+    smoothed = web_app._smooth_faces(prev, curr)
+    # 各臉與上一幀的同一張臉平滑，輸出依目前幀的順序（與特徵點的索引一致）
+    assert smoothed[0][0] > 150 and smoothed[1][0] < 50
+
+
+def _faces(scores):
+    points = np.zeros((len(scores), NUM_LANDMARKS, 3), dtype=np.float32)
+    return FaceLandmarks(points, scores=np.array(scores, dtype=np.float32))
+
+
+def test_filter_scores_by_sensitivity():
+    faces = _faces([0.95, 0.45, 0.7])
+    assert faces.filter_scores(0.3, 0.3).scores.tolist() == faces.scores.tolist()
+    np.testing.assert_array_equal(faces.filter_scores(0.7, 0.3).scores, np.float32([0.95, 0.7]))
+    assert len(faces.filter_scores(0.99, 0.3)) == 0
+
+
+def test_filter_scores_unmatched_face_fails_stricter_thresholds():
+    # 沒有配對到偵測框的臉只在偵測時的靈敏度下保留
+    faces = _faces([0.9, np.nan])
+    assert len(faces.filter_scores(0.3, 0.3)) == 2
+    np.testing.assert_array_equal(faces.filter_scores(0.4, 0.3).scores, np.float32([0.9]))
+    np.testing.assert_array_equal(faces.filter_scores(0.9, 0.3).scores, np.float32([0.9]))
@@ -0,0 +1,69 @@
+"""逐臉混合模式（face_modes）的測試"""
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_background, make_face
+from core.face_landmarks import NUM_LANDMARKS, FaceLandmarks
+from core.media_processor import MediaProcessor, normalize_face_modes
+from core.overlay import PreparedOverlay
+
+
+def test_normalize_face_modes():
+    assert normalize_face_modes(None) is None
+    assert normalize_face_modes({"0": "blur", 2: "none"}) == {0: "blur", 2: "none"}
+    with pytest.raises(ValueError):
+        normalize_face_modes({0: "sparkles"})
+    with pytest.raises(ValueError):
+        normalize_face_modes({"first": "blur"})
+
+
+def test_face_groups_combine_plan_and_selection():
+    groups = MediaProcessor._face_groups(5, "mosaic", [0, 1, 4], {1: "eyes", 3: "replace", 4: "none"})
+    # 計畫優先；未列出的臉只有被選取時才套用預設模式
+    assert groups == {"mosaic": [0], "eyes": [1], "replace": [3]}
+    assert MediaProcessor._face_groups(2, "blur", None, {}) == {"blur": [0, 1]}
+
+
+def test_mixed_render_matches_effects_applied_separately(web_app):
+    image = make_background(640, 480, seed=6)
+    boxes = np.array([[20, 20, 120, 120], [200, 40, 120, 120], [380, 60, 120, 120], [200, 260, 160, 160]])
+    points = np.zeros((len(boxes), NUM_LANDMARKS, 3), np.float32)
+    points[..., 0] = (boxes[:, 0] + boxes[:, 2] * np.linspace(0.2, 0.8, NUM_LANDMARKS)[:, None]).T
+    points[..., 1] = (boxes[:, 1] + boxes[:, 3] * 0.4)[:, None]
+    landmarks = FaceLandmarks(points, boxes)
+    rgba = np.full((32, 32, 4), 200, np.uint8)
+    overlay = PreparedOverlay(rgba)
+    plan = {0: "blur", 1: "replace", 2: "none", 3: "eyes"}
+
+    processor = MediaProcessor(0.6)
+    frame = image.copy()
+    result, eye_boxes = processor._render_mixed(frame, "mosaic", landmarks, boxes, None, overlay, None, frame, plan)
+    assert result is frame
+
+    expected = web_app.apply_blur(image, boxes[[0]])
+    web_app.apply_face_replace(expected, boxes[[1]], overlay, out=expected)
+    _, expected_eyes = web_app.apply_eye_cover(expected, landmarks.select([3]), None, out=expected)
+    np.testing.assert_array_equal(result, expected)
+    assert eye_boxes == expected_eyes
+    # 標為 none 的臉不處理
+    np.testing.assert_array_equal(result[60:180, 380:500], image[60:180, 380:500])
+
+
+def test_process_image_with_plan(web_app, tmp_path):
+    image = make_background(640, 480, seed=4)
+    image[100:300, 200:400] = make_face(200)
+    cv2.imwrite(str(tmp_path / "face.png"), image)
+    processor = MediaProcessor(0.5)
+    untouched = processor.process_image(
+        tmp_path / "face.png", "mosaic", face_modes={0: "none"}, output_path=tmp_path / "a.png"
+    )
+    np.testing.assert_array_equal(cv2.imread(str(untouched)), image)
+    planned = processor.process_image(
+        tmp_path / "face.png", "mosaic", face_modes={0: "blur"}, output_path=tmp_path / "b.png"
+    )
+    blurred = processor.process_image(tmp_path / "face.png", "blur", output_path=tmp_path / "c.png")
+    np.testing.assert_array_equal(cv2.imread(str(planned)), cv2.imread(str(blurred)))
+    # 計畫中有替換模式時需要覆蓋圖
+    with pytest.raises(ValueError, match="overlay_path"):
+        processor.process_image(tmp_path / "face.png", "mosaic", face_modes={0: "replace"})
@@ -0,0 +1,64 @@
+"""就地（out=）套用效果與 FrameBuffers 重複使用的測試"""
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_background, make_face
+from core.frame_buffers import FrameBuffers
+from core.overlay import PreparedOverlay
+
+FACES = np.array([[40, 30, 96, 96], [300, 200, 80, 90]])
+
+
+def _overlay():
+    rgba = np.zeros((64, 64, 4), np.uint8)
+    rgba[..., 2] = 255
+    rgba[..., 3] = np.linspace(0, 255, 64, dtype=np.uint8)
+    return PreparedOverlay(rgba)
+
+
+@pytest.mark.parametrize("effect", ["apply_mosaic", "apply_blur", "apply_face_replace", "draw_face_boxes"])
+def test_in_place_matches_copy_and_reuses_output(web_app, effect):
+    fn = getattr(web_app, effect)
+    args = (_overlay(),) if effect == "apply_face_replace" else ()
+    image = make_background(480, 360, seed=1)
+    copied = fn(image, FACES, *args)
+    assert not np.array_equal(copied, image)  # 預設不修改輸入
+
+    # 傳入預先配置的陣列：結果寫入該陣列
+    out = np.empty_like(image)
+    assert fn(image, FACES, *args, out=out) is out
+    np.testing.assert_array_equal(out, copied)
+
+    # 傳入輸入本身：就地處理
+    frame = image.copy()
+    assert fn(frame, FACES, *args, out=frame) is frame
+    np.testing.assert_array_equal(frame, copied)
+
+
+def test_frame_buffers_reallocate_only_when_shape_changes():
+    buffers = FrameBuffers()
+    first = buffers.get("rgb", (360, 480, 3))
+    assert buffers.get("rgb", (360, 480, 3)) is first
+    assert buffers.get("proxy", (180, 240, 3)) is not first
+    assert buffers.allocations == 2 and buffers.nbytes == first.nbytes + 180 * 240 * 3
+    assert buffers.get("rgb", (720, 960, 3)).shape == (720, 960, 3)
+    assert buffers.get("rgb", (720, 960, 3), np.float32).dtype == np.float32
+    assert buffers.allocations == 4
+    buffers.clear()
+    assert buffers.nbytes == 0
+
+
+def test_detection_with_buffers_matches_and_stops_allocating(web_app):
+    image = make_background(1920, 1080, seed=2)
+    image[300:700, 800:1200] = make_face(400)
+    buffers = FrameBuffers()
+    with web_app.LANDMARKER_POOL.lease(web_app.MODE_IMAGE, 0.5) as landmarker:
+        expected, expected_boxes = web_app._detect_landmarks_bgr(image, landmarker, max_side=640)
+        allocations = []
+        for _ in range(3):
+            faces, boxes = web_app._detect_landmarks_bgr(image, landmarker, max_side=640, buffers=buffers)
+            np.testing.assert_array_equal(boxes, expected_boxes)
+            np.testing.assert_allclose(faces.points, expected.points)
+            allocations.append(buffers.allocations)
+    # 同樣尺寸的影格之後不再配置新陣列
+    assert allocations[0] > 0 and allocations == [allocations[0]] * 3
@@ -0,0 +1,118 @@
+"""core.job_queue 的回歸測試（SQLite 資料庫）"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from core.job_queue import JobWorker, active_job_for_media, delete_jobs_for_media, enqueue_job, heartbeat, lease_next_job
+from core.models import db, Media, ProcessingJob
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'jobs.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Media(media_id="m1", file_type="image"))
+        db.session.commit()
+    return app
+
+
+def test_enqueue_rejects_second_active_job(app):
+    with app.app_context():
+        job = enqueue_job("m1", None, {"mode": "mosaic"})
+        assert job.state == ProcessingJob.STATE_QUEUED
+        assert active_job_for_media("m1").job_id == job.job_id
+        assert enqueue_job("m1", None, {"mode": "blur"}) is None
+
+
+def test_concurrent_enqueue_creates_one_job(app):
+    # 多個請求同時通過 /process 的檢查後排入，資料庫中仍只能有一個進行中的工作
+    barrier = threading.Barrier(8)
+    created, errors = [], []
+
+    def submit():
+        with app.app_context():
+            barrier.wait()
+            try:
+                job = enqueue_job("m1", None, {"mode": "mosaic"})
+            except Exception as e:
+                errors.append(e)
+            else:
+                if job is not None:
+                    created.append(job.job_id)
+            db.session.remove()
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(created) == 1
+    with app.app_context():
+        assert ProcessingJob.query.count() == 1
+
+
+def test_enqueue_after_finished_job(app):
+    with app.app_context():
+        job = enqueue_job("m1", None, {})
+        job.state = ProcessingJob.STATE_FAILED
+        db.session.commit()
+        assert enqueue_job("m1", None, {}) is not None
+        assert enqueue_job("missing", None, {}) is None
+
+
+def test_worker_reports_failed_job(app):
+    failed = []
+
+    def execute(job, on_progress):
+        raise ValueError("找不到檔案")
+
+    with app.app_context():
+        job_id = enqueue_job("m1", None, {}).job_id
+    assert JobWorker(app, execute, name="w1", on_failed=failed.append).run_once()
+    assert failed == [job_id]
+    with app.app_context():
+        job = ProcessingJob.query.filter_by(job_id=job_id).one()
+        assert job.state == ProcessingJob.STATE_FAILED
+        assert job.error == "找不到檔案"
+
+
+def test_worker_reports_abandoned_job(app):
+    # 租約到期且已達重試上限的工作（worker 多次中斷）標記為失敗時也要清理
+    failed = []
+    with app.app_context():
+        job = enqueue_job("m1", None, {})
+        job.state = ProcessingJob.STATE_RUNNING
+        job.attempts = 3
+        job.lease_expires_at = datetime.now() - timedelta(seconds=1)
+        db.session.commit()
+        job_id = job.job_id
+    assert not JobWorker(app, None, name="w1", max_attempts=3, on_failed=failed.append).run_once()
+    assert failed == [job_id]
+    with app.app_context():
+        assert ProcessingJob.query.filter_by(job_id=job_id).one().state == ProcessingJob.STATE_FAILED
+
+
+def test_deleting_media_jobs_stops_running_worker(app):
+    with app.app_context():
+        db.session.add(Media(media_id="m2", file_type="image"))
+        db.session.commit()
+        finished = enqueue_job("m1", None, {})
+        finished.state = ProcessingJob.STATE_SUCCEEDED
+        db.session.commit()
+        finished_id = finished.job_id
+        enqueue_job("m1", None, {})
+        running = lease_next_job("w1")
+        running_pk, running_id = running.id, running.job_id
+        other_id = enqueue_job("m2", None, {}).job_id
+
+        assert sorted(delete_jobs_for_media("m1")) == sorted([finished_id, running_id])
+        db.session.commit()
+        assert [job.job_id for job in ProcessingJob.query.all()] == [other_id]
+        # 處理中的工作被刪除後，worker 的心跳失敗而中止處理
+        assert not heartbeat(running_pk, "w1")
@@ -0,0 +1,27 @@
+"""core.keyframe_tracker 的測試（合成影格，不需要偵測模型）"""
+from benchmarks.synthetic import make_background, make_face
+from core.face_landmarks import FaceLandmarks
+from core.keyframe_tracker import KeyframeTracker
+
+
+def _sources(frames, stride):
+    tracker = KeyframeTracker(stride)
+    for frame in frames:
+        if tracker.track(frame) is None:
+            tracker.reset(FaceLandmarks.empty())
+    return "".join(tracker.sources)
+
+
+def test_face_entering_between_keyframes_forces_detection():
+    background = make_background(320, 240, seed=1)
+    frames = [background.copy() for _ in range(6)]
+    for frame in frames[3:]:
+        frame[100:160, 200:260] = make_face(60)
+    assert _sources(frames, stride=8) == "KTTMTT"
+
+
+def test_camera_pan_keeps_keyframe_interval():
+    # 鏡頭平移時整個畫面都在變化，不應因此每一幀都偵測
+    background = make_background(400, 240, seed=2)
+    frames = [background[:, 2 * i : 2 * i + 320].copy() for i in range(10)]
+    assert _sources(frames, stride=4) == "KTTTKTTTKT"
@@ -0,0 +1,82 @@
+"""core.landmark_store 的測試"""
+import numpy as np
+
+from conftest import write_face_video
+from core.face_landmarks import NUM_LANDMARKS, FaceLandmarks
+from core.landmark_store import MAGIC, LandmarkStore, LandmarkTrackWriter, save_landmarks
+
+
+def _faces(n, offset, seed=0):
+    rng = np.random.default_rng(seed)
+    points = rng.random((n, NUM_LANDMARKS, 3), dtype=np.float32) * 200 + np.float32([offset, offset, 0])
+    faces = FaceLandmarks(points, scores=rng.random(n, dtype=np.float32))
+    faces.boxes = faces.compute_boxes(4000, 3000)
+    return faces
+
+
+def test_track_round_trip(tmp_path):
+    frames = [_faces(2, 3000, seed=1), FaceLandmarks.empty(), _faces(1, 100, seed=2)]
+    smoothed = [frames[0].boxes + 1, np.zeros((0, 4), np.int32), None]
+    writer = LandmarkTrackWriter(tmp_path / "video.lmk")
+    for faces, boxes in zip(frames, smoothed):
+        writer.append(faces, boxes)
+    writer.save(content_hash="abc", sensitivity=0.61, variant="img1280", kind="video", fps=24.0)
+    assert list(tmp_path.iterdir()) == [tmp_path / "video.lmk"]  # 暫存檔已清除
+
+    store = LandmarkStore.open(tmp_path / "video.lmk")
+    try:
+        assert store.num_frames == 3 and store.num_faces == 3
+        assert store.matches("abc", 0.6, "img1280")
+        assert not store.matches("abc", 0.7, "img1280") and not store.matches("def", 0.6, "img1280")
+        assert store.meta["fps"] == 24.0
+        for i, faces in enumerate(frames):
+            loaded, boxes = store.frame(i)
+            # 相對於臉部中心以 float16 儲存：遠離原點的臉也保持次像素精度
+            np.testing.assert_allclose(loaded.points, faces.points, atol=0.1)
+            np.testing.assert_array_equal(loaded.boxes, faces.boxes)
+            np.testing.assert_allclose(loaded.scores, faces.scores, atol=1e-3)
+            expected_boxes = smoothed[i] if smoothed[i] is not None else faces.boxes
+            np.testing.assert_array_equal(boxes, expected_boxes)
+        assert len(store.frame(3)[0]) == 0  # 超出範圍
+    finally:
+        store.close()
+
+
+def test_single_image_file_is_compact(tmp_path):
+    faces = _faces(5, 500)
+    path = save_landmarks(tmp_path / "photo.lmk", faces, content_hash="abc", sensitivity=0.6, variant="")
+    assert path.read_bytes().startswith(MAGIC)
+    # 特徵點以 float16 儲存，約為 float32 陣列的一半
+    assert path.stat().st_size < faces.points.nbytes * 0.6
+
+
+def test_discarded_or_invalid_files_are_not_opened(tmp_path):
+    writer = LandmarkTrackWriter(tmp_path / "video.lmk")
+    writer.append(_faces(1, 0))
+    writer.discard()
+    assert list(tmp_path.iterdir()) == []
+    assert LandmarkStore.open(tmp_path / "video.lmk") is None
+    assert LandmarkStore.open(None) is None
+    (tmp_path / "other.lmk").write_bytes(b"not a landmark file")
+    assert LandmarkStore.open(tmp_path / "other.lmk") is None
+
+
+def test_reprocessing_video_reuses_stored_track(web_app, tmp_path):
+    from core.media_processor import MediaProcessor
+
+    video = write_face_video(tmp_path / "faces.mp4", frames=24)
+    track = tmp_path / "faces.lmk"
+    MediaProcessor(0.6).process_video(video, "mosaic", output_path=tmp_path / "mosaic.mp4", landmarks_path=track)
+    store = LandmarkStore.open(track)
+    assert store.num_frames == 24
+    store.close()
+
+    # 換處理模式時直接讀取特徵點檔渲染，不再執行偵測
+    processor = MediaProcessor(0.6)
+
+    def no_detection(*args, **kwargs):
+        raise AssertionError("不應重新偵測")
+
+    processor._get_app_funcs()['_video_detector'] = no_detection
+    out = processor.process_video(video, "blur", output_path=tmp_path / "blur.mp4", landmarks_path=track)
+    assert out.exists()
@@ -0,0 +1,82 @@
+"""core.landmarker_pool 的測試（以假的偵測器取代 MediaPipe 模型）"""
+from core.landmarker_pool import MODE_IMAGE, MODE_VIDEO, LandmarkerPool
+
+
+class FakeLandmarker:
+    def __init__(self, sensitivity):
+        self.sensitivity = sensitivity
+        self.closed = False
+        self.timestamps = []
+
+    def detect_for_video(self, image, timestamp_ms):
+        self.timestamps.append(timestamp_ms)
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(max_idle=8):
+    return LandmarkerPool({MODE_IMAGE: FakeLandmarker, MODE_VIDEO: FakeLandmarker}, max_idle=max_idle)
+
+
+def test_video_landmarker_is_not_reused():
+    # 影片模式的偵測器保留追蹤狀態：每個串流都要用新的實例，歸還時關閉
+    pool = _pool()
+    with pool.lease(MODE_VIDEO, 0.6) as first:
+        first.detect_for_video(None, 0)
+        first.detect_for_video(None, 40)
+    with pool.lease(MODE_VIDEO, 0.6) as second:
+        second.detect_for_video(None, 0)
+    assert second is not first
+    assert first.landmarker.closed
+    assert second.landmarker.timestamps == [0]  # 新串流的時間戳從 0 開始，不接在上一支影片之後
+    assert pool.stats()["idle"] == 0
+
+
+def test_video_timestamps_stay_strictly_increasing():
+    # 同一幀以較高解析度重新偵測時使用相同的時間戳
+    pool = _pool()
+    with pool.lease(MODE_VIDEO, 0.6) as landmarker:
+        for ts in (0, 0, 40, 40, 80):
+            landmarker.detect_for_video(None, ts)
+    assert landmarker.landmarker.timestamps == [0, 1, 40, 41, 80]
+
+
+def test_image_landmarker_is_reused_per_quantized_sensitivity():
+    pool = _pool()
+    with pool.lease(MODE_IMAGE, 0.6) as first:
+        pass
+    with pool.lease(MODE_IMAGE, 0.61) as second:  # 量化後同為 0.6
+        pass
+    with pool.lease(MODE_IMAGE, 0.8) as third:
+        pass
+    assert second is first
+    assert third is not first and third.sensitivity == 0.8
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"], stats["creations"]) == (1, 2, 2)
+    assert not first.closed
+
+
+def test_concurrent_leases_get_separate_instances():
+    # 借出中的偵測器不會同時借給其他執行緒
+    pool = _pool()
+    with pool.lease(MODE_IMAGE, 0.6) as first, pool.lease(MODE_IMAGE, 0.6) as second:
+        assert second is not first
+        assert pool.stats()["in_use"] == 2
+    assert pool.stats()["idle"] == 2
+
+
+def test_least_recently_used_key_is_evicted():
+    pool = _pool(max_idle=2)
+    for sensitivity in (0.3, 0.5, 0.7):
+        with pool.lease(MODE_IMAGE, sensitivity):
+            pass
+        if sensitivity == 0.5:
+            with pool.lease(MODE_IMAGE, 0.3) as oldest:  # 0.3 重新使用後變成最近使用
+                pass
+    stats = pool.stats()
+    assert stats["keys"] == ["image@0.30", "image@0.70"]
+    assert stats["evictions"] == 1
+    assert not oldest.closed
+    pool.clear()
+    assert oldest.closed and pool.stats()["idle"] == 0
@@ -0,0 +1,95 @@
+"""即時效果預覽（core.live_preview 與 /live-preview）的測試"""
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_background, make_face
+from core.live_preview import LivePreviewCache
+
+
+def test_cache_hits_and_lru_eviction():
+    cache = LivePreviewCache(max_proxies=1, max_renders=2)
+    builds = []
+
+    def build(value):
+        return lambda: builds.append(value) or value
+
+    assert cache.render("a", build(b"A")) == (b"A", False)
+    assert cache.render("a", build(b"X")) == (b"A", True)
+    cache.render("b", build(b"B"))
+    cache.render("a", build(b"X"))  # a 變成最近使用
+    cache.render("c", build(b"C"))  # 淘汰 b
+    assert cache.render("b", build(b"B2")) == (b"B2", False)
+    assert cache.proxy("m1", build("p1")) == "p1" and cache.proxy("m1", build("p1x")) == "p1"
+    cache.proxy("m2", build("p2"))
+    assert cache.proxy("m1", build("p1y")) == "p1y"
+    assert builds == [b"A", b"B", b"C", b"B2", "p1", "p2", "p1y"]
+    stats = cache.stats()
+    assert (stats["render_hits"], stats["render_misses"], stats["renders"]) == (2, 4, 2)
+
+
+@pytest.fixture
+def live(web_app, tmp_path, monkeypatch):
+    from core.models import db, Media, User
+
+    monkeypatch.setattr(web_app, "METADATA_DIR", tmp_path)
+    image = make_background(1920, 1280, seed=3)
+    image[400:800, 700:1100] = make_face(400)
+    upload = tmp_path / "live.png"
+    cv2.imwrite(str(upload), image)
+    with web_app.app.app_context():
+        user = User.query.filter_by(email="live@example.com").first()
+        if user is None:
+            user = User(email="live@example.com", username="live")
+            user.set_password("Passw0rd!")
+            db.session.add(user)
+            db.session.commit()
+        media = Media.query.filter_by(media_id="live-test").first()
+        if media is None:
+            media = Media(media_id="live-test", file_type="image", user_id=user.id)
+            db.session.add(media)
+        media.upload_path = str(upload)
+        db.session.commit()
+    web_app.LIVE_PREVIEWS.clear()
+    client = web_app.app.test_client()
+    client.post("/auth/login", data={"email": "live@example.com", "password": "Passw0rd!"})
+    return client, image
+
+
+def _decode(response):
+    return cv2.imdecode(np.frombuffer(response.data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def test_live_preview_renders_on_proxy_and_caches(live):
+    client, image = live
+    first = client.get("/live-preview/live-test?mode=mosaic")
+    assert first.status_code == 200 and first.mimetype == "image/jpeg"
+    assert first.headers["X-Preview-Cache"] == "miss"
+    preview = _decode(first)
+    assert preview.shape == (640, 960, 3)  # 代理影像長邊 LIVE_PREVIEW_MAX_SIDE
+    # 人臉區域（縮放後）套用了馬賽克，背景不變
+    proxy = cv2.resize(image, (960, 640), interpolation=cv2.INTER_AREA)
+    face_diff = np.abs(preview[250:350, 400:500].astype(np.int16) - proxy[250:350, 400:500]).mean()
+    assert face_diff > np.abs(preview[:150, :300].astype(np.int16) - proxy[:150, :300]).mean() + 3
+
+    again = client.get("/live-preview/live-test?mode=mosaic")
+    assert again.headers["X-Preview-Cache"] == "hit" and again.data == first.data
+    none = client.get("/live-preview/live-test?mode=mosaic&face_mode_0=none")
+    assert none.headers["X-Preview-Cache"] == "miss" and none.data != first.data
+
+
+def test_live_preview_replace_uses_uploaded_overlay(live):
+    client, _ = live
+    assert client.get("/live-preview/live-test?mode=replace").status_code == 400
+    overlay = cv2.imencode(".png", np.full((64, 64, 3), (0, 0, 255), np.uint8))[1].tobytes()
+    response = client.post(
+        "/live-preview/live-test",
+        data={"mode": "replace", "overlay": (io.BytesIO(overlay), "red.png")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    assert np.abs(_decode(response)[280:320, 430:470].mean(axis=(0, 1)) - (0, 0, 255)).max() < 20
+    # 之後不必再附上覆蓋圖
+    assert client.get("/live-preview/live-test?mode=replace").status_code == 200
@@ -0,0 +1,27 @@
+"""刪除媒體時一併刪除處理工作與檢查點"""
+
+
+def test_delete_media_removes_jobs_and_checkpoints(web_app, tmp_path, monkeypatch):
+    from core.job_queue import enqueue_job
+    from core.models import db, Media, ProcessingJob, User
+
+    monkeypatch.setattr(web_app, "JOB_CHECKPOINT_DIR", tmp_path / "checkpoints")
+    with web_app.app.app_context():
+        user = User(email="delete@example.com", username="delete")
+        user.set_password("Passw0rd!")
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(Media(media_id="delete-me", file_type="video", user_id=user.id))
+        db.session.commit()
+        job_id = enqueue_job("delete-me", user.id, {"mode": "mosaic"}).job_id
+    checkpoint = tmp_path / "checkpoints" / job_id
+    checkpoint.mkdir(parents=True)
+    (checkpoint / "seg00000000.lmk").write_bytes(b"")
+
+    client = web_app.app.test_client()
+    client.post("/auth/login", data={"email": "delete@example.com", "password": "Passw0rd!"})
+    assert client.post("/media/delete-me/delete").status_code == 302
+    with web_app.app.app_context():
+        assert Media.query.filter_by(media_id="delete-me").first() is None
+        assert ProcessingJob.query.filter_by(media_id="delete-me").count() == 0
+    assert not checkpoint.exists()
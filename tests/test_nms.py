@@ -0,0 +1,23 @@
+"""core.nms 的回歸測試"""
+from core.nms import NMS_HARD, NMS_SOFT, nms
+
+NAN = float("nan")
+
+
+def test_soft_nms_keeps_unscored_face_without_overlap():
+    # 評分器沒有對應到的臉信心度為 NaN，不能因分數下限被移除
+    assert nms([[0, 0, 100, 100], [500, 500, 80, 80]], [0.9, NAN], method=NMS_SOFT) == [0, 1]
+
+
+def test_hard_nms_keeps_unscored_face_without_overlap():
+    assert nms([[0, 0, 100, 100], [500, 500, 80, 80]], [0.9, NAN], method=NMS_HARD) == [0, 1]
+
+
+def test_soft_nms_removes_near_duplicate():
+    # IoU 約 0.96 的重複偵測降分後仍高於分數下限，必須直接移除
+    assert nms([[0, 0, 100, 100], [1, 1, 100, 100]], [0.9, 0.8], method=NMS_SOFT) == [0]
+
+
+def test_soft_nms_keeps_partially_overlapping_faces():
+    # IoU 0.6 的兩張臉（人群中相鄰的人）降分後都保留
+    assert nms([[0, 0, 100, 100], [25, 0, 100, 100]], [0.9, 0.8], method=NMS_SOFT) == [0, 1]
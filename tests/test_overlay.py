@@ -0,0 +1,80 @@
+"""core.overlay 與 MediaProcessor 覆蓋圖快取的測試"""
+import cv2
+import numpy as np
+
+from core.overlay import PreparedOverlay
+
+
+def _rgba(width=200, height=160, seed=0):
+    rng = np.random.default_rng(seed)
+    rgba = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    rgba[:, : width // 4, 3] = 0      # 完全透明
+    rgba[:, -width // 4 :, 3] = 255   # 完全不透明
+    return rgba
+
+
+def _float_blend(roi, rgba):
+    """以浮點數計算的未預乘 alpha 混合（與整數版本比較用）"""
+    alpha = rgba[:, :, 3:].astype(np.float64) / 255
+    return roi * (1 - alpha) + rgba[:, :, :3] * alpha
+
+
+def test_blend_matches_float_reference():
+    rgba = _rgba()
+    roi = np.random.default_rng(1).integers(0, 256, (160, 200, 3), dtype=np.uint8)
+    expected = _float_blend(roi.astype(np.float64), rgba)
+    blended = roi.copy()
+    PreparedOverlay(rgba).blend_into(blended)
+    # 整數運算的誤差在兩個灰階以內；透明區域完全不變
+    assert np.abs(blended.astype(np.int16) - expected.round()).max() <= 2
+    np.testing.assert_array_equal(blended[:, :50], roi[:, :50])
+
+
+def test_opaque_overlay_is_copied():
+    rgba = _rgba()
+    rgba[:, :, 3] = 255
+    overlay = PreparedOverlay(rgba)
+    assert overlay.stats()["opaque"]
+    roi = np.zeros((80, 100, 3), np.uint8)
+    overlay.blend_into(roi)
+    expected = cv2.resize(rgba[:, :, :3], (100, 80), interpolation=cv2.INTER_AREA)
+    assert np.abs(roi.astype(np.int16) - expected).max() <= 1
+
+
+def test_resized_sizes_are_cached_with_lru_eviction():
+    overlay = PreparedOverlay(_rgba(), max_cached_sizes=2)
+    first = overlay.resized(50, 40)
+    assert overlay.resized(50, 40) is first
+    overlay.resized(60, 48)
+    overlay.resized(50, 40)     # 變成最近使用
+    overlay.resized(70, 56)     # 淘汰 60x48
+    stats = overlay.stats()
+    assert (stats["hits"], stats["misses"], stats["cached_sizes"]) == (2, 3, 2)
+    assert overlay.resized(50, 40) is first
+    assert overlay.resized(60, 48) is not None and overlay.stats()["misses"] == 4
+    # 200x160 縮到 50x40 時建立 100x80 與 50x40 兩級
+    assert stats["levels"] == 3
+
+
+def test_levels_are_built_only_when_needed():
+    overlay = PreparedOverlay(_rgba())
+    overlay.resized(150, 120)
+    assert overlay.stats()["levels"] == 1
+    overlay.resized(90, 70)
+    assert overlay.stats()["levels"] == 2
+
+
+def test_processor_reuses_overlay_until_file_changes(web_app, tmp_path):
+    from core.media_processor import MediaProcessor
+
+    path = tmp_path / "overlay.png"
+    cv2.imwrite(str(path), _rgba())
+    processor = MediaProcessor(0.6)
+    first = processor._load_overlay(path)
+    assert isinstance(first, PreparedOverlay)
+    assert processor._load_overlay(path) is first
+
+    cv2.imwrite(str(path), _rgba(seed=1)[:100])
+    changed = processor._load_overlay(path)
+    assert changed is not first and changed.shape[:2] == (100, 200)
+    assert processor._load_overlay(tmp_path / "missing.png") is None
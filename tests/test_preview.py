@@ -0,0 +1,52 @@
+"""預覽圖的測試：存縮小且不含人臉框的底圖，人臉框由選項頁依偵測畫面尺寸繪製"""
+import json
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import make_background, make_face
+
+
+def test_save_preview_downscales_large_frames(web_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(web_app, "PREVIEW_DIR", tmp_path)
+    image = make_background(2400, 1600, seed=1)
+    path = web_app._save_preview(image, "big_preview")
+    assert cv2.imread(str(path)).shape == (853, 1280, 3)
+
+    small = make_background(640, 480, seed=1)
+    assert cv2.imread(str(web_app._save_preview(small, "small_preview"))).shape == small.shape
+    monkeypatch.setattr(web_app, "PREVIEW_MAX_SIDE", 0)
+    assert cv2.imread(str(web_app._save_preview(image, "full_preview"))).shape == image.shape
+
+
+def test_options_page_stores_plain_preview_and_frame_size(web_app, tmp_path, monkeypatch):
+    from core.models import db, Media, User
+
+    monkeypatch.setattr(web_app, "PREVIEW_DIR", tmp_path)
+    monkeypatch.setattr(web_app, "METADATA_DIR", tmp_path)
+    image = make_background(2400, 1600, seed=3)
+    image[500:1100, 900:1500] = make_face(600)
+    upload = tmp_path / "upload.png"
+    cv2.imwrite(str(upload), image)
+    with web_app.app.app_context():
+        user = User(email="preview@example.com", username="preview")
+        user.set_password("Passw0rd!")
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(Media(media_id="preview-test", file_type="image", user_id=user.id, upload_path=str(upload)))
+        db.session.commit()
+    client = web_app.app.test_client()
+    client.post("/auth/login", data={"email": "preview@example.com", "password": "Passw0rd!"})
+
+    response = client.get("/options/preview-test")
+    assert response.status_code == 200
+    assert b"const frameSize = [2400, 1600];" in response.data
+    ref = json.loads((tmp_path / "preview-test_detect.json").read_text(encoding="utf-8"))
+    assert ref["frame_size"] == [2400, 1600]
+    assert len(json.loads((tmp_path / "preview-test_faces.json").read_text(encoding="utf-8"))) == 1
+
+    # 預覽圖縮小且沒有畫上黃色人臉框：與直接縮小的原圖幾乎相同
+    preview = cv2.imread(str(tmp_path / "preview-test_preview.jpg"))
+    expected = cv2.resize(image, (1280, 853), interpolation=cv2.INTER_AREA)
+    assert preview.shape == expected.shape
+    assert np.abs(preview.astype(np.int16) - expected).max() < 64
@@ -0,0 +1,36 @@
+"""/process 的回歸測試：參數錯誤在排入工作前直接回應"""
+import cv2
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def web(web_app, tmp_path_factory):
+    from core.models import db, Media, User
+
+    upload = tmp_path_factory.mktemp("uploads") / "process-route.jpg"
+    cv2.imwrite(str(upload), np.zeros((32, 32, 3), np.uint8))
+    with web_app.app.app_context():
+        user = User(email="process@example.com", username="process")
+        user.set_password("Passw0rd!")
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(Media(media_id="process-route", file_type="image", user_id=user.id, upload_path=str(upload)))
+        db.session.commit()
+    client = web_app.app.test_client()
+    client.post("/auth/login", data={"email": "process@example.com", "password": "Passw0rd!"})
+    return web_app, client
+
+
+@pytest.mark.parametrize("form", [
+    {"mode": "replace"},
+    {"mode": "mosaic", "face_mode_0": "replace"},
+])
+def test_replace_without_overlay_is_rejected_before_enqueue(web, form):
+    web_app, client = web
+    from core.models import ProcessingJob
+
+    response = client.post("/process", data={"media_id": "process-route", **form})
+    assert response.status_code == 400
+    with web_app.app.app_context():
+        assert ProcessingJob.query.filter_by(media_id="process-route").count() == 0
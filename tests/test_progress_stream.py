@@ -0,0 +1,68 @@
+"""/media/<media_id>/progress（SSE）的回歸測試：以模擬的 worker 發布進度，不實際處理媒體"""
+import json
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def web(web_app):
+    # conftest 已停用網站行程內的 worker：工作由測試中的模擬 worker 處理
+    from core.models import db, User
+
+    with web_app.app.app_context():
+        user = User(email="progress@example.com", username="progress")
+        user.set_password("Passw0rd!")
+        db.session.add(user)
+        db.session.commit()
+    client = web_app.app.test_client()
+    client.post("/auth/login", data={"email": "progress@example.com", "password": "Passw0rd!"})
+    return web_app, client
+
+
+def _read_events(response) -> list:
+    events, buf = [], b""
+    for chunk in response.response:
+        buf += chunk
+        while b"\n\n" in buf:
+            event, buf = buf.split(b"\n\n", 1)
+            if event.startswith(b"event: progress"):
+                events.append(json.loads(event.split(b"data: ", 1)[1]))
+    response.close()
+    return events
+
+
+def test_subscriber_of_queued_job_receives_running_progress(web):
+    # 排隊中就訂閱的使用者：worker 每 0.5 秒內就發布一次進度時，也要收到處理中的進度，而不是只有排隊中與完成
+    web_app, client = web
+    from core.job_queue import enqueue_job, finish_job, lease_next_job
+    from core.models import db, Media
+
+    with web_app.app.app_context():
+        user_id = web_app.User.query.filter_by(username="progress").one().id
+        db.session.add(Media(media_id="queued-progress", file_type="video", user_id=user_id))
+        db.session.commit()
+        job_key = enqueue_job("queued-progress", user_id, {"mode": "mosaic"}).job_id
+
+    def worker():
+        time.sleep(0.3)
+        with web_app.app.app_context():
+            job = lease_next_job("test-worker")
+            for done in range(0, 30, 3):
+                web_app.JOB_PROGRESS.publish(
+                    job_key, {"state": "running", "stage": "detect", "frames_done": done, "frames_total": 30}
+                )
+                time.sleep(0.2)
+            finish_job(job.id, "test-worker", progress={"stage": "detect", "frames_done": 30, "frames_total": 30})
+            web_app.JOB_PROGRESS.publish(job_key, {"state": "succeeded", "media_id": "queued-progress"})
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    events = _read_events(client.get("/media/queued-progress/progress", buffered=False))
+    thread.join()
+
+    assert events[0]["state"] == "queued"
+    running = [event for event in events if event["state"] == "running"]
+    assert running and running[-1]["frames_done"] > 0
+    assert events[-1]["state"] == "succeeded"
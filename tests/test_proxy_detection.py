@@ -0,0 +1,51 @@
+"""縮圖（proxy）偵測的測試：在縮圖上偵測，結果換回原圖座標"""
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import make_background, make_face
+from core.face_landmarks import NUM_LANDMARKS, FaceLandmarks
+
+
+def _face_of_size(size):
+    points = np.zeros((1, NUM_LANDMARKS, 3), dtype=np.float32)
+    points[0, 1:, :2] = size
+    return FaceLandmarks(points)
+
+
+def test_required_side_grows_for_small_faces(web_app):
+    min_px = web_app.DETECTION_MIN_FACE_PX
+    # 縮圖上夠大的臉不需要提高解析度
+    assert web_app._required_detection_side(_face_of_size(400), 4000, 1280) == 1280
+    # 原圖 60 像素的臉在 1280 的縮圖上不到 DETECTION_MIN_FACE_PX
+    assert web_app._required_detection_side(_face_of_size(60), 4000, 1280) == int(np.ceil(4000 * min_px / 60))
+    # 最多提高到原圖
+    assert web_app._required_detection_side(_face_of_size(5), 4000, 1280) == 4000
+
+
+def test_proxy_detection_returns_native_coordinates(web_app):
+    image = make_background(2400, 1600, seed=3)
+    image[500:1100, 900:1500] = make_face(600)
+    with web_app.LANDMARKER_POOL.lease(web_app.MODE_IMAGE, 0.5) as landmarker:
+        native, native_boxes = web_app._detect_landmarks_bgr(image, landmarker, max_side=0)
+        proxy, proxy_boxes = web_app._detect_landmarks_bgr(image, landmarker, max_side=480)
+    assert len(native) == len(proxy) == 1
+    # 縮圖上的結果換回原圖座標後與原圖偵測的結果一致（容許縮圖造成的少量誤差）
+    assert np.abs(proxy_boxes[0] - native_boxes[0]).max() <= 0.03 * 600
+    x, y, w, h = proxy_boxes[0]
+    assert 850 <= x <= 1000 and 1000 <= x + w <= 1550 and y + h <= 1150
+
+
+def test_effect_is_rendered_at_full_resolution(web_app, tmp_path):
+    from core.media_processor import MediaProcessor
+
+    image = make_background(2400, 1600, seed=3)
+    image[500:1100, 900:1500] = make_face(600)
+    cv2.imwrite(str(tmp_path / "big.png"), image)
+    out = MediaProcessor(0.5, detection_max_side=480).process_image(
+        tmp_path / "big.png", "mosaic", output_path=tmp_path / "out.png"
+    )
+    result = cv2.imread(str(out))
+    assert result.shape == image.shape
+    # 臉的區域套用了馬賽克，背景維持原解析度不變
+    assert not np.array_equal(result[700:900, 1100:1300], image[700:900, 1100:1300])
+    np.testing.assert_array_equal(result[:300, :600], image[:300, :600])
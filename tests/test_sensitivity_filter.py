@@ -0,0 +1,62 @@
+"""照片只以最低靈敏度偵測一次，換靈敏度時以信心度篩選的測試"""
+import json
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import make_background, make_face
+
+
+def _image():
+    image = make_background(1280, 720, seed=8)
+    image[50:350, 50:350] = make_face(300)
+    return image
+
+
+def test_every_sensitivity_filters_one_detection(web_app):
+    image = _image()
+    before = web_app.DETECTION_CACHE.stats()
+    candidates = web_app._detect_candidates_cached(image, "sensitivity-filter-test")
+    assert len(candidates) == 1 and 0.3 < candidates.scores[0] < 0.9
+    for sensitivity in (0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9):
+        landmarks, boxes = web_app._detect_image_cached(image, "sensitivity-filter-test", sensitivity)
+        expected = int(candidates.scores[0] >= sensitivity)
+        assert len(landmarks) == len(boxes) == expected
+    after = web_app.DETECTION_CACHE.stats()
+    # 只偵測並寫入快取一次，其餘都是篩選快取的候選人臉
+    assert after["stores"] - before["stores"] == 1
+    assert after["memory_hits"] - before["memory_hits"] == 7
+
+
+def test_options_sensitivity_update_refilters_without_detection(web_app, tmp_path, monkeypatch):
+    from core.models import db, Media, User
+
+    monkeypatch.setattr(web_app, "PREVIEW_DIR", tmp_path)
+    monkeypatch.setattr(web_app, "METADATA_DIR", tmp_path)
+    upload = tmp_path / "sensitivity.png"
+    cv2.imwrite(str(upload), _image())
+    with web_app.app.app_context():
+        user = User(email="sensitivity@example.com", username="sensitivity")
+        user.set_password("Passw0rd!")
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(Media(media_id="sensitivity-test", file_type="image", user_id=user.id, upload_path=str(upload)))
+        db.session.commit()
+    client = web_app.app.test_client()
+    client.post("/auth/login", data={"email": "sensitivity@example.com", "password": "Passw0rd!"})
+    assert client.get("/options/sensitivity-test").status_code == 200
+
+    def faces_json():
+        return json.loads((tmp_path / "sensitivity-test_faces.json").read_text(encoding="utf-8"))
+
+    assert len(faces_json()) == 1
+    stores = web_app.DETECTION_CACHE.stats()["stores"]
+    response = client.post("/options/sensitivity-test/sensitivity", data={"sensitivity": "0.9"})
+    assert response.get_json() == {"sensitivity": 0.9, "face_count": 0}
+    assert faces_json() == []
+    response = client.post("/options/sensitivity-test/sensitivity", data={"sensitivity": "0.5"})
+    assert response.get_json()["face_count"] == 1 and len(faces_json()) == 1
+    ref = json.loads((tmp_path / "sensitivity-test_detect.json").read_text(encoding="utf-8"))
+    assert ref["sensitivity"] == 0.5
+    assert web_app.DETECTION_CACHE.stats()["stores"] == stores
+    assert client.post("/options/sensitivity-test/sensitivity", data={"sensitivity": "high"}).status_code == 400
@@ -0,0 +1,73 @@
+"""core.tiled_detection 的測試（以找白色方塊的假偵測器取代模型）"""
+import cv2
+import numpy as np
+
+from core.face_landmarks import NUM_LANDMARKS, FaceLandmarks
+from core.tiled_detection import detect_tiled, tile_grid
+
+# 假偵測器只找得到區塊中 20-130 像素的「臉」（模擬 MediaPipe 對臉的大小的限制）
+MIN_FACE, MAX_FACE = 20, 130
+
+
+def _fake_detect(region):
+    gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    contours, _ = cv2.findContours((gray > 128).astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    faces = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if MIN_FACE <= max(w, h) <= MAX_FACE:
+            grid = np.linspace(0, 1, 22)
+            xs = x + grid[np.arange(NUM_LANDMARKS) % 22] * (w - 1)
+            ys = y + grid[np.arange(NUM_LANDMARKS) // 22] * (h - 1)
+            faces.append(np.stack([xs, ys, np.zeros(NUM_LANDMARKS)], axis=1))
+    return FaceLandmarks(np.array(faces, dtype=np.float32).reshape(-1, NUM_LANDMARKS, 3))
+
+
+def test_tile_grid_covers_image_at_every_level():
+    tiles = tile_grid(1000, 700, tile_size=256, overlap=0.25)
+    scales = sorted({scale for scale, *_ in tiles}, reverse=True)
+    assert scales[0] == 1.0 and scales[-1] < 1.0
+    for scale in scales:
+        level = [tile for tile in tiles if tile[0] == scale]
+        covered = np.zeros((700, 1000), dtype=bool)
+        for _, x1, y1, x2, y2 in level:
+            assert 0 <= x1 < x2 <= 1000 and 0 <= y1 < y2 <= 700
+            covered[y1:y2, x1:x2] = True
+        assert covered.all()
+    # 最上層一個區塊就涵蓋整張影像
+    assert [tile[1:] for tile in tiles if tile[0] == scales[-1]] == [(0, 0, 1000, 700)]
+
+
+def test_detect_tiled_finds_small_and_large_faces_once():
+    image = np.zeros((700, 1000, 3), dtype=np.uint8)
+    squares = [
+        (30, 40, 50),     # 小臉
+        (180, 170, 60),   # 跨過第 0 層的區塊邊界
+        (600, 300, 40),
+        (520, 420, 260),  # 大臉：只有縮小的層級偵測得到
+    ]
+    for x, y, size in squares:
+        image[y : y + size, x : x + size] = 255
+
+    # 整張影像直接偵測時，小臉與大臉都找不到
+    assert len(_fake_detect(cv2.resize(image, (256, 179), interpolation=cv2.INTER_AREA))) < len(squares)
+
+    faces = detect_tiled(image, _fake_detect, tile_size=256, workers=4)
+    assert len(faces) == len(squares)
+    found = sorted(faces.extents().tolist())
+    for (x, y, size), (x1, y1, x2, y2) in zip(sorted(squares), found):
+        tolerance = max(2, size * 0.03)
+        assert abs(x1 - x) <= tolerance and abs(y1 - y) <= tolerance
+        assert abs(x2 - (x + size - 1)) <= tolerance and abs(y2 - (y + size - 1)) <= tolerance
+    assert faces.boxes.shape == (len(squares), 4)
+
+
+def test_detect_tiled_respects_max_faces():
+    image = np.zeros((600, 600, 3), dtype=np.uint8)
+    for i in range(5):
+        image[40 + 110 * i : 80 + 110 * i, 40 : 40 + 20 + 10 * i] = 255
+    faces = detect_tiled(image, _fake_detect, tile_size=256, max_faces=3, workers=1)
+    assert len(faces) == 3
+    # 沒有信心度時依面積保留最大的臉
+    widths = sorted((faces.extents()[:, 2] - faces.extents()[:, 0]).round().tolist())
+    assert widths == [39, 49, 59]
@@ -0,0 +1,57 @@
+"""影片檢查點的測試：中斷後從檢查點繼續的輸出與未中斷時相同，參數錯誤時不留下暫存檔"""
+import pytest
+
+from conftest import write_face_video
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_resumed_output_matches_uninterrupted(web_app, tmp_path, monkeypatch):
+    from core.media_processor import MediaProcessor
+
+    video = write_face_video(tmp_path / "faces.mp4")
+
+    def processor(name):
+        return MediaProcessor(0.6, segment_workers=1, checkpoint_frames=24, checkpoint_dir=tmp_path / name)
+
+    full = processor("full.parts").process_video(video, "eyes", output_path=tmp_path / "full.mp4")
+
+    analyze = MediaProcessor._analyze_video_segment
+
+    def interrupt_at_48(self, video_path, start, *args, **kwargs):
+        if start == 48:
+            raise Interrupted()
+        return analyze(self, video_path, start, *args, **kwargs)
+
+    for name in ("first", "second"):
+        (tmp_path / name).mkdir()
+    monkeypatch.setattr(MediaProcessor, "_analyze_video_segment", interrupt_at_48)
+    with pytest.raises(Interrupted):
+        processor("job.parts").process_video(video, "eyes", output_path=tmp_path / "first" / "out.mp4")
+    assert sorted(p.name for p in (tmp_path / "job.parts").iterdir()) == ["seg00000000.lmk", "seg00000024.lmk"]
+    monkeypatch.undo()
+
+    # 重新執行時輸出路徑不同（例如跨月的日期資料夾），檢查點目錄固定即可繼續
+    resumed_processor = processor("job.parts")
+    resumed = resumed_processor.process_video(video, "eyes", output_path=tmp_path / "second" / "out.mp4")
+    assert resumed_processor.last_video_report["resumed_segments"] == 2
+    assert resumed.read_bytes() == full.read_bytes()
+    assert not (tmp_path / "job.parts").exists()
+
+
+def test_missing_overlay_leaves_no_partial_file(web_app, tmp_path):
+    from core.media_processor import MediaProcessor
+
+    video = write_face_video(tmp_path / "faces.mp4", frames=4)
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    with pytest.raises(ValueError):
+        MediaProcessor(0.6).process_video(video, "replace", output_path=out_dir / "out.mp4")
+    with pytest.raises(ValueError):
+        MediaProcessor(0.6).process_video(
+            video, "mosaic", overlay_path=tmp_path / "missing.png", output_path=out_dir / "out.mp4",
+            face_modes={0: "replace"},
+        )
+    assert list(out_dir.iterdir()) == []
@@ -0,0 +1,55 @@
+"""偵測服務的 worker 在影片處理中途結束時，改在本行程偵測（模擬服務的偵測函數，不啟動 worker 行程）"""
+import itertools
+from contextlib import contextmanager
+
+import pytest
+
+from conftest import write_face_video
+from core.detection_service import DetectionServiceError
+
+
+def _with_dying_service(processor, fail_at):
+    """讓處理器的影片偵測在第 fail_at 次送往「服務」時失敗（worker 結束一次）；local=True 時直接在本行程偵測"""
+    funcs = processor._get_app_funcs()
+    video_detector = funcs['_video_detector']
+    calls = {"service": 0, "local": 0}
+    counter = itertools.count()
+
+    @contextmanager
+    def detector(sensitivity, local=False):
+        with video_detector(sensitivity, local=True) as detect:
+            def service_detect(frame, timestamp_ms, max_side=None):
+                calls["service"] += 1
+                if next(counter) == fail_at:
+                    raise DetectionServiceError("偵測 worker 0 已結束: exit code -9")
+                return detect(frame, timestamp_ms, max_side)
+
+            def local_detect(frame, timestamp_ms, max_side=None):
+                calls["local"] += 1
+                return detect(frame, timestamp_ms, max_side)
+
+            yield local_detect if local else service_detect
+
+    funcs['_video_detector'] = detector
+    return calls
+
+
+@pytest.mark.parametrize("checkpoint_frames", [0, 24])
+def test_dead_service_worker_falls_back_to_local_detection(web_app, tmp_path, checkpoint_frames):
+    from core.media_processor import MediaProcessor
+
+    video = write_face_video(tmp_path / "faces.mp4")
+
+    def processor():
+        return MediaProcessor(0.6, segment_workers=1, checkpoint_frames=checkpoint_frames, checkpoint_dir=tmp_path / "parts")
+
+    expected = processor().process_video(video, "mosaic", output_path=tmp_path / "expected.mp4")
+
+    flaky = processor()
+    calls = _with_dying_service(flaky, fail_at=30)
+    output = flaky.process_video(video, "mosaic", output_path=tmp_path / "out.mp4")
+    assert calls["service"] > 30 and calls["local"] > 0
+    if checkpoint_frames:
+        assert calls["local"] < 72  # 分段時只重新偵測中斷的那一段
+    assert output.read_bytes() == expected.read_bytes()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["expected.mp4", "faces.mp4", "out.mp4"]
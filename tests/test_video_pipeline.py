@@ -0,0 +1,117 @@
+"""core.video_pipeline 的測試（以假的解碼器與編碼器取代 OpenCV）"""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from conftest import write_face_video
+from core.video_pipeline import VideoPipeline
+
+
+class FakeCapture:
+    """依序「解碼」出內容為影格編號的影格，記錄用過的緩衝區"""
+
+    def __init__(self, frames, fail_at=None):
+        self.frames = frames
+        self.fail_at = fail_at
+        self.index = 1  # 第一幀由呼叫端先讀出
+        self.buffers = set()
+
+    def read(self, buf):
+        if self.index == self.fail_at:
+            raise RuntimeError("decode failed")
+        if self.index >= self.frames:
+            return False, buf
+        buf[:] = self.index
+        self.buffers.add(id(buf))
+        self.index += 1
+        return True, buf
+
+
+class FakeWriter:
+    def __init__(self, delay=0.0, fail_at=None):
+        self.written = []
+        self.delay = delay
+        self.fail_at = fail_at
+        self.thread_names = set()
+
+    def write(self, frame):
+        if len(self.written) == self.fail_at:
+            raise RuntimeError("encode failed")
+        time.sleep(self.delay)
+        self.thread_names.add(threading.current_thread().name)
+        self.written.append(int(frame[0, 0, 0]))
+
+
+def _run(frames, max_frames, writer=None, cap=None):
+    cap = cap or FakeCapture(frames)
+    writer = writer or FakeWriter()
+    first = np.zeros((4, 4, 3), np.uint8)
+    with VideoPipeline(cap, writer, first, max_frames) as pipeline:
+        for frame in pipeline:
+            frame += 1  # 就地處理
+            pipeline.write(frame)
+    return pipeline, cap, writer
+
+
+@pytest.mark.parametrize("max_frames", [0, 3, 6])
+def test_frames_are_written_in_order(max_frames):
+    pipeline, cap, writer = _run(50, max_frames, FakeWriter(delay=0.001))
+    assert writer.written == list(range(1, 51))
+    stats = pipeline.stats()
+    assert stats["frames"] == 50 and stats["threaded"] == (max_frames > 0)
+    # 在途影格數不超過緩衝區池大小（第一幀另外算）
+    assert len(cap.buffers) <= stats["max_frames"]
+    if max_frames:
+        assert writer.thread_names == {"video-encode"}
+    else:
+        assert writer.thread_names == {threading.current_thread().name}
+
+
+def test_slow_encoder_applies_backpressure():
+    cap = FakeCapture(1000)
+    writer = FakeWriter(delay=0.002)
+    first = np.zeros((4, 4, 3), np.uint8)
+    with VideoPipeline(cap, writer, first, max_frames=4) as pipeline:
+        for i, frame in enumerate(pipeline):
+            # 解碼執行緒最多領先 max_frames 張，不會把整部影片讀進記憶體
+            assert cap.index - i <= 5
+            pipeline.write(frame)
+            if i == 30:
+                break
+    assert len(writer.written) == 31
+
+
+@pytest.mark.parametrize("max_frames", [0, 4])
+def test_encoder_error_is_raised(max_frames):
+    with pytest.raises(RuntimeError, match="encode failed"):
+        _run(50, max_frames, FakeWriter(fail_at=10))
+
+
+def test_decoder_error_is_raised():
+    with pytest.raises(RuntimeError, match="decode failed"):
+        _run(50, 4, cap=FakeCapture(50, fail_at=20))
+
+
+def test_processing_error_stops_threads():
+    with pytest.raises(ValueError):
+        with VideoPipeline(FakeCapture(1000), FakeWriter(), np.zeros((4, 4, 3), np.uint8), 4) as pipeline:
+            for i, frame in enumerate(pipeline):
+                pipeline.write(frame)
+                if i == 5:
+                    raise ValueError("render failed")
+    assert not any(t.name in ("video-decode", "video-encode") for t in threading.enumerate())
+
+
+def test_threaded_video_output_matches_sequential(web_app, tmp_path):
+    from core.media_processor import MediaProcessor
+
+    video = write_face_video(tmp_path / "faces.mp4", frames=36)
+    outputs = []
+    for pipeline_frames in (0, 6):
+        processor = MediaProcessor(0.6, segment_workers=1, checkpoint_frames=0)
+        processor._get_app_funcs()['VIDEO_PIPELINE_FRAMES'] = pipeline_frames
+        outputs.append(processor.process_video(video, "mosaic", output_path=tmp_path / f"out{pipeline_frames}.mp4"))
+        assert processor.last_video_report["pipeline"]["threaded"] == (pipeline_frames > 0)
+    assert outputs[0].read_bytes() == outputs[1].read_bytes()
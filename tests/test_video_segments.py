@@ -0,0 +1,43 @@
+"""影片分段偵測的測試：段落的結果只由影片內容決定，與執行順序無關"""
+import numpy as np
+
+from conftest import write_face_video
+from core.landmark_store import LandmarkStore
+
+
+def _track(path):
+    store = LandmarkStore.open(path)
+    try:
+        return [store.frame(i)[1].copy() for i in range(store.num_frames)]
+    finally:
+        store.close()
+
+
+def _assert_same_tracks(a, b):
+    assert len(a) == len(b)
+    for boxes_a, boxes_b in zip(a, b):
+        np.testing.assert_array_equal(boxes_a, boxes_b)
+
+
+def test_segment_tracks_do_not_depend_on_run_order(web_app, tmp_path):
+    from core.media_processor import MediaProcessor
+
+    video = write_face_video(tmp_path / "faces.mp4")
+    processor = MediaProcessor(0.6, detect_stride=1, segment_workers=1)
+    segments = [(0, 24), (24, 48), (48, None)]
+
+    def run(order, name):
+        parts = {}
+        for i in order:
+            start, end = segments[i]
+            parts[i] = tmp_path / f"{name}{i}.lmk"
+            processor._analyze_video_segment(video, start, end, 12, 24.0, parts[i])
+        return [box for i in range(len(segments)) for box in _track(parts[i])]
+
+    forward = run([0, 1, 2], "forward")
+    backward = run([2, 1, 0], "backward")
+    assert any(len(boxes) for boxes in forward)  # 合成的人臉有被偵測到
+    _assert_same_tracks(forward, backward)
+    # 重新執行同一段（例如從檢查點繼續時）結果也相同
+    processor._analyze_video_segment(video, 48, None, 12, 24.0, tmp_path / "again.lmk")
+    _assert_same_tracks(_track(tmp_path / "forward2.lmk"), _track(tmp_path / "again.lmk"))